@@ -0,0 +1,55 @@
+"""Shared helpers for the benchmark scripts"""
+
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+from lancompute.master_service import MasterHTTPServer, MasterService  # noqa: E402
+
+
+def start_local_master():
+    """Start an in-process master on an ephemeral port"""
+    master = MasterService(host="127.0.0.1", port=0)
+    server = MasterHTTPServer(("127.0.0.1", 0), master)
+    master.server = server
+    master.scheduler.start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return master, server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def spawn_master(*extra_args):
+    """Start a master in a child process so it does not share our GIL"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "lancompute.master_service",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "WARNING",
+         *extra_args],
+        env={"PYTHONPATH": str(SRC_DIR), "PATH": ""},
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("master did not start")
+
+
+def stop_master(server=None, proc=None):
+    """Stop whatever start_local_master/spawn_master started"""
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    if proc is not None:
+        proc.terminate()
+        proc.wait()
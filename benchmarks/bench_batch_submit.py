@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark batch task submission throughput
+
+Measures tasks per second for
+  * ingest: incremental NDJSON parsing plus TaskQueue.add_tasks in-process
+  * http:   POST /tasks/batch against a master in a child process
+  * single: one POST /task per task over a keep-alive connection, for contrast
+
+Usage:
+  python benchmarks/bench_batch_submit.py --tasks 100000
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import time
+import uuid
+from urllib.parse import urlparse
+
+from _util import spawn_master, stop_master
+
+from lancompute.master_service import (  # noqa: E402
+    MasterHTTPHandler, TaskQueue, iter_json_objects
+)
+
+
+def make_ndjson(count):
+    """Representative small task specs, one per line"""
+    lines = []
+    for i in range(count):
+        spec = {
+            "type": "compute",
+            "payload": {"operation": "matrix_multiply", "size": 100 + i % 50},
+            "priority": i % 10,
+            "requirements": {"memory_gb": 1 + i % 4},
+        }
+        lines.append(json.dumps(spec))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def bench_ingest(body, chunk_size=65536):
+    queue = TaskQueue()
+    chunks = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+    start = time.perf_counter()
+    batch_id = uuid.uuid4().hex
+    tasks = [MasterHTTPHandler._build_task(spec, f"{batch_id}-{index}")
+             for index, spec in enumerate(iter_json_objects(chunks))]
+    queue.add_tasks(tasks)
+    return len(tasks), time.perf_counter() - start
+
+
+def bench_http(url, body):
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=300)
+    start = time.perf_counter()
+    conn.request("POST", "/tasks/batch", body=body,
+                 headers={"Content-Type": "application/x-ndjson"})
+    response = conn.getresponse()
+    result = json.loads(response.read())
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return result["count"], elapsed
+
+
+def bench_single(url, body, limit):
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    lines = body.splitlines()[:limit]
+    start = time.perf_counter()
+    for line in lines:
+        conn.request("POST", "/task", body=line, headers={"Content-Type": "application/json"})
+        conn.getresponse().read()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return len(lines), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch submission throughput benchmark")
+    parser.add_argument("--tasks", type=int, default=100000)
+    parser.add_argument("--single", type=int, default=2000,
+                        help="Tasks to submit one by one for comparison (0 to skip)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    body = make_ndjson(args.tasks)
+    print(f"payload: {args.tasks} tasks, {len(body) / 1e6:.1f} MB NDJSON")
+
+    count, elapsed = bench_ingest(body)
+    print(f"ingest   {count:>8} tasks in {elapsed:6.2f}s  {count / elapsed:>10,.0f} tasks/s")
+
+    proc, url = spawn_master()
+    try:
+        count, elapsed = bench_http(url, body)
+        print(f"batch    {count:>8} tasks in {elapsed:6.2f}s  {count / elapsed:>10,.0f} tasks/s")
+        if args.single:
+            count, elapsed = bench_single(url, body, args.single)
+            print(f"single   {count:>8} tasks in {elapsed:6.2f}s  "
+                  f"{count / elapsed:>10,.0f} tasks/s")
+    finally:
+        stop_master(proc=proc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark message codecs on representative task payloads
+
+For every payload and every available format (JSON, CBOR, msgpack when
+installed), reports encode and decode throughput and the bytes on the
+wire, uncompressed and with each available content encoding. Numeric
+vectors are sent once as plain lists and once as typed arrays, which the
+binary formats carry as raw buffers.
+
+Usage:
+  python benchmarks/bench_codec.py
+  python benchmarks/bench_codec.py --values 100000 --min-time 1
+"""
+
+import argparse
+import array
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from lancompute.codec import (  # noqa: E402
+    ENCODING_IDENTITY, available_encodings, available_formats, compress, decode, encode
+)
+
+
+def payloads(values):
+    rng = random.Random(42)
+    vector = [rng.random() for _ in range(values)]
+    task = {
+        "id": uuid.uuid4().hex, "type": "compute", "priority": 1, "slots": 1,
+        "payload": {"operation": "matrix_multiply", "size": 100},
+        "created_at": time.time(), "timeout": 60.0, "attempts": 0,
+    }
+    return {
+        "heartbeat": {"node_id": "worker-1", "used_slots": 3, "slots": 8, "load": 2.41,
+                      "cpu_percent": 37.5, "memory_percent": 61.2, "want": 5,
+                      "blobs": [uuid.uuid4().hex + uuid.uuid4().hex for _ in range(4)]},
+        "poll (32 tasks)": {"tasks": [dict(task, id=uuid.uuid4().hex) for _ in range(32)],
+                            "cancel": []},
+        "float list": {"type": "compute", "payload": {"vector": vector}},
+        "float64 array": {"type": "compute", "payload": {"vector": array.array("d", vector)}},
+        "int32 array": {"type": "compute", "payload": {
+            "ids": array.array("i", (rng.randrange(1 << 31) for _ in range(values)))}},
+        "result rows": {"result": [{"id": i, "label": f"item-{i}", "score": rng.random(),
+                                    "ok": i % 3 != 0} for i in range(values // 10)]},
+    }
+
+
+def timed(fn, min_time):
+    """Average seconds per call, repeating until min_time has passed"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--values", type=int, default=10000,
+                        help="elements in the numeric payloads")
+    parser.add_argument("--min-time", type=float, default=0.3,
+                        help="seconds spent timing each measurement")
+    args = parser.parse_args()
+
+    encodings = [e for e in available_encodings() if e != ENCODING_IDENTITY]
+    print(f"{'payload':<16} {'format':<20} {'encode MB/s':>11} {'decode MB/s':>11} "
+          f"{'bytes':>10} " + " ".join(f"{e:>10}" for e in encodings))
+    for name, data in payloads(args.values).items():
+        json_size = len(encode(data))
+        for media in available_formats():
+            body = encode(data, media)
+            encode_time = timed(lambda: encode(data, media), args.min_time)
+            decode_time = timed(lambda: decode(body, media), args.min_time)
+            # Throughput is relative to the JSON size, so formats compare like for like
+            print(f"{name:<16} {media:<20} {json_size / encode_time / 1e6:>11.1f} "
+                  f"{json_size / decode_time / 1e6:>11.1f} {len(body):>10,} "
+                  + " ".join(f"{len(compress(body, e)):>10,}" for e in encodings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark scheduling task dependency DAGs through TaskQueue
+
+Submits synthetic DAGs in one batch and drains them through a node,
+completing each task as soon as it is handed out, so every completion has
+to release the children that became ready. Shapes:
+
+  wide     one root fanning out to N-2 tasks that all feed one sink
+  deep     a single chain of N tasks
+  layered  layers of 1000 tasks, each depending on 2 tasks of the layer above
+
+With --legacy the same DAGs also run through a queue that rescans every
+blocked task after each completion, which is quadratic in the DAG size.
+
+Usage:
+  python benchmarks/bench_dag.py
+  python benchmarks/bench_dag.py --sizes 2000 10000 100000 --legacy
+"""
+
+import argparse
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from lancompute.master_service import Node, Task, TaskQueue, TaskStatus  # noqa: E402
+
+
+class RescanTaskQueue(TaskQueue):
+    """Re-checks every blocked task after each completion, kept for comparison"""
+
+    def _resolve_dependents(self, task):
+        self._dependents.clear()
+        for child_id in list(self._waiting):
+            child = self.tasks[child_id]
+            if all(self.tasks[parent].status is TaskStatus.COMPLETED
+                   for parent in child.depends_on):
+                del self._waiting[child_id]
+                self.apply_status(child, TaskStatus.PENDING, time.time())
+                self._changed(child, TaskStatus.BLOCKED, None)
+                self._push(child)
+        return 0
+
+
+def wide(size):
+    tasks = [Task("root", "test", {})]
+    tasks += [Task(f"t{i}", "test", {}, depends_on=["root"]) for i in range(size - 2)]
+    tasks.append(Task("sink", "test", {}, depends_on=[f"t{i}" for i in range(size - 2)]))
+    return tasks
+
+
+def deep(size):
+    tasks = [Task("t0", "test", {})]
+    tasks += [Task(f"t{i}", "test", {}, depends_on=[f"t{i - 1}"]) for i in range(1, size)]
+    return tasks
+
+
+def layered(size, width=1000, seed=42):
+    rng = random.Random(seed)
+    tasks = []
+    for i in range(size):
+        layer_start = i - i % width
+        if layer_start == 0:
+            tasks.append(Task(f"t{i}", "test", {}))
+        else:
+            parents = rng.sample(range(layer_start - width, layer_start), 2)
+            tasks.append(Task(f"t{i}", "test", {}, depends_on=[f"t{p}" for p in parents]))
+    return tasks
+
+
+SHAPES = {"wide": wide, "deep": deep, "layered": layered}
+
+
+def run(queue_cls, tasks):
+    """Submit and drain a DAG; returns (submit seconds, drain seconds)"""
+    queue = queue_cls()
+    node = Node("node-1", "127.0.0.1", 0, {})
+
+    start = time.perf_counter()
+    queue.add_tasks(tasks)
+    submitted = time.perf_counter()
+
+    completed = 0
+    while True:
+        task = queue.get_task_for_node(node)
+        if task is None:
+            break
+        queue.update_task_status(task.id, TaskStatus.COMPLETED)
+        completed += 1
+    drained = time.perf_counter()
+
+    assert completed == len(tasks), f"only {completed} of {len(tasks)} tasks ran"
+    return submitted - start, drained - submitted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000],
+                        help="tasks per DAG")
+    parser.add_argument("--shapes", nargs="+", choices=sorted(SHAPES),
+                        default=["wide", "deep", "layered"])
+    parser.add_argument("--legacy", action="store_true",
+                        help="also run the rescanning queue")
+    parser.add_argument("--legacy-max", type=int, default=5000,
+                        help="largest DAG to run through the rescanning queue")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{'shape':<8} {'tasks':>8} {'queue':<8} {'submit s':>9} {'drain s':>9} "
+          f"{'us/task':>8}")
+    for shape in args.shapes:
+        for size in args.sizes:
+            variants = [("counter", TaskQueue)]
+            if args.legacy and size <= args.legacy_max:
+                variants.append(("rescan", RescanTaskQueue))
+            for label, queue_cls in variants:
+                submit, drain = run(queue_cls, SHAPES[shape](size))
+                print(f"{shape:<8} {size:>8,} {label:<8} {submit:>9.3f} {drain:>9.3f} "
+                      f"{(submit + drain) / size * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Load test of the master's OpenAI-compatible gateway
+
+Starts stub LLM backends that each generate one completion at a time
+(taking --latency seconds, the first one --slow-factor times longer) and
+sends chat completions from many concurrent clients: once straight to a
+single backend on a new connection per request, as scripts/lmstudio_chat.py
+does, then through the gateway over all backends. Halfway through the
+gateway run one backend crashes to show retries and ejection. Reports
+throughput, p50/p99 latency, errors and how requests were spread.
+
+Usage:
+  python benchmarks/bench_gateway.py --backends 4 --clients 16 --requests 400
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import statistics
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from _util import start_local_master, stop_master
+
+from lancompute.gateway import InferenceGateway
+
+MODEL = "qwen2.5-7b"
+
+
+class StubBackend(BaseHTTPRequestHandler):
+    """OpenAI-compatible server generating one completion at a time"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.server.crashed:
+            self.close_connection = True
+            return
+        self._reply({"object": "list", "data": [{"id": MODEL, "object": "model"}]})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        if self.server.crashed:
+            # Like a server that died: drop kept-alive connections unanswered
+            self.close_connection = True
+            return
+        with self.server.generating:
+            time.sleep(self.server.latency)
+        self._reply({"model": MODEL, "choices": [
+            {"message": {"role": "assistant", "content": "Hello from " + self.server.name}}]})
+
+    def _reply(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_backend(name, latency):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBackend)
+    server.daemon_threads = True
+    server.name = name
+    server.latency = latency
+    server.generating = threading.Lock()
+    server.crashed = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def client(port, count, keep_alive, latencies, errors, backends):
+    """Send `count` chat completions, on one connection or a new one each"""
+    body = json.dumps({"model": MODEL, "messages": [{"role": "user", "content": "Hi"}]})
+    conn = None
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            conn.request("POST", "/v1/chat/completions", body=body,
+                         headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+            else:
+                latencies.append(time.perf_counter() - start)
+                backends[response.getheader("X-Backend", "direct")] += 1
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            conn.close()
+            conn = None
+        if not keep_alive and conn is not None:
+            conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def run(label, port, clients, requests, keep_alive, names, during=None):
+    latencies, errors, backends = [], [], Counter()
+    threads = [threading.Thread(target=client, args=(port, requests // clients, keep_alive,
+                                                     latencies, errors, backends))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    if during is not None:
+        during()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0
+    print(f"{label:<28} {len(latencies) / elapsed:8.1f} req/s  "
+          f"p50 {statistics.median(latencies) * 1000 if latencies else 0:7.1f} ms  "
+          f"p99 {p99 * 1000:7.1f} ms  errors {len(errors)}")
+    if len(backends) > 1:
+        spread = sorted((names[backend], count) for backend, count in backends.items())
+        print(f"{'':<28} spread: " + ", ".join(f"{name} {count}" for name, count in spread))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference gateway load test")
+    parser.add_argument("--backends", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Seconds a backend takes per completion")
+    parser.add_argument("--slow-factor", type=float, default=4.0,
+                        help="How much slower the first backend is")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    servers = [start_backend(f"b{i}", args.latency * (args.slow_factor if i == 0 else 1))
+               for i in range(args.backends)]
+    print(f"{args.backends} backends ({args.latency * 1000:.0f} ms per completion, b0 "
+          f"{args.slow_factor:g}x slower), {args.clients} clients, {args.requests} requests")
+
+    run("direct, one backend", servers[1].server_address[1], args.clients,
+        args.requests, keep_alive=False, names={})
+
+    master, server, _ = start_local_master()
+    master.gateway = InferenceGateway([f"127.0.0.1:{s.server_address[1]}" for s in servers],
+                                      max_failures=1, eject_seconds=60)
+    master.gateway.check_health()
+    port = server.server_address[1]
+    names = {f"127.0.0.1:{s.server_address[1]}": s.name for s in servers}
+    run("gateway", port, args.clients, args.requests, keep_alive=True, names=names)
+
+    def stop_one():
+        time.sleep(args.requests / args.clients * args.latency / 2)
+        servers[-1].crashed = True
+        servers[-1].shutdown()
+        servers[-1].server_close()
+
+    run(f"gateway, b{args.backends - 1} crashes midway", port, args.clients,
+        args.requests, keep_alive=True, names=names, during=stop_one)
+    stop_master(server)
+    for backend in servers[:-1]:
+        backend.shutdown()
+        backend.server_close()
+
+
+if __name__ == "__main__":
+    main()
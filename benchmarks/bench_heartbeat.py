@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Load generator measuring master heartbeat latency
+
+Simulates many workers, each holding one keep-alive connection to the
+master and sending heartbeats in a loop. Reports p50/p99 latency across
+all heartbeats. Optionally opens stalled connections that never finish
+their request to show they do not block everybody else.
+
+Usage:
+  python benchmarks/bench_heartbeat.py --workers 500
+  python benchmarks/bench_heartbeat.py --url http://192.168.1.10:8080
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import socket
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+from _util import spawn_master, start_local_master, stop_master
+
+
+def post(conn, path, data):
+    body = json.dumps(data)
+    conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def worker(host, port, node_id, rounds, interval, barrier, latencies, errors):
+    """One simulated worker on its own keep-alive connection"""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    try:
+        post(conn, "/node/register", {"id": node_id, "address": "127.0.0.1",
+                                      "port": 0, "capabilities": {}})
+        barrier.wait()
+        for _ in range(rounds):
+            start = time.perf_counter()
+            status = post(conn, "/node/heartbeat", {"node_id": node_id})
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+            if interval:
+                time.sleep(interval)
+    except Exception as e:
+        errors.append(repr(e))
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Master heartbeat latency benchmark")
+    parser.add_argument("--url", help="Existing master URL (default: spawn a local master)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run the master inside the benchmark process")
+    parser.add_argument("--workers", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20, help="Heartbeats per worker")
+    parser.add_argument("--interval", type=float, default=0.05,
+                        help="Pause between heartbeats of one worker in seconds")
+    parser.add_argument("--stalled", type=int, default=10,
+                        help="Connections that send a partial request and stall")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    threading.stack_size(256 * 1024)
+
+    server = proc = None
+    url = args.url
+    if url is None and args.in_process:
+        _, server, url = start_local_master()
+    elif url is None:
+        proc, url = spawn_master()
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+
+    stalled = []
+    for _ in range(args.stalled):
+        sock = socket.create_connection((host, port))
+        sock.sendall(b"POST /node/heartbeat HTTP/1.1\r\nContent-Length: 64\r\n\r\n{")
+        stalled.append(sock)
+
+    latencies, errors = [], []
+    barrier = threading.Barrier(args.workers + 1)
+    threads = [
+        threading.Thread(target=worker, daemon=True,
+                         args=(host, port, f"bench-{i}", args.rounds, args.interval,
+                               barrier, latencies, errors))
+        for i in range(args.workers)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stop_master(server, proc)
+
+    latencies.sort()
+    ms = [value * 1000 for value in latencies]
+    print(f"workers={args.workers} heartbeats={len(ms)} errors={len(errors)} "
+          f"stalled_connections={args.stalled}")
+    print(f"throughput: {len(ms) / elapsed:,.0f} heartbeats/s")
+    print(f"p50: {statistics.median(ms):.2f} ms  "
+          f"p99: {ms[int(len(ms) * 0.99) - 1]:.2f} ms  max: {ms[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
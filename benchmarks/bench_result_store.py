@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark result store backends
+
+Stores N results of a given size and reports write/read throughput and the
+growth in anonymous (non file-backed) memory, which is what the master pays
+for keeping results. Pages of mmap'd segments are file-backed and can be
+reclaimed by the kernel, so they are not counted.
+
+Usage:
+  python benchmarks/bench_result_store.py
+  python benchmarks/bench_result_store.py --results 20000 --size 8192
+"""
+
+import argparse
+import logging
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from lancompute.result_store import FileResultStore, MemoryResultStore  # noqa: E402
+
+
+def anonymous_memory(process):
+    info = process.memory_info()
+    return info.rss - getattr(info, "shared", 0)
+
+
+def run(name, store, results, size):
+    process = psutil.Process()
+    before = anonymous_memory(process)
+
+    start = time.perf_counter()
+    for i in range(results):
+        # A distinct object per task, as results arrive over the network
+        store.put(f"task-{i}", {"data": str(i) * (size // len(str(i)))})
+    write_time = time.perf_counter() - start
+
+    ids = [f"task-{random.randrange(results)}" for _ in range(min(results, 10000))]
+    start = time.perf_counter()
+    for task_id in ids:
+        store.get(task_id)
+    read_time = time.perf_counter() - start
+
+    growth = (anonymous_memory(process) - before) / 1024 ** 2
+    print(f"{name:<8} writes {results / write_time:>10,.0f}/s   "
+          f"reads {len(ids) / read_time:>10,.0f}/s   memory +{growth:,.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--results", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=4096, help="result size in bytes")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as base_dir:
+        store = FileResultStore(base_dir)
+        run("file", store, args.results, args.size)
+        store.close()
+    run("memory", MemoryResultStore(), args.results, args.size)
+
+
+if __name__ == "__main__":
+    main()
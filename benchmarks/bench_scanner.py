@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Benchmark the network scanner against fake hosts on loopback
+
+Every address in 127.0.0.0/8 is local on Linux, so a /24 (or /16) under it
+can be scanned without touching the network. Fake HTTP listeners answer as
+LM Studio and Ollama on every --every'th host. A --silent fraction of the
+other hosts never answer, like unused addresses on a LAN: their ports
+listen with a full accept queue, so connection attempts are dropped and
+time out. The rest refuse connections. Reports wall time, probes per second
+and hosts found for the asyncio engine, and with --legacy for the old
+thread pool running ping plus sequential blocking connects per host.
+
+With --inventory, a day of periodic discovery is then simulated against a
+host inventory: a scan every --interval seconds of simulated time, each
+probing only the hosts that are due. Reports the hosts probed and scan
+time against running a full sweep every round.
+
+Usage:
+  python benchmarks/bench_scanner.py
+  python benchmarks/bench_scanner.py --prefix 16 --every 1000 --silent 0
+  python benchmarks/bench_scanner.py --legacy
+  python benchmarks/bench_scanner.py --inventory --interval 300 --hours 24
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import logging
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from lancompute import network_scanner  # noqa: E402
+from lancompute.inventory import HostInventory  # noqa: E402
+from lancompute.network_scanner import (  # noqa: E402
+    DEFAULT_PORTS, raise_fd_limit, scan_host, scan_incremental, scan_network
+)
+
+BANNERS = {1234: b"HTTP/1.0 200 OK\r\nServer: LM Studio\r\n\r\n",
+           11434: b"HTTP/1.0 200 OK\r\n\r\nOllama is running"}
+
+
+def start_fake_services(hosts):
+    """Serve fake LM Studio/Ollama banners on the given hosts from a background loop"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def handler(port):
+        async def handle(reader, writer):
+            try:
+                await asyncio.wait_for(reader.read(1024), 1.0)
+                writer.write(BANNERS[port])
+                await writer.drain()
+            except (asyncio.TimeoutError, OSError):
+                pass
+            writer.close()
+        return handle
+
+    async def serve():
+        for host in hosts:
+            for port in BANNERS:
+                await asyncio.start_server(handler(port), str(host), port)
+        ready.set()
+
+    def run():
+        loop.run_until_complete(serve())
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return loop
+
+
+def silence(hosts, ports):
+    """Make connections to these hosts hang: listen, never accept, fill the queue"""
+    sockets = []
+    for host in hosts:
+        for port in ports:
+            listener = socket.socket()
+            listener.bind((str(host), port))
+            listener.listen(0)
+            sockets.append(listener)
+            for _ in range(2):
+                filler = socket.socket()
+                filler.setblocking(False)
+                filler.connect_ex((str(host), port))
+                sockets.append(filler)
+    return sockets
+
+
+def run_asyncio(net, concurrency):
+    async def scan():
+        return [host async for host in scan_network(net.hosts(), DEFAULT_PORTS,
+                                                    concurrency=concurrency)]
+    return asyncio.run(scan())
+
+
+def run_legacy(net, threads):
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda ip: scan_host(ip, DEFAULT_PORTS), net.hosts()))
+    return [host for host in results if host["alive"] or host["open_ports"]]
+
+
+def run_inventory(net, concurrency, interval, hours):
+    """Scan every `interval` simulated seconds; returns (rounds, hosts probed, seconds)"""
+    async def scan(inventory, now):
+        async for _ in scan_incremental(inventory, net.hosts(), DEFAULT_PORTS, now=now,
+                                        concurrency=concurrency):
+            pass
+
+    rounds = int(hours * 3600 / interval)
+    probed = 0
+    seconds = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        inventory = HostInventory(os.path.join(tmp, "hosts.db"))
+        for round_number in range(rounds):
+            now = round_number * interval
+            probed += len(inventory.due(net.hosts(), now))
+            start = time.perf_counter()
+            asyncio.run(scan(inventory, now))
+            seconds += time.perf_counter() - start
+        inventory.close()
+    return rounds, probed, seconds
+
+
+def report(name, net, seconds, found):
+    hosts = net.num_addresses - 2
+    services = sum(len(host["open_ports"]) for host in found)
+    print(f"{name:<8} {net}  {seconds:>7.2f}s  "
+          f"{hosts * len(DEFAULT_PORTS) / seconds:>10,.0f} probes/s   "
+          f"{len(found):,} hosts up, {services:,} services")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--prefix", type=int, default=24, help="size of the scanned network")
+    parser.add_argument("--every", type=int, default=10,
+                        help="run fake services on every Nth host")
+    parser.add_argument("--silent", type=float, default=0.8,
+                        help="fraction of the other hosts that never answer")
+    parser.add_argument("--concurrency", type=int, default=2048)
+    parser.add_argument("--legacy", action="store_true",
+                        help="also time the thread pool scanner (50 threads)")
+    parser.add_argument("--inventory", action="store_true",
+                        help="also simulate periodic scans against a host inventory")
+    parser.add_argument("--interval", type=float, default=300,
+                        help="simulated seconds between inventory scans")
+    parser.add_argument("--hours", type=float, default=24,
+                        help="simulated hours of inventory scans")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    net = ipaddress.ip_network(f"127.42.0.0/{args.prefix}")
+    all_hosts = list(net.hosts())
+    services = all_hosts[::args.every]
+    others = sorted(set(all_hosts) - set(services))
+    silent = set(random.Random(1).sample(others, int(len(others) * args.silent)))
+    raise_fd_limit(len(silent) * len(DEFAULT_PORTS) * 3 + args.concurrency + 256)
+    start_fake_services(services)
+    sockets = silence(silent, DEFAULT_PORTS)
+
+    start = time.perf_counter()
+    found = run_asyncio(net, args.concurrency)
+    sweep_seconds = time.perf_counter() - start
+    report("asyncio", net, sweep_seconds, found)
+    assert sum(1 for host in found if host["open_ports"]) == len(services)
+
+    if args.inventory:
+        rounds, probed, seconds = run_inventory(net, args.concurrency, args.interval,
+                                                args.hours)
+        hosts = len(all_hosts)
+        print(f"inventory: {rounds} scans over {args.hours:g}h probed {probed:,} hosts in "
+              f"{seconds:.1f}s; full sweeps: {rounds * hosts:,} hosts in "
+              f"~{rounds * sweep_seconds:.0f}s ({probed / (rounds * hosts):.1%} of the probes, "
+              f"{seconds / (rounds * sweep_seconds):.1%} of the time)")
+
+    if args.legacy:
+        name = "legacy"
+        if shutil.which("ping") is None:
+            # Stand-in for "ping -c 1 -W 1": silent hosts cost the 1s wait
+            def ping_host(ip):
+                if ip in silent:
+                    time.sleep(1)
+                    return False
+                return True
+            network_scanner.ping_host = ping_host
+            name = "legacy*"
+            print("* ping is not installed: emulating it (1s for silent hosts)")
+        start = time.perf_counter()
+        found = run_legacy(net, 50)
+        report(name, net, time.perf_counter() - start, found)
+
+    for sock in sockets:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark master memory per pending task
+
+Queues N small tasks parsed from JSON, as they arrive over HTTP, and
+reports the bytes allocated per pending task for the previous dataclass
+representation, the compact slotted one, and the compact one with payloads
+moved to a file payload store. Also times serializing the tasks for a
+response (dataclasses.asdict versus Task.to_dict).
+
+Usage:
+  python benchmarks/bench_task_memory.py
+  python benchmarks/bench_task_memory.py --tasks 1000000
+"""
+
+import argparse
+import gc
+import json
+import logging
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from lancompute.master_service import Task, TaskQueue, TaskStatus  # noqa: E402
+from lancompute.result_store import FileResultStore  # noqa: E402
+
+
+@dataclass
+class LegacyTask:
+    """The dataclass representation kept for comparison"""
+    id: str
+    type: str
+    payload: Dict[str, Any]
+    priority: int = 0
+    requirements: Dict[str, Any] = None
+    status: TaskStatus = TaskStatus.PENDING
+    assigned_node: Optional[str] = None
+    created_at: float = None
+    started_at: Optional[float] = None
+    completed_at: Optional[float] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    execution_time: Optional[float] = None
+    timeout: Optional[float] = None
+    attempts: int = 0
+    max_retries: Optional[int] = None
+
+    def __post_init__(self):
+        if self.created_at is None:
+            self.created_at = time.time()
+        if self.requirements is None:
+            self.requirements = {}
+
+
+class LegacyTaskQueue(TaskQueue):
+    """Queue that stores tasks as submitted, without compacting them"""
+
+    def _compact(self, task):
+        pass
+
+
+def make_tasks(cls, count):
+    tasks = []
+    for i in range(count):
+        spec = json.loads(json.dumps({
+            "type": "compute",
+            "payload": {"script": "sum(range(1000))", "i": i},
+            "priority": i % 10,
+            "requirements": {"min_memory_gb": 4, "platform": "Linux"}
+        }))
+        tasks.append(cls(id=f"task-{i}", type=spec["type"], payload=spec["payload"],
+                         priority=spec["priority"], requirements=spec["requirements"]))
+    return tasks
+
+
+def measure(label, cls, queue, count):
+    gc.collect()
+    tracemalloc.start()
+    queue.add_tasks(make_tasks(cls, count))
+    gc.collect()
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<24} {used / count:>8,.0f} bytes/task   "
+          f"{used / 1024 ** 2:>8,.1f} MiB total")
+    return queue
+
+
+def time_serialization(label, tasks, serialize):
+    start = time.perf_counter()
+    for task in tasks:
+        serialize(task)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<24} {len(tasks) / elapsed:>10,.0f} tasks/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=200000, help="pending tasks to queue")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"Memory per pending task ({args.tasks:,} tasks):")
+    legacy = measure("dataclass", LegacyTask, LegacyTaskQueue(), args.tasks)
+    legacy_tasks = list(legacy.tasks.values())
+    del legacy
+    compact = measure("slots + interning", Task, TaskQueue(), args.tasks)
+    compact_tasks = list(compact.tasks.values())
+    del compact
+    with tempfile.TemporaryDirectory() as directory:
+        store = FileResultStore(directory)
+        measure("+ file payload store", Task, TaskQueue(payload_store=store), args.tasks)
+        store.close()
+
+    print("Serialization:")
+    time_serialization("dataclasses.asdict", legacy_tasks, asdict)
+    time_serialization("Task.to_dict", compact_tasks, Task.to_dict)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark the master write-ahead log
+
+Measures task submission throughput with the WAL disabled and under each
+fsync policy (several submitting threads, so group commit can share
+fsyncs), then the cold-start recovery time for a large task history both
+from a snapshot and from the raw WAL.
+
+Usage:
+  python benchmarks/bench_wal.py
+  python benchmarks/bench_wal.py --submit 20000 --threads 16 --history 1000000
+"""
+
+import argparse
+import gc
+import logging
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from lancompute.master_service import MasterService, Task, TaskStatus  # noqa: E402
+from lancompute.wal import SYNC_ALWAYS, SYNC_BATCH, SYNC_OFF, WriteAheadLog  # noqa: E402
+
+
+def bench_submit(label, wal, count, threads):
+    master = MasterService(wal=wal)
+    per_thread = count // threads
+
+    def submit(offset):
+        for i in range(offset, offset + per_thread):
+            master.task_queue.add_task(Task(id=f"task-{i}", type="test", payload={"i": i}))
+
+    workers = [threading.Thread(target=submit, args=(n * per_thread,))
+               for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    if wal is not None:
+        wal.close()
+    print(f"  {label:<16} {per_thread * threads / elapsed:>10,.0f} tasks/s")
+
+
+def build_history(directory, count, snapshot):
+    master = MasterService(wal=WriteAheadLog(directory, sync=SYNC_OFF))
+    batch = []
+    for i in range(count):
+        batch.append(Task(id=f"task-{i}", type="compute", priority=i % 10,
+                          payload={"script": "sum(range(1000))", "i": i}))
+        if len(batch) == 10000:
+            master.task_queue.add_tasks(batch)
+            batch = []
+    if batch:
+        master.task_queue.add_tasks(batch)
+    # Most of the history is finished, as on a long-running master
+    for i in range(0, count, 10):
+        for j in range(i, min(i + 9, count)):
+            master.task_queue.update_task_status(f"task-{j}", TaskStatus.COMPLETED,
+                                                 execution_time=0.1)
+    if snapshot:
+        master.snapshot()
+    master.wal.close()
+
+
+def bench_recovery(count, snapshot):
+    with tempfile.TemporaryDirectory() as directory:
+        build_history(directory, count, snapshot)
+        # Keep garbage from building the history out of the measurement
+        gc.collect()
+        start = time.perf_counter()
+        master = MasterService(wal=WriteAheadLog(directory, sync=SYNC_OFF))
+        elapsed = time.perf_counter() - start
+        pending = master.task_queue.pending_count()
+        master.wal.close()
+    source = "snapshot" if snapshot else "WAL only"
+    print(f"  {source:<16} {elapsed:>8.2f}s for {count:,} tasks ({pending:,} pending)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--submit", type=int, default=20000, help="tasks per throughput run")
+    parser.add_argument("--threads", type=int, default=16, help="submitting threads")
+    parser.add_argument("--history", type=int, default=1000000,
+                        help="tasks in the recovery benchmark")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    print(f"Submit throughput ({args.threads} threads):")
+    bench_submit("no WAL", None, args.submit, args.threads)
+    for sync in (SYNC_OFF, SYNC_BATCH, SYNC_ALWAYS):
+        with tempfile.TemporaryDirectory() as directory:
+            bench_submit(f"sync={sync}", WriteAheadLog(directory, sync=sync),
+                         args.submit, args.threads)
+
+    print("Cold start recovery:")
+    bench_recovery(args.history, snapshot=True)
+    bench_recovery(args.history, snapshot=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Replay a task trace against each scheduling policy on a simulated cluster
+
+Drives the real TaskQueue, TaskScheduler and policies on a virtual clock:
+tasks arrive at their trace times, start as soon as the scheduler assigns
+them, and finish after their duration scaled by the node's speed for the
+task type (with some noise). Reports makespan, wait times (arrival to
+start) and response times (arrival to finish) per policy.
+
+A trace is a JSON lines file of {"at": seconds, "type": str, "duration":
+seconds on a speed 1.0 node}; without one a synthetic trace is generated.
+A cluster file is a JSON list of {"id", "cpus", "slots", "speed": {type:
+factor, "*": factor}}; the default mixes fast, slow and GPU nodes.
+
+Usage:
+  python benchmarks/simulate_scheduling.py
+  python benchmarks/simulate_scheduling.py --tasks 5000 --load 0.9
+  python benchmarks/simulate_scheduling.py --burst
+  python benchmarks/simulate_scheduling.py --trace trace.jsonl --cluster nodes.json
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import random
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from lancompute.master_service import MasterService, Task, TaskStatus  # noqa: E402
+from lancompute.scheduling import POLICIES, create_policy  # noqa: E402
+
+# Listed in registration order, which the priority policy follows
+DEFAULT_CLUSTER = [
+    {"id": "laptop", "cpus": 4, "slots": 2, "speed": {"*": 3.0}},
+    {"id": "ws-mid", "cpus": 8, "slots": 4, "speed": {"*": 1.6}},
+    {"id": "gpu-box", "cpus": 8, "slots": 2, "speed": {"ml_inference": 0.25, "*": 2.0}},
+    {"id": "ws-fast", "cpus": 16, "slots": 4, "speed": {"*": 1.0}},
+]
+
+# Task type -> (share of the trace, duration on a speed 1.0 node)
+TASK_MIX = {"compute": (0.6, 2.0), "data_processing": (0.25, 4.0), "ml_inference": (0.15, 3.0)}
+
+
+def synthetic_trace(count, cluster, load, seed, burst=False):
+    """Poisson arrivals sized to keep the cluster at roughly `load` utilization
+    
+    With burst, every task arrives at time zero instead.
+    """
+    rng = random.Random(seed)
+    types = list(TASK_MIX)
+    weights = [TASK_MIX[t][0] for t in types]
+    # Work per second the cluster gets through, in speed 1.0 seconds
+    mean_duration = sum(share * duration for share, duration in TASK_MIX.values())
+    capacity = sum(node["slots"] / node["speed"].get("*", 1.0) for node in cluster)
+    rate = load * capacity / mean_duration
+    at = 0.0
+    trace = []
+    for _ in range(count):
+        if not burst:
+            at += rng.expovariate(rate)
+        task_type = rng.choices(types, weights)[0]
+        trace.append({"at": at, "type": task_type, "duration": TASK_MIX[task_type][1]})
+    return trace
+
+
+def simulate(policy_name, trace, cluster, seed=0):
+    """Run a trace through one policy; returns (makespan, wait times, response times)"""
+    rng = random.Random(seed)
+    clock = [0.0]
+    policy = create_policy(policy_name)
+    if hasattr(policy, "clock"):
+        policy.clock = lambda: clock[0]
+
+    master = MasterService()
+    master.scheduler.policy = policy
+    queue = master.task_queue
+    # Nodes never send heartbeats here
+    master.node_manager.heartbeat_timeout = float("inf")
+    speeds = {}
+    for spec in cluster:
+        master.node_manager.register_node({
+            "id": spec["id"], "address": "127.0.0.1", "port": 0,
+            "capabilities": {"cpu_count_logical": spec["cpus"]},
+            "slots": spec["slots"], "prefetch_depth": 0})
+        speeds[spec["id"]] = spec["speed"]
+
+    sequence = itertools.count()
+    events = [(entry["at"], next(sequence), "submit", (f"task-{i}", entry))
+              for i, entry in enumerate(trace)]
+    heapq.heapify(events)
+    submitted = {}
+    waits = []
+    responses = []
+    last_finish = 0.0
+
+    while events:
+        now, _, kind, data = heapq.heappop(events)
+        clock[0] = now
+        if kind == "submit":
+            task_id, entry = data
+            submitted[task_id] = entry
+            queue.add_task(Task(task_id, entry["type"], {}))
+        else:
+            node_id, task_id, duration = data
+            queue.update_task_status(task_id, TaskStatus.COMPLETED, execution_time=duration)
+            master.node_manager.complete_task_on_node(node_id, task_id, True)
+            master.scheduler.task_finished(queue.get_task(task_id), node_id)
+            responses.append(now - submitted[task_id]["at"])
+            last_finish = now
+
+        master.scheduler.schedule()
+        for node_id, speed in speeds.items():
+            for task in master.dispatcher.take(node_id, max_tasks=1000, timeout=0):
+                entry = submitted[task.id]
+                queue.update_task_status(task.id, TaskStatus.RUNNING)
+                task.started_at = now
+                waits.append(now - entry["at"])
+                duration = (entry["duration"] * speed.get(task.type, speed.get("*", 1.0))
+                            * rng.lognormvariate(0, 0.2))
+                heapq.heappush(events, (now + duration, next(sequence), "finish",
+                                        (node_id, task.id, duration)))
+
+    return last_finish - trace[0]["at"], waits, responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--trace", help="JSON lines trace to replay")
+    parser.add_argument("--cluster", help="JSON list of simulated nodes")
+    parser.add_argument("--tasks", type=int, default=2000, help="synthetic trace length")
+    parser.add_argument("--load", type=float, default=0.8,
+                        help="synthetic arrival rate as a fraction of cluster capacity")
+    parser.add_argument("--burst", action="store_true",
+                        help="submit the whole synthetic trace at once")
+    parser.add_argument("--policies", nargs="+", choices=sorted(POLICIES),
+                        default=["priority", "round_robin", "least_loaded", "predictive"])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    cluster = json.loads(Path(args.cluster).read_text()) if args.cluster else DEFAULT_CLUSTER
+    if args.trace:
+        with open(args.trace) as f:
+            trace = [json.loads(line) for line in f if line.strip()]
+        trace.sort(key=lambda entry: entry["at"])
+    else:
+        trace = synthetic_trace(args.tasks, cluster, args.load, args.seed, args.burst)
+
+    print(f"{len(trace):,} tasks on {len(cluster)} nodes")
+    print(f"{'policy':<14} {'makespan s':>11} {'mean wait s':>12} {'p95 wait s':>11} "
+          f"{'mean response s':>16}")
+    for name in args.policies:
+        makespan, waits, responses = simulate(name, trace, cluster, args.seed)
+        p95 = statistics.quantiles(waits, n=20)[-1]
+        print(f"{name:<14} {makespan:>11.1f} {statistics.mean(waits):>12.2f} {p95:>11.2f} "
+              f"{statistics.mean(responses):>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,16 @@ Usage examples:
   - List models:
       python scripts/lmstudio_chat.py --list-models
 
-  - Send a quick prompt (defaults shown):
+  - Send a quick prompt (defaults shown); tokens are printed as they arrive:
       python scripts/lmstudio_chat.py \
         --model mistral:latest \
         --prompt "Give me one fun fact."
 
+  - Wait for the whole completion instead of streaming it:
+      python scripts/lmstudio_chat.py --no-stream --prompt "Give me one fun fact."
+
+Time to first token and tokens/sec are reported on stderr after each reply.
+
 Configuration:
   - Reads environment variables, and if present a local `.env` file.
   - LM_STUDIO_BASE_URL  Base URL to the API (default: http://127.0.0.1:1234)
@@ -21,8 +26,9 @@ import argparse
 import json
 import os
 import sys
+import time
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 
 import requests
 
@@ -63,6 +69,86 @@ def list_models(base_url: str) -> int:
     return 0
 
 
+def iter_stream_deltas(lines: Iterable[bytes]) -> Iterator[Tuple[str, Optional[int]]]:
+    """Yield (content, completion_tokens) from the server-sent events of a streamed chat.
+
+    completion_tokens is set on the usage chunk servers send last when asked
+    for it with stream_options.include_usage; it is None on the others.
+    """
+    for line in lines:
+        if not line.startswith(b"data:"):
+            continue
+        data = line[len(b"data:"):].strip()
+        if data == b"[DONE]":
+            return
+        try:
+            event = json.loads(data)
+        except ValueError:
+            continue
+        usage = event.get("usage") or {}
+        content = ""
+        for choice in event.get("choices") or []:
+            content += (choice.get("delta") or {}).get("content") or ""
+        yield content, usage.get("completion_tokens")
+
+
+def _report(started: float, first_token: Optional[float], tokens: Optional[int]) -> None:
+    """Print time to first token and tokens/sec to stderr.
+
+    Without streaming the first token shows up with the last, so TTFT is
+    the whole request and tokens/sec covers it all; when streaming,
+    tokens/sec is the generation speed after the first token.
+    """
+    finished = time.perf_counter()
+    streamed = first_token is not None
+    first_token = first_token if streamed else finished
+    stats = [f"TTFT {first_token - started:.2f}s", f"total {finished - started:.2f}s"]
+    if tokens:
+        stats.append(f"{tokens} tokens")
+        if not streamed:
+            stats.append(f"{tokens / (finished - started):.1f} tokens/s")
+        elif tokens > 1 and finished > first_token:
+            stats.append(f"{(tokens - 1) / (finished - first_token):.1f} tokens/s")
+    print(f"[{', '.join(stats)}]", file=sys.stderr)
+
+
+def stream_chat(base_url: str, body: Dict[str, Any]) -> int:
+    """Send a chat completion with stream=True and print tokens as they arrive."""
+    body = dict(body, stream=True, stream_options={"include_usage": True})
+    started = time.perf_counter()
+    first_token = None
+    chunks = 0
+    usage_tokens = None
+    try:
+        with requests.post(
+            f"{base_url}/v1/chat/completions",
+            json=body,
+            stream=True,
+            timeout=(15, 60),
+        ) as r:
+            r.raise_for_status()
+            # chunk_size=None hands over each chunk as it arrives, unbuffered
+            for content, completion_tokens in iter_stream_deltas(r.iter_lines(chunk_size=None)):
+                if completion_tokens is not None:
+                    usage_tokens = completion_tokens
+                if not content:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    content = content.lstrip()
+                chunks += 1
+                print(content, end="", flush=True)
+    except requests.RequestException as exc:
+        if first_token is not None:
+            print()
+        print(f"Error: chat request failed: {exc}", file=sys.stderr)
+        return 2
+    print()
+    # Servers send one token per chunk; prefer their own count when given
+    _report(started, first_token, usage_tokens or chunks)
+    return 0
+
+
 def chat(
     base_url: str,
     model: str,
@@ -70,6 +156,7 @@ def chat(
     system_prompt: str = "You are a concise assistant.",
     max_tokens: int = 128,
     temperature: float = 0.2,
+    stream: bool = False,
 ) -> int:
     body: Dict[str, Any] = {
         "model": model,
@@ -80,6 +167,9 @@ def chat(
         "max_tokens": max_tokens,
         "temperature": temperature,
     }
+    if stream:
+        return stream_chat(base_url, body)
+    started = time.perf_counter()
     try:
         r = requests.post(
             f"{base_url}/v1/chat/completions",
@@ -105,6 +195,8 @@ def chat(
         return 0
 
     print(content)
+    # Nothing is shown before the whole completion, so that is the first token too
+    _report(started, None, (data.get("usage") or {}).get("completion_tokens"))
     return 0
 
 
@@ -136,6 +228,12 @@ def main() -> int:
     )
     parser.add_argument("--max-tokens", type=int, default=128)
     parser.add_argument("--temperature", type=float, default=0.2)
+    parser.add_argument(
+        "--no-stream",
+        dest="stream",
+        action="store_false",
+        help="Wait for the whole completion instead of printing tokens as they arrive",
+    )
 
     args = parser.parse_args()
 
@@ -156,6 +254,7 @@ def main() -> int:
         system_prompt=args.system,
         max_tokens=args.max_tokens,
         temperature=args.temperature,
+        stream=args.stream,
     )
 
 
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Upload a file to the LANCompute master's blob store, resuming after failures.
+
+Usage examples:
+  - Upload a model and print its digest:
+      python scripts/upload_blob.py model.bin
+
+  - Larger ranges, against another master:
+      python scripts/upload_blob.py shard-00.parquet \
+        --master-url http://192.168.1.100:8080 --chunk-mb 256
+
+The file is hashed first, so an interrupted upload (or one re-run after a
+crash) continues from the bytes the master already has, and a file the
+master already stores is not sent again. Reference the printed digest in a
+task's "blobs".
+
+Configuration:
+  - LANCOMPUTE_MASTER_URL  Master URL (default: http://127.0.0.1:8080)
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import BinaryIO, Iterator, Optional
+
+import requests
+
+DEFAULT_MASTER_URL = os.environ.get("LANCOMPUTE_MASTER_URL", "http://127.0.0.1:8080")
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _read_range(f: BinaryIO, start: int, length: int) -> Iterator[bytes]:
+    f.seek(start)
+    while length > 0:
+        block = f.read(min(length, 1024 * 1024))
+        if not block:
+            return
+        length -= len(block)
+        yield block
+
+
+def _remote_offset(blob_url: str) -> Optional[int]:
+    """Bytes the master has of the upload, or None if the blob is already stored"""
+    r = requests.head(blob_url, timeout=15)
+    if r.status_code == 200:
+        return None
+    return int(r.headers.get("X-Upload-Offset", 0))
+
+
+def upload(master_url: str, path: str, chunk_size: int, retries: int = 5) -> int:
+    size = os.path.getsize(path)
+    digest = file_digest(path)
+    blob_url = f"{master_url}/blob/{digest}"
+    failures = 0
+    with open(path, "rb") as f:
+        while True:
+            try:
+                offset = _remote_offset(blob_url)
+                if offset is None:
+                    break
+                length = min(chunk_size, size - offset)
+                # The range is read from disk as it is sent, with chunked encoding
+                headers = {}
+                if size:
+                    headers["Content-Range"] = (
+                        f"bytes {offset}-{offset + length - 1}/{size}" if length
+                        else f"bytes */{size}")
+                r = requests.put(blob_url, data=_read_range(f, offset, length),
+                                 headers=headers, timeout=(15, 600))
+                if r.status_code == 409:
+                    # Someone else is uploading it, or our offset was stale
+                    time.sleep(1)
+                    continue
+                r.raise_for_status()
+                failures = 0
+                print(f"{min(offset + length, size)}/{size} bytes", file=sys.stderr)
+                if r.json().get("complete"):
+                    break
+            except requests.HTTPError as exc:
+                print(f"Error: upload rejected: {exc}", file=sys.stderr)
+                return 2
+            except requests.RequestException as exc:
+                failures += 1
+                if failures > retries:
+                    print(f"Error: upload failed: {exc}", file=sys.stderr)
+                    return 2
+                print(f"Upload interrupted ({exc}); resuming", file=sys.stderr)
+                time.sleep(min(30, 2 ** failures))
+    print(json.dumps({"digest": digest, "size": size}))
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Upload a blob to the LANCompute master")
+    parser.add_argument("path", help="File to upload")
+    parser.add_argument(
+        "--master-url",
+        default=DEFAULT_MASTER_URL,
+        help=f"Master URL (default: {DEFAULT_MASTER_URL})",
+    )
+    parser.add_argument("--chunk-mb", type=int, default=64,
+                        help="Bytes sent per request, in MB")
+    parser.add_argument("--retries", type=int, default=5,
+                        help="Consecutive failed requests before giving up")
+    args = parser.parse_args()
+    return upload(args.master_url.rstrip("/"), args.path, args.chunk_mb * 1024 * 1024,
+                  args.retries)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Content-addressed blobs for LANCompute
+Large task inputs are uploaded to the master once, referenced by their
+SHA-256 digest, and kept by workers in a local LRU cache
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Blobs are named by the lowercase hex SHA-256 of their content
+_DIGEST = re.compile(r'[0-9a-f]{64}')
+
+# Prefix of files still being written; they are never served or cached
+_PARTIAL_PREFIX = '.partial-'
+# Prefix of resumable uploads on the master, followed by the expected digest
+_UPLOAD_PREFIX = '.upload-'
+
+# Bytes read at a time when hashing a file
+_READ_SIZE = 1024 * 1024
+
+
+def is_digest(value: object) -> bool:
+    """Check if a value is a blob digest"""
+    return isinstance(value, str) and _DIGEST.fullmatch(value) is not None
+
+
+def _write_hashed(chunks: Iterable[bytes], path: str) -> Tuple[str, int]:
+    """Write chunks to a new file, returning their digest and total size"""
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        for chunk in chunks:
+            sha.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    return sha.hexdigest(), size
+
+
+class UploadConflict(Exception):
+    """A resumable upload cannot continue at the requested offset"""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        # Bytes of the upload the store has, where the client should resume
+        self.offset = offset
+
+
+class BlobStore:
+    """Blobs on the master's disk, one file per digest
+
+    An upload is hashed while it is written to a temporary file, which is
+    renamed into place once complete, so a blob that exists is whole and
+    uploading the same content twice is harmless.
+
+    Resumable uploads are addressed by the digest the client expects. Each
+    request appends a byte range to a partial file kept across requests
+    and restarts; the blob is checked against the digest and stored once
+    the last byte arrives. The running hash is kept between requests, so
+    finishing a large upload does not read it back from disk.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._sizes: Dict[str, int] = {}
+        # digest -> (bytes hashed, running hash) of resumable uploads
+        self._hashes: Dict[str, Tuple[int, 'hashlib._Hash']] = {}
+        # Digests with a request writing to their upload right now
+        self._writing: Set[str] = set()
+
+    def path(self, digest: str) -> str:
+        """File holding a blob; digests fan out over 256 subdirectories"""
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def size(self, digest: str) -> Optional[int]:
+        """Size of a stored blob in bytes, or None if there is no such blob"""
+        size = self._sizes.get(digest)
+        if size is None and is_digest(digest):
+            try:
+                size = os.path.getsize(self.path(digest))
+            except OSError:
+                return None
+            with self._lock:
+                self._sizes[digest] = size
+        return size
+
+    def exists(self, digest: str) -> bool:
+        """Check if a blob is stored"""
+        return self.size(digest) is not None
+
+    def put(self, chunks: Iterable[bytes], digest: Optional[str] = None) -> Tuple[str, int]:
+        """Store the content of an upload; returns its digest and size
+
+        Raises ValueError if `digest` is given and the content does not
+        match it; nothing is stored then.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        partial = os.path.join(self.directory, f"{_PARTIAL_PREFIX}{uuid.uuid4().hex}")
+        try:
+            actual, size = _write_hashed(chunks, partial)
+            if digest is not None and actual != digest:
+                raise ValueError(f"Content does not match digest {digest} (got {actual})")
+            os.makedirs(os.path.dirname(self.path(actual)), exist_ok=True)
+            os.replace(partial, self.path(actual))
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        with self._lock:
+            self._sizes[actual] = size
+        logger.info(f"Stored blob {actual} ({size} bytes)")
+        return actual, size
+
+    def open(self, digest: str) -> BinaryIO:
+        """Open a stored blob for reading (raises OSError if missing)"""
+        if not is_digest(digest):
+            raise FileNotFoundError(f"Invalid blob digest: {digest}")
+        return open(self.path(digest), 'rb')
+
+    def _upload_path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{_UPLOAD_PREFIX}{digest}")
+
+    def upload_offset(self, digest: str) -> Optional[int]:
+        """Bytes received so far of a resumable upload, or None if none is open"""
+        if not is_digest(digest):
+            return None
+        try:
+            return os.path.getsize(self._upload_path(digest))
+        except OSError:
+            return None
+
+    def write_upload(self, digest: str, chunks: Iterable[bytes], start: int = 0,
+                     total: Optional[int] = None) -> Tuple[int, bool]:
+        """Write a byte range of a resumable upload; returns (offset, complete)
+
+        The range starts at `start`, which may not be past the bytes already
+        received; earlier bytes are overwritten. The upload completes once it
+        holds `total` bytes. Raises UploadConflict for a gap or a concurrent
+        write to the same upload, and ValueError if the body ends early (the
+        bytes received are kept) or the completed blob does not match its
+        digest (the upload is discarded).
+        """
+        if not is_digest(digest):
+            raise ValueError(f"Invalid blob digest: {digest}")
+        with self._lock:
+            if digest in self._writing:
+                raise UploadConflict(f"Upload of {digest} is in progress",
+                                     self.upload_offset(digest) or 0)
+            self._writing.add(digest)
+        try:
+            offset = self._append(digest, chunks, start)
+            if total is None or offset < total:
+                return offset, False
+            if offset > total:
+                self._discard_upload(digest)
+                raise ValueError(f"Upload of {digest} is longer than {total} bytes")
+            self._finish_upload(digest, offset)
+            return offset, True
+        finally:
+            with self._lock:
+                self._writing.discard(digest)
+
+    def _append(self, digest: str, chunks: Iterable[bytes], start: int) -> int:
+        """Write chunks into an upload at `start`, keeping its running hash"""
+        os.makedirs(self.directory, exist_ok=True)
+        partial = self._upload_path(digest)
+        offset = self.upload_offset(digest) or 0
+        if start > offset:
+            raise UploadConflict(f"Upload of {digest} has {offset} bytes, not {start}", offset)
+
+        hashed, sha = self._hashes.pop(digest, (0, None))
+        if sha is None or hashed != start:
+            # Resumed after a restart or rewinding: hash the kept bytes again
+            sha = hashlib.sha256()
+            hashed = 0
+            if start:
+                with open(partial, 'rb') as f:
+                    while hashed < start:
+                        data = f.read(min(_READ_SIZE, start - hashed))
+                        sha.update(data)
+                        hashed += len(data)
+        with open(partial, 'r+b' if offset else 'wb') as f:
+            f.truncate(start)
+            f.seek(start)
+            try:
+                for chunk in chunks:
+                    f.write(chunk)
+                    sha.update(chunk)
+                    hashed += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                # Bytes that arrived before an interrupted body count
+                self._hashes[digest] = (hashed, sha)
+        return hashed
+
+    def _finish_upload(self, digest: str, size: int) -> None:
+        """Check a completed upload against its digest and store it"""
+        _, sha = self._hashes.pop(digest)
+        actual = sha.hexdigest()
+        if actual != digest:
+            self._discard_upload(digest)
+            raise ValueError(f"Content does not match digest {digest} (got {actual})")
+        os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+        os.replace(self._upload_path(digest), self.path(digest))
+        with self._lock:
+            self._sizes[digest] = size
+        logger.info(f"Stored blob {digest} ({size} bytes) from a resumable upload")
+
+    def _discard_upload(self, digest: str) -> None:
+        self._hashes.pop(digest, None)
+        try:
+            os.remove(self._upload_path(digest))
+        except OSError:
+            pass
+
+    def expire_uploads(self, max_age: float) -> int:
+        """Delete resumable uploads not written to for `max_age` seconds; returns how many"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        expired = 0
+        cutoff = time.time() - max_age
+        for name in names:
+            digest = name[len(_UPLOAD_PREFIX):]
+            if not name.startswith(_UPLOAD_PREFIX) or digest in self._writing:
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.directory, name)) < cutoff:
+                    self._discard_upload(digest)
+                    expired += 1
+            except OSError:
+                continue
+        if expired:
+            logger.info(f"Expired {expired} abandoned blob uploads")
+        return expired
+
+
+class BlobCache:
+    """Worker-side cache of blobs, evicting the least recently used
+
+    Blobs are kept as files named by digest in `directory` while their
+    total size stays within `max_bytes`. A blob is pinned while a running
+    task uses it and is never evicted then, so the cache may briefly exceed
+    its limit. Concurrent requests for a blob that is not cached yet share
+    one download. The cache survives restarts: files already in the
+    directory are picked up, oldest modification time first.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # digest -> size, least recently used first
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._pins: Dict[str, int] = {}
+        # digest -> set once a download in progress finishes or fails
+        self._loading: Dict[str, threading.Event] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self) -> None:
+        """Index the blobs left in the cache directory by an earlier run"""
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(_PARTIAL_PREFIX):
+                os.remove(path)
+            elif is_digest(name):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name, stat.st_size))
+        for _, digest, size in sorted(found):
+            self._entries[digest] = size
+            self.total_bytes += size
+        with self.lock:
+            self._evict()
+
+    def path(self, digest: str) -> str:
+        """File holding a cached blob"""
+        return os.path.join(self.directory, digest)
+
+    def digests(self) -> List[str]:
+        """Blobs cached or being downloaded, for the master's placement decisions"""
+        with self.lock:
+            return list(self._entries) + list(self._loading)
+
+    def acquire(self, digest: str, fetch: Callable[[str], Iterable[bytes]]) -> str:
+        """Pin a blob, downloading it with `fetch` if needed; returns its file
+
+        Raises ValueError if the downloaded content does not match the
+        digest, and whatever `fetch` raises. Every successful call must be
+        paired with release().
+        """
+        if not is_digest(digest):
+            raise ValueError(f"Invalid blob digest: {digest}")
+        while True:
+            with self.lock:
+                if digest in self._entries:
+                    self._entries.move_to_end(digest)
+                    self._pins[digest] = self._pins.get(digest, 0) + 1
+                    self.hits += 1
+                    path = self.path(digest)
+                    os.utime(path)
+                    return path
+                loading = self._loading.get(digest)
+                if loading is None:
+                    loading = self._loading[digest] = threading.Event()
+                    break
+            # Someone else is downloading it; use theirs, or retry if it failed
+            loading.wait()
+
+        try:
+            size = self._download(digest, fetch)
+        except BaseException:
+            with self.lock:
+                del self._loading[digest]
+            loading.set()
+            raise
+        with self.lock:
+            del self._loading[digest]
+            self._entries[digest] = size
+            self._pins[digest] = self._pins.get(digest, 0) + 1
+            self.total_bytes += size
+            self.misses += 1
+            self._evict()
+        loading.set()
+        return self.path(digest)
+
+    def acquire_all(self, blobs: Mapping[str, str],
+                    fetch: Callable[[str], Iterable[bytes]]) -> Dict[str, str]:
+        """Pin a task's blobs, given as name -> digest; returns name -> file
+
+        On failure the blobs pinned so far are released again.
+        """
+        paths: Dict[str, str] = {}
+        try:
+            for name, digest in blobs.items():
+                paths[name] = self.acquire(digest, fetch)
+        except BaseException:
+            for name in paths:
+                self.release(blobs[name])
+            raise
+        return paths
+
+    def release(self, digest: str) -> None:
+        """Unpin a blob acquired earlier, making it evictable once unused"""
+        with self.lock:
+            pins = self._pins.get(digest, 0) - 1
+            if pins > 0:
+                self._pins[digest] = pins
+                return
+            self._pins.pop(digest, None)
+            self._evict()
+
+    def _download(self, digest: str, fetch: Callable[[str], Iterable[bytes]]) -> int:
+        """Fetch a blob into the cache directory, verifying its digest"""
+        partial = os.path.join(self.directory, f"{_PARTIAL_PREFIX}{uuid.uuid4().hex}")
+        try:
+            actual, size = _write_hashed(fetch(digest), partial)
+            if actual != digest:
+                raise ValueError(f"Blob {digest} downloaded with digest {actual}")
+            os.replace(partial, self.path(digest))
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        logger.info(f"Cached blob {digest} ({size} bytes)")
+        return size
+
+    def _evict(self) -> None:
+        """Drop unpinned blobs, least recently used first, down to the limit (lock held)"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        for digest in list(self._entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if digest in self._pins:
+                continue
+            self.total_bytes -= self._entries.pop(digest)
+            try:
+                os.remove(self.path(digest))
+            except OSError as e:
+                logger.warning(f"Could not remove cached blob {digest}: {e}")
+            logger.info(f"Evicted blob {digest} from the cache")
+
+    def stats(self) -> Dict[str, int]:
+        """Cache size and hit counters"""
+        with self.lock:
+            return {'blobs': len(self._entries), 'bytes': self.total_bytes,
+                    'max_bytes': self.max_bytes, 'hits': self.hits, 'misses': self.misses}
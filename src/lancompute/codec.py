@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Codec helpers for LANCompute master/worker communication
+Message encodings (JSON, CBOR, msgpack) negotiated per request, and
+streaming compression for payloads that are too large to inline
+"""
+
+import array
+import json
+import struct
+import sys
+import zlib
+from enum import Enum
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+# zstd is optional; fall back to zlib when the package is missing
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# msgpack is optional; CBOR is implemented here and always available
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_DECOMPRESS_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+# Content-Encoding tokens understood by master and worker
+ENCODING_IDENTITY = 'identity'
+ENCODING_DEFLATE = 'deflate'
+ENCODING_ZSTD = 'zstd'
+
+# Largest piece of output a decompressor produces at once
+DECOMPRESS_CHUNK = 65536
+
+
+class BodyTooLargeError(ValueError):
+    """A decompressed body grew past the size it was allowed"""
+
+
+def available_encodings() -> List[str]:
+    """Content encodings supported by this installation, best first"""
+    encodings = [ENCODING_DEFLATE, ENCODING_IDENTITY]
+    if zstandard is not None:
+        encodings.insert(0, ENCODING_ZSTD)
+    return encodings
+
+
+def _compressobj(encoding: str):
+    """Create an incremental compressor with compress()/flush()"""
+    if encoding == ENCODING_DEFLATE:
+        return zlib.compressobj(6)
+    if encoding == ENCODING_ZSTD and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+class _ChunkReader:
+    """File-like read() over an iterable of chunks, for zstandard's readers"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = b''
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b''
+            self._pending = chunk
+        if size < 0:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+def iter_compressed(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a stream of chunks without buffering the whole stream"""
+    if encoding in (None, '', ENCODING_IDENTITY):
+        yield from chunks
+        return
+
+    compressor = _compressobj(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    data = compressor.flush()
+    if data:
+        yield data
+
+
+def iter_decompressed(chunks: Iterable[bytes], encoding: str,
+                      max_size: Optional[int] = None) -> Iterator[bytes]:
+    """Decompress a stream of chunks without buffering the whole stream
+
+    Output comes in pieces of at most DECOMPRESS_CHUNK bytes, so a small
+    compressed chunk never expands in memory all at once. With max_size,
+    BodyTooLargeError is raised as soon as the output grows past it.
+    """
+    if encoding in (None, '', ENCODING_IDENTITY):
+        pieces = chunks
+    else:
+        pieces = _iter_inflated(chunks, encoding)
+    size = 0
+    for piece in pieces:
+        size += len(piece)
+        if max_size is not None and size > max_size:
+            raise BodyTooLargeError(f"Body is larger than {max_size} bytes")
+        yield piece
+
+
+def _iter_inflated(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Decompress chunks into pieces of at most DECOMPRESS_CHUNK bytes"""
+    if encoding == ENCODING_DEFLATE:
+        decompressor = zlib.decompressobj()
+        try:
+            for chunk in chunks:
+                while chunk:
+                    data = decompressor.decompress(chunk, DECOMPRESS_CHUNK)
+                    chunk = decompressor.unconsumed_tail
+                    if data:
+                        yield data
+            data = decompressor.flush()
+        except _DECOMPRESS_ERRORS as e:
+            raise ValueError(f"Corrupt {encoding} stream: {e}")
+        if data:
+            yield data
+        if not decompressor.eof:
+            raise ValueError("Truncated deflate stream")
+        return
+    if encoding == ENCODING_ZSTD and zstandard is not None:
+        reader = _ChunkReader(chunks)
+        try:
+            yield from zstandard.ZstdDecompressor().read_to_iter(
+                reader, write_size=DECOMPRESS_CHUNK)
+        except _DECOMPRESS_ERRORS as e:
+            raise ValueError(f"Corrupt {encoding} stream: {e}")
+        return
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def iter_chunks(data: bytes, chunk_size: int = 65536) -> Iterator[bytes]:
+    """Split a bytes object into chunks without copying it up front"""
+    view = memoryview(data)
+    for start in range(0, len(data), chunk_size):
+        yield bytes(view[start:start + chunk_size])
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a whole message body"""
+    return b''.join(iter_compressed([data], encoding))
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    """Decompress a whole message body (raises ValueError if corrupt)"""
+    return b''.join(iter_decompressed([data], encoding))
+
+
+# Media types of message bodies
+MEDIA_JSON = 'application/json'
+MEDIA_CBOR = 'application/cbor'
+MEDIA_MSGPACK = 'application/msgpack'
+
+_MEDIA_ALIASES = {
+    'application/x-msgpack': MEDIA_MSGPACK,
+    'application/vnd.msgpack': MEDIA_MSGPACK,
+}
+
+
+def available_formats() -> List[str]:
+    """Message media types supported by this installation, best first"""
+    formats = [MEDIA_CBOR, MEDIA_JSON]
+    if msgpack is not None:
+        formats.insert(0, MEDIA_MSGPACK)
+    return formats
+
+
+def media_type(content_type: Optional[str]) -> str:
+    """Normalized media type of a Content-Type header; JSON when absent or unknown
+
+    Clients such as curl label JSON bodies as form data, so only the binary
+    types change how a body is read.
+    """
+    value = (content_type or '').split(';', 1)[0].strip().lower()
+    value = _MEDIA_ALIASES.get(value, value)
+    return value if value in (MEDIA_CBOR, MEDIA_MSGPACK) else MEDIA_JSON
+
+
+def negotiate(header: Optional[str], offered: List[str]) -> Optional[str]:
+    """Pick from `offered` (best first) by an Accept or Accept-Encoding header
+
+    The highest client quality wins and ties go to the earlier offer.
+    Returns None without a header, or when it rules out every offer.
+    """
+    if not header:
+        return None
+    qualities = {}
+    for part in header.split(','):
+        name, *params = part.strip().split(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[_MEDIA_ALIASES.get(name, name)] = quality
+    best, best_quality = None, 0.0
+    for option in offered:
+        quality = qualities.get(option)
+        if quality is None:
+            # "*/*", "application/*" and "*" stand for anything not listed
+            quality = qualities.get(option.split('/')[0] + '/*',
+                                    qualities.get('*/*', qualities.get('*')))
+            if quality is None and option == ENCODING_IDENTITY:
+                quality = 1.0  # identity is acceptable unless ruled out
+        if quality is not None and quality > best_quality:
+            best, best_quality = option, quality
+    return best
+
+
+# Numeric arrays (array.array, 1-D numpy arrays) travel as raw little-endian
+# buffers, tagged by element type with the RFC 8746 typed array tags:
+# 64 + 16 * float + 8 * signed + 4 * little-endian + log2 of the element size
+# (for floats: 0 = 16, 1 = 32, 2 = 64 bits)
+_TYPED_ARRAY_TAGS = {
+    ('u', 1): 64, ('u', 2): 69, ('u', 4): 70, ('u', 8): 71,
+    ('i', 1): 72, ('i', 2): 77, ('i', 4): 78, ('i', 8): 79,
+    ('f', 4): 85, ('f', 8): 86,
+}
+# array.array typecode for each tag, whatever the platform's C type sizes
+_KIND_TYPECODES = {'u': 'BHILQ', 'i': 'bhilq', 'f': 'fd'}
+_TYPECODES = {tag: next(code for code in _KIND_TYPECODES[kind]
+                        if array.array(code).itemsize == size)
+              for (kind, size), tag in _TYPED_ARRAY_TAGS.items()}
+# msgpack carries the same arrays as extension types numbered tag - 64, and
+# integers beyond 64 bits as signed big-endian bytes
+_MSGPACK_EXT_BASE = 64
+_MSGPACK_BIGNUM = 32
+
+
+def _typed_array(obj: Any) -> Optional[Tuple[int, bytes]]:
+    """(tag, little-endian bytes) of a flat numeric buffer, or None"""
+    try:
+        view = memoryview(obj)
+    except TypeError:
+        return None
+    if view.ndim != 1 or not view.c_contiguous:
+        return None
+    order, fmt = (view.format[0], view.format[1:]) if view.format[0] in '@=<>!' else (
+        '@', view.format)
+    if len(fmt) != 1:
+        return None
+    kind = 'f' if fmt in 'fd' else 'i' if fmt in 'bhilqn' else 'u' if fmt in 'BHILQN' else None
+    tag = _TYPED_ARRAY_TAGS.get((kind, view.itemsize))
+    if tag is None:
+        return None
+    data = view.tobytes()
+    big_endian = order in '>!' or (order in '@=' and sys.byteorder == 'big')
+    if big_endian and view.itemsize > 1:
+        swapped = array.array(_TYPECODES[tag], data)
+        swapped.byteswap()
+        data = swapped.tobytes()
+    return tag, data
+
+
+def _from_typed_array(tag: int, data: bytes) -> array.array:
+    """Rebuild an array.array from a tagged little-endian buffer"""
+    values = array.array(_TYPECODES[tag])
+    if len(data) % values.itemsize:
+        raise ValueError("Typed array length is not a multiple of its element size")
+    values.frombytes(data)
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+
+def _plain(obj: Any, strict: bool = False) -> Any:
+    """Stand-in for a value no encoder handles natively
+
+    Anything unrecognized becomes its str(), or raises TypeError if strict.
+    """
+    if isinstance(obj, Enum):
+        return obj.value
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()  # array.array, numpy arrays and scalars
+    for base in (str, int, float, dict, list, tuple):
+        if isinstance(obj, base):
+            return base(obj)
+    if strict:
+        raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+    return str(obj)
+
+
+def _strict_plain(obj: Any) -> Any:
+    return _plain(obj, strict=True)
+
+
+def json_default(obj: Any) -> Any:
+    """json.dumps fallback: enums as their values, numeric arrays as lists"""
+    return _plain(obj)
+
+
+def _cbor_head(out: bytearray, major: int, value: int) -> None:
+    if value < 24:
+        out.append(major << 5 | value)
+    elif value < 0x100:
+        out += struct.pack('>BB', major << 5 | 24, value)
+    elif value < 0x10000:
+        out += struct.pack('>BH', major << 5 | 25, value)
+    elif value < 0x100000000:
+        out += struct.pack('>BI', major << 5 | 26, value)
+    else:
+        out += struct.pack('>BQ', major << 5 | 27, value)
+
+
+def _cbor_encode(obj: Any, out: bytearray, default: Callable[[Any], Any] = _plain) -> None:
+    # Exact type checks first: they are the common case and bool is an int
+    kind = type(obj)
+    if kind is str:
+        data = obj.encode()
+        _cbor_head(out, 3, len(data))
+        out += data
+    elif kind is int:
+        if 0 <= obj < 1 << 64:
+            _cbor_head(out, 0, obj)
+        elif -(1 << 64) <= obj < 0:
+            _cbor_head(out, 1, -1 - obj)
+        else:
+            # Bignums: tag 2 (positive) or 3 (negative) around the magnitude
+            magnitude = obj if obj >= 0 else -1 - obj
+            _cbor_head(out, 6, 2 if obj >= 0 else 3)
+            _cbor_encode(magnitude.to_bytes((magnitude.bit_length() + 7) // 8, 'big'), out)
+    elif kind is float:
+        out += struct.pack('>Bd', 0xfb, obj)
+    elif kind is dict:
+        _cbor_head(out, 5, len(obj))
+        for key, value in obj.items():
+            _cbor_encode(key, out, default)
+            _cbor_encode(value, out, default)
+    elif kind is list or kind is tuple:
+        _cbor_head(out, 4, len(obj))
+        for item in obj:
+            _cbor_encode(item, out, default)
+    elif obj is None:
+        out.append(0xf6)
+    elif obj is True:
+        out.append(0xf5)
+    elif obj is False:
+        out.append(0xf4)
+    elif kind is bytes or kind is bytearray:
+        _cbor_head(out, 2, len(obj))
+        out += obj
+    else:
+        typed = _typed_array(obj)
+        if typed is not None:
+            _cbor_head(out, 6, typed[0])
+            _cbor_head(out, 2, len(typed[1]))
+            out += typed[1]
+        else:
+            _cbor_encode(default(obj), out, default)
+
+
+_CBOR_ARGUMENT = {24: struct.Struct('>B'), 25: struct.Struct('>H'),
+                  26: struct.Struct('>I'), 27: struct.Struct('>Q')}
+_CBOR_FLOAT = {25: struct.Struct('>e'), 26: struct.Struct('>f'), 27: struct.Struct('>d')}
+_CBOR_SIMPLE = {20: False, 21: True, 22: None, 23: None}
+
+
+def _cbor_decode(data: bytes, pos: int) -> Tuple[Any, int]:
+    """Decode the CBOR item at `pos`; returns it and the position after it"""
+    initial = data[pos]
+    pos += 1
+    major, info = initial >> 5, initial & 0x1f
+    if major == 7:
+        if info in _CBOR_SIMPLE:
+            return _CBOR_SIMPLE[info], pos
+        unpacker = _CBOR_FLOAT.get(info)
+        if unpacker is None:
+            raise ValueError(f"Unsupported CBOR simple value {info}")
+        return unpacker.unpack_from(data, pos)[0], pos + unpacker.size
+    if info < 24:
+        value = info
+    else:
+        unpacker = _CBOR_ARGUMENT.get(info)
+        if unpacker is None:
+            raise ValueError("Indefinite-length CBOR items are not supported")
+        value = unpacker.unpack_from(data, pos)[0]
+        pos += unpacker.size
+    if major == 0:
+        return value, pos
+    if major == 3 or major == 2:
+        end = pos + value
+        if end > len(data):
+            raise ValueError("Truncated CBOR data")
+        if major == 2:
+            return bytes(data[pos:end]), end
+        return str(data[pos:end], 'utf-8'), end
+    if major == 4:
+        items = []
+        append = items.append
+        for _ in range(value):
+            item, pos = _cbor_decode(data, pos)
+            append(item)
+        return items, pos
+    if major == 5:
+        result = {}
+        for _ in range(value):
+            key, pos = _cbor_decode(data, pos)
+            result[key], pos = _cbor_decode(data, pos)
+        return result, pos
+    if major == 1:
+        return -1 - value, pos
+    # Tagged item
+    item, pos = _cbor_decode(data, pos)
+    if value in _TYPECODES:
+        if not isinstance(item, bytes):
+            raise ValueError("Typed array tag on a non-byte-string item")
+        return _from_typed_array(value, item), pos
+    if value in (2, 3) and isinstance(item, bytes):
+        magnitude = int.from_bytes(item, 'big')
+        return (magnitude if value == 2 else -1 - magnitude), pos
+    return item, pos
+
+
+def _msgpack_default(obj: Any, strict: bool = False) -> Any:
+    if type(obj) is int:
+        return msgpack.ExtType(_MSGPACK_BIGNUM, obj.to_bytes(obj.bit_length() // 8 + 1, 'big',
+                                                             signed=True))
+    typed = _typed_array(obj)
+    if typed is not None:
+        return msgpack.ExtType(typed[0] - _MSGPACK_EXT_BASE, typed[1])
+    return _plain(obj, strict)
+
+
+def _msgpack_ext(code: int, data: bytes) -> Any:
+    if code == _MSGPACK_BIGNUM:
+        return int.from_bytes(data, 'big', signed=True)
+    tag = code + _MSGPACK_EXT_BASE
+    if tag in _TYPECODES:
+        return _from_typed_array(tag, data)
+    return msgpack.ExtType(code, data)
+
+
+def encode(data: Any, media: str = MEDIA_JSON, strict: bool = False) -> bytes:
+    """Serialize a message in one of the available_formats()
+
+    Values with no natural encoding are sent as strings, or raise TypeError
+    if strict.
+    """
+    if media == MEDIA_CBOR:
+        out = bytearray()
+        _cbor_encode(data, out, _strict_plain if strict else _plain)
+        return bytes(out)
+    if media == MEDIA_MSGPACK and msgpack is not None:
+        return msgpack.packb(data, default=lambda obj: _msgpack_default(obj, strict),
+                             use_bin_type=True, datetime=False)
+    if media == MEDIA_JSON:
+        return json.dumps(data, default=_strict_plain if strict else _plain).encode()
+    raise ValueError(f"Unsupported media type: {media}")
+
+
+def decode(body: bytes, media: str = MEDIA_JSON) -> Any:
+    """Parse a message body (raises ValueError if malformed)"""
+    if media == MEDIA_CBOR:
+        try:
+            data, end = _cbor_decode(body, 0)
+        except (IndexError, struct.error):
+            raise ValueError("Truncated CBOR data")
+        except (TypeError, UnicodeDecodeError) as e:
+            # Unhashable map keys, invalid UTF-8
+            raise ValueError(f"Invalid CBOR data: {e}")
+        except RecursionError:
+            raise ValueError("CBOR data nested too deeply")
+        if end != len(body):
+            raise ValueError("Unexpected data after CBOR item")
+        return data
+    if media == MEDIA_MSGPACK and msgpack is not None:
+        try:
+            return msgpack.unpackb(body, ext_hook=_msgpack_ext, raw=False,
+                                   strict_map_key=False)
+        except Exception as e:
+            raise ValueError(f"Invalid msgpack data: {e or type(e).__name__}")
+    if media == MEDIA_JSON:
+        return json.loads(body)
+    raise ValueError(f"Unsupported media type: {media}")
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+LLM endpoint discovery for LANCompute
+Finds OpenAI-compatible LLM servers (LM Studio, Ollama) on the LAN with the
+network scanner and enrolls each as a master-managed node that advertises
+the models it serves. The master health-checks the endpoints and runs the
+tasks routed to them itself, as chat completion requests.
+"""
+
+import asyncio
+import http.client
+import ipaddress
+import json
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from .inventory import HostInventory
+from .network_scanner import (
+    LIVENESS_NONE, detect_service, get_local_network, scan_incremental, scan_network
+)
+
+if TYPE_CHECKING:
+    from .master_service import MasterService, Node, Task
+
+logger = logging.getLogger(__name__)
+
+# LM Studio and Ollama default ports
+LLM_PORTS = [1234, 11434]
+
+# Service of an endpoint whose banner was not recognised
+SERVICE_OPENAI = 'openai'
+
+# Payload keys that are not chat completion parameters
+_TASK_KEYS = ('prompt', 'system')
+
+
+def endpoint_node_id(address: str, port: int) -> str:
+    """Node id under which an endpoint is enrolled"""
+    return f"llm-{address}:{port}"
+
+
+def request(address: str, port: int, method: str, path: str,
+            body: Optional[Dict[str, Any]] = None,
+            timeout: float = 10.0) -> Tuple[int, bytes]:
+    """Send one HTTP request to an endpoint and return (status, body)
+
+    Raises OSError or http.client.HTTPException if the endpoint cannot be
+    reached or breaks off the response.
+    """
+    conn = http.client.HTTPConnection(address, port, timeout=timeout)
+    try:
+        if body is None:
+            conn.request(method, path)
+        else:
+            conn.request(method, path, body=json.dumps(body).encode(),
+                         headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def fetch_models(address: str, port: int, timeout: float = 5.0) -> List[str]:
+    """Ids of the models an OpenAI-compatible server lists at /v1/models
+
+    Raises OSError or http.client.HTTPException if the server cannot be
+    reached, and ValueError if it does not answer like an OpenAI API.
+    """
+    status, body = request(address, port, 'GET', '/v1/models', timeout=timeout)
+    if status != 200:
+        raise ValueError(f"/v1/models returned HTTP {status}")
+    try:
+        return [model['id'] for model in json.loads(body)['data']]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Not an OpenAI-compatible model list: {e!r}")
+
+
+def chat_request(payload: Dict[str, Any], model: str) -> Dict[str, Any]:
+    """Chat completion request for an ml_inference payload
+
+    The payload carries OpenAI chat parameters ("messages", "max_tokens",
+    ...), or a "prompt" and optional "system" prompt to build the messages
+    from.
+    """
+    body = {key: value for key, value in payload.items() if key not in _TASK_KEYS}
+    body['model'] = model
+    body['stream'] = False
+    if 'messages' not in body:
+        messages = []
+        if payload.get('system'):
+            messages.append({'role': 'system', 'content': payload['system']})
+        messages.append({'role': 'user', 'content': payload.get('prompt', '')})
+        body['messages'] = messages
+    return body
+
+
+class LLMDiscovery:
+    """Enrolls LLM servers found on the LAN as nodes and runs their tasks
+
+    Every `interval` seconds the networks are scanned for the LLM ports
+    (through the host inventory when one is given, so only hosts due a
+    recheck are probed). Each open port answering /v1/models becomes a node
+    with capabilities {'models': [...], 'service': ..., 'exclusive':
+    ['models']}: it only takes tasks whose requirements name a model, e.g.
+    {"type": "ml_inference", "requirements": {"models": "qwen2.5-7b"}}, and
+    the scheduler sends those to a node that lists the model.
+
+    Enrolled endpoints are polled every `health_interval` seconds; a
+    successful poll counts as the node's heartbeat and refreshes its model
+    list, so an endpoint that stops answering goes offline like a silent
+    worker and its tasks are reclaimed. Each endpoint runs up to `slots`
+    tasks at once, one thread per slot.
+    """
+
+    def __init__(self, master: 'MasterService', networks: Optional[Iterable[str]] = None,
+                 ports: Optional[Iterable[int]] = None,
+                 endpoints: Optional[Iterable[str]] = None,
+                 interval: float = 300.0, health_interval: float = 10.0,
+                 scan_timeout: float = 1.0, request_timeout: float = 600.0,
+                 slots: int = 1, inventory: Optional[HostInventory] = None):
+        self.master = master
+        # None scans the master's own /24; an empty list disables scanning
+        if networks is None:
+            networks = [get_local_network()]
+        self.networks = [ipaddress.ip_network(n, strict=False) for n in networks]
+        self.ports = list(ports or LLM_PORTS)
+        self.static_endpoints = [self._parse_endpoint(e) for e in endpoints or ()]
+        self.interval = interval
+        self.health_interval = health_interval
+        self.scan_timeout = scan_timeout
+        self.request_timeout = request_timeout
+        self.slots = slots
+        self.inventory = inventory
+        # node_id -> (address, port, service)
+        self.endpoints: Dict[str, Tuple[str, int, str]] = {}
+        self.lock = threading.Lock()
+        self.running = False
+        self._stop = threading.Event()
+        self._runners: Set[str] = set()
+
+    @staticmethod
+    def _parse_endpoint(endpoint: str) -> Tuple[str, int]:
+        """(address, port) of a configured endpoint, "host:port" or a URL"""
+        parsed = urlparse(endpoint if '://' in endpoint else f"http://{endpoint}")
+        if not parsed.hostname:
+            raise ValueError(f"Invalid LLM endpoint: {endpoint!r}")
+        return parsed.hostname, parsed.port or 80
+
+    def start(self):
+        """Start the discovery and health check loops"""
+        self.running = True
+        self._stop.clear()
+        threading.Thread(target=self._loop, args=(self.discover, self.interval),
+                         daemon=True).start()
+        threading.Thread(target=self._loop, args=(self.check_health, self.health_interval),
+                         daemon=True).start()
+        logger.info(f"LLM discovery started: {', '.join(map(str, self.networks)) or 'no scans'}, "
+                    f"ports {', '.join(map(str, self.ports))}")
+
+    def stop(self):
+        """Stop discovery; tasks already running on endpoints are finished"""
+        self.running = False
+        self._stop.set()
+
+    def _loop(self, step, interval: float):
+        while self.running:
+            try:
+                step()
+            except Exception as e:
+                logger.error(f"LLM discovery {step.__name__} failed: {e}")
+            self._stop.wait(interval)
+
+    def discover(self) -> int:
+        """Scan for LLM servers and enroll new ones; returns the number enrolled"""
+        candidates: Dict[Tuple[str, int], Optional[str]] = {
+            endpoint: None for endpoint in self.static_endpoints}
+        hosts = asyncio.run(self._scan()) if self.networks else []
+        if self.inventory is not None:
+            # Hosts not due a rescan are known from earlier passes
+            hosts.extend(host for host in self.inventory.hosts(alive=True)
+                         if any(ipaddress.ip_address(host['ip']) in net
+                                for net in self.networks))
+        for host in hosts:
+            for port in host['open_ports']:
+                if port in self.ports:
+                    banner = host['services'].get(port, '')
+                    candidates[(host['ip'], port)] = detect_service(port, banner)
+
+        enrolled = 0
+        for (address, port), service in candidates.items():
+            with self.lock:
+                known = endpoint_node_id(address, port) in self.endpoints
+            if not known and self.enroll(address, port, service) is not None:
+                enrolled += 1
+        if enrolled:
+            self.master.scheduler.notify()
+        return enrolled
+
+    async def _scan(self) -> List[Dict[str, Any]]:
+        hosts = []
+        for net in self.networks:
+            if self.inventory is not None:
+                results = scan_incremental(self.inventory, net.hosts(), self.ports,
+                                           timeout=self.scan_timeout)
+            else:
+                results = scan_network(net.hosts(), self.ports, timeout=self.scan_timeout,
+                                       liveness=LIVENESS_NONE)
+            async for host in results:
+                hosts.append(host)
+        return hosts
+
+    def enroll(self, address: str, port: int, service: Optional[str] = None) -> Optional['Node']:
+        """Register an endpoint as a node if it lists its models; None if it does not"""
+        try:
+            models = fetch_models(address, port, timeout=self.scan_timeout + 4)
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            logger.debug(f"{address}:{port} is not an LLM endpoint: {e}")
+            return None
+        node_id = endpoint_node_id(address, port)
+        service = service or SERVICE_OPENAI
+        with self.lock:
+            self.endpoints[node_id] = (address, port, service)
+            start_runners = node_id not in self._runners
+            self._runners.add(node_id)
+        node = self._register(node_id, address, port, service, models)
+        if self.master.gateway is not None:
+            # Also serve the endpoint's models through the master's OpenAI API
+            self.master.gateway.add_backend(address, port, models)
+        logger.info(f"Enrolled {service} endpoint {address}:{port} serving "
+                    f"{len(models)} models: {', '.join(models)}")
+        if start_runners:
+            for _ in range(self.slots):
+                threading.Thread(target=self._run_slot, args=(node_id,), daemon=True).start()
+        return node
+
+    def _register(self, node_id: str, address: str, port: int, service: str,
+                  models: List[str]) -> 'Node':
+        return self.master.node_manager.register_node({
+            'id': node_id, 'address': address, 'port': port, 'slots': self.slots,
+            'capabilities': {'models': models, 'service': service, 'exclusive': ['models']},
+        })
+
+    def check_health(self) -> None:
+        """Poll every enrolled endpoint; answering counts as the node's heartbeat"""
+        with self.lock:
+            endpoints = list(self.endpoints.items())
+        for node_id, (address, port, service) in endpoints:
+            try:
+                models = fetch_models(address, port, timeout=self.health_interval)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                logger.warning(f"LLM endpoint {address}:{port} failed its health check: {e}")
+                continue
+            node = self.master.node_manager.get_node(node_id)
+            if node is None or node.capabilities.get('models') != models:
+                # Models were loaded or unloaded; new capabilities reroute tasks
+                self._register(node_id, address, port, service, models)
+                self.master.scheduler.notify()
+            else:
+                self.master.node_manager.update_heartbeat(node_id)
+
+    def _run_slot(self, node_id: str) -> None:
+        """Take the tasks scheduled to an endpoint and run them, one at a time"""
+        dispatcher = self.master.dispatcher
+        while self.running:
+            tasks = dispatcher.take(node_id, 1, timeout=1.0)
+            # Tasks taken back before they started (stolen, or a losing copy)
+            cancelled = dispatcher.take_cancellations(node_id)
+            for task in tasks:
+                if task.id not in cancelled:
+                    self.run_task(node_id, task)
+
+    def run_task(self, node_id: str, task: 'Task') -> None:
+        """Run a task as a chat completion on an endpoint and report its outcome"""
+        master = self.master
+        address, port, _ = self.endpoints[node_id]
+        attempt = task.attempts
+        if not master.apply_task_update(task.id, 'running', node_id, attempt=attempt):
+            return
+        payload = master.task_queue.get_payload(task) or {}
+        model = payload.get('model') or task.requirements.get('models')
+        start = time.time()
+        try:
+            status, body = request(address, port, 'POST', '/v1/chat/completions',
+                                   chat_request(payload, model), self.request_timeout)
+        except (OSError, http.client.HTTPException) as e:
+            # The endpoint went away: the task is retried elsewhere
+            master.deadlines.release(task.id, attempt, f"LLM endpoint {address}:{port} "
+                                     f"failed: {e}", node_id)
+            master.scheduler.notify()
+            return
+        execution_time = time.time() - start
+        if status == 200:
+            try:
+                result = json.loads(body)
+            except ValueError:
+                result = body.decode('utf-8', errors='replace')
+            master.apply_task_update(task.id, 'completed', node_id, result=result,
+                                     execution_time=execution_time, attempt=attempt)
+        else:
+            error = body.decode('utf-8', errors='replace')[:500]
+            master.apply_task_update(task.id, 'failed', node_id,
+                                     error=f"HTTP {status} from {address}:{port}: {error}",
+                                     execution_time=execution_time, attempt=attempt)
+
+    def stats(self) -> Dict[str, Any]:
+        """Discovery counters for the status endpoint"""
+        with self.lock:
+            endpoints = len(self.endpoints)
+        stats: Dict[str, Any] = {'endpoints': endpoints,
+                                 'networks': [str(net) for net in self.networks]}
+        if self.inventory is not None:
+            stats['inventory'] = self.inventory.stats()
+        return stats
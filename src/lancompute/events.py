@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Task event fan-out for LANCompute
+Publishes task changes to filtered subscribers with bounded buffers
+"""
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+# Events buffered per subscriber before the oldest are dropped
+DEFAULT_BUFFER_SIZE = 1000
+
+
+class Subscription:
+    """One consumer's filtered queue of events
+
+    The buffer is bounded: when a consumer falls behind, the oldest events
+    are dropped and the count is handed to the consumer with its next
+    batch, so it can resynchronize instead of the master holding an
+    unbounded backlog for it.
+    """
+
+    def __init__(self, task_ids: Optional[Iterable[str]] = None,
+                 job_ids: Optional[Iterable[str]] = None,
+                 statuses: Optional[Iterable[str]] = None,
+                 max_buffer: int = DEFAULT_BUFFER_SIZE):
+        self.task_ids: Optional[Set[str]] = set(task_ids) if task_ids else None
+        self.job_ids: Optional[Set[str]] = set(job_ids) if job_ids else None
+        self.statuses: Optional[Set[str]] = set(statuses) if statuses else None
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self.closed = False
+        self._events: Deque[Dict[str, Any]] = deque()
+        self._cond = threading.Condition()
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        """Check an event against this subscription's filters"""
+        if self.statuses is not None and event.get('status') not in self.statuses:
+            return False
+        if self.task_ids is None and self.job_ids is None:
+            return True
+        return ((self.task_ids is not None and event.get('task_id') in self.task_ids)
+                or (self.job_ids is not None and event.get('job_id') in self.job_ids))
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        """Buffer an event, dropping the oldest one if the buffer is full"""
+        with self._cond:
+            if len(self._events) >= self.max_buffer:
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """Wait for events; returns everything buffered and the number dropped since"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._events or self.dropped or self.closed,
+                                timeout=timeout)
+            events = list(self._events)
+            self._events.clear()
+            dropped, self.dropped = self.dropped, 0
+            return events, dropped
+
+    def close(self) -> None:
+        """Wake the consumer and stop accepting events"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+class EventBus:
+    """Routes published events to matching subscriptions
+
+    Subscriptions filtered by task or job id are indexed by those ids, so
+    publishing an event only visits the subscribers that asked for its task
+    or job plus those without an id filter, not every open stream.
+    """
+
+    def __init__(self, max_buffer: int = DEFAULT_BUFFER_SIZE):
+        self.max_buffer = max_buffer
+        self._lock = threading.Lock()
+        self._by_task: Dict[str, Set[Subscription]] = {}
+        self._by_job: Dict[str, Set[Subscription]] = {}
+        self._unfiltered: Set[Subscription] = set()
+        self._count = 0
+
+    @property
+    def active(self) -> bool:
+        """Whether anyone is subscribed; publishers can skip building events if not"""
+        return self._count > 0
+
+    def subscribe(self, task_ids: Optional[Iterable[str]] = None,
+                  job_ids: Optional[Iterable[str]] = None,
+                  statuses: Optional[Iterable[str]] = None) -> Subscription:
+        """Open a subscription with optional task, job and status filters"""
+        subscription = Subscription(task_ids, job_ids, statuses, self.max_buffer)
+        with self._lock:
+            if subscription.task_ids is None and subscription.job_ids is None:
+                self._unfiltered.add(subscription)
+            for task_id in subscription.task_ids or ():
+                self._by_task.setdefault(task_id, set()).add(subscription)
+            for job_id in subscription.job_ids or ():
+                self._by_job.setdefault(job_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Close a subscription and stop routing events to it"""
+        subscription.close()
+        with self._lock:
+            self._unfiltered.discard(subscription)
+            for index, keys in ((self._by_task, subscription.task_ids),
+                                (self._by_job, subscription.job_ids)):
+                for key in keys or ():
+                    subscribers = index.get(key)
+                    if subscribers is not None:
+                        subscribers.discard(subscription)
+                        if not subscribers:
+                            del index[key]
+            self._count -= 1
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Deliver an event to every matching subscription"""
+        with self._lock:
+            targets = set(self._unfiltered)
+            targets.update(self._by_task.get(event.get('task_id'), ()))
+            if event.get('job_id') is not None:
+                targets.update(self._by_job.get(event['job_id'], ()))
+        for subscription in targets:
+            if subscription.matches(event):
+                subscription.offer(event)
+
+    def close(self) -> None:
+        """Close every subscription, ending their streams"""
+        with self._lock:
+            subscriptions = set(self._unfiltered)
+            for index in (self._by_task, self._by_job):
+                for subscribers in index.values():
+                    subscriptions.update(subscribers)
+        for subscription in subscriptions:
+            subscription.close()
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+OpenAI-compatible inference gateway for LANCompute
+Serves /v1/models and /v1/chat/completions from the master by proxying
+to a pool of LM Studio / Ollama backends over kept-alive connections,
+sending each request to the least busy healthy backend serving its model
+"""
+
+import http.client
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Backend answers that mean "try another backend"; other errors are the client's
+RETRY_STATUSES = (502, 503, 504)
+
+# Request headers passed on to backends
+FORWARDED_HEADERS = ('Content-Type', 'Accept', 'Authorization')
+
+# Content type of streamed completions ("stream": true)
+MEDIA_EVENT_STREAM = 'text/event-stream'
+
+
+class NoBackendError(Exception):
+    """No backend can take a request
+
+    `status` is 404 when no backend serves the model at all, 503 when the
+    ones that do are ejected or all failed.
+    """
+
+    def __init__(self, message: str, status: int = 503):
+        super().__init__(message)
+        self.status = status
+
+
+class Backend:
+    """One OpenAI-compatible server behind the gateway, with its idle connections"""
+
+    def __init__(self, address: str, port: int, pool_size: int = 16,
+                 connect_timeout: float = 5.0, request_timeout: float = 600.0):
+        self.address = address
+        self.port = port
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        # Model ids from the last health check; unknown until the first one
+        self.models: List[str] = []
+        self.checked = False
+        # Requests in flight, and in total (guarded by the gateway lock)
+        self.outstanding = 0
+        self.requests = 0
+        # Consecutive failed requests or health checks
+        self.failures = 0
+        self.ejected_until = 0.0
+        self._idle: List[http.client.HTTPConnection] = []
+        self._pool_lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return f"{self.address}:{self.port}"
+
+    def connection(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """An idle kept-alive connection, or a new one; returns (connection, reused)"""
+        with self._pool_lock:
+            if self._idle:
+                return self._idle.pop(), True
+        conn = http.client.HTTPConnection(self.address, self.port,
+                                          timeout=self.connect_timeout)
+        return conn, False
+
+    def reuse(self, conn: http.client.HTTPConnection) -> None:
+        """Return a connection whose response was read in full to the pool"""
+        with self._pool_lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        """Close the idle connections"""
+        with self._pool_lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'models': self.models,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'failures': self.failures,
+            'ejected': self.ejected_until > time.time(),
+        }
+
+
+class GatewayResponse:
+    """A backend's response, read from the backend as the client is sent it
+
+    The connection goes back to the backend's pool once the body has been
+    read in full; close() must be called either way.
+    """
+
+    def __init__(self, gateway: 'InferenceGateway', backend: Backend,
+                 conn: http.client.HTTPConnection, response: http.client.HTTPResponse,
+                 started: float = 0.0):
+        self.gateway = gateway
+        self.backend = backend
+        self.status = response.status
+        self.headers = response.headers
+        # When the request went to the backend
+        self.started = started
+        self._conn = conn
+        self._response = response
+        self._closed = False
+
+    @property
+    def streaming(self) -> bool:
+        """Whether the body is a stream of server-sent events, to pass on as it arrives"""
+        content_type = self.headers.get('Content-Type') or ''
+        return content_type.split(';', 1)[0].strip().lower() == MEDIA_EVENT_STREAM
+
+    def read(self) -> bytes:
+        """The whole body"""
+        return self._response.read()
+
+    def iter_chunks(self, chunk_size: int = 65536) -> Iterator[bytes]:
+        """The body as it arrives, without waiting to fill chunk_size"""
+        while True:
+            chunk = self._response.read1(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self, error: Optional[str] = None) -> None:
+        """Release the backend; `error` counts a body broken off towards its ejection"""
+        if self._closed:
+            return
+        self._closed = True
+        if error is None and self._response.isclosed() and not self._response.will_close:
+            self.backend.reuse(self._conn)
+        else:
+            self._conn.close()
+        self.gateway._finished(self.backend)
+        if error is not None:
+            self.gateway._failed(self.backend, error)
+
+
+class InferenceGateway:
+    """Load-balanced proxy to OpenAI-compatible LLM servers
+
+    Each request goes to the backend with the fewest requests in flight
+    among those that serve the requested model (by their /v1/models list)
+    and are not ejected. A backend is ejected for `eject_seconds` after
+    `max_failures` consecutive connection errors, 502/503/504 answers or
+    failed health checks, and readmitted by its next successful health
+    check. A request that fails on one backend before any of its response
+    reached the client is retried on another, up to `retries` times.
+    """
+
+    def __init__(self, backends: Iterable[str] = (), retries: int = 2,
+                 max_failures: int = 3, eject_seconds: float = 30.0,
+                 health_interval: float = 10.0, pool_size: int = 16,
+                 connect_timeout: float = 5.0, request_timeout: float = 600.0):
+        self.retries = retries
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.backends: Dict[str, Backend] = {}
+        self.lock = threading.Lock()
+        self.running = False
+        self._stop = threading.Event()
+        for backend in backends:
+            self.add_backend(*self.parse_backend(backend))
+
+    @staticmethod
+    def parse_backend(backend: str) -> Tuple[str, int]:
+        """(address, port) of a backend given as "host:port" or a URL"""
+        parsed = urlparse(backend if '://' in backend else f"http://{backend}")
+        if not parsed.hostname:
+            raise ValueError(f"Invalid gateway backend: {backend!r}")
+        return parsed.hostname, parsed.port or 80
+
+    def add_backend(self, address: str, port: int,
+                    models: Optional[List[str]] = None) -> Backend:
+        """Put a backend in the pool
+
+        It takes requests once its models are known: from `models`, or from
+        its first health check.
+        """
+        backend = Backend(address, port, self.pool_size, self.connect_timeout,
+                          self.request_timeout)
+        with self.lock:
+            backend = self.backends.setdefault(backend.name, backend)
+            if models is not None and not backend.checked:
+                backend.models = list(models)
+                backend.checked = True
+        return backend
+
+    def start(self):
+        """Start health checking the backends"""
+        self.running = True
+        self._stop.clear()
+        threading.Thread(target=self._health_loop, daemon=True).start()
+        logger.info(f"Inference gateway started with {len(self.backends)} backends")
+
+    def stop(self):
+        self.running = False
+        self._stop.set()
+        with self.lock:
+            backends = list(self.backends.values())
+        for backend in backends:
+            backend.close()
+
+    def _health_loop(self):
+        while self.running:
+            try:
+                self.check_health()
+            except Exception as e:
+                logger.error(f"Gateway health check failed: {e}")
+            self._stop.wait(self.health_interval)
+
+    def check_health(self) -> None:
+        """Refresh every backend's model list; failures count towards ejection"""
+        with self.lock:
+            backends = list(self.backends.values())
+        for backend in backends:
+            conn = http.client.HTTPConnection(backend.address, backend.port,
+                                              timeout=self.connect_timeout)
+            try:
+                conn.request('GET', '/v1/models')
+                response = conn.getresponse()
+                body = response.read()
+                if response.status != 200:
+                    raise ValueError(f"/v1/models returned HTTP {response.status}")
+                models = [model['id'] for model in json.loads(body)['data']]
+            except (OSError, http.client.HTTPException, ValueError, KeyError, TypeError) as e:
+                self._failed(backend, f"health check failed: {e!r}")
+                continue
+            finally:
+                conn.close()
+            with self.lock:
+                if backend.ejected_until:
+                    logger.info(f"Gateway backend {backend.name} is healthy again")
+                backend.models = models
+                backend.checked = True
+                backend.failures = 0
+                backend.ejected_until = 0.0
+
+    def models(self) -> List[str]:
+        """Ids of the models served by backends currently taking requests"""
+        now = time.time()
+        with self.lock:
+            models = {model for backend in self.backends.values()
+                      if backend.checked and backend.ejected_until <= now
+                      for model in backend.models}
+        return sorted(models)
+
+    def pick(self, model: Optional[str], exclude: Iterable[str] = ()) -> Backend:
+        """Reserve the least busy backend for a model (raises NoBackendError)
+
+        Ties go to the backend that has served the fewest requests.
+        """
+        now = time.time()
+        with self.lock:
+            serving = [backend for backend in self.backends.values()
+                       if backend.checked and (model is None or model in backend.models)]
+            if not serving:
+                raise NoBackendError(f"The model {model!r} is not served by any backend", 404)
+            candidates = [backend for backend in serving
+                          if backend.ejected_until <= now and backend.name not in exclude]
+            if not candidates:
+                raise NoBackendError(f"No healthy backend for model {model!r}")
+            backend = min(candidates, key=lambda b: (b.outstanding, b.requests))
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def _finished(self, backend: Backend) -> None:
+        with self.lock:
+            backend.outstanding -= 1
+
+    def _failed(self, backend: Backend, reason: str) -> None:
+        with self.lock:
+            backend.failures += 1
+            eject = backend.failures >= self.max_failures and backend.ejected_until <= time.time()
+            if eject:
+                backend.ejected_until = time.time() + self.eject_seconds
+        if eject:
+            logger.warning(f"Ejecting gateway backend {backend.name} for "
+                           f"{self.eject_seconds:.0f}s: {reason}")
+        else:
+            logger.debug(f"Gateway backend {backend.name}: {reason}")
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> GatewayResponse:
+        """Send a request to the best backend for the model named in its JSON body
+
+        Retries on other backends after connection errors and 502/503/504
+        answers. Raises NoBackendError when no backend is left to try.
+        """
+        model = None
+        if body:
+            try:
+                model = json.loads(body).get('model')
+            except (ValueError, AttributeError):
+                pass
+        tried: List[str] = []
+        last_error = None
+        for _ in range(self.retries + 1):
+            try:
+                backend = self.pick(model, tried)
+            except NoBackendError as e:
+                if last_error is None or e.status == 404:
+                    raise
+                raise NoBackendError(f"All backends failed for model {model!r}: {last_error}")
+            tried.append(backend.name)
+            started = time.time()
+            try:
+                conn, response = self._send(backend, method, path, body, headers or {})
+            except (OSError, http.client.HTTPException) as e:
+                self._finished(backend)
+                self._failed(backend, repr(e))
+                last_error = repr(e)
+                continue
+            if response.status in RETRY_STATUSES:
+                response.read()
+                GatewayResponse(self, backend, conn, response).close()
+                self._failed(backend, f"HTTP {response.status}")
+                last_error = f"HTTP {response.status} from {backend.name}"
+                continue
+            with self.lock:
+                backend.failures = 0
+            return GatewayResponse(self, backend, conn, response, started)
+        raise NoBackendError(f"All backends failed for model {model!r}: {last_error}")
+
+    def _send(self, backend: Backend, method: str, path: str, body: Optional[bytes],
+              headers: Dict[str, str]) -> Tuple[http.client.HTTPConnection,
+                                                 http.client.HTTPResponse]:
+        """Send on a pooled connection, once more on a new one if the pooled one went stale"""
+        while True:
+            conn, reused = backend.connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                # Generation may take minutes; only connecting uses the short timeout
+                conn.sock.settimeout(backend.request_timeout)
+                return conn, conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                # The backend closed an idle keep-alive connection; not a failure
+                if not reused:
+                    raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-backend counters for the status endpoint"""
+        with self.lock:
+            return {'backends': [backend.to_dict() for backend in self.backends.values()]}
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Persistent host inventory for LANCompute network discovery
+Remembers what every scanned address answered (SQLite), so later scans
+revalidate known hosts first and only sweep addresses whose recheck is due
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    ip TEXT PRIMARY KEY,
+    first_seen REAL,
+    last_seen REAL,
+    last_checked REAL NOT NULL,
+    next_check REAL NOT NULL,
+    alive INTEGER NOT NULL,
+    streak INTEGER NOT NULL,
+    open_ports TEXT NOT NULL,
+    services TEXT NOT NULL,
+    service_types TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hosts_next_check ON hosts (next_check);
+"""
+
+_COLUMNS = ('ip', 'first_seen', 'last_seen', 'last_checked', 'next_check', 'alive',
+            'streak', 'open_ports', 'services', 'service_types')
+
+
+class HostInventory:
+    """What each scanned address answered, and when to look at it again
+
+    Every scanned address gets a row, live or not. The recheck interval
+    adapts to the address's history: live hosts are rechecked every
+    `alive_interval`; a host that has been seen but stopped answering is
+    retried from `alive_interval` and an address never seen up from
+    `dead_interval`, doubling with every consecutive miss up to
+    `max_interval`. Empty ranges therefore end up swept about once per
+    `max_interval` while known hosts stay fresh.
+    """
+
+    def __init__(self, path: str, alive_interval: float = 300.0,
+                 dead_interval: float = 3600.0, max_interval: float = 86400.0):
+        self.path = path
+        self.alive_interval = alive_interval
+        self.dead_interval = dead_interval
+        self.max_interval = max_interval
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        # One fsync per checkpoint rather than per scan batch
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        logger.info(f"Host inventory opened at {path}: {len(self)} addresses")
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self._db.execute("SELECT COUNT(*) FROM hosts").fetchone()[0]
+
+    def interval(self, alive: bool, streak: int, seen_before: bool) -> float:
+        """Seconds until an address with this history is checked again"""
+        if alive:
+            return self.alive_interval
+        base = self.alive_interval if seen_before else self.dead_interval
+        return min(self.max_interval, base * 2 ** max(0, min(streak - 1, 32)))
+
+    def due(self, hosts: Iterable[Any], now: Optional[float] = None) -> List[str]:
+        """The addresses among `hosts` to scan now, in the order to scan them
+
+        Known live hosts come first (most recently seen first), so the
+        inventory is revalidated before anything new is swept; then
+        addresses never scanned, then addresses that were down.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            known = {row['ip']: row for row in self._db.execute(
+                "SELECT ip, next_check, alive, last_seen FROM hosts")}
+        live, unknown, dead = [], [], []
+        for host in hosts:
+            ip = str(host)
+            row = known.get(ip)
+            if row is None:
+                unknown.append(ip)
+            elif row['next_check'] <= now:
+                (live if row['alive'] else dead).append((row['last_seen'] or 0.0, ip))
+        live.sort(reverse=True)
+        return [ip for _, ip in live] + unknown + [ip for _, ip in dead]
+
+    def next_check(self) -> Optional[float]:
+        """When the earliest recheck falls due, or None for an empty inventory"""
+        with self.lock:
+            return self._db.execute("SELECT MIN(next_check) FROM hosts").fetchone()[0]
+
+    def record(self, results: Iterable[Dict[str, Any]], now: Optional[float] = None) -> int:
+        """Store scan results (scan_host dicts, dead hosts included) in one transaction
+
+        A result may carry 'service_types' (port -> service name). Returns
+        the number of results stored.
+        """
+        now = time.time() if now is None else now
+        results = list(results)
+        with self.lock:
+            previous = {}
+            for result in results:
+                row = self._db.execute(
+                    "SELECT alive, streak, first_seen, last_seen FROM hosts WHERE ip = ?",
+                    (result['ip'],)).fetchone()
+                if row is not None:
+                    previous[result['ip']] = row
+            rows = []
+            for result in results:
+                alive = bool(result['alive'] or result['open_ports'])
+                before = previous.get(result['ip'])
+                streak = before['streak'] + 1 if before and bool(before['alive']) == alive else 1
+                first_seen = before['first_seen'] if before else None
+                last_seen = before['last_seen'] if before else None
+                if alive:
+                    first_seen = now if first_seen is None else first_seen
+                    last_seen = now
+                rows.append((
+                    result['ip'], first_seen, last_seen, now,
+                    now + self.interval(alive, streak, last_seen is not None),
+                    int(alive), streak, json.dumps(sorted(result['open_ports'])),
+                    json.dumps({str(p): b for p, b in result['services'].items()}),
+                    json.dumps({str(p): t for p, t in result.get('service_types', {}).items()}),
+                ))
+            with self._db:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO hosts ({', '.join(_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(_COLUMNS))})", rows)
+        return len(rows)
+
+    def get(self, ip: str) -> Optional[Dict[str, Any]]:
+        """The stored record of one address, or None if it was never scanned"""
+        with self.lock:
+            row = self._db.execute("SELECT * FROM hosts WHERE ip = ?", (str(ip),)).fetchone()
+        return None if row is None else self._to_dict(row)
+
+    def hosts(self, alive: Optional[bool] = None,
+              service_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Stored records, optionally only live (or down) hosts or those running a service"""
+        query = "SELECT * FROM hosts"
+        params: List[Any] = []
+        if alive is not None:
+            query += " WHERE alive = ?"
+            params.append(int(alive))
+        with self.lock:
+            rows = self._db.execute(query + " ORDER BY ip", params).fetchall()
+        records = [self._to_dict(row) for row in rows]
+        if service_type is not None:
+            records = [r for r in records if service_type in r['service_types'].values()]
+        return records
+
+    def stats(self) -> Dict[str, Any]:
+        """Inventory counts for status output"""
+        with self.lock:
+            total, alive = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(alive), 0) FROM hosts").fetchone()
+        return {'addresses': total, 'alive': alive, 'next_check': self.next_check()}
+
+    def close(self):
+        with self.lock:
+            self._db.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record['alive'] = bool(record['alive'])
+        record['open_ports'] = json.loads(record['open_ports'])
+        record['services'] = {int(p): b for p, b in json.loads(record['services']).items()}
+        record['service_types'] = {int(p): t for p, t
+                                   in json.loads(record['service_types']).items()}
+        return record
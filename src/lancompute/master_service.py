@@ -5,22 +5,47 @@ Central coordinator for task distribution and node management
 """
 
 import asyncio
+import codecs
+import gc
+import heapq
+import itertools
 import json
 import logging
+import math
+import os
 import time
 import uuid
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Set
-from dataclasses import dataclass, asdict
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from enum import Enum
 import socket
 import threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.client import HTTPException
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
-from queue import Queue, PriorityQueue
 import signal
 import sys
 
+from .blobs import BlobStore, UploadConflict, is_digest
+from .codec import (
+    ENCODING_IDENTITY, MEDIA_JSON, BodyTooLargeError, available_encodings, available_formats,
+    compress, decode, decompress, encode, iter_decompressed, json_default, media_type, negotiate
+)
+from .discovery import LLMDiscovery
+from .events import DEFAULT_BUFFER_SIZE, EventBus
+from .gateway import FORWARDED_HEADERS, InferenceGateway, NoBackendError
+from .inventory import HostInventory
+from .result_store import MemoryResultStore, ResultStore, create_result_store
+from .scheduling import SchedulingPolicy, StragglerDetector, create_policy
+from .wal import SYNC_BATCH, WriteAheadLog
+
+# YAML config files are optional; defaults are used without PyYAML
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
 
 # Configure logging
 logging.basicConfig(
@@ -29,10 +54,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Upper bound for a worker long poll on /node/poll, in seconds
+MAX_POLL_TIMEOUT = 60.0
+
+# Page size of GET /tasks and /nodes when no limit is given, and the largest allowed
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# Seconds between keep-alive messages on an idle GET /events stream
+EVENT_KEEPALIVE_INTERVAL = 15.0
+
+# Task statuses after which a task never changes again
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+# How often result eviction and WAL snapshots are considered, in seconds
+MAINTENANCE_INTERVAL = 60.0
+
+# How often running tasks are checked for stragglers with speculation on, in seconds
+SPECULATION_INTERVAL = 1.0
+
 
 class TaskStatus(Enum):
     """Task execution status"""
     PENDING = "pending"
+    BLOCKED = "blocked"
     ASSIGNED = "assigned"
     RUNNING = "running"
     COMPLETED = "completed"
@@ -48,103 +93,893 @@ class NodeStatus(Enum):
     MAINTENANCE = "maintenance"
 
 
-@dataclass
 class Task:
-    """Represents a computational task"""
-    id: str
-    type: str
-    payload: Dict[str, Any]
-    priority: int = 0
-    requirements: Dict[str, Any] = None
-    status: TaskStatus = TaskStatus.PENDING
-    assigned_node: Optional[str] = None
-    created_at: float = None
-    started_at: Optional[float] = None
-    completed_at: Optional[float] = None
-    result: Optional[Any] = None
-    error: Optional[str] = None
-    
-    def __post_init__(self):
-        if self.created_at is None:
-            self.created_at = time.time()
-        if self.requirements is None:
-            self.requirements = {}
+    """Represents a computational task
+
+    The master may hold millions of these, so instances use __slots__
+    rather than a per-instance __dict__. The task queue interns type strings
+    and shares one requirements dict between all tasks with the same
+    requirements; treat both as read-only.
+    """
+    
+    __slots__ = ('id', 'type', 'payload', 'priority', 'requirements', 'status',
+                 'assigned_node', 'created_at', 'started_at', 'completed_at', 'result',
+                 'error', 'execution_time', 'timeout', 'attempts', 'max_retries', 'job_id',
+                 'depends_on', 'slots', 'idempotent', 'blobs', 'seq')
+    
+    def __init__(self, id: str, type: str, payload: Dict[str, Any], priority: int = 0,
+                 requirements: Optional[Dict[str, Any]] = None,
+                 status: TaskStatus = TaskStatus.PENDING,
+                 assigned_node: Optional[str] = None, created_at: Optional[float] = None,
+                 started_at: Optional[float] = None, completed_at: Optional[float] = None,
+                 result: Optional[Any] = None, error: Optional[str] = None,
+                 execution_time: Optional[float] = None, timeout: Optional[float] = None,
+                 attempts: int = 0, max_retries: Optional[int] = None,
+                 job_id: Optional[str] = None, depends_on: Optional[List[str]] = None,
+                 slots: int = 1, idempotent: bool = True,
+                 blobs: Optional[Dict[str, str]] = None):
+        self.id = id
+        self.type = type
+        self.payload = payload
+        self.priority = priority
+        self.requirements = _NO_REQUIREMENTS if requirements is None else requirements
+        self.status = status
+        self.assigned_node = assigned_node
+        self.created_at = time.time() if created_at is None else created_at
+        self.started_at = started_at
+        self.completed_at = completed_at
+        self.result = result
+        self.error = error
+        self.execution_time = execution_time
+        # Execution deadline in seconds (None = no limit)
+        self.timeout = timeout
+        # Number of times the task has been assigned to a node
+        self.attempts = attempts
+        # Reassignments allowed after a timeout or node loss (None = queue default)
+        self.max_retries = max_retries
+        # Job the task belongs to, if any
+        self.job_id = job_id
+        # Ids of the tasks that must complete before this one can run
+        self.depends_on = depends_on
+        # Node slots the task occupies while assigned, e.g. the cores it uses
+        self.slots = slots
+        # Whether the task may run twice at once (speculative copies, work stealing)
+        self.idempotent = idempotent
+        # Input blobs by name -> digest, fetched into the worker's blob cache
+        self.blobs = blobs
+        # Position in the queue's submission order, set when the task is queued
+        self.seq = None
+    
+    def __repr__(self):
+        return f"Task(id={self.id!r}, type={self.type!r}, status={self.status.value})"
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready view of the task
+        
+        Shallow: payload and requirements are shared with the task, not
+        copied, so the caller must not modify them.
+        """
+        return {
+            'id': self.id,
+            'type': self.type,
+            'payload': self.payload,
+            'priority': self.priority,
+            'requirements': self.requirements,
+            'status': self.status.value,
+            'assigned_node': self.assigned_node,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'completed_at': self.completed_at,
+            'result': self.result,
+            'error': self.error,
+            'execution_time': self.execution_time,
+            'timeout': self.timeout,
+            'attempts': self.attempts,
+            'max_retries': self.max_retries,
+            'job_id': self.job_id,
+            'depends_on': self.depends_on,
+            'slots': self.slots,
+            'idempotent': self.idempotent,
+            'blobs': self.blobs
+        }
+    
+    def to_record(self) -> List[Any]:
+        """Task state as a positional row for the write-ahead log
+
+        Results are not included; they live in the result store.
+        """
+        return [self.id, self.type, self.payload, self.priority, self.requirements,
+                self.status.value, self.assigned_node, self.created_at, self.started_at,
+                self.completed_at, self.error, self.execution_time, self.timeout,
+                self.attempts, self.max_retries, self.job_id, self.depends_on,
+                self.slots, self.idempotent, self.blobs]
+    
+    @classmethod
+    def from_record(cls, row: List[Any]) -> 'Task':
+        """Rebuild a task from a write-ahead log row"""
+        # Positional construction is markedly faster when replaying millions
+        # of rows; the None fills the result field, which is not logged.
+        # Rows written before a field existed are shorter and use its default
+        return cls(*row[:5], TASK_STATUS_BY_VALUE[row[5]], *row[6:10], None, *row[10:])
     
     def __lt__(self, other):
         """For priority queue comparison"""
         return self.priority > other.priority
 
 
-@dataclass
+# Shared by every task submitted without requirements
+_NO_REQUIREMENTS: Dict[str, Any] = {}
+
+# Faster than TaskStatus(value) when replaying millions of records
+TASK_STATUS_BY_VALUE = {status.value: status for status in TaskStatus}
+
+
 class Node:
     """Represents a compute node"""
-    id: str
-    address: str
-    port: int
-    capabilities: Dict[str, Any]
-    status: NodeStatus = NodeStatus.ONLINE
-    last_heartbeat: float = None
-    current_tasks: Set[str] = None
-    total_completed: int = 0
-    total_failed: int = 0
-    
-    def __post_init__(self):
-        if self.last_heartbeat is None:
-            self.last_heartbeat = time.time()
-        if self.current_tasks is None:
-            self.current_tasks = set()
+    
+    __slots__ = ('id', 'address', 'port', 'capabilities', 'status', 'last_heartbeat',
+                 'current_tasks', 'total_completed', 'total_failed', 'slots',
+                 'prefetch_depth', 'running', 'queued', 'load', 'cpu_percent',
+                 'memory_percent', 'oversubscription', 'throttled', 'weights', 'blobs')
+    
+    def __init__(self, id: str, address: str, port: int, capabilities: Dict[str, Any],
+                 status: NodeStatus = NodeStatus.ONLINE,
+                 last_heartbeat: Optional[float] = None,
+                 current_tasks: Optional[Set[str]] = None,
+                 total_completed: int = 0, total_failed: int = 0,
+                 slots: int = 2, prefetch_depth: int = 0, running: int = 0, queued: int = 0,
+                 load: float = 0.0, oversubscription: float = 1.0):
+        self.id = id
+        self.address = address
+        self.port = port
+        self.capabilities = capabilities
+        self.status = status
+        self.last_heartbeat = time.time() if last_heartbeat is None else last_heartbeat
+        self.current_tasks = set() if current_tasks is None else current_tasks
+        self.total_completed = total_completed
+        self.total_failed = total_failed
+        # Slot accounting advertised by the worker
+        self.slots = slots
+        self.prefetch_depth = prefetch_depth
+        self.running = running
+        self.queued = queued
+        # One-minute load average and CPU and memory use reported by the worker
+        self.load = load
+        self.cpu_percent = 0.0
+        self.memory_percent = 0.0
+        # Slots are multiplied by this; extra tasks wait in the worker's run queue
+        self.oversubscription = oversubscription
+        # Set while the node is short of CPU or memory headroom
+        self.throttled = False
+        # Slots taken by current tasks that occupy more than one
+        self.weights: Dict[str, int] = {}
+        # Digests of the blobs in the worker's cache
+        self.blobs: Set[str] = set()
+    
+    def __repr__(self):
+        return f"Node(id={self.id!r}, address={self.address!r}, status={self.status.value})"
+    
+    @property
+    def capacity(self) -> int:
+        """Slots the node can hold: executor slots, oversubscribed, plus its prefetch queue"""
+        return max(self.slots, int(self.slots * self.oversubscription)) + self.prefetch_depth
+    
+    @property
+    def used_slots(self) -> int:
+        """Slots taken by the node's current tasks"""
+        return len(self.current_tasks) + sum(self.weights.values()) - len(self.weights)
+    
+    def has_capacity(self, slots: int = 1) -> bool:
+        """Check if a task taking this many slots can be assigned to the node
+        
+        A task wider than the whole node fits once the node is otherwise idle.
+        """
+        if self.throttled:
+            return False
+        capacity = self.capacity
+        return self.used_slots + min(slots, capacity) <= capacity
+    
+    def add_task(self, task_id: str, slots: int = 1) -> None:
+        """Count a task assigned to the node; a task wider than the node fills it"""
+        self.current_tasks.add(task_id)
+        slots = min(slots, self.capacity)
+        if slots > 1:
+            self.weights[task_id] = slots
+    
+    def remove_task(self, task_id: str) -> None:
+        """Stop counting a task that left the node"""
+        self.current_tasks.discard(task_id)
+        self.weights.pop(task_id, None)
+    
+    @staticmethod
+    def parse_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate slot accounting and load reported in a registration or heartbeat
+        
+        Returns the attributes to set; raises ValueError on any bad field so
+        that a node is never left half-updated.
+        """
+        values: Dict[str, Any] = {}
+        for key in ('slots', 'prefetch_depth', 'running', 'queued'):
+            if key in stats:
+                try:
+                    values[key] = max(0, int(stats[key]))
+                except (TypeError, ValueError, OverflowError):
+                    raise ValueError(f"Invalid {key}: {stats[key]!r}") from None
+        for key in ('load', 'cpu_percent', 'memory_percent'):
+            if key in stats:
+                try:
+                    value = float(stats[key])
+                except (TypeError, ValueError):
+                    value = math.nan
+                if not math.isfinite(value):
+                    raise ValueError(f"Invalid {key}: {stats[key]!r}")
+                values[key] = max(0.0, value)
+        if 'blobs' in stats:
+            blobs = stats['blobs']
+            if not (isinstance(blobs, list) and all(isinstance(b, str) for b in blobs)):
+                raise ValueError(f"Invalid blobs: expected a list of digests, got {blobs!r}")
+            values['blobs'] = set(blobs)
+        return values
+    
+    def update_slots(self, stats: Dict[str, Any]) -> None:
+        """Apply slot accounting and load reported in a registration or heartbeat"""
+        for key, value in self.parse_stats(stats).items():
+            setattr(self, key, value)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready view of the node"""
+        return {
+            'id': self.id,
+            'address': self.address,
+            'port': self.port,
+            'capabilities': self.capabilities,
+            'status': self.status.value,
+            'last_heartbeat': self.last_heartbeat,
+            'current_tasks': list(self.current_tasks),
+            'total_completed': self.total_completed,
+            'total_failed': self.total_failed,
+            'slots': self.slots,
+            'prefetch_depth': self.prefetch_depth,
+            'running': self.running,
+            'queued': self.queued,
+            'load': self.load,
+            'cpu_percent': self.cpu_percent,
+            'memory_percent': self.memory_percent,
+            'throttled': self.throttled,
+            'used_slots': self.used_slots,
+            'cached_blobs': len(self.blobs)
+        }
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Registration state for the write-ahead log"""
+        return {
+            'id': self.id,
+            'address': self.address,
+            'port': self.port,
+            'capabilities': self.capabilities,
+            'slots': self.slots,
+            'prefetch_depth': self.prefetch_depth,
+            'total_completed': self.total_completed,
+            'total_failed': self.total_failed
+        }
+
+
+RequirementSignature = Tuple[Tuple[str, Any], ...]
+# Pending tasks are bucketed by requirement signature and slot width
+BucketKey = Tuple[RequirementSignature, int]
+# (-priority, sequence, task, task.attempts when it was queued)
+QueueEntry = Tuple[int, int, Task, int]
+
+
+def _freeze(value: Any) -> Any:
+    """Convert a requirement value into a hashable equivalent"""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def requirement_signature(requirements: Dict[str, Any]) -> RequirementSignature:
+    """Canonical, hashable signature for a requirements dict"""
+    if not requirements:
+        return ()
+    signature = tuple(sorted(requirements.items()))
+    try:
+        # Fast path: plain scalar requirement values are already hashable
+        hash(signature)
+        return signature
+    except TypeError:
+        return tuple(sorted((str(k), _freeze(v)) for k, v in requirements.items()))
 
 
 class TaskQueue:
-    """Priority-based task queue with requirements matching"""
+    """Priority-based task queue with requirements matching
+
+    Pending tasks are bucketed by requirement signature and slot width;
+    each bucket is a heap ordered by (priority, submission order). Matching
+    a node therefore only evaluates each distinct signature once instead of
+    draining the whole backlog. Per-node match results are cached in a
+    capability index that is rebuilt whenever the node's capabilities
+    object changes. Among tasks of equal priority a node gets those whose
+    input blobs it already caches first, most cached bytes first, so large
+    inputs are not sent over the network again; a per-blob index of the
+    bucket entries keeps that lookup to the blobs the node caches.
     
-    def __init__(self):
-        self.queue = PriorityQueue()
+    Submitted tasks are compacted before they are queued: type strings are
+    interned, tasks with equal requirements share one dict, and with a
+    payload store the payload is moved out of memory until the task is
+    dispatched.
+    
+    Listings are served from secondary indexes mapping a status, type or
+    node to the submission positions of its tasks, and every change bumps a
+    revision number so pollers can ask for just the tasks changed since the
+    revision they last saw.
+    
+    Tasks may depend on other tasks. A task with unfinished parents is held
+    BLOCKED, outside the buckets, with a counter of the parents it still
+    waits for; each completion decrements its children's counters and
+    queues those that reach zero, so running a DAG costs time linear in its
+    tasks and edges rather than rescanning the blocked tasks.
+    """
+    
+    def __init__(self, result_store: Optional[ResultStore] = None,
+                 default_timeout: Optional[float] = None,
+                 type_timeouts: Optional[Dict[str, float]] = None,
+                 max_retries: int = 3, retry_backoff: float = 1.0,
+                 retry_backoff_max: float = 60.0,
+                 payload_store: Optional[ResultStore] = None,
+                 event_buffer: int = DEFAULT_BUFFER_SIZE,
+                 blob_store: Optional[BlobStore] = None):
         self.tasks: Dict[str, Task] = {}
         self.lock = threading.Lock()
+        # Timeouts applied to tasks submitted without one
+        self.default_timeout = default_timeout
+        self.type_timeouts = type_timeouts or {}
+        # Retry policy after a timeout or node loss: exponential backoff
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        # Finished results live here rather than on the Task objects
+        self.result_store = result_store or MemoryResultStore()
+        # Optional out-of-line storage for payloads of queued tasks; tasks
+        # keep payload=None and it is loaded again when they are serialized
+        self.payload_store = payload_store
+        # Input blobs tasks may reference; without a store any digest is accepted
+        self.blob_store = blob_store
+        # Optional write-ahead log; records are appended with the lock held
+        self.journal: Optional[WriteAheadLog] = None
+        # (signature, slots) -> heap of queue entries
+        self._buckets: Dict[BucketKey, List[QueueEntry]] = {}
+        # blob digest -> bucket key -> heap of that bucket's entries reading the blob
+        self._blob_index: Dict[str, Dict[BucketKey, List[QueueEntry]]] = {}
+        # Sizes of the blobs queued tasks take as input, weighing cache affinity
+        self._blob_sizes: Dict[str, int] = {}
+        # signature -> requirements dict shared by every task with that signature
+        self._requirements: Dict[RequirementSignature, Dict[str, Any]] = {(): _NO_REQUIREMENTS}
+        # node id -> (capabilities, matching signatures, non-matching signatures)
+        self._capability_index: Dict[
+            str, Tuple[Dict[str, Any], Set[RequirementSignature], Set[RequirementSignature]]
+        ] = {}
+        self._sequence = itertools.count()
+        # Every task in submission order; a task's seq is its position here
+        self._order: List[Task] = []
+        # (field, value) -> seqs of the tasks with that status, type, job or node
+        self._index: Dict[Tuple[str, Any], Set[int]] = {}
+        # Change feed: task id -> revision of its last change, oldest first.
+        # Revisions restart with the process; epoch tells clients it did
+        self.revision = 0
+        self.epoch = uuid.uuid4().hex
+        self._changes: Dict[str, int] = {}
+        # Every change is also published here for GET /events streams
+        self.events = EventBus(max_buffer=event_buffer)
+        # Called with (task, old status) on every status change, lock held
+        self.on_status_change: Optional[Callable[[Task, TaskStatus], None]] = None
+        # Dependency tracking: blocked task id -> parents it still waits for,
+        # and unfinished parent id -> ids of the blocked tasks waiting on it
+        self._waiting: Dict[str, int] = {}
+        self._dependents: Dict[str, List[str]] = {}
     
     def add_task(self, task: Task) -> None:
-        """Add a task to the queue"""
+        """Add a task to the queue
+        
+        Raises ValueError if it depends on an unknown task or on itself,
+        or takes an unknown blob as input.
+        """
+        self._apply_defaults(task)
+        self.check_blobs(task.blobs)
+        dependent = self._check_dependencies([task])
+        self._compact(task)
         with self.lock:
             self.tasks[task.id] = task
-            self.queue.put(task)
+            if dependent:
+                self._block(task)
+            if task.status is TaskStatus.PENDING:
+                self._push(task)
+            self._track(task)
+            lsn = self._log({'op': 'task', 'task': task.to_record()})
             logger.info(f"Task {task.id} added to queue")
+        self._wait_durable(lsn)
     
-    def get_task_for_node(self, node: Node) -> Optional[Task]:
-        """Get next suitable task for a node based on capabilities"""
+    def add_tasks(self, tasks: List[Task]) -> None:
+        """Add many tasks to the queue under a single lock acquisition
+        
+        Tasks may depend on tasks earlier or later in the same batch. Raises
+        ValueError, before adding any task, for an unknown parent, a cycle or
+        an unknown input blob.
+        """
+        lsn = 0
+        for task in tasks:
+            self._apply_defaults(task)
+            self.check_blobs(task.blobs)
+        dependent = self._check_dependencies(tasks)
+        for task in tasks:
+            self._compact(task)
+        with self.lock:
+            for task in tasks:
+                self.tasks[task.id] = task
+            # Parents first, so a child sees whether an in-batch parent failed
+            for task in dependent:
+                self._block(task)
+            for task in tasks:
+                if task.status is TaskStatus.PENDING:
+                    self._push(task)
+                self._track(task)
+            if self.journal is not None:
+                # One record per batch keeps the log compact and cheap to replay
+                lsn = self.journal.append(
+                    {'op': 'tasks', 'rows': [task.to_record() for task in tasks]})
+        logger.info(f"Added {len(tasks)} tasks to queue")
+        self._wait_durable(lsn)
+    
+    def restore(self, tasks: Iterable[Task]) -> None:
+        """Load recovered tasks, re-queueing the pending ones in submission order"""
         with self.lock:
-            temp_tasks = []
-            found_task = None
+            blocked = []
+            for task in tasks:
+                self._share_strings(task)
+                self.tasks[task.id] = task
+                self._track(task)
+                if task.status is TaskStatus.PENDING:
+                    self._push(task)
+                elif task.status is TaskStatus.BLOCKED:
+                    blocked.append(task)
             
-            while not self.queue.empty():
-                task = self.queue.get()
-                
-                # Check if task still exists and is pending
-                if task.id not in self.tasks or task.status != TaskStatus.PENDING:
+            # Dependency counters are not persisted; count them again
+            failed = []
+            for task in blocked:
+                self._block(task)
+                if task.status is not TaskStatus.BLOCKED:
+                    self._changed(task, TaskStatus.BLOCKED, None)
+                    if task.status is TaskStatus.PENDING:
+                        self._push(task)
+                    else:
+                        failed.append(task)
+            for task in failed:
+                self._resolve_dependents(task)
+    
+    def check_blobs(self, blobs: Optional[Dict[str, str]]) -> None:
+        """Check that input blobs, by name -> digest, are stored (raises ValueError)"""
+        if not blobs or self.blob_store is None:
+            return
+        for name, digest in blobs.items():
+            if not self.blob_store.exists(digest):
+                raise ValueError(f"Unknown blob for input {name!r}: {digest}")
+    
+    def _apply_defaults(self, task: Task) -> None:
+        """Fill in the timeout for tasks submitted without one"""
+        if task.timeout is None:
+            task.timeout = self.type_timeouts.get(task.type, self.default_timeout)
+        if task.timeout is not None and task.timeout <= 0:
+            task.timeout = None
+    
+    def _compact(self, task: Task) -> None:
+        """Shrink a submitted task's footprint before it is queued"""
+        self._share_strings(task)
+        if self.payload_store is not None and task.payload is not None:
+            self.payload_store.put(task.id, task.payload)
+            task.payload = None
+    
+    def _share_strings(self, task: Task) -> None:
+        """Intern the task type and share the requirements dict of equal tasks"""
+        if isinstance(task.type, str):
+            task.type = sys.intern(task.type)
+        if task.requirements:
+            signature = requirement_signature(task.requirements)
+            # setdefault is atomic, so this is safe without the queue lock
+            task.requirements = self._requirements.setdefault(signature, task.requirements)
+        else:
+            task.requirements = _NO_REQUIREMENTS
+    
+    def _check_dependencies(self, tasks: List[Task]) -> List[Task]:
+        """Validate a batch's dependencies; returns its tasks that have any, parents first
+        
+        Parents must already be queued or be in the same batch. Raises
+        ValueError for an unknown parent or a cycle within the batch.
+        """
+        if not any(task.depends_on for task in tasks):
+            return []
+        batch = {task.id: task for task in tasks}
+        children: Dict[str, List[Task]] = {}
+        in_degree = dict.fromkeys(batch, 0)
+        with self.lock:
+            for task in tasks:
+                if not task.depends_on:
+                    continue
+                task.depends_on = list(dict.fromkeys(task.depends_on))
+                for parent_id in task.depends_on:
+                    if parent_id in batch:
+                        children.setdefault(parent_id, []).append(task)
+                        in_degree[task.id] += 1
+                    elif parent_id not in self.tasks:
+                        raise ValueError(f"Task {task.id} depends on unknown task {parent_id}")
+        
+        # Kahn's algorithm over the edges within the batch
+        ordered = []
+        ready = [task for task in tasks if not in_degree[task.id]]
+        while ready:
+            task = ready.pop()
+            ordered.append(task)
+            for child in children.get(task.id, ()):
+                in_degree[child.id] -= 1
+                if not in_degree[child.id]:
+                    ready.append(child)
+        if len(ordered) < len(batch):
+            raise ValueError("Task dependencies form a cycle")
+        return [task for task in ordered if task.depends_on]
+    
+    def _block(self, task: Task) -> None:
+        """Hold a task back until its parents complete (lock held)
+        
+        Leaves the task BLOCKED with its unfinished parents counted, PENDING
+        if they all completed, or FAILED if one of them failed.
+        """
+        waiting = 0
+        for parent_id in task.depends_on:
+            parent = self.tasks.get(parent_id)
+            if parent is not None and parent.status is TaskStatus.COMPLETED:
+                continue
+            if parent is None or parent.status.value in FINAL_STATUSES:
+                error = (f"Dependency {parent_id} "
+                         f"{'not found' if parent is None else parent.status.value}")
+                self._waiting.pop(task.id, None)
+                self.apply_status(task, TaskStatus.FAILED, time.time(), error)
+                return
+            self._dependents.setdefault(parent_id, []).append(task.id)
+            waiting += 1
+        if waiting:
+            self._waiting[task.id] = waiting
+            task.status = TaskStatus.BLOCKED
+        else:
+            task.status = TaskStatus.PENDING
+    
+    def _resolve_dependents(self, task: Task) -> int:
+        """Queue or fail the tasks waiting on a task that just finished (lock held)
+        
+        Only the finished task's own children are visited. A failure
+        cascades to every descendant. Returns the last journal position
+        written.
+        """
+        lsn = 0
+        finished = [task]
+        while finished:
+            parent = finished.pop()
+            for child_id in self._dependents.pop(parent.id, ()):
+                waiting = self._waiting.get(child_id)
+                if waiting is None:
+                    # Already failed through another parent
                     continue
+                if parent.status is TaskStatus.COMPLETED:
+                    if waiting > 1:
+                        self._waiting[child_id] = waiting - 1
+                        continue
+                    status, error = TaskStatus.PENDING, None
+                else:
+                    status = TaskStatus.FAILED
+                    error = f"Dependency {parent.id} {parent.status.value}"
+                del self._waiting[child_id]
                 
-                # Check if node meets task requirements
-                if self._node_meets_requirements(node, task):
-                    found_task = task
-                    break
+                child = self.tasks[child_id]
+                now = time.time()
+                self.apply_status(child, status, now, error)
+                self._changed(child, TaskStatus.BLOCKED, None)
+                lsn = self._log({'op': 'status', 'id': child_id, 'status': status.value,
+                                 'at': now, 'error': error, 'execution_time': None})
+                if status is TaskStatus.PENDING:
+                    self._push(child)
                 else:
-                    temp_tasks.append(task)
-            
-            # Put back tasks that weren't suitable
-            for task in temp_tasks:
-                self.queue.put(task)
+                    finished.append(child)
+        return lsn
+    
+    def _track(self, task: Task) -> None:
+        """Add a new task to the listing indexes and change feed (lock held)"""
+        task.seq = len(self._order)
+        self._order.append(task)
+        self._index_set(('status', task.status.value), task.seq, True)
+        self._index_set(('type', task.type), task.seq, True)
+        if task.job_id is not None:
+            self._index_set(('job', task.job_id), task.seq, True)
+        if task.assigned_node is not None:
+            self._index_set(('node', task.assigned_node), task.seq, True)
+        self._touch(task)
+    
+    def _changed(self, task: Task, old_status: TaskStatus, old_node: Optional[str]) -> None:
+        """Move a changed task between listing indexes and record the change (lock held)"""
+        if task.status is not old_status:
+            self._index_set(('status', old_status.value), task.seq, False)
+            self._index_set(('status', task.status.value), task.seq, True)
+        if task.assigned_node != old_node:
+            if old_node is not None:
+                self._index_set(('node', old_node), task.seq, False)
+            if task.assigned_node is not None:
+                self._index_set(('node', task.assigned_node), task.seq, True)
+        self._touch(task)
+        if self.on_status_change is not None:
+            self.on_status_change(task, old_status)
+    
+    def _index_set(self, key: Tuple[str, Any], seq: int, present: bool) -> None:
+        """Add a task to or drop it from one secondary index (lock held)"""
+        if present:
+            entries = self._index.get(key)
+            if entries is None:
+                entries = self._index[key] = set()
+            entries.add(seq)
+        else:
+            entries = self._index.get(key)
+            if entries is not None:
+                entries.discard(seq)
+                if not entries:
+                    del self._index[key]
+    
+    def _touch(self, task: Task) -> None:
+        """Move a task to the end of the change feed under a new revision (lock held)"""
+        self.revision += 1
+        self._changes.pop(task.id, None)
+        self._changes[task.id] = self.revision
+        if self.events.active:
+            # Published with the lock held so subscribers see changes in revision order
+            self.events.publish(self.task_event(task, self.revision))
+    
+    def current_event(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Event for a task's current state, or None if there is no such task"""
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return None
+            return self.task_event(task, self._changes[task_id])
+    
+    @staticmethod
+    def task_event(task: Task, revision: int) -> Dict[str, Any]:
+        """Event describing a task's current state"""
+        return {
+            'task_id': task.id,
+            'job_id': task.job_id,
+            'status': task.status.value,
+            'node': task.assigned_node,
+            'error': task.error,
+            'execution_time': task.execution_time,
+            'revision': revision
+        }
+    
+    def _log(self, record: Dict[str, Any]) -> int:
+        """Append a record to the journal, if any (lock held)"""
+        if self.journal is None:
+            return 0
+        return self.journal.append(record)
+    
+    def _wait_durable(self, lsn: int) -> None:
+        """Wait for a journal record to reach disk (lock not held)"""
+        if lsn:
+            self.journal.wait_durable(lsn)
+    
+    def _push(self, task: Task) -> None:
+        """Push a pending task into its requirement bucket (lock held)"""
+        signature = requirement_signature(task.requirements)
+        key = (signature, task.slots)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = []
+            self._requirements.setdefault(signature, task.requirements)
+        entry = (-task.priority, next(self._sequence), task, task.attempts)
+        heapq.heappush(bucket, entry)
+        if task.blobs:
+            for digest in set(task.blobs.values()):
+                buckets = self._blob_index.get(digest)
+                if buckets is None:
+                    buckets = self._blob_index[digest] = {}
+                    size = self.blob_store.size(digest) if self.blob_store else None
+                    # Unknown sizes still count, so more cached inputs win
+                    self._blob_sizes[digest] = size or 1
+                heapq.heappush(buckets.setdefault(key, []), entry)
+    
+    def pending_count(self) -> int:
+        """Number of entries waiting in the requirement buckets"""
+        with self.lock:
+            return sum(len(bucket) for bucket in self._buckets.values())
+    
+    def get_task_for_node(self, node: Node, cached_only: bool = False) -> Optional[Task]:
+        """Get the next task that suits a node's capabilities and fits its free slots
+        
+        With cached_only, only a task that reads blobs the node already
+        caches is returned.
+        """
+        with self.lock:
+            best = self._best_entry(node, cached_only)
+            if best is None:
+                return None
             
-            if found_task:
-                found_task.status = TaskStatus.ASSIGNED
-                found_task.assigned_node = node.id
-                logger.info(f"Task {found_task.id} assigned to node {node.id}")
+            bucket_key, entry = best
+            found_task = entry[2]
+            found_task.status = TaskStatus.ASSIGNED
+            found_task.assigned_node = node.id
+            found_task.attempts += 1
+            # Its queue entries are stale now; drop those at the front of their heaps
+            self._bucket_head(bucket_key)
+            self._unindex_blobs(found_task, bucket_key)
+            if found_task.blobs:
+                # The node fetches them now; count them as cached there so its
+                # next tasks can follow before its heartbeat says so
+                node.blobs.update(found_task.blobs.values())
+            self._changed(found_task, TaskStatus.PENDING, None)
+            self._log({'op': 'assign', 'id': found_task.id, 'node': node.id,
+                       'attempt': found_task.attempts})
+            logger.info(f"Task {found_task.id} assigned to node {node.id}")
             
             return found_task
     
+    def peek_task_for_node(self, node: Node) -> Optional[Task]:
+        """The task get_task_for_node would hand a node, without assigning it"""
+        with self.lock:
+            best = self._best_entry(node)
+            if best is None:
+                return None
+            return best[1][2]
+    
+    def _best_entry(self, node: Node, cached_only: bool = False
+                    ) -> Optional[Tuple[BucketKey, QueueEntry]]:
+        """Bucket key and queue entry of a node's next task, if any (lock held)
+        
+        Buckets of tasks wider than the node's free slots are skipped, so
+        smaller tasks behind them fill the gaps (first fit in priority order).
+        Within a priority, tasks whose input blobs the node caches come
+        first, by cached bytes; only the blob index entries of the node's
+        cached blobs are looked at. With cached_only, None is returned unless
+        the node's next task reads cached blobs.
+        """
+        best = None
+        best_rank = None
+        
+        for bucket_key in list(self._buckets):
+            signature, slots = bucket_key
+            if not self._signature_matches(node, signature) or not node.has_capacity(slots):
+                continue
+            
+            head = self._bucket_head(bucket_key)
+            if head is None:
+                continue
+            
+            rank = (head[0], 0, head[1])
+            if best_rank is None or rank < best_rank:
+                best_rank = rank
+                best = (bucket_key, head)
+        
+        if best_rank is not None and node.blobs:
+            for digest in node.blobs:
+                buckets = self._blob_index.get(digest)
+                if buckets is None:
+                    continue
+                for bucket_key in list(buckets):
+                    signature, slots = bucket_key
+                    if (not self._signature_matches(node, signature)
+                            or not node.has_capacity(slots)):
+                        continue
+                    head = self._blob_head(digest, bucket_key)
+                    # Lower priorities never win on cache affinity
+                    if head is None or head[0] != best_rank[0]:
+                        continue
+                    cached = sum(self._blob_sizes[input_digest]
+                                 for input_digest in set(head[2].blobs.values())
+                                 if input_digest in node.blobs)
+                    rank = (head[0], -cached, head[1])
+                    if rank < best_rank:
+                        best_rank = rank
+                        best = (bucket_key, head)
+        
+        if cached_only and best_rank is not None and best_rank[1] == 0:
+            return None
+        return best
+    
+    def _is_queued(self, entry: QueueEntry) -> bool:
+        """Whether a queue entry still stands for a pending task (lock held)
+        
+        Entries of tasks that were removed, left PENDING or were assigned
+        since they were queued (even if re-queued after) are stale.
+        """
+        task = entry[2]
+        return (self.tasks.get(task.id) is task and task.status == TaskStatus.PENDING
+                and task.attempts == entry[3])
+    
+    def _bucket_head(self, bucket_key: BucketKey) -> Optional[QueueEntry]:
+        """Return the head of a bucket, discarding stale entries (lock held)"""
+        bucket = self._buckets.get(bucket_key)
+        while bucket:
+            if self._is_queued(bucket[0]):
+                return bucket[0]
+            task = heapq.heappop(bucket)[2]
+            self._unindex_blobs(task, bucket_key)
+        
+        self._buckets.pop(bucket_key, None)
+        return None
+    
+    def _blob_head(self, digest: str, bucket_key: BucketKey) -> Optional[QueueEntry]:
+        """Return the head of a blob index heap, discarding stale entries (lock held)
+        
+        Emptied heaps are dropped, and with the last of a blob's heaps its
+        size too.
+        """
+        buckets = self._blob_index.get(digest)
+        heap = buckets.get(bucket_key) if buckets else None
+        if heap is None:
+            return None
+        while heap:
+            if self._is_queued(heap[0]):
+                return heap[0]
+            heapq.heappop(heap)
+        
+        del buckets[bucket_key]
+        if not buckets:
+            del self._blob_index[digest]
+            del self._blob_sizes[digest]
+        return None
+    
+    def _unindex_blobs(self, task: Task, bucket_key: BucketKey) -> None:
+        """Drop a task's stale entries off the front of its blob index heaps (lock held)
+        
+        A heap holds a subset of its bucket in the same order, so every
+        entry ahead of one leaving the bucket has left it too.
+        """
+        if task.blobs:
+            for digest in set(task.blobs.values()):
+                self._blob_head(digest, bucket_key)
+    
+    def _signature_matches(self, node: Node, signature: RequirementSignature) -> bool:
+        """Look up (or compute and cache) whether a node satisfies a signature"""
+        entry = self._capability_index.get(node.id)
+        if entry is None or entry[0] is not node.capabilities:
+            # Keep a reference to the capabilities object so identity checks
+            # reliably detect re-registration with new capabilities
+            entry = (node.capabilities, set(), set())
+            self._capability_index[node.id] = entry
+        
+        _, matching, non_matching = entry
+        if signature in matching:
+            return True
+        if signature in non_matching:
+            return False
+        
+        if self._capabilities_meet(node.capabilities, self._requirements[signature]):
+            matching.add(signature)
+            return True
+        non_matching.add(signature)
+        return False
+    
     def _node_meets_requirements(self, node: Node, task: Task) -> bool:
         """Check if node capabilities meet task requirements"""
-        for req_key, req_value in task.requirements.items():
-            node_value = node.capabilities.get(req_key)
+        return self._capabilities_meet(node.capabilities, task.requirements)
+    
+    @staticmethod
+    def _capabilities_meet(capabilities: Dict[str, Any], requirements: Dict[str, Any]) -> bool:
+        """Check if a capabilities dict satisfies a requirements dict
+        
+        A string requirement matches a list capability containing it. Nodes
+        listing capability keys under 'exclusive' only take tasks that
+        require one of them (an LLM endpoint only runs tasks naming a model).
+        """
+        exclusive = capabilities.get('exclusive')
+        if exclusive and not any(key in requirements for key in exclusive):
+            return False
+        for req_key, req_value in requirements.items():
+            node_value = capabilities.get(req_key)
             
             if node_value is None:
                 return False
@@ -157,7 +992,10 @@ class TaskQueue:
                 if node_value != req_value:
                     return False
             elif isinstance(req_value, str):
-                if node_value != req_value:
+                if isinstance(node_value, list):
+                    if req_value not in node_value:
+                        return False
+                elif node_value != req_value:
                     return False
             elif isinstance(req_value, list):
                 if node_value not in req_value:
@@ -166,23 +1004,155 @@ class TaskQueue:
         return True
     
     def update_task_status(self, task_id: str, status: TaskStatus, 
-                          result: Any = None, error: str = None) -> bool:
-        """Update task status"""
+                          result: Any = None, error: str = None,
+                          execution_time: Optional[float] = None,
+                          attempt: Optional[int] = None,
+                          node_id: Optional[str] = None) -> bool:
+        """Update task status
+        
+        Reports carrying an attempt number other than the task's current
+        one come from a node the task was taken away from and are ignored,
+        as are reports for a task that already finished, such as the losing
+        copy of a speculatively executed task. A completion reported by
+        another node than the assigned one, the winning speculative copy,
+        moves the task to that node; its other reports are ignored.
+        """
+        finished = status in [TaskStatus.COMPLETED, TaskStatus.FAILED]
+        if finished and result is not None:
+            if not self.is_current_attempt(task_id, attempt):
+                return False
+            # Store before the status flips so readers never see a missing result
+            self.result_store.put(task_id, result)
+        
         with self.lock:
-            if task_id in self.tasks:
-                task = self.tasks[task_id]
-                task.status = status
-                
-                if status == TaskStatus.RUNNING:
-                    task.started_at = time.time()
-                elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
-                    task.completed_at = time.time()
-                    task.result = result
-                    task.error = error
-                
+            task = self.tasks.get(task_id)
+            moved = (task is not None and node_id is not None
+                     and task.assigned_node not in (None, node_id))
+            if self.is_current_attempt(task_id, attempt) and (
+                    not moved or status == TaskStatus.COMPLETED):
+                now = time.time()
+                old_status, old_node = task.status, task.assigned_node
+                if moved:
+                    task.assigned_node = node_id
+                self.apply_status(task, status, now, error, execution_time)
+                self._changed(task, old_status, old_node)
+                record = {'op': 'status', 'id': task_id, 'status': status.value,
+                          'at': now, 'error': error, 'execution_time': execution_time}
+                if moved:
+                    record['node'] = node_id
+                lsn = self._log(record)
+                if (status.value in FINAL_STATUSES
+                        and old_status.value not in FINAL_STATUSES):
+                    lsn = self._resolve_dependents(task) or lsn
                 logger.info(f"Task {task_id} status updated to {status.value}")
-                return True
-            return False
+            else:
+                return False
+        self._wait_durable(lsn)
+        return True
+    
+    @staticmethod
+    def apply_status(task: Task, status: TaskStatus, at: float,
+                     error: Optional[str] = None,
+                     execution_time: Optional[float] = None) -> None:
+        """Apply a status transition to a task (shared with WAL replay)"""
+        task.status = status
+        if status == TaskStatus.RUNNING:
+            task.started_at = at
+        elif status in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+            task.completed_at = at
+            task.error = error
+            task.execution_time = execution_time
+        elif status == TaskStatus.PENDING:
+            # Back in the queue for another attempt; keep why the last one ended
+            task.assigned_node = None
+            task.started_at = None
+            task.error = error
+    
+    def is_current_attempt(self, task_id: str, attempt: Optional[int]) -> bool:
+        """Check that a task exists and a worker report is for its latest, unfinished assignment"""
+        task = self.tasks.get(task_id)
+        return task is not None and (attempt is None or (
+            attempt == task.attempts and task.status.value not in FINAL_STATUSES))
+    
+    def can_run(self, node: Node, task: Task) -> bool:
+        """Check if a node's capabilities meet a task's requirements"""
+        return self._node_meets_requirements(node, task)
+    
+    def steal_task(self, task_id: str, from_node: str, to_node: str) -> Optional[Task]:
+        """Reassign a task that a node holds but has not started to another node
+        
+        The attempt number goes up, so a report from the old node, should it
+        start the task after all, is ignored. Returns None if the task is no
+        longer waiting on the old node.
+        """
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if (task is None or task.status != TaskStatus.ASSIGNED
+                    or task.assigned_node != from_node):
+                return None
+            task.assigned_node = to_node
+            task.attempts += 1
+            self._changed(task, TaskStatus.ASSIGNED, from_node)
+            self._log({'op': 'assign', 'id': task_id, 'node': to_node,
+                       'attempt': task.attempts})
+            logger.info(f"Task {task_id} moved from node {from_node} to idle node {to_node}")
+            return task
+    
+    def move_task(self, task_id: str, attempt: int, from_node: str, to_node: str) -> bool:
+        """Hand a started task over to the node running its speculative copy
+        
+        Used when the original node fails the task or goes away while the
+        copy is still running; the attempt number stays the same.
+        """
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if (task is None or task.attempts != attempt or task.assigned_node != from_node
+                    or task.status not in (TaskStatus.ASSIGNED, TaskStatus.RUNNING)):
+                return False
+            task.assigned_node = to_node
+            self._changed(task, task.status, from_node)
+            lsn = self._log({'op': 'move', 'id': task_id, 'node': to_node})
+        self._wait_durable(lsn)
+        return True
+    
+    def release_task(self, task_id: str, attempt: Optional[int], reason: str) -> Optional[Task]:
+        """Take a task back from its node after a timeout or node loss
+        
+        The task goes back to PENDING if it has retries left, otherwise it
+        fails. It is not re-queued here; call requeue once any backoff has
+        passed. Returns None if the task already moved on.
+        """
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if (task is None or task.status not in (TaskStatus.ASSIGNED, TaskStatus.RUNNING)
+                    or (attempt is not None and attempt != task.attempts)):
+                return None
+            
+            max_retries = self.max_retries if task.max_retries is None else task.max_retries
+            status = TaskStatus.PENDING if task.attempts <= max_retries else TaskStatus.FAILED
+            now = time.time()
+            old_status, old_node = task.status, task.assigned_node
+            self.apply_status(task, status, now, reason)
+            self._changed(task, old_status, old_node)
+            lsn = self._log({'op': 'status', 'id': task_id, 'status': status.value,
+                             'at': now, 'error': reason, 'execution_time': None})
+            if status is TaskStatus.FAILED:
+                lsn = self._resolve_dependents(task) or lsn
+        self._wait_durable(lsn)
+        return task
+    
+    def retry_delay(self, task: Task) -> float:
+        """Exponential backoff before a released task is offered again"""
+        return min(self.retry_backoff * 2 ** max(0, task.attempts - 1), self.retry_backoff_max)
+    
+    def requeue(self, task_id: str, attempt: int) -> bool:
+        """Make a released task available for assignment again"""
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None or task.status != TaskStatus.PENDING or task.attempts != attempt:
+                return False
+            self._push(task)
+            return True
     
     def get_task(self, task_id: str) -> Optional[Task]:
         """Get task by ID"""
@@ -193,18 +1163,409 @@ class TaskQueue:
         """Get all tasks"""
         with self.lock:
             return list(self.tasks.values())
+    
+    def list_tasks(self, filters: Optional[Dict[str, List[Any]]] = None,
+                   cursor: Optional[int] = None,
+                   limit: int = 1000) -> Tuple[List[Task], Optional[int]]:
+        """A page of tasks in submission order, matched through the secondary indexes
+        
+        filters maps 'status', 'type', 'node' or 'job' to the values to accept.
+        Returns the page and the cursor for the next one (None on the last).
+        Costs O(page) unfiltered, else O(tasks matching the most selective
+        filter) rather than O(all tasks).
+        """
+        start = 0 if cursor is None else cursor + 1
+        with self.lock:
+            if not filters:
+                page = self._order[start:start + limit + 1]
+            else:
+                candidates = []
+                for field, values in filters.items():
+                    sets = [self._index.get((field, value), set()) for value in values]
+                    candidates.append(sets[0] if len(sets) == 1 else set().union(*sets))
+                candidates.sort(key=len)
+                smallest, others = candidates[0], candidates[1:]
+                seqs = heapq.nsmallest(limit + 1, (
+                    seq for seq in smallest
+                    if seq >= start and all(seq in other for other in others)
+                ))
+                page = [self._order[seq] for seq in seqs]
+        
+        if len(page) > limit:
+            page = page[:limit]
+            return page, page[-1].seq
+        return page, None
+    
+    def changes_since(self, revision: int, filters: Optional[Dict[str, List[Any]]] = None,
+                      limit: int = 1000) -> Tuple[List[Task], int, bool]:
+        """Tasks changed after a revision, oldest change first
+        
+        Returns the tasks, the revision to pass next time and whether more
+        changes are waiting. Costs O(changes since the revision).
+        """
+        with self.lock:
+            changed = []
+            for task_id, task_revision in reversed(self._changes.items()):
+                if task_revision <= revision:
+                    break
+                changed.append((task_revision, self.tasks[task_id]))
+            current = self.revision
+        changed.reverse()
+        
+        if filters:
+            changed = [(task_revision, task) for task_revision, task in changed
+                       if self._task_matches(task, filters)]
+        if len(changed) > limit:
+            return [task for _, task in changed[:limit]], changed[limit - 1][0], True
+        return [task for _, task in changed], current, False
+    
+    @staticmethod
+    def _task_matches(task: Task, filters: Dict[str, List[Any]]) -> bool:
+        """Check a task against listing filters without the indexes"""
+        values = {'status': task.status.value, 'type': task.type, 'node': task.assigned_node,
+                  'job': task.job_id}
+        return all(values[field] in accepted for field, accepted in filters.items())
+    
+    def status_counts(self) -> Dict[str, int]:
+        """Number of tasks in each status, from the status index"""
+        with self.lock:
+            return {value: len(seqs) for (field, value), seqs in self._index.items()
+                    if field == 'status'}
+    
+    def get_result(self, task_id: str) -> Any:
+        """Load a finished task's result from the result store"""
+        return self.result_store.get(task_id)
+    
+    def get_payload(self, task: Task) -> Any:
+        """A task's payload, loaded from the payload store if it was moved there"""
+        if task.payload is None and self.payload_store is not None:
+            return self.payload_store.get(task.id)
+        return task.payload
+    
+    def task_to_dict(self, task: Task, fields: Optional[Set[str]] = None) -> Dict[str, Any]:
+        """Serialize a task, reading its payload and result lazily from their stores
+        
+        With fields, only those keys are returned and the stores are only
+        read for the ones asked for.
+        """
+        data = task.to_dict()
+        if fields is not None:
+            data = {key: value for key, value in data.items() if key in fields}
+        if (task.payload is None and self.payload_store is not None
+                and (fields is None or 'payload' in fields)):
+            data['payload'] = self.payload_store.get(task.id)
+        if (task.status in (TaskStatus.COMPLETED, TaskStatus.FAILED)
+                and (fields is None or 'result' in fields)):
+            data['result'] = self.get_result(task.id)
+        return data
+
+
+def job_params(source: Dict[str, Any]) -> Tuple[Iterable[Any], int]:
+    """Parameter iterable and count for a job's 'params' list or 'range' spec
+    
+    Raises ValueError for a malformed source.
+    """
+    if 'range' in source:
+        spec = source['range']
+        try:
+            params = range(int(spec.get('start', 0)), int(spec['stop']),
+                           int(spec.get('step', 1)))
+        except (KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Invalid range: {e}")
+        return params, len(params)
+    params = source.get('params')
+    if not isinstance(params, list):
+        raise ValueError("A job needs a 'params' list or a 'range'")
+    return params, len(params)
+
+
+class Job:
+    """A group of tasks built from one template and a stream of parameters
+    
+    Tasks are created from the template only as the queue drains, so a job
+    of a million parameters never holds a million Task objects at once.
+    Per-status counters cover the tasks created so far; parameters not yet
+    turned into tasks count as pending.
+    """
+    
+    def __init__(self, id: str, template: Dict[str, Any], params: Iterable[Any],
+                 total: Optional[int] = None, source: Optional[Dict[str, Any]] = None,
+                 created_at: Optional[float] = None):
+        self.id = id
+        self.template = template
+        self.total = total
+        # The serializable definition ('params' or 'range'); None for jobs
+        # built from a Python iterable, which are not journaled
+        self.source = source
+        self.created_at = time.time() if created_at is None else created_at
+        self.completed_at: Optional[float] = None
+        self.materialized = 0
+        self.exhausted = total == 0
+        # Set when the queue rejected the job's tasks; no more are created
+        self.error: Optional[str] = None
+        self.counts: Dict[str, int] = {status.value: 0 for status in TaskStatus}
+        # Ids of finished tasks in the order they finished
+        self.finished: List[str] = []
+        self._params = iter(params)
+    
+    @property
+    def done(self) -> bool:
+        """Whether every parameter has become a task and every task finished"""
+        return self.exhausted and len(self.finished) == self.materialized
+    
+    def next_tasks(self, count: int) -> List[Task]:
+        """Create up to count more tasks from the template"""
+        tasks = []
+        while len(tasks) < count and not self.exhausted:
+            try:
+                param = next(self._params)
+            except StopIteration:
+                self.exhausted = True
+                break
+            tasks.append(self._build(self.materialized, param))
+            self.materialized += 1
+            if self.total is not None and self.materialized >= self.total:
+                self.exhausted = True
+        return tasks
+    
+    def skip_materialized(self) -> None:
+        """Skip the parameters whose tasks were recovered (they are created in order)"""
+        self._params = itertools.islice(self._params, self.materialized, None)
+        if self.total is not None and self.materialized >= self.total:
+            self.exhausted = True
+    
+    def _build(self, index: int, param: Any) -> Task:
+        """Task for one parameter: dict parameters are merged into the payload"""
+        template = self.template
+        payload = dict(template.get('payload') or {})
+        if isinstance(param, dict):
+            payload.update(param)
+        else:
+            payload[template.get('param_key', 'param')] = param
+        return Task(
+            id=f"{self.id}-{index}",
+            type=template['type'],
+            payload=payload,
+            priority=template.get('priority', 0),
+            requirements=template.get('requirements'),
+            timeout=template.get('timeout'),
+            max_retries=template.get('max_retries'),
+            job_id=self.id,
+            slots=template.get('slots', 1),
+            idempotent=template.get('idempotent', True),
+            blobs=template.get('blobs')
+        )
+    
+    def summary(self) -> Dict[str, Any]:
+        """Aggregate job state, computed from the counters in O(1)"""
+        counts = self.counts
+        unmaterialized = None if self.total is None else self.total - self.materialized
+        if self.error is not None:
+            unmaterialized = 0
+        status = 'running'
+        if self.done:
+            status = 'done' if self.error is None else 'failed'
+        return {
+            'id': self.id,
+            'type': self.template['type'],
+            'status': status,
+            'error': self.error,
+            'total': self.total,
+            'materialized': self.materialized,
+            'pending': counts['pending'] + (unmaterialized or 0),
+            'assigned': counts['assigned'],
+            'running': counts['running'],
+            'completed': counts['completed'],
+            'failed': counts['failed'],
+            'cancelled': counts['cancelled'],
+            'created_at': self.created_at,
+            'completed_at': self.completed_at
+        }
+    
+    def to_record(self) -> Dict[str, Any]:
+        """Job definition for the write-ahead log"""
+        return {'id': self.id, 'template': self.template, 'source': self.source,
+                'created_at': self.created_at}
+
+
+class JobManager:
+    """Creates job tasks lazily and keeps per-job counters current
+    
+    Each job keeps at most `window` of its tasks waiting in the queue. The
+    task queue reports every status change of a job task, which updates the
+    job's counters and marks it for a refill once tasks leave the queue;
+    the scheduler tops marked jobs up before it assigns work.
+    """
+    
+    def __init__(self, task_queue: TaskQueue, window: int = 1000):
+        self.task_queue = task_queue
+        self.window = window
+        self.jobs: Dict[str, Job] = {}
+        self.condition = threading.Condition()
+        # Optional write-ahead log for job definitions
+        self.journal: Optional[WriteAheadLog] = None
+        self._needs_refill: Set[str] = set()
+        task_queue.on_status_change = self.task_changed
+    
+    def submit(self, template: Dict[str, Any], params: Iterable[Any],
+               total: Optional[int] = None, source: Optional[Dict[str, Any]] = None) -> Job:
+        """Create a job and queue its first window of tasks"""
+        job = Job(uuid.uuid4().hex, template, params, total, source)
+        with self.condition:
+            self.jobs[job.id] = job
+            if self.journal is not None and source is not None:
+                self.journal.append({'op': 'job', 'job': job.to_record()})
+            self._needs_refill.add(job.id)
+        logger.info(f"Job {job.id} submitted with {total if total is not None else 'streamed'} "
+                    f"parameters")
+        self.refill()
+        return job
+    
+    def get_job(self, job_id: str) -> Optional[Job]:
+        """Get job by ID"""
+        with self.condition:
+            return self.jobs.get(job_id)
+    
+    def summaries(self) -> List[Dict[str, Any]]:
+        """Summaries of all jobs"""
+        with self.condition:
+            return [job.summary() for job in self.jobs.values()]
+    
+    def refill(self) -> int:
+        """Queue more tasks for jobs whose queued tasks were taken; returns how many"""
+        with self.condition:
+            if not self._needs_refill:
+                return 0
+            batches = []
+            for job_id in self._needs_refill:
+                job = self.jobs[job_id]
+                tasks = job.next_tasks(self.window - job.counts['pending'])
+                job.counts['pending'] += len(tasks)
+                if tasks:
+                    batches.append(tasks)
+                self._finish_if_done(job)
+            self._needs_refill.clear()
+        
+        # Queued outside the job lock: the queue calls back into task_changed
+        queued = 0
+        for tasks in batches:
+            try:
+                self.task_queue.add_tasks(tasks)
+            except ValueError as e:
+                self._rejected(tasks, str(e))
+                continue
+            queued += len(tasks)
+        return queued
+    
+    def _rejected(self, tasks: List[Task], error: str) -> None:
+        """Stop a job whose new tasks the queue rejected, forgetting those tasks"""
+        with self.condition:
+            job = self.jobs[tasks[0].job_id]
+            job.counts['pending'] -= len(tasks)
+            job.materialized -= len(tasks)
+            job.exhausted = True
+            job.error = f"Could not queue tasks {tasks[0].id} to {tasks[-1].id}: {error}"
+            # Finishes now if none of its earlier tasks is still out
+            self._finish_if_done(job)
+        logger.error(f"Job {job.id} stopped: {job.error}")
+    
+    def task_changed(self, task: Task, old_status: TaskStatus) -> None:
+        """Status change hook called by the task queue (its lock held)"""
+        if task.job_id is None or task.status is old_status:
+            return
+        with self.condition:
+            job = self.jobs.get(task.job_id)
+            if job is None:
+                return
+            job.counts[old_status.value] -= 1
+            job.counts[task.status.value] += 1
+            if old_status == TaskStatus.PENDING and not job.exhausted:
+                self._needs_refill.add(job.id)
+            if task.status.value in FINAL_STATUSES:
+                job.finished.append(task.id)
+                self._finish_if_done(job)
+                self.condition.notify_all()
+    
+    def _finish_if_done(self, job: Job) -> None:
+        """Stamp a job's completion time once its last task finishes (lock held)"""
+        if job.completed_at is None and job.done:
+            job.completed_at = time.time()
+            logger.info(f"Job {job.id} done: {job.counts['completed']} completed, "
+                        f"{job.counts['failed']} failed")
+            self.condition.notify_all()
+    
+    def wait_finished(self, job_id: str, offset: int, timeout: float,
+                      max_items: int = 1000) -> Tuple[List[str], bool]:
+        """Wait for tasks finished after the first `offset`, in completion order
+        
+        Returns their ids and whether the job is done and nothing follows.
+        """
+        with self.condition:
+            job = self.jobs[job_id]
+            self.condition.wait_for(lambda: len(job.finished) > offset or job.done,
+                                    timeout=timeout)
+            task_ids = job.finished[offset:offset + max_items]
+            return task_ids, job.done and offset + len(task_ids) >= len(job.finished)
+    
+    def restore(self, records: Iterable[Dict[str, Any]], tasks: Iterable[Task]) -> None:
+        """Rebuild jobs from their definitions and the recovered tasks"""
+        with self.condition:
+            for record in records:
+                params, total = job_params(record['source'])
+                self.jobs[record['id']] = Job(record['id'], record['template'], params,
+                                              total, record['source'], record['created_at'])
+            
+            finished = []
+            for task in tasks:
+                if task.job_id is None:
+                    continue
+                job = self.jobs.get(task.job_id)
+                if job is None:
+                    # Built from a Python iterable, so only its tasks survive
+                    job = self.jobs[task.job_id] = Job(
+                        task.job_id, {'type': task.type}, (), None, None, task.created_at)
+                    job.exhausted = True
+                job.materialized += 1
+                job.counts[task.status.value] += 1
+                if task.status.value in FINAL_STATUSES:
+                    finished.append(task)
+            finished.sort(key=lambda task: task.completed_at or 0)
+            for task in finished:
+                self.jobs[task.job_id].finished.append(task.id)
+            
+            for job in self.jobs.values():
+                job.skip_materialized()
+                if not job.exhausted:
+                    self._needs_refill.add(job.id)
+                self._finish_if_done(job)
 
 
 class NodeManager:
-    """Manages compute nodes"""
+    """Manages compute nodes
     
-    def __init__(self, heartbeat_timeout: float = 30.0):
+    A node's capacity is the slots its worker advertises, multiplied by the
+    oversubscription factor. Nodes reporting CPU or memory use at or above
+    the configured limits are throttled: they get no new tasks until their
+    next heartbeat shows headroom again. CPU use only throttles a node that
+    has free slots, since a node busy with its own tasks is expected to be
+    at full CPU.
+    """
+    
+    def __init__(self, heartbeat_timeout: float = 30.0, oversubscription_factor: float = 1.0,
+                 max_cpu_percent: Optional[float] = None,
+                 max_memory_percent: Optional[float] = None):
         self.nodes: Dict[str, Node] = {}
         self.heartbeat_timeout = heartbeat_timeout
+        self.oversubscription_factor = oversubscription_factor
+        self.max_cpu_percent = max_cpu_percent
+        self.max_memory_percent = max_memory_percent
         self.lock = threading.Lock()
+        # Optional write-ahead log for registrations
+        self.journal: Optional[WriteAheadLog] = None
     
     def register_node(self, node_data: Dict[str, Any]) -> Node:
         """Register a new node or update existing"""
+        stats = Node.parse_stats(node_data)
         with self.lock:
             node_id = node_data.get('id', str(uuid.uuid4()))
             
@@ -226,39 +1587,104 @@ class NodeManager:
                 self.nodes[node_id] = node
                 logger.info(f"New node registered: {node_id}")
             
+            node.oversubscription = self.oversubscription_factor
+            for key, value in stats.items():
+                setattr(node, key, value)
+            self._update_throttle(node)
+            if self.journal is not None:
+                self.journal.append({'op': 'node', 'node': node.to_record()})
             return node
     
-    def update_heartbeat(self, node_id: str) -> bool:
-        """Update node heartbeat"""
+    def restore(self, records: Iterable[Dict[str, Any]], tasks: Iterable[Task]) -> None:
+        """Load recovered nodes as offline until they heartbeat again"""
+        with self.lock:
+            for record in records:
+                # Allow one heartbeat timeout to reconnect before its tasks are reclaimed
+                node = Node(status=NodeStatus.OFFLINE, last_heartbeat=time.time(),
+                            oversubscription=self.oversubscription_factor, **record)
+                self.nodes[node.id] = node
+            for task in tasks:
+                if (task.status in (TaskStatus.ASSIGNED, TaskStatus.RUNNING)
+                        and task.assigned_node in self.nodes):
+                    self.nodes[task.assigned_node].add_task(task.id, task.slots)
+    
+    def update_heartbeat(self, node_id: str, stats: Optional[Dict[str, Any]] = None) -> bool:
+        """Update node heartbeat and any reported slot accounting
+        
+        Raises ValueError, leaving the node untouched, if the stats are invalid.
+        """
         with self.lock:
             if node_id in self.nodes:
-                self.nodes[node_id].last_heartbeat = time.time()
-                self.nodes[node_id].status = NodeStatus.ONLINE
+                node = self.nodes[node_id]
+                node.last_heartbeat = time.time()
+                node.status = NodeStatus.ONLINE
+                if stats:
+                    node.update_slots(stats)
+                    self._update_throttle(node)
                 return True
             return False
     
-    def get_available_nodes(self) -> List[Node]:
-        """Get list of available nodes"""
+    def _update_throttle(self, node: Node) -> None:
+        """Throttle a node whose reported CPU or memory use leaves no headroom (lock held)"""
+        throttled = ((self.max_memory_percent is not None
+                      and node.memory_percent >= self.max_memory_percent)
+                     or (self.max_cpu_percent is not None
+                         and node.cpu_percent >= self.max_cpu_percent
+                         and node.running < node.slots))
+        if throttled != node.throttled:
+            if throttled:
+                logger.warning(f"Node {node.id} is at {node.cpu_percent:.0f}% CPU and "
+                               f"{node.memory_percent:.0f}% memory; throttling")
+            else:
+                logger.info(f"Node {node.id} has headroom again")
+            node.throttled = throttled
+    
+    def get_online_nodes(self) -> List[Node]:
+        """Get nodes that are online, busy or not, marking silent ones offline"""
         with self.lock:
             current_time = time.time()
-            available = []
+            online = []
             
             for node in self.nodes.values():
                 # Check if node is responsive
                 if current_time - node.last_heartbeat > self.heartbeat_timeout:
                     node.status = NodeStatus.OFFLINE
                 
-                # Node is available if online and not at capacity
-                if node.status == NodeStatus.ONLINE and len(node.current_tasks) < 2:
-                    available.append(node)
+                if node.status == NodeStatus.ONLINE:
+                    online.append(node)
             
-            return available
+            return online
+    
+    def get_available_nodes(self) -> List[Node]:
+        """Get list of available nodes"""
+        # Node is available if online and not at capacity
+        return [node for node in self.get_online_nodes() if node.has_capacity()]
+    
+    def expire_nodes(self) -> List[Tuple[str, List[str]]]:
+        """Mark nodes with a stale heartbeat offline and take back their tasks
+        
+        Returns (node_id, task_ids) for every node that still held tasks.
+        """
+        expired = []
+        with self.lock:
+            current_time = time.time()
+            for node in self.nodes.values():
+                if current_time - node.last_heartbeat <= self.heartbeat_timeout:
+                    continue
+                if node.status != NodeStatus.OFFLINE:
+                    logger.warning(f"Node {node.id} missed heartbeats; marking offline")
+                node.status = NodeStatus.OFFLINE
+                if node.current_tasks:
+                    expired.append((node.id, list(node.current_tasks)))
+                    node.current_tasks.clear()
+                    node.weights.clear()
+        return expired
     
-    def assign_task_to_node(self, node_id: str, task_id: str) -> bool:
-        """Assign a task to a node"""
+    def assign_task_to_node(self, node_id: str, task_id: str, slots: int = 1) -> bool:
+        """Assign a task taking the given number of slots to a node"""
         with self.lock:
             if node_id in self.nodes:
-                self.nodes[node_id].current_tasks.add(task_id)
+                self.nodes[node_id].add_task(task_id, slots)
                 return True
             return False
     
@@ -267,7 +1693,7 @@ class NodeManager:
         with self.lock:
             if node_id in self.nodes:
                 node = self.nodes[node_id]
-                node.current_tasks.discard(task_id)
+                node.remove_task(task_id)
                 if success:
                     node.total_completed += 1
                 else:
@@ -275,6 +1701,14 @@ class NodeManager:
                 return True
             return False
     
+    def release_task_from_node(self, node_id: str, task_id: str) -> bool:
+        """Free the slots of a task a node will not report, e.g. one moved elsewhere"""
+        with self.lock:
+            if node_id in self.nodes:
+                self.nodes[node_id].remove_task(task_id)
+                return True
+            return False
+    
     def get_node(self, node_id: str) -> Optional[Node]:
         """Get node by ID"""
         with self.lock:
@@ -286,44 +1720,268 @@ class NodeManager:
             return list(self.nodes.values())
 
 
-class MasterHTTPHandler(BaseHTTPRequestHandler):
-    """HTTP request handler for the master service"""
+class TaskDispatcher:
+    """Per-node mailboxes that push assigned tasks to waiting workers
     
-    def do_GET(self):
-        """Handle GET requests"""
-        parsed_path = urlparse(self.path)
-        
-        if parsed_path.path == '/status':
-            self._handle_status()
-        elif parsed_path.path == '/tasks':
-            self._handle_list_tasks()
-        elif parsed_path.path == '/nodes':
-            self._handle_list_nodes()
-        elif parsed_path.path.startswith('/task/'):
-            task_id = parsed_path.path.split('/')[-1]
-            self._handle_get_task(task_id)
-        else:
-            self.send_error(404, "Not Found")
+    The scheduler drops assignments into a node's mailbox; a worker blocked
+    in a long poll on that mailbox is woken immediately instead of waiting
+    for its next heartbeat. Tasks a worker should drop (stolen by another
+    node, or the losing copy of a speculative execution) are delivered the
+    same way.
+    """
     
-    def do_POST(self):
-        """Handle POST requests"""
-        content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length)
-        
-        try:
-            data = json.loads(body)
-        except json.JSONDecodeError:
-            self.send_error(400, "Invalid JSON")
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mailboxes: Dict[str, Deque[Task]] = {}
+        self.conditions: Dict[str, threading.Condition] = {}
+        self.cancellations: Dict[str, Set[str]] = {}
+    
+    def _condition(self, node_id: str) -> threading.Condition:
+        """Get the condition for a node's mailbox (lock held)"""
+        condition = self.conditions.get(node_id)
+        if condition is None:
+            condition = self.conditions[node_id] = threading.Condition(self.lock)
+            self.mailboxes[node_id] = deque()
+        return condition
+    
+    def push(self, node_id: str, task: Task) -> None:
+        """Deliver an assigned task to a node's mailbox"""
+        with self.lock:
+            condition = self._condition(node_id)
+            self.mailboxes[node_id].append(task)
+            condition.notify()
+    
+    def restore(self, node_id: str, tasks: List[Task]) -> None:
+        """Put undelivered tasks back at the front of a node's mailbox"""
+        with self.lock:
+            condition = self._condition(node_id)
+            self.mailboxes[node_id].extendleft(reversed(tasks))
+            condition.notify()
+    
+    def take(self, node_id: str, max_tasks: int = 1, timeout: float = 0) -> List[Task]:
+        """Take up to max_tasks from a node's mailbox, waiting up to timeout seconds"""
+        with self.lock:
+            condition = self._condition(node_id)
+            mailbox = self.mailboxes[node_id]
+            if not mailbox and timeout > 0:
+                condition.wait_for(lambda: mailbox or self.cancellations.get(node_id),
+                                   timeout=timeout)
+            tasks = []
+            while mailbox and len(tasks) < max_tasks:
+                tasks.append(mailbox.popleft())
+            return tasks
+    
+    def holds(self, node_id: str, task_id: str) -> bool:
+        """Check if a task is still waiting in a node's mailbox"""
+        with self.lock:
+            return any(task.id == task_id for task in self.mailboxes.get(node_id, ()))
+    
+    def withdraw(self, node_id: str, task_id: str) -> bool:
+        """Take a task back out of a node's mailbox; False if it was already delivered"""
+        with self.lock:
+            mailbox = self.mailboxes.get(node_id)
+            for task in mailbox or ():
+                if task.id == task_id:
+                    mailbox.remove(task)
+                    return True
+            return False
+    
+    def cancel(self, node_id: str, task_id: str) -> None:
+        """Tell a node to drop a task it was given, waking its long poll"""
+        with self.lock:
+            condition = self._condition(node_id)
+            self.cancellations.setdefault(node_id, set()).add(task_id)
+            condition.notify()
+    
+    def take_cancellations(self, node_id: str) -> List[str]:
+        """Collect the tasks a node should drop"""
+        with self.lock:
+            return sorted(self.cancellations.pop(node_id, ()))
+    
+    def clear(self, node_id: str) -> int:
+        """Drop everything waiting in a node's mailbox"""
+        with self.lock:
+            self.cancellations.pop(node_id, None)
+            mailbox = self.mailboxes.get(node_id)
+            if not mailbox:
+                return 0
+            count = len(mailbox)
+            mailbox.clear()
+            return count
+    
+    def pending(self, node_id: str) -> int:
+        """Number of tasks waiting in a node's mailbox"""
+        with self.lock:
+            return len(self.mailboxes.get(node_id, ()))
+
+
+def iter_json_objects(chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """Incrementally parse a JSON array or NDJSON stream of objects
+    
+    The body is consumed chunk by chunk, so a large batch is never held in
+    memory as a single string. Raises ValueError on malformed input.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    is_array = None
+    finished = False
+    chunks = iter(chunks)
+    eof = False
+    
+    while True:
+        # Skip whitespace and (inside an array) element separators
+        while pos < len(buffer) and (buffer[pos].isspace() or (is_array and buffer[pos] == ',')):
+            pos += 1
+        
+        if pos < len(buffer):
+            if finished:
+                raise ValueError("Unexpected data after end of JSON array")
+            char = buffer[pos]
+            if is_array is None:
+                is_array = char == '['
+                if is_array:
+                    pos += 1
+                    continue
+            if is_array and char == ']':
+                finished = True
+                pos += 1
+                continue
+            if char != '{':
+                raise ValueError(f"Expected a JSON object, got {char!r}")
+            try:
+                obj, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # An object that fails to decode may just be incomplete
+                if eof:
+                    raise ValueError("Truncated or invalid JSON object")
+                obj = None
+            if obj is not None:
+                pos = end
+                yield obj
+                continue
+        elif eof:
+            if is_array and not finished:
+                raise ValueError("Unterminated JSON array")
             return
         
+        # Need more data: drop the consumed prefix and read the next chunk
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            buffer += text_decoder.decode(b'', final=True)
+        else:
+            buffer += text_decoder.decode(chunk)
+
+
+class MasterHTTPHandler(BaseHTTPRequestHandler):
+    """HTTP request handler for the master service"""
+    
+    # HTTP/1.1 keeps worker connections open between heartbeats; requests
+    # pipelined on a connection are answered in order from the read buffer
+    protocol_version = 'HTTP/1.1'
+    # Idle keep-alive connections are closed after this many seconds
+    timeout = 120
+    # Headers and body go out in separate writes; without TCP_NODELAY every
+    # response on a kept-alive connection waits out the peer's delayed ACK
+    disable_nagle_algorithm = True
+    
+    def do_GET(self):
+        """Handle GET requests"""
+        parsed_path = urlparse(self.path)
+        
+        if parsed_path.path == '/status':
+            self._handle_status()
+        elif parsed_path.path == '/tasks':
+            self._handle_list_tasks(parsed_path.query)
+        elif parsed_path.path == '/nodes':
+            self._handle_list_nodes(parsed_path.query)
+        elif parsed_path.path == '/events':
+            self._handle_events(parsed_path.query)
+        elif parsed_path.path == '/jobs':
+            self._send_json_response({'jobs': self.server.master.jobs.summaries()})
+        elif parsed_path.path.startswith('/job/'):
+            parts = parsed_path.path.split('/')
+            if len(parts) == 4 and parts[3] == 'results':
+                self._handle_job_results(parts[2], parsed_path.query)
+            elif len(parts) == 3:
+                self._handle_get_job(parts[2])
+            else:
+                self.send_error(404, "Not Found")
+        elif parsed_path.path.startswith('/task/'):
+            parts = parsed_path.path.split('/')
+            if len(parts) == 4 and parts[3] == 'result':
+                self._handle_get_result(parts[2])
+            else:
+                self._handle_get_task(parts[-1])
+        elif parsed_path.path.startswith('/blob/'):
+            self._handle_get_blob(parsed_path.path[len('/blob/'):])
+        elif parsed_path.path == '/v1/models' and self.server.master.gateway is not None:
+            self._handle_gateway_models()
+        else:
+            self.send_error(404, "Not Found")
+    
+    def do_HEAD(self):
+        """Handle HEAD requests: check whether a blob is already stored"""
+        parsed_path = urlparse(self.path)
+        if parsed_path.path.startswith('/blob/'):
+            self._handle_get_blob(parsed_path.path[len('/blob/'):], head=True)
+        else:
+            self.send_error(404, "Not Found")
+    
+    def do_PUT(self):
+        """Handle PUT requests"""
+        path = urlparse(self.path).path
+        if path == '/blob':
+            self._handle_put_blob()
+        elif path.startswith('/blob/'):
+            self._handle_upload_blob(path[len('/blob/'):])
+        else:
+            self.close_connection = True
+            self.send_error(404, "Not Found")
+    
+    def do_POST(self):
+        """Handle POST requests"""
         parsed_path = urlparse(self.path)
         
+        # Streaming endpoints consume the request body themselves
+        if parsed_path.path == '/tasks/batch':
+            self._handle_submit_batch()
+            return
+        if parsed_path.path == '/task/result':
+            self._handle_task_result()
+            return
+        # OpenAI API requests are proxied to LLM backends as they are
+        if parsed_path.path.startswith('/v1/') and self.server.master.gateway is not None:
+            self._handle_gateway()
+            return
+        
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length)
+        
+        media, encoding = self._body_format()
+        if media is None:
+            self.send_error(415, "Unsupported content type or encoding")
+            return
+        try:
+            data = decode(decompress(body, encoding), media)
+        except ValueError as e:
+            self.send_error(400, f"Invalid request body: {e}")
+            return
+        
         if parsed_path.path == '/task':
             self._handle_submit_task(data)
+        elif parsed_path.path == '/job':
+            self._handle_submit_job(data)
         elif parsed_path.path == '/node/register':
             self._handle_register_node(data)
         elif parsed_path.path == '/node/heartbeat':
             self._handle_heartbeat(data)
+        elif parsed_path.path == '/node/poll':
+            self._handle_poll(data)
         elif parsed_path.path == '/task/update':
             self._handle_update_task(data)
         else:
@@ -336,50 +1994,543 @@ class MasterHTTPHandler(BaseHTTPRequestHandler):
             'version': '1.0.0',
             'uptime': time.time() - self.server.master.start_time,
             'total_tasks': len(self.server.master.task_queue.tasks),
+            'tasks_by_status': self.server.master.task_queue.status_counts(),
+            'task_revision': self.server.master.task_queue.revision,
             'total_nodes': len(self.server.master.node_manager.nodes),
+            'result_store': self.server.master.task_queue.result_store.stats(),
             'timestamp': datetime.utcnow().isoformat()
         }
+        if self.server.master.discovery is not None:
+            status['llm_discovery'] = self.server.master.discovery.stats()
+        if self.server.master.gateway is not None:
+            status['gateway'] = self.server.master.gateway.stats()
         self._send_json_response(status)
     
-    def _handle_list_tasks(self):
-        """List all tasks"""
-        tasks = self.server.master.task_queue.get_all_tasks()
-        task_list = [asdict(task) for task in tasks]
-        self._send_json_response({'tasks': task_list})
+    def _handle_list_tasks(self, query: str):
+        """List tasks a page at a time, or only those changed since a revision
+        
+        Query parameters: status, type, node and job filters (comma-separated
+        values), fields to return, limit, and either the cursor of the
+        previous page or since=<revision>&epoch=<epoch> for the change feed.
+        """
+        task_queue = self.server.master.task_queue
+        params = parse_qs(query)
+        try:
+            filters = {field: params[field][-1].split(',')
+                       for field in ('status', 'type', 'node', 'job') if field in params}
+            fields = self._fields_param(params)
+            limit = self._limit_param(params)
+            cursor = int(params['cursor'][-1]) if 'cursor' in params else None
+            since = int(params['since'][-1]) if 'since' in params else None
+        except ValueError as e:
+            self.send_error(400, f"Invalid query parameter: {e}")
+            return
+        
+        if since is not None:
+            if params.get('epoch', [task_queue.epoch])[-1] != task_queue.epoch:
+                # Revisions restarted with the master; the client must list again
+                self.send_error(410, "Task revisions were reset; list tasks again")
+                return
+            tasks, revision, more = task_queue.changes_since(since, filters, limit)
+            response = {'revision': revision, 'more': more}
+        else:
+            # Read before listing, so the feed from here covers later changes
+            revision = task_queue.revision
+            tasks, next_cursor = task_queue.list_tasks(filters, cursor, limit)
+            response = {'revision': revision, 'next_cursor': next_cursor}
+        
+        # Serialized after the queue lock is released
+        response['epoch'] = task_queue.epoch
+        response['tasks'] = [task_queue.task_to_dict(task, fields) for task in tasks]
+        self._send_json_response(response)
     
-    def _handle_list_nodes(self):
-        """List all nodes"""
+    def _handle_list_nodes(self, query: str):
+        """List nodes a page at a time, optionally filtered by status"""
+        params = parse_qs(query)
+        try:
+            statuses = params['status'][-1].split(',') if 'status' in params else None
+            fields = self._fields_param(params)
+            limit = self._limit_param(params)
+            start = int(params['cursor'][-1]) + 1 if 'cursor' in params else 0
+        except ValueError as e:
+            self.send_error(400, f"Invalid query parameter: {e}")
+            return
+        
+        # Nodes are never removed, so a position in registration order is a stable cursor
         nodes = self.server.master.node_manager.get_all_nodes()
+        page = [(position, node) for position, node in enumerate(nodes)
+                if position >= start and (statuses is None or node.status.value in statuses)]
+        next_cursor = page[limit - 1][0] if len(page) > limit else None
+        
         node_list = []
-        for node in nodes:
-            node_dict = asdict(node)
-            node_dict['current_tasks'] = list(node.current_tasks)
+        for _, node in page[:limit]:
+            node_dict = node.to_dict()
+            node_dict['assigned'] = len(node.current_tasks)
+            node_dict['capacity'] = node.capacity
+            node_dict['free_slots'] = max(0, node.slots - node.running)
+            if fields is not None:
+                node_dict = {key: value for key, value in node_dict.items() if key in fields}
             node_list.append(node_dict)
-        self._send_json_response({'nodes': node_list})
+        self._send_json_response({'nodes': node_list, 'next_cursor': next_cursor})
+    
+    def _handle_events(self, query: str):
+        """Stream task events as server-sent events or NDJSON
+        
+        Query parameters: task_id, job and status filters (comma-separated
+        values) and format=ndjson for newline-delimited JSON instead of
+        text/event-stream. The current state of each named task is sent
+        first, and a stream naming task ids ends once they have all finished.
+        """
+        params = parse_qs(query)
+        task_ids, job_ids, statuses = (
+            params[name][-1].split(',') if name in params else None
+            for name in ('task_id', 'job', 'status')
+        )
+        ndjson = params.get('format', ['sse'])[-1] == 'ndjson'
+        task_queue = self.server.master.task_queue
+        
+        # Subscribe before reading current states, so a change racing with
+        # them is delivered twice rather than lost
+        subscription = task_queue.events.subscribe(task_ids, job_ids, statuses)
+        try:
+            self._start_chunked_response('application/x-ndjson' if ndjson
+                                         else 'text/event-stream')
+            unfinished = set(task_ids) if task_ids else None
+            initial = (task_queue.current_event(task_id) for task_id in task_ids or ())
+            events = [event for event in initial
+                      if event is not None and subscription.matches(event)]
+            dropped = 0
+            
+            while True:
+                messages = []
+                if dropped:
+                    # The client fell behind; it can catch up with GET /tasks?since=
+                    messages.append(self._format_event(
+                        'overflow', {'dropped': dropped, 'revision': task_queue.revision},
+                        ndjson))
+                for event in events:
+                    messages.append(self._format_event('task', event, ndjson))
+                    if unfinished is not None and event['status'] in FINAL_STATUSES:
+                        unfinished.discard(event['task_id'])
+                if not messages:
+                    messages.append(b'\n' if ndjson else b': keepalive\n\n')
+                self._write_chunk(b''.join(messages))
+                self.wfile.flush()
+                
+                if unfinished is not None and not unfinished:
+                    break
+                events, dropped = subscription.get(timeout=EVENT_KEEPALIVE_INTERVAL)
+                if subscription.closed:
+                    break
+            self._end_chunked_response()
+        except OSError:
+            # The client disconnected
+            self.close_connection = True
+        finally:
+            task_queue.events.unsubscribe(subscription)
+    
+    @staticmethod
+    def _format_event(kind: str, data: Dict[str, Any], ndjson: bool) -> bytes:
+        """Encode one event for an SSE or NDJSON stream"""
+        if ndjson:
+            return json.dumps({'event': kind, **data}).encode() + b'\n'
+        message = f"event: {kind}\n"
+        if 'revision' in data:
+            message += f"id: {data['revision']}\n"
+        return (message + f"data: {json.dumps(data)}\n\n").encode()
+    
+    @staticmethod
+    def _fields_param(params: Dict[str, List[str]]) -> Optional[Set[str]]:
+        """Fields a listing should return (None for all)"""
+        if 'fields' not in params:
+            return None
+        return set(params['fields'][-1].split(','))
+    
+    @staticmethod
+    def _limit_param(params: Dict[str, List[str]]) -> int:
+        """Page size of a listing, clamped to MAX_PAGE_SIZE"""
+        if 'limit' not in params:
+            return DEFAULT_PAGE_SIZE
+        return min(max(int(params['limit'][-1]), 1), MAX_PAGE_SIZE)
     
     def _handle_get_task(self, task_id: str):
         """Get specific task details"""
-        task = self.server.master.task_queue.get_task(task_id)
+        task_queue = self.server.master.task_queue
+        task = task_queue.get_task(task_id)
         if task:
-            self._send_json_response(asdict(task))
+            self._send_json_response(task_queue.task_to_dict(task))
         else:
             self.send_error(404, "Task not found")
     
+    def _handle_get_result(self, task_id: str):
+        """Get a completed task's result, e.g. a parent result needed by a dependent task"""
+        task_queue = self.server.master.task_queue
+        task = task_queue.get_task(task_id)
+        if task is None:
+            self.send_error(404, "Task not found")
+        elif task.status != TaskStatus.COMPLETED:
+            self.send_error(409, f"Task is {task.status.value}, not completed")
+        else:
+            self._send_json_response(task_queue.get_result(task_id))
+    
+    def _handle_put_blob(self, digest: Optional[str] = None):
+        """Store a blob, streaming the body to disk; responds with its digest and size
+        
+        An X-Blob-Digest header, or the digest in the path, makes the master
+        reject content that does not hash to it.
+        """
+        digest = digest or self.headers.get('X-Blob-Digest')
+        if digest is not None and not is_digest(digest):
+            self.close_connection = True
+            self.send_error(400, "X-Blob-Digest must be a lowercase hex SHA-256 digest")
+            return
+        try:
+            digest, size = self.server.master.blob_store.put(self._iter_body(), digest)
+        except ValueError as e:
+            self.close_connection = True
+            self.send_error(400, str(e))
+            return
+        self._send_json_response({'digest': digest, 'size': size, 'complete': True})
+    
+    def _handle_upload_blob(self, digest: str):
+        """Write one range of a resumable upload of the blob with this digest
+        
+        The body is the range given by a Content-Range header, "bytes
+        <first>-<last>/<total>" (total may be * until the last range), or
+        the whole blob without one. A range must not start past the bytes
+        received so far; HEAD /blob/<digest> reports them as X-Upload-Offset.
+        """
+        store = self.server.master.blob_store
+        # The body is left unread on early errors, so the connection must close
+        if not is_digest(digest):
+            self.close_connection = True
+            self.send_error(400, "Invalid blob digest")
+            return
+        if store.exists(digest):
+            self.close_connection = True
+            self._send_json_response({'digest': digest, 'size': store.size(digest),
+                                      'complete': True})
+            return
+        content_range = self.headers.get('Content-Range')
+        if content_range is None:
+            self._handle_put_blob(digest)
+            return
+        try:
+            start, total = self._parse_content_range(content_range)
+        except ValueError as e:
+            self.close_connection = True
+            self.send_error(400, str(e))
+            return
+        
+        try:
+            offset, complete = store.write_upload(digest, self._iter_body(), start, total)
+        except UploadConflict as e:
+            self.close_connection = True
+            self._send_json_response({'error': str(e), 'offset': e.offset}, status=409,
+                                     headers={'X-Upload-Offset': str(e.offset)})
+            return
+        except ValueError as e:
+            self.close_connection = True
+            self.send_error(400, str(e))
+            return
+        response = {'digest': digest, 'offset': offset, 'complete': complete}
+        if complete:
+            response['size'] = offset
+        self._send_json_response(response, headers={'X-Upload-Offset': str(offset)})
+    
+    @staticmethod
+    def _parse_content_range(header: str) -> Tuple[int, Optional[int]]:
+        """Start offset and total size (None if not yet known) from an upload's Content-Range
+        
+        Raises ValueError for a malformed header.
+        """
+        unit, _, spec = header.strip().partition(' ')
+        span, _, total = spec.partition('/')
+        try:
+            if unit != 'bytes' or not total:
+                raise ValueError
+            total = None if total == '*' else int(total)
+            if span == '*':
+                if total is None:
+                    raise ValueError
+                # An empty request that only announces the total
+                return total, total
+            first, last = (int(value) for value in span.split('-'))
+            if first < 0 or last < first or (total is not None and last >= total):
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Invalid Content-Range: {header}")
+        return first, total
+    
+    @staticmethod
+    def _parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+        """First and last byte of a single-range Range header, or None for the whole blob
+        
+        Malformed and multi-range headers are ignored, as HTTP allows.
+        Raises ValueError when the range lies past the end of the blob.
+        """
+        if header is None:
+            return None
+        unit, _, spec = header.strip().partition('=')
+        if unit.strip() != 'bytes' or ',' in spec:
+            return None
+        first, _, last = spec.strip().partition('-')
+        try:
+            first = int(first) if first else None
+            last = int(last) if last else None
+        except ValueError:
+            return None
+        if first is None:
+            # Suffix range: the last N bytes
+            if last is None or last < 0:
+                return None
+            if last == 0:
+                raise ValueError("Range not satisfiable")
+            return max(0, size - last), size - 1
+        if first < 0 or (last is not None and last < first):
+            return None
+        if first >= size:
+            raise ValueError("Range not satisfiable")
+        return first, size - 1 if last is None else min(last, size - 1)
+    
+    def _handle_get_blob(self, digest: str, head: bool = False):
+        """Serve a stored blob, or the byte range asked for, straight from disk
+        
+        The file is written to the socket with sendfile where the platform
+        has it, so a large blob is never copied through Python buffers.
+        """
+        store = self.server.master.blob_store
+        try:
+            f = store.open(digest)
+        except OSError:
+            offset = store.upload_offset(digest)
+            if not head or offset is None:
+                self.send_error(404, "Blob not found")
+                return
+            # An unfinished resumable upload: tell the client where to resume
+            self.send_response(404)
+            self.send_header('X-Upload-Offset', str(offset))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            try:
+                byte_range = self._parse_range(self.headers.get('Range'), size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            first, last = byte_range or (0, size - 1)
+            length = last - first + 1
+            self.send_response(200 if byte_range is None else 206)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            # Content never changes under a digest
+            self.send_header('ETag', f'"{digest}"')
+            if byte_range is not None:
+                self.send_header('Content-Range', f"bytes {first}-{last}/{size}")
+            self.end_headers()
+            if not head and length > 0:
+                self.connection.sendfile(f, first, length)
+    
+    @staticmethod
+    def _build_task(data: Dict[str, Any], task_id: str,
+                    batch_id: Optional[str] = None) -> Task:
+        """Create a task from a submitted spec
+        
+        Raises KeyError on missing fields and ValueError on a malformed
+        depends_on, slots, idempotent or blobs. Within a batch, an integer
+        dependency names the task at that index of the batch.
+        """
+        slots = MasterHTTPHandler._parse_slots(data.get('slots', 1))
+        idempotent = MasterHTTPHandler._parse_idempotent(data.get('idempotent', True))
+        blobs = MasterHTTPHandler._parse_blobs(data.get('blobs'))
+        depends_on = data.get('depends_on')
+        if depends_on is not None:
+            if not isinstance(depends_on, list):
+                raise ValueError("depends_on must be a list of task ids")
+            parents = []
+            for parent in depends_on:
+                if isinstance(parent, str):
+                    parents.append(parent)
+                elif (batch_id is not None and isinstance(parent, int)
+                        and not isinstance(parent, bool)):
+                    parents.append(f"{batch_id}-{parent}")
+                else:
+                    raise ValueError(f"Invalid dependency: {parent!r}")
+            depends_on = parents or None
+        return Task(
+            id=task_id,
+            type=data['type'],
+            payload=data['payload'],
+            priority=data.get('priority', 0),
+            requirements=data.get('requirements', {}),
+            timeout=data.get('timeout'),
+            max_retries=data.get('max_retries'),
+            job_id=data.get('job_id'),
+            depends_on=depends_on,
+            slots=slots,
+            idempotent=idempotent,
+            blobs=blobs
+        )
+    
+    @staticmethod
+    def _parse_slots(slots: Any) -> int:
+        """Validate the number of node slots a task takes (raises ValueError)"""
+        if not isinstance(slots, int) or isinstance(slots, bool) or slots < 1:
+            raise ValueError("slots must be a positive integer")
+        return slots
+    
+    @staticmethod
+    def _parse_blobs(blobs: Any) -> Optional[Dict[str, str]]:
+        """Validate a task's input blobs, a dict of name -> digest (raises ValueError)"""
+        if blobs is None:
+            return None
+        if not isinstance(blobs, dict):
+            raise ValueError("blobs must map input names to blob digests")
+        for name, digest in blobs.items():
+            if not is_digest(digest):
+                raise ValueError(f"Invalid digest for blob {name!r}: {digest!r}")
+        return blobs or None
+    
+    @staticmethod
+    def _parse_idempotent(idempotent: Any) -> bool:
+        """Validate a task's idempotent flag (raises ValueError)"""
+        if not isinstance(idempotent, bool):
+            raise ValueError("idempotent must be true or false")
+        return idempotent
+    
     def _handle_submit_task(self, data: Dict[str, Any]):
         """Submit a new task"""
         try:
-            task = Task(
-                id=str(uuid.uuid4()),
-                type=data['type'],
-                payload=data['payload'],
-                priority=data.get('priority', 0),
-                requirements=data.get('requirements', {})
-            )
+            task = self._build_task(data, str(uuid.uuid4()))
             self.server.master.task_queue.add_task(task)
             self.server.master.scheduler.notify()
             self._send_json_response({'task_id': task.id, 'status': 'submitted'})
         except KeyError as e:
             self.send_error(400, f"Missing required field: {e}")
+        except ValueError as e:
+            self.send_error(400, str(e))
+    
+    def _handle_submit_job(self, data: Dict[str, Any]):
+        """Submit a job: one task template plus a 'params' list or a 'range'"""
+        template = {key: data[key] for key in ('type', 'payload', 'priority', 'requirements',
+                                               'timeout', 'max_retries', 'param_key', 'slots',
+                                               'idempotent', 'blobs')
+                    if key in data}
+        if 'type' not in template:
+            self.send_error(400, "Missing required field: 'type'")
+            return
+        source = {'range': data['range']} if 'range' in data else {'params': data.get('params')}
+        try:
+            self._parse_slots(template.get('slots', 1))
+            self._parse_idempotent(template.get('idempotent', True))
+            self.server.master.task_queue.check_blobs(self._parse_blobs(template.get('blobs')))
+            params, total = job_params(source)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        
+        master = self.server.master
+        job = master.jobs.submit(template, params, total, source)
+        master.scheduler.notify()
+        self._send_json_response({'job_id': job.id, 'status': 'submitted', 'total': total})
+    
+    def _handle_get_job(self, job_id: str):
+        """Get a job's aggregate status"""
+        job = self.server.master.jobs.get_job(job_id)
+        if job:
+            self._send_json_response(job.summary())
+        else:
+            self.send_error(404, "Job not found")
+    
+    def _handle_job_results(self, job_id: str, query: str):
+        """Stream a job's finished tasks as NDJSON, in the order they finished
+        
+        offset skips results already received, to resume a broken stream.
+        The stream ends after the job's last task.
+        """
+        master = self.server.master
+        if master.jobs.get_job(job_id) is None:
+            self.send_error(404, "Job not found")
+            return
+        try:
+            offset = int(parse_qs(query).get('offset', ['0'])[-1])
+        except ValueError as e:
+            self.send_error(400, f"Invalid offset: {e}")
+            return
+        
+        try:
+            self._start_chunked_response('application/x-ndjson')
+            done = False
+            while not done:
+                task_ids, done = master.jobs.wait_finished(job_id, offset,
+                                                           EVENT_KEEPALIVE_INTERVAL)
+                lines = []
+                for task_id in task_ids:
+                    task = master.task_queue.get_task(task_id)
+                    lines.append(json.dumps({
+                        'task_id': task_id,
+                        'index': int(task_id.rsplit('-', 1)[1]),
+                        'status': task.status.value,
+                        'result': master.task_queue.get_result(task_id),
+                        'error': task.error
+                    }, default=json_default).encode() + b'\n')
+                offset += len(task_ids)
+                # An empty line keeps an idle stream alive
+                self._write_chunk(b''.join(lines) or b'\n')
+                self.wfile.flush()
+            self._end_chunked_response()
+        except OSError:
+            # The client disconnected
+            self.close_connection = True
+    
+    def _handle_submit_batch(self):
+        """Submit a JSON array or NDJSON stream of tasks in one go"""
+        # One uuid per batch; task ids are <batch>-<index>
+        batch_id = uuid.uuid4().hex
+        tasks = []
+        media, encoding = self._body_format()
+        if media is None:
+            self.close_connection = True
+            self.send_error(415, "Unsupported content type or encoding")
+            return
+        try:
+            for index, spec in enumerate(self._iter_task_specs(media, encoding)):
+                try:
+                    tasks.append(self._build_task(spec, f"{batch_id}-{index}", batch_id))
+                except KeyError as e:
+                    self.close_connection = True
+                    self.send_error(400, f"Task {index}: missing required field: {e}")
+                    return
+                except ValueError as e:
+                    self.close_connection = True
+                    self.send_error(400, f"Task {index}: {e}")
+                    return
+        except ValueError as e:
+            self.close_connection = True
+            self.send_error(400, f"Invalid request body: {e}")
+            return
+        
+        master = self.server.master
+        try:
+            master.task_queue.add_tasks(tasks)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        master.scheduler.notify()
+        
+        self._start_chunked_response('application/json')
+        self._write_chunk(b'{"status": "submitted", "count": %d, "task_ids": [' % len(tasks))
+        for start in range(0, len(tasks), 4096):
+            ids = ', '.join(f'"{task.id}"' for task in tasks[start:start + 4096])
+            self._write_chunk((', ' + ids if start else ids).encode())
+        self._write_chunk(b']}')
+        self._end_chunked_response()
     
     def _handle_register_node(self, data: Dict[str, Any]):
         """Register a new node"""
@@ -391,6 +2542,8 @@ class MasterHTTPHandler(BaseHTTPRequestHandler):
             })
         except KeyError as e:
             self.send_error(400, f"Missing required field: {e}")
+        except ValueError as e:
+            self.send_error(400, str(e))
     
     def _handle_heartbeat(self, data: Dict[str, Any]):
         """Handle node heartbeat"""
@@ -399,24 +2552,114 @@ class MasterHTTPHandler(BaseHTTPRequestHandler):
             self.send_error(400, "Missing node_id")
             return
         
-        success = self.server.master.node_manager.update_heartbeat(node_id)
+        want = None
+        if 'want' in data:
+            try:
+                want = max(int(data['want']), 0)
+            except (TypeError, ValueError):
+                self.send_error(400, f"Invalid want: {data['want']!r}")
+                return
+        
+        master = self.server.master
+        task_queue = master.task_queue
+        try:
+            success = master.node_manager.update_heartbeat(node_id, data)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
         if success:
-            # Check for tasks for this node
-            node = self.server.master.node_manager.get_node(node_id)
-            if node and len(node.current_tasks) < 2:
-                task = self.server.master.task_queue.get_task_for_node(node)
-                if task:
-                    self.server.master.node_manager.assign_task_to_node(node_id, task.id)
-                    self._send_json_response({
-                        'status': 'ok',
-                        'task': asdict(task)
-                    })
-                    return
+            response = {'status': 'ok'}
+            if want is not None:
+                # Worker asks for a number of tasks to fill its slots and prefetch queue
+                tasks = self._take_tasks(node_id, want, timeout=0)
+                response['tasks'] = [task_queue.task_to_dict(task) for task in tasks]
+            else:
+                # Deliver a task the scheduler already assigned, else pull one
+                tasks = self._take_tasks(node_id, 1, timeout=0)
+                if tasks:
+                    response['task'] = task_queue.task_to_dict(tasks[0])
             
-            self._send_json_response({'status': 'ok'})
+            cancel = master.dispatcher.take_cancellations(node_id)
+            if cancel:
+                response['cancel'] = cancel
+            try:
+                self._send_json_response(response)
+            except OSError:
+                # The worker gave up on the heartbeat; keep its tasks for the next one
+                if tasks:
+                    master.dispatcher.restore(node_id, tasks)
+                for task_id in cancel:
+                    master.dispatcher.cancel(node_id, task_id)
+                raise
         else:
             self.send_error(404, "Node not found")
     
+    def _handle_poll(self, data: Dict[str, Any]):
+        """Long poll: block until tasks are pushed to the node or timeout"""
+        node_id = data.get('node_id')
+        if not node_id:
+            self.send_error(400, "Missing node_id")
+            return
+        try:
+            timeout = float(data.get('timeout', 30))
+            max_tasks = max(int(data.get('max_tasks', 1)), 1)
+            if math.isnan(timeout):
+                raise ValueError("timeout is NaN")
+        except (TypeError, ValueError) as e:
+            self.send_error(400, f"Invalid timeout or max_tasks: {e}")
+            return
+        timeout = min(max(timeout, 0), MAX_POLL_TIMEOUT)
+        
+        master = self.server.master
+        try:
+            known = master.node_manager.update_heartbeat(node_id, data)
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        if not known:
+            self.send_error(404, "Node not found")
+            return
+        
+        tasks = self._take_tasks(node_id, max_tasks, timeout)
+        cancel = master.dispatcher.take_cancellations(node_id)
+        master.node_manager.update_heartbeat(node_id)
+        
+        response = {
+            'status': 'ok',
+            'tasks': [master.task_queue.task_to_dict(task) for task in tasks]
+        }
+        if cancel:
+            response['cancel'] = cancel
+        try:
+            self._send_json_response(response)
+        except OSError:
+            # The worker went away mid-poll; keep its tasks for the next poll
+            if tasks:
+                master.dispatcher.restore(node_id, tasks)
+            for task_id in cancel:
+                master.dispatcher.cancel(node_id, task_id)
+            raise
+    
+    def _take_tasks(self, node_id: str, max_tasks: int, timeout: float) -> List[Task]:
+        """Collect tasks for a node from its mailbox or directly from the queue"""
+        master = self.server.master
+        if max_tasks <= 0:
+            return []
+        tasks = master.dispatcher.take(node_id, max_tasks)
+        
+        node = master.node_manager.get_node(node_id)
+        while node and len(tasks) < max_tasks and node.has_capacity():
+            task = master.task_queue.get_task_for_node(node)
+            if not task:
+                break
+            master.node_manager.assign_task_to_node(node_id, task.id, task.slots)
+            master.deadlines.track_assigned(task)
+            tasks.append(task)
+        
+        if not tasks and timeout > 0:
+            tasks = master.dispatcher.take(node_id, max_tasks, timeout)
+        return tasks
+    
     def _handle_update_task(self, data: Dict[str, Any]):
         """Update task status"""
         task_id = data.get('task_id')
@@ -433,45 +2676,311 @@ class MasterHTTPHandler(BaseHTTPRequestHandler):
             self.send_error(400, f"Invalid status: {status}")
             return
         
-        success = self.server.master.task_queue.update_task_status(
-            task_id, 
-            task_status,
-            result=data.get('result'),
-            error=data.get('error')
-        )
+        self._apply_task_update(task_id, task_status, node_id,
+                                result=data.get('result'),
+                                error=data.get('error'),
+                                execution_time=data.get('execution_time'),
+                                attempt=data.get('attempt'))
+    
+    def _handle_task_result(self):
+        """Receive a large task result streamed in (optionally compressed) chunks"""
+        task_id = self.headers.get('X-Task-Id')
+        node_id = self.headers.get('X-Node-Id')
+        media, encoding = self._body_format()
         
-        if success and node_id:
-            # Update node statistics
-            is_success = task_status == TaskStatus.COMPLETED
-            self.server.master.node_manager.complete_task_on_node(
-                node_id, task_id, is_success
-            )
+        # The body is left unread on early errors, so the connection must close
+        if not task_id:
+            self.close_connection = True
+            self.send_error(400, "Missing X-Task-Id header")
+            return
+        if media is None:
+            self.close_connection = True
+            self.send_error(415, "Unsupported content type or encoding")
+            return
+        try:
+            task_status = TaskStatus(self.headers.get('X-Task-Status', 'completed'))
+            execution_time = self.headers.get('X-Execution-Time')
+            execution_time = float(execution_time) if execution_time else None
+            attempt = self.headers.get('X-Task-Attempt')
+            attempt = int(attempt) if attempt else None
+        except ValueError as e:
+            self.close_connection = True
+            self.send_error(400, str(e))
+            return
         
-        if success:
+        try:
+            body = b''.join(iter_decompressed(self._iter_body(), encoding,
+                                              self.server.master.max_result_size))
+            result = decode(body, media)
+        except BodyTooLargeError as e:
+            self.close_connection = True
+            self.send_error(413, f"Result too large: {e}")
+            return
+        except ValueError as e:
+            self.close_connection = True
+            self.send_error(400, f"Invalid result body: {e}")
+            return
+        
+        self._apply_task_update(task_id, task_status, node_id, result=result,
+                                execution_time=execution_time, attempt=attempt)
+    
+    def _apply_task_update(self, task_id: str, task_status: TaskStatus,
+                           node_id: Optional[str], result: Any = None,
+                           error: Optional[str] = None,
+                           execution_time: Optional[float] = None,
+                           attempt: Optional[int] = None):
+        """Record a task status change and respond"""
+        master = self.server.master
+        if master.apply_task_update(task_id, task_status, node_id, result=result, error=error,
+                                    execution_time=execution_time, attempt=attempt):
             self._send_json_response({'status': 'updated'})
+        elif master.task_queue.get_task(task_id) is not None:
+            # The task was timed out or reassigned since this worker got it
+            self.send_error(409, "Stale task attempt")
         else:
             self.send_error(404, "Task not found")
     
-    def _send_json_response(self, data: Any):
-        """Send JSON response"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'application/json')
+    def _handle_gateway_models(self):
+        """List the models the gateway's backends serve, like an OpenAI API"""
+        self._send_json_response({
+            'object': 'list',
+            'data': [{'id': model, 'object': 'model', 'owned_by': 'lancompute'}
+                     for model in self.server.master.gateway.models()],
+        })
+    
+    def _handle_gateway(self):
+        """Proxy an OpenAI API request to the least busy backend serving its model"""
+        gateway = self.server.master.gateway
+        try:
+            body = b''.join(self._iter_body())
+        except ValueError as e:
+            self.close_connection = True
+            self.send_error(400, f"Invalid request body: {e}")
+            return
+        headers = {name: self.headers[name] for name in FORWARDED_HEADERS
+                   if name in self.headers}
+        try:
+            response = gateway.request('POST', self.path, body, headers)
+        except NoBackendError as e:
+            self._send_gateway_error(e.status, str(e))
+            return
+        if response.streaming:
+            self._stream_gateway_response(response)
+            return
+        try:
+            body = response.read()
+        except (OSError, HTTPException) as e:
+            response.close(error=repr(e))
+            self._send_gateway_error(502, f"Backend {response.backend.name} failed: {e}")
+            return
+        response.close()
+        self.send_response(response.status)
+        self.send_header('Content-Type', response.headers.get('Content-Type', MEDIA_JSON))
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Backend', response.backend.name)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _stream_gateway_response(self, response):
+        """Pass a backend's server-sent events (streamed tokens) on as they arrive"""
+        self.send_response(response.status)
+        self.send_header('Content-Type', response.headers.get('Content-Type'))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('X-Backend', response.backend.name)
+        self.end_headers()
+        chunks = response.iter_chunks()
+        first_chunk = None
+        size = 0
+        while True:
+            try:
+                chunk = next(chunks, b'')
+            except (OSError, HTTPException) as e:
+                # Part of the answer is out: cut the client off rather than retry
+                logger.warning(f"Backend {response.backend.name} broke off a stream: {e}")
+                response.close(error=repr(e))
+                self.close_connection = True
+                return
+            if not chunk:
+                break
+            if first_chunk is None:
+                first_chunk = time.time()
+            size += len(chunk)
+            try:
+                self._write_chunk(chunk)
+            except OSError:
+                # The client went away; dropping the backend connection stops generating
+                response.close()
+                self.close_connection = True
+                return
+        self._end_chunked_response()
+        response.close()
+        if first_chunk is not None:
+            logger.debug(f"Streamed {size} bytes from {response.backend.name}: first after "
+                         f"{(first_chunk - response.started) * 1000:.0f} ms, done after "
+                         f"{(time.time() - response.started) * 1000:.0f} ms")
+    
+    def _send_gateway_error(self, status: int, message: str):
+        """Send an error in the OpenAI API's format"""
+        if status == 404:
+            error = {'message': message, 'type': 'invalid_request_error',
+                     'code': 'model_not_found'}
+        else:
+            error = {'message': message, 'type': 'server_error', 'code': 'backend_unavailable'}
+        self._send_json_response({'error': error}, status)
+    
+    def _send_json_response(self, data: Any, status: int = 200,
+                            headers: Optional[Dict[str, str]] = None):
+        """Send a response in the format the client accepts (JSON by default)
+        
+        JSON is preferred unless a binary format is asked for by name, so
+        clients sending "Accept: */*" keep getting JSON. Bodies of at least
+        the configured compression threshold are compressed with the best
+        encoding the client accepts.
+        """
+        offered = [MEDIA_JSON] + [media for media in available_formats() if media != MEDIA_JSON]
+        media = negotiate(self.headers.get('Accept'), offered) or MEDIA_JSON
+        body = encode(data, media)
+        threshold = self.server.master.compression_threshold
+        encoding = ENCODING_IDENTITY
+        if threshold is not None and len(body) >= threshold:
+            encoding = negotiate(self.headers.get('Accept-Encoding'),
+                                 available_encodings()) or ENCODING_IDENTITY
+            body = compress(body, encoding)
+        self.send_response(status)
+        self.send_header('Content-Type', media)
+        if encoding != ENCODING_IDENTITY:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept, Accept-Encoding')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _body_format(self) -> Tuple[Optional[str], str]:
+        """Media type and content encoding of the request body
+        
+        The media type is None when this master cannot read the body.
+        """
+        media = media_type(self.headers.get('Content-Type'))
+        encoding = self.headers.get('Content-Encoding', ENCODING_IDENTITY).strip().lower()
+        if media not in available_formats() or encoding not in available_encodings():
+            return None, encoding
+        return media, encoding
+    
+    def _iter_task_specs(self, media: str, encoding: str) -> Iterator[Dict[str, Any]]:
+        """Task specs of a batch: streamed from JSON, or a decoded binary array"""
+        chunks = iter_decompressed(self._iter_body(), encoding)
+        if media == MEDIA_JSON:
+            yield from iter_json_objects(chunks)
+            return
+        specs = decode(b''.join(chunks), media)
+        if not isinstance(specs, list):
+            raise ValueError("Expected an array of task objects")
+        for spec in specs:
+            if not isinstance(spec, dict):
+                raise ValueError(f"Expected a task object, got {type(spec).__name__}")
+            yield spec
+    
+    def _iter_body(self, chunk_size: int = 65536) -> Iterator[bytes]:
+        """Yield the request body in chunks (Content-Length or chunked encoding)"""
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            while True:
+                size_line = self.rfile.readline(65537)
+                try:
+                    size = int(size_line.split(b';', 1)[0].strip(), 16)
+                except ValueError:
+                    raise ValueError("Malformed chunk size")
+                if size == 0:
+                    # Discard optional trailers up to the terminating blank line
+                    while self.rfile.readline(65537) not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                yield from self._read_exactly(size, chunk_size)
+                self.rfile.readline(3)
+        else:
+            yield from self._read_exactly(int(self.headers.get('Content-Length', 0)), chunk_size)
+    
+    def _read_exactly(self, length: int, chunk_size: int) -> Iterator[bytes]:
+        """Yield exactly `length` bytes from the request stream"""
+        while length > 0:
+            data = self.rfile.read(min(length, chunk_size))
+            if not data:
+                raise ValueError("Request body ended early")
+            length -= len(data)
+            yield data
+    
+    def _start_chunked_response(self, content_type: str, status: int = 200):
+        """Send headers for a response streamed with chunked encoding"""
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
         self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+    
+    def _write_chunk(self, data: bytes):
+        """Write one chunk of a chunked response"""
+        if data:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+    
+    def _end_chunked_response(self):
+        """Terminate a chunked response"""
+        self.wfile.write(b'0\r\n\r\n')
     
     def log_message(self, format, *args):
         """Override to use logger instead of stderr"""
         logger.info(f"{self.client_address[0]} - {format % args}")
 
 
+class MasterHTTPServer(ThreadingHTTPServer):
+    """Thread-per-connection HTTP server bound to a master service
+
+    Each keep-alive connection gets its own handler thread, so a slow client
+    only stalls its own connection instead of every heartbeat and submit.
+    """
+    
+    daemon_threads = True
+    request_queue_size = 1024
+    
+    def __init__(self, server_address, master: 'MasterService'):
+        self.master = master
+        super().__init__(server_address, MasterHTTPHandler)
+
+
 class TaskScheduler:
-    """Background task scheduler"""
+    """Background task scheduler
     
-    def __init__(self, master):
+    Which nodes get tasks first is up to the scheduling policy (see
+    scheduling.py), chosen with master.scheduler.algorithm. Before that,
+    nodes whose blob cache holds the inputs of their next task take those
+    tasks, so a task reading a large blob goes to a node that has it
+    whenever one has room, rather than to whichever node the policy ranks
+    first.
+    
+    Once the queue has nothing left for a node with idle slots, the
+    scheduler can put it to work in two more ways. With work stealing it
+    takes tasks that another node holds but has not started, from nodes
+    holding more tasks than they have slots. With speculative execution it
+    starts a copy of a straggling task, one running much longer than its
+    type usually takes; the first copy to complete wins and the other is
+    cancelled. Tasks submitted with idempotent false never run twice at
+    once: they are only stolen while still undelivered and never copied.
+    """
+    
+    def __init__(self, master, policy: Optional[SchedulingPolicy] = None,
+                 stragglers: Optional[StragglerDetector] = None, work_stealing: bool = False):
         self.master = master
+        self.policy = policy or SchedulingPolicy()
+        # Speculative execution is off without a straggler detector
+        self.stragglers = stragglers
+        self.work_stealing = work_stealing
+        # task_id -> (node running the task, node running its speculative copy)
+        self.copies: Dict[str, Tuple[str, str]] = {}
+        self.copies_lock = threading.Lock()
         self.running = False
         self.thread = None
         self.condition = threading.Condition()
+        self._pending = False
     
     def start(self):
         """Start the scheduler"""
@@ -491,43 +3000,665 @@ class TaskScheduler:
     def notify(self):
         """Notify scheduler of new work"""
         with self.condition:
+            # Remember the notification in case the loop is mid-pass
+            self._pending = True
             self.condition.notify()
     
     def _run(self):
         """Main scheduler loop"""
+        # Stragglers are found by time passing, not by any notification
+        timeout = SPECULATION_INTERVAL if self.stragglers is not None else 5.0
         while self.running:
             with self.condition:
                 # Wait for notification or timeout
-                self.condition.wait(timeout=5.0)
+                self.condition.wait_for(lambda: self._pending or not self.running,
+                                        timeout=timeout)
+                self._pending = False
             
             if not self.running:
                 break
             
-            # Get available nodes
-            available_nodes = self.master.node_manager.get_available_nodes()
-            
-            # Assign tasks to available nodes
-            for node in available_nodes:
-                if len(node.current_tasks) >= 2:
+            self.schedule()
+    
+    def schedule(self) -> int:
+        """Assign tasks in rounds until no node takes another; returns the number assigned
+        
+        Stolen tasks count as assigned; speculative copies do not.
+        """
+        master = self.master
+        nodes = master.node_manager.get_online_nodes()
+        count = 0
+        # Tasks whose inputs are cached somewhere go to those nodes first
+        for cached_only in (True, False):
+            if cached_only and not any(node.blobs for node in nodes):
+                continue
+            assigned = True
+            while assigned:
+                # Top up jobs whose queued tasks were taken in the last round
+                master.jobs.refill()
+                assigned = False
+                for node in self.policy.rank(nodes, master.task_queue):
+                    if not node.has_capacity() or (cached_only and not node.blobs):
+                        continue
+                    
+                    task = master.task_queue.get_task_for_node(node, cached_only)
+                    if task:
+                        master.node_manager.assign_task_to_node(node.id, task.id, task.slots)
+                        master.deadlines.track_assigned(task)
+                        self.policy.task_assigned(task, node)
+                        # Push to the worker right away rather than on its next heartbeat
+                        master.dispatcher.push(node.id, task)
+                        logger.info(f"Scheduled task {task.id} to node {node.id}")
+                        assigned = True
+                        count += 1
+        
+        if self.work_stealing:
+            count += self.steal_tasks(nodes)
+        if self.stragglers is not None:
+            self.speculate(nodes)
+        return count
+    
+    @staticmethod
+    def _idle_nodes(nodes: List[Node]) -> List[Node]:
+        """Nodes with executor slots that no assigned task is waiting for"""
+        return [node for node in nodes if not node.throttled and node.used_slots < node.slots]
+    
+    def steal_tasks(self, nodes: List[Node]) -> int:
+        """Move tasks that backlogged nodes have not started to idle nodes"""
+        master = self.master
+        idle = self._idle_nodes(nodes)
+        backlogged = [node for node in nodes if node.used_slots > node.slots]
+        if not idle or not backlogged:
+            return 0
+        
+        stolen = 0
+        for thief in idle:
+            while thief.used_slots < thief.slots:
+                found = self._find_stealable(thief, backlogged)
+                if found is None:
+                    break
+                victim, task = found
+                withdrawn = master.dispatcher.withdraw(victim.id, task.id)
+                if master.task_queue.steal_task(task.id, victim.id, thief.id) is None:
+                    continue
+                master.node_manager.release_task_from_node(victim.id, task.id)
+                master.node_manager.assign_task_to_node(thief.id, task.id, task.slots)
+                master.deadlines.track_assigned(task)
+                if not withdrawn:
+                    # Already delivered; the victim drops it from its run queue
+                    master.dispatcher.cancel(victim.id, task.id)
+                self.policy.task_assigned(task, thief)
+                master.dispatcher.push(thief.id, task)
+                stolen += 1
+        return stolen
+    
+    def _find_stealable(self, thief: Node,
+                        victims: List[Node]) -> Optional[Tuple[Node, Task]]:
+        """Highest-priority task the most backlogged node holds that the thief can run"""
+        master = self.master
+        for victim in sorted(victims, key=lambda node: node.slots - node.used_slots):
+            if victim is thief or victim.used_slots <= victim.slots:
+                continue
+            best = None
+            for task_id in list(victim.current_tasks):
+                task = master.task_queue.get_task(task_id)
+                if (task is None or task.status != TaskStatus.ASSIGNED
+                        or task.assigned_node != victim.id
+                        or not thief.has_capacity(task.slots)
+                        or not master.task_queue.can_run(thief, task)
+                        or (best is not None and (task.priority, -task.seq)
+                            <= (best.priority, -best.seq))):
+                    continue
+                # A delivered task may be starting right now; only run it twice if allowed
+                if task.idempotent or master.dispatcher.holds(victim.id, task.id):
+                    best = task
+            if best is not None:
+                return victim, best
+        return None
+    
+    def speculate(self, nodes: List[Node]) -> int:
+        """Start copies of straggling tasks on idle nodes; returns the number started"""
+        master = self.master
+        idle = self._idle_nodes(nodes)
+        if not idle:
+            return 0
+        
+        now = time.time()
+        started = 0
+        for node in nodes:
+            for task_id in list(node.current_tasks):
+                if not idle:
+                    return started
+                task = master.task_queue.get_task(task_id)
+                if (task is None or task.status != TaskStatus.RUNNING
+                        or task.assigned_node != node.id or not task.idempotent
+                        or task.started_at is None or task_id in self.copies
+                        or not self.stragglers.is_straggler(task.type, now - task.started_at)):
                     continue
                 
-                task = self.master.task_queue.get_task_for_node(node)
-                if task:
-                    self.master.node_manager.assign_task_to_node(node.id, task.id)
-                    logger.info(f"Scheduled task {task.id} to node {node.id}")
+                backup = self._backup_node(task, node, idle)
+                if backup is None:
+                    continue
+                with self.copies_lock:
+                    self.copies[task.id] = (node.id, backup.id)
+                master.node_manager.assign_task_to_node(backup.id, task.id, task.slots)
+                master.dispatcher.push(backup.id, task)
+                logger.warning(f"Task {task.id} has run {now - task.started_at:.1f}s on node "
+                               f"{node.id}; starting a speculative copy on node {backup.id}")
+                started += 1
+                if backup.used_slots >= backup.slots:
+                    idle.remove(backup)
+        return started
+    
+    def _backup_node(self, task: Task, node: Node, idle: List[Node]) -> Optional[Node]:
+        """Idle node expected to run the task fastest, unless it would straggle too"""
+        candidates = [other for other in idle
+                      if other is not node and other.has_capacity(task.slots)
+                      and self.master.task_queue.can_run(other, task)]
+        if not candidates:
+            return None
+        estimator = self.stragglers.estimator
+        backup = min(candidates, key=lambda other: (estimator.estimate(task.type, other.id),
+                                                    other.id))
+        if estimator.estimate(task.type, backup.id) >= self.stragglers.threshold(task.type):
+            return None
+        return backup
+    
+    def copy_report(self, task_id: str, node_id: str, status: TaskStatus,
+                    attempt: Optional[int]) -> bool:
+        """Handle a report about a speculatively executed task that leaves it running
+        
+        Returns True if the report was consumed: the copy started or failed,
+        or the original failed and the copy takes over. Completions are left
+        to the caller; the first one wins.
+        """
+        with self.copies_lock:
+            copies = self.copies.get(task_id)
+        if copies is None or node_id not in copies or status == TaskStatus.COMPLETED:
+            return False
+        original, backup = copies
+        master = self.master
+        
+        if node_id == backup:
+            if status == TaskStatus.FAILED:
+                self._forget_copy(task_id)
+                master.node_manager.complete_task_on_node(backup, task_id, False)
+                self.notify()
+            # The copy's own progress does not change the task
+            return True
+        
+        if status == TaskStatus.FAILED:
+            task = master.task_queue.get_task(task_id)
+            current = task.attempts if task is not None else None
+            if master.task_queue.move_task(task_id, current if attempt is None else attempt,
+                                           original, backup):
+                self._forget_copy(task_id)
+                master.node_manager.complete_task_on_node(original, task_id, False)
+                master.deadlines.track_assigned(task)
+                logger.warning(f"Task {task_id} failed on node {original}; "
+                               f"its copy on node {backup} carries on")
+                self.notify()
+                return True
+        return False
+    
+    def copy_lost(self, task_id: str, node_id: str) -> bool:
+        """Handle a node holding one copy of a task going away; True if the task lives on"""
+        with self.copies_lock:
+            copies = self.copies.get(task_id)
+        if copies is None or node_id not in copies:
+            return False
+        original, backup = copies
+        self._forget_copy(task_id)
+        if node_id == backup:
+            return True
+        task = self.master.task_queue.get_task(task_id)
+        if task is None or not self.master.task_queue.move_task(
+                task_id, task.attempts, original, backup):
+            return False
+        self.master.deadlines.track_assigned(task)
+        return True
+    
+    def cancel_copy(self, task_id: str, keep_node: Optional[str] = None) -> None:
+        """Stop the copies of a task except the one on keep_node"""
+        copies = self._forget_copy(task_id)
+        if copies is None:
+            return
+        master = self.master
+        for node_id in copies:
+            if node_id == keep_node:
+                continue
+            master.node_manager.release_task_from_node(node_id, task_id)
+            if not master.dispatcher.withdraw(node_id, task_id):
+                master.dispatcher.cancel(node_id, task_id)
+            logger.info(f"Cancelled the copy of task {task_id} on node {node_id}")
+    
+    def _forget_copy(self, task_id: str) -> Optional[Tuple[str, str]]:
+        with self.copies_lock:
+            return self.copies.pop(task_id, None)
+    
+    def task_finished(self, task: Task, node_id: str) -> None:
+        """Feed a finished task back to the policy and straggler detector
+        
+        A completed task that ran speculatively has its other copy cancelled.
+        """
+        self.policy.task_finished(task, node_id)
+        if task.status == TaskStatus.COMPLETED:
+            if self.stragglers is not None and task.execution_time:
+                self.stragglers.observe(task.type, node_id, task.execution_time)
+            if task.id in self.copies:
+                self.cancel_copy(task.id, keep_node=node_id)
+
+
+class DeadlineTracker:
+    """Times out running tasks and reclaims tasks from nodes that went silent
+    
+    Deadlines live in a heap of (due, sequence, kind, task_id, attempt,
+    node_id). Entries are never removed early: when one comes due it is
+    simply ignored if the task has finished or moved on to another attempt
+    or node. Released tasks are re-queued through the same heap after their
+    retry backoff.
+    
+    Assigned tasks also hold a lease: a task its node has not started when
+    the lease runs out is taken back, unless every slot of the node is busy
+    running other tasks, in which case it may still be waiting in the node's
+    run queue and the lease is renewed.
+    """
+    
+    # Extra time past a task's timeout before the master gives up on it, so
+    # the worker's own timeout report normally arrives first
+    TIMEOUT_GRACE = 5.0
+    
+    def __init__(self, master, check_interval: float = 5.0,
+                 assignment_lease: Optional[float] = 120.0):
+        self.master = master
+        self.check_interval = check_interval
+        # Seconds an idle node has to start a task assigned to it (None = no limit)
+        self.assignment_lease = assignment_lease
+        self.running = False
+        self.thread = None
+        self.condition = threading.Condition()
+        self._heap: List[Tuple[float, int, str, str, int, Optional[str]]] = []
+        self._sequence = itertools.count()
+    
+    def start(self):
+        """Start the deadline tracker"""
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        logger.info("Deadline tracker started")
+    
+    def stop(self):
+        """Stop the deadline tracker"""
+        self.running = False
+        with self.condition:
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
+    
+    def track_running(self, task: Task) -> None:
+        """Arm the execution deadline of a task that just started"""
+        if task.timeout:
+            started_at = task.started_at or time.time()
+            self._schedule(started_at + task.timeout + self.TIMEOUT_GRACE, 'timeout',
+                           task.id, task.attempts)
+    
+    def track_assigned(self, task: Task) -> None:
+        """Arm the lease of a task just assigned, stolen or moved to a node"""
+        node_id = task.assigned_node
+        if (self.assignment_lease and node_id is not None
+                and task.status == TaskStatus.ASSIGNED):
+            self._schedule(time.time() + self.assignment_lease, 'lease', task.id,
+                           task.attempts, node_id)
+    
+    def pending(self) -> int:
+        """Number of armed deadlines and retries, including stale ones"""
+        with self.condition:
+            return len(self._heap)
+    
+    def _schedule(self, due: float, kind: str, task_id: str, attempt: int,
+                  node_id: Optional[str] = None) -> None:
+        with self.condition:
+            heapq.heappush(self._heap,
+                           (due, next(self._sequence), kind, task_id, attempt, node_id))
+            self.condition.notify()
+    
+    def _run(self):
+        """Main tracker loop"""
+        next_node_check = time.time()
+        while self.running:
+            due_entries = []
+            with self.condition:
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    due_entries.append(heapq.heappop(self._heap))
+                if not due_entries and now < next_node_check:
+                    wait = next_node_check - now
+                    if self._heap:
+                        wait = min(wait, self._heap[0][0] - now)
+                    self.condition.wait(wait)
+                    continue
+            
+            for _, _, kind, task_id, attempt, node_id in due_entries:
+                try:
+                    if kind == 'timeout':
+                        task = self.master.task_queue.get_task(task_id)
+                        if task is not None and task.status == TaskStatus.RUNNING:
+                            self.release(task_id, attempt,
+                                         f"Task timed out after {task.timeout}s")
+                    elif kind == 'lease':
+                        self.lease_expired(task_id, attempt, node_id)
+                    elif kind == 'retry':
+                        if self.master.task_queue.requeue(task_id, attempt):
+                            self.master.scheduler.notify()
+                except Exception as e:
+                    logger.error(f"Deadline handling failed for task {task_id}: {e}")
+            
+            if time.time() >= next_node_check:
+                self.check_nodes()
+                next_node_check = time.time() + self.check_interval
+    
+    def lease_expired(self, task_id: str, attempt: int, node_id: str) -> None:
+        """Take back a task its node never started, or renew the lease of a busy node"""
+        master = self.master
+        task = master.task_queue.get_task(task_id)
+        if (task is None or task.status != TaskStatus.ASSIGNED or task.attempts != attempt
+                or task.assigned_node != node_id):
+            return
+        node = master.node_manager.get_node(node_id)
+        if node is not None and node.status == NodeStatus.ONLINE:
+            with master.node_manager.lock:
+                task_ids = list(node.current_tasks)
+            running = 0
+            for other_id in task_ids:
+                other = master.task_queue.get_task(other_id)
+                if other is not None and other.status == TaskStatus.RUNNING:
+                    running += other.slots
+            if running >= node.slots:
+                # The task may be queued behind the ones the node is running
+                self._schedule(time.time() + self.assignment_lease, 'lease', task_id,
+                               attempt, node_id)
+                return
+        if not master.dispatcher.withdraw(node_id, task_id):
+            # Already delivered; the node drops it if it still holds it
+            master.dispatcher.cancel(node_id, task_id)
+        self.release(task_id, attempt, f"Task was not started on node {node_id} within "
+                     f"{self.assignment_lease:g}s of its assignment", node_id)
+        master.scheduler.notify()
+    
+    def check_nodes(self) -> None:
+        """Reclaim the tasks of nodes whose heartbeat went stale"""
+        for node_id, task_ids in self.master.node_manager.expire_nodes():
+            self.master.dispatcher.clear(node_id)
+            logger.warning(f"Reclaiming {len(task_ids)} tasks from offline node {node_id}")
+            for task_id in task_ids:
+                self.release(task_id, None, f"Node {node_id} went offline", node_id)
+    
+    def release(self, task_id: str, attempt: Optional[int], reason: str,
+                node_id: Optional[str] = None) -> None:
+        """Take a task back and schedule its retry, or fail it for good"""
+        task_queue = self.master.task_queue
+        if node_id is not None and self.master.scheduler.copy_lost(task_id, node_id):
+            logger.warning(f"{reason}: task {task_id} carries on as its speculative copy")
+            return
+        task = task_queue.get_task(task_id)
+        if task is None or (node_id is not None and task.assigned_node != node_id):
+            return
+        node_id = task.assigned_node
+        
+        task = task_queue.release_task(task_id, attempt, reason)
+        if task is None:
+            return
+        if node_id is not None:
+            self.master.node_manager.complete_task_on_node(node_id, task_id, False)
+        self.master.scheduler.cancel_copy(task_id)
+        
+        if task.status == TaskStatus.PENDING:
+            delay = task_queue.retry_delay(task)
+            logger.warning(f"{reason}: retrying task {task_id} in {delay:.1f}s "
+                           f"(attempt {task.attempts})")
+            self._schedule(time.time() + delay, 'retry', task_id, task.attempts)
+        else:
+            logger.error(f"{reason}: task {task_id} failed after {task.attempts} attempts")
 
 
 class MasterService:
     """Main master service coordinator"""
     
-    def __init__(self, host: str = '0.0.0.0', port: int = 8080):
+    def __init__(self, host: str = '0.0.0.0', port: int = 8080,
+                 result_store: Optional[ResultStore] = None,
+                 wal: Optional[WriteAheadLog] = None, snapshot_every: int = 100000,
+                 config: Optional[Dict[str, Any]] = None,
+                 payload_store: Optional[ResultStore] = None,
+                 blob_store: Optional[BlobStore] = None):
         self.host = host
         self.port = port
-        self.task_queue = TaskQueue()
-        self.node_manager = NodeManager()
-        self.scheduler = TaskScheduler(self)
+        
+        # Timeouts and retry policy come from config.yaml when one is given
+        config = config or {}
+        master_config = config.get('master') or {}
+        queue_config = master_config.get('task_queue') or {}
+        node_config = master_config.get('node_manager') or {}
+        type_timeouts = {
+            name: spec['timeout'] for name, spec in (config.get('task_types') or {}).items()
+            if isinstance(spec, dict) and spec.get('timeout')
+        }
+        # Input blobs; the directory is only created by the first upload
+        blob_config = master_config.get('blobs') or {}
+        self.blob_store = blob_store or BlobStore(blob_config.get('directory', './blobs'))
+        # Unfinished resumable uploads are deleted after this many idle seconds
+        self.blob_upload_expiry = blob_config.get('upload_expiry', 86400)
+        # Streamed task results may decompress to at most this many bytes
+        self.max_result_size = queue_config.get('max_result_size', 256 * 1024 * 1024)
+        # Responses at least this large are compressed for clients that accept it
+        communication = (config.get('network') or {}).get('communication') or {}
+        self.compression_threshold = (communication.get('compression_threshold', 1024)
+                                      if communication.get('enable_compression', True)
+                                      else None)
+        self.task_queue = TaskQueue(
+            result_store,
+            default_timeout=queue_config.get('task_timeout'),
+            type_timeouts=type_timeouts,
+            max_retries=queue_config.get('max_retries', 3),
+            retry_backoff=queue_config.get('retry_backoff', 1.0),
+            retry_backoff_max=queue_config.get('retry_backoff_max', 60.0),
+            payload_store=payload_store,
+            event_buffer=(master_config.get('events') or {}).get('buffer_size',
+                                                                 DEFAULT_BUFFER_SIZE),
+            blob_store=self.blob_store
+        )
+        # Workers do not read config.yaml; their resource limits are applied here
+        resource_limits = (config.get('worker') or {}).get('resources') or {}
+        self.node_manager = NodeManager(
+            heartbeat_timeout=node_config.get('heartbeat_timeout', 30.0),
+            oversubscription_factor=node_config.get('oversubscription_factor', 1.0),
+            max_cpu_percent=resource_limits.get('max_cpu_percent'),
+            max_memory_percent=resource_limits.get('max_memory_percent'))
+        self.dispatcher = TaskDispatcher()
+        scheduler_config = master_config.get('scheduler') or {}
+        algorithm = ('predictive' if scheduler_config.get('predictive_scheduling')
+                     else scheduler_config.get('algorithm', 'priority'))
+        speculation = scheduler_config.get('speculation') or {}
+        stragglers = None
+        if speculation.get('enabled'):
+            stragglers = StragglerDetector(
+                quantile=speculation.get('quantile', 0.9),
+                multiplier=speculation.get('multiplier', 1.5),
+                min_samples=speculation.get('min_samples', 10),
+                min_elapsed=speculation.get('min_elapsed', 5.0))
+        self.scheduler = TaskScheduler(self, create_policy(algorithm), stragglers,
+                                       work_stealing=scheduler_config.get('work_stealing', False))
+        self.jobs = JobManager(
+            self.task_queue,
+            window=(master_config.get('jobs') or {}).get('materialize_window', 1000))
+        self.deadlines = DeadlineTracker(
+            self, assignment_lease=queue_config.get('assignment_lease', 120.0))
+        # OpenAI-compatible API proxied to LLM servers (see gateway.py)
+        gateway_config = master_config.get('gateway') or {}
+        self.gateway = None
+        if gateway_config.get('enabled'):
+            self.gateway = InferenceGateway(
+                backends=gateway_config.get('backends') or (),
+                retries=gateway_config.get('retries', 2),
+                max_failures=gateway_config.get('max_failures', 3),
+                eject_seconds=gateway_config.get('eject_seconds', 30.0),
+                health_interval=gateway_config.get('health_interval', 10.0),
+                pool_size=gateway_config.get('pool_size', 16),
+                request_timeout=gateway_config.get('request_timeout', 600.0))
+        # LM Studio / Ollama servers on the LAN, enrolled as nodes (see discovery.py)
+        discovery_config = master_config.get('llm_discovery') or {}
+        self.discovery = None
+        if discovery_config.get('enabled'):
+            inventory = None
+            if discovery_config.get('inventory'):
+                inventory = HostInventory(discovery_config['inventory'])
+            self.discovery = LLMDiscovery(
+                self,
+                networks=discovery_config.get('networks'),
+                ports=discovery_config.get('ports'),
+                endpoints=discovery_config.get('endpoints'),
+                interval=discovery_config.get('interval', 300.0),
+                health_interval=discovery_config.get('health_interval', 10.0),
+                scan_timeout=discovery_config.get('scan_timeout', 1.0),
+                request_timeout=discovery_config.get('request_timeout', 600.0),
+                slots=discovery_config.get('slots', 1),
+                inventory=inventory)
         self.server = None
         self.start_time = time.time()
+        self._stop_event = threading.Event()
+        
+        self.wal = wal
+        self.snapshot_every = snapshot_every
+        if wal is not None:
+            self._recover()
+            wal.open()
+            self.task_queue.journal = wal
+            self.node_manager.journal = wal
+            self.jobs.journal = wal
+    
+    def apply_task_update(self, task_id: str, task_status: Any, node_id: Optional[str],
+                          result: Any = None, error: Optional[str] = None,
+                          execution_time: Optional[float] = None,
+                          attempt: Optional[int] = None) -> bool:
+        """Record a task status reported by a node (a TaskStatus or its value)
+        
+        Returns False if the task is unknown or the report is for an attempt
+        that was timed out or reassigned.
+        """
+        task_status = TaskStatus(task_status)
+        if node_id and self.scheduler.copy_report(task_id, node_id, task_status, attempt):
+            return True
+        
+        success = self.task_queue.update_task_status(
+            task_id, 
+            task_status,
+            result=result,
+            error=error,
+            execution_time=execution_time,
+            attempt=attempt,
+            node_id=node_id
+        )
+        
+        if success and node_id and task_status in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+            # Update node statistics
+            is_success = task_status == TaskStatus.COMPLETED
+            self.node_manager.complete_task_on_node(
+                node_id, task_id, is_success
+            )
+            task = self.task_queue.get_task(task_id)
+            if task is not None:
+                self.scheduler.task_finished(task, node_id)
+            # A slot freed up (and a job may have tasks to refill)
+            self.scheduler.notify()
+        
+        if success and task_status == TaskStatus.RUNNING:
+            task = self.task_queue.get_task(task_id)
+            if task is not None:
+                self.deadlines.track_running(task)
+        return success
+    
+    def _recover(self):
+        """Rebuild task and node state from the newest snapshot and the WAL"""
+        start = time.time()
+        tasks: Dict[str, Task] = {}
+        nodes: Dict[str, Dict[str, Any]] = {}
+        jobs: Dict[str, Dict[str, Any]] = {}
+        
+        # Millions of long-lived objects are created here; collecting during
+        # the load only rescans them, so defer it and freeze them afterwards
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for record in self.wal.load():
+                op = record['op']
+                if op == 'tasks':
+                    for row in record['rows']:
+                        task = Task.from_record(row)
+                        tasks[task.id] = task
+                elif op == 'task':
+                    task = Task.from_record(record['task'])
+                    tasks[task.id] = task
+                elif op == 'assign':
+                    task = tasks.get(record['id'])
+                    if task is not None:
+                        task.status = TaskStatus.ASSIGNED
+                        task.assigned_node = record['node']
+                        # The attempt is recorded rather than counted, so an
+                        # assignment already in the snapshot row replays safely
+                        task.attempts = record.get('attempt', task.attempts + 1)
+                elif op == 'move':
+                    task = tasks.get(record['id'])
+                    if task is not None:
+                        task.assigned_node = record['node']
+                elif op == 'status':
+                    task = tasks.get(record['id'])
+                    if task is not None:
+                        if 'node' in record:
+                            task.assigned_node = record['node']
+                        TaskQueue.apply_status(task, TASK_STATUS_BY_VALUE[record['status']],
+                                               record['at'], record.get('error'),
+                                               record.get('execution_time'))
+                elif op == 'node':
+                    nodes[record['node']['id']] = record['node']
+                elif op == 'job':
+                    jobs[record['job']['id']] = record['job']
+            
+            self.task_queue.restore(tasks.values())
+            self.node_manager.restore(nodes.values(), tasks.values())
+            self.jobs.restore(jobs.values(), tasks.values())
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if tasks:
+            gc.freeze()
+        
+        # Mailboxes are not persisted; redeliver assigned tasks (workers skip
+        # tasks they already hold)
+        for task in tasks.values():
+            if task.status == TaskStatus.ASSIGNED and task.assigned_node in nodes:
+                self.dispatcher.push(task.assigned_node, task)
+                self.deadlines.track_assigned(task)
+            elif task.status == TaskStatus.RUNNING:
+                self.deadlines.track_running(task)
+        
+        if tasks or nodes:
+            logger.info(f"Recovered {len(tasks)} tasks and {len(nodes)} nodes "
+                        f"in {time.time() - start:.2f}s")
+    
+    def snapshot(self):
+        """Write a compact snapshot of all state and drop the WAL it replaces"""
+        with self.task_queue.lock, self.node_manager.lock, self.jobs.condition:
+            segment = self.wal.begin_snapshot()
+            # Rows are taken here, so they hold exactly the state before the
+            # new segment's first record; only writing them waits for disk
+            rows = [task.to_record() for task in self.task_queue.tasks.values()]
+            nodes = [node.to_record() for node in self.node_manager.nodes.values()]
+            jobs = [job.to_record() for job in self.jobs.jobs.values() if job.source is not None]
+        records = itertools.chain(
+            ({'op': 'node', 'node': node} for node in nodes),
+            ({'op': 'job', 'job': job} for job in jobs),
+            ({'op': 'tasks', 'rows': rows[i:i + 10000]} for i in range(0, len(rows), 10000))
+        )
+        self.wal.write_snapshot(segment, records)
     
     def start(self):
         """Start the master service"""
@@ -535,10 +3666,15 @@ class MasterService:
         
         # Start scheduler
         self.scheduler.start()
+        self.deadlines.start()
+        if self.gateway is not None:
+            self.gateway.start()
+        if self.discovery is not None:
+            self.discovery.start()
+        threading.Thread(target=self._maintenance_loop, daemon=True).start()
         
         # Start HTTP server
-        self.server = HTTPServer((self.host, self.port), MasterHTTPHandler)
-        self.server.master = self
+        self.server = MasterHTTPServer((self.host, self.port), self)
         
         # Handle shutdown signals
         signal.signal(signal.SIGINT, self._handle_shutdown)
@@ -550,10 +3686,53 @@ class MasterService:
     def _handle_shutdown(self, signum, frame):
         """Handle shutdown signal"""
         logger.info("Shutting down master service...")
+        self._stop_event.set()
         self.scheduler.stop()
+        self.deadlines.stop()
+        if self.discovery is not None:
+            self.discovery.stop()
+        if self.gateway is not None:
+            self.gateway.stop()
+        if self.wal is not None:
+            if self.wal.records_since_snapshot:
+                self.snapshot()
+            self.wal.close()
+        self.task_queue.events.close()
+        self.task_queue.result_store.close()
+        if self.task_queue.payload_store is not None:
+            self.task_queue.payload_store.close()
         if self.server:
-            self.server.shutdown()
+            # Signals are delivered on the thread running serve_forever, so
+            # shutdown() must not be waited on here or it blocks on itself
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
         sys.exit(0)
+    
+    def _maintenance_loop(self):
+        """Periodically evict old results, drop abandoned uploads and snapshot a long WAL"""
+        while not self._stop_event.wait(MAINTENANCE_INTERVAL):
+            try:
+                self.task_queue.result_store.evict()
+            except Exception as e:
+                logger.error(f"Result eviction failed: {e}")
+            
+            try:
+                self.blob_store.expire_uploads(self.blob_upload_expiry)
+            except Exception as e:
+                logger.error(f"Blob upload expiry failed: {e}")
+            
+            if self.wal is not None and self.wal.records_since_snapshot >= self.snapshot_every:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    logger.error(f"Snapshot failed: {e}")
+
+
+def load_config(path: str) -> Dict[str, Any]:
+    """Load a YAML configuration file such as config.yaml"""
+    if yaml is None:
+        raise RuntimeError("Loading a config file requires the 'pyyaml' package")
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
 
 
 def main():
@@ -563,6 +3742,10 @@ def main():
     parser = argparse.ArgumentParser(description='LANCompute Master Service')
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
     parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--config', help='Path to a config.yaml (storage section selects '
+                                         'the result store; default keeps results in memory)')
+    parser.add_argument('--state-dir', help='Directory for the write-ahead log and snapshots '
+                                            '(overrides master.persistence.directory)')
     parser.add_argument('--log-level', default='INFO', 
                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
                        help='Logging level')
@@ -572,8 +3755,28 @@ def main():
     # Configure logging
     logging.getLogger().setLevel(getattr(logging, args.log_level))
     
+    config = load_config(args.config) if args.config else {}
+    result_store = create_result_store(config.get('storage'))
+    
+    # Payloads of queued tasks can be kept out of memory, using the same backends
+    queue_config = (config.get('master') or {}).get('task_queue') or {}
+    payload_store = None
+    if queue_config.get('payload_store'):
+        payload_store = create_result_store(queue_config['payload_store'])
+    
+    persistence = (config.get('master') or {}).get('persistence') or {}
+    wal = None
+    if args.state_dir or persistence.get('enabled'):
+        wal = WriteAheadLog(
+            args.state_dir or persistence.get('directory', './state'),
+            sync=persistence.get('sync', SYNC_BATCH),
+            batch_interval=persistence.get('batch_interval_ms', 10) / 1000.0
+        )
+    
     # Start master service
-    master = MasterService(host=args.host, port=args.port)
+    master = MasterService(host=args.host, port=args.port, result_store=result_store,
+                           wal=wal, snapshot_every=persistence.get('snapshot_every', 100000),
+                           config=config, payload_store=payload_store)
     master.start()
 
 
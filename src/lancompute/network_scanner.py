@@ -2,20 +2,59 @@
 """
 Network scanner to discover machines suitable for running LLM processes.
 Scans for common ports used by LMStudio and similar services.
+
+The scan engine is asyncio based: every port probe is a non-blocking
+connect, all probes share one concurrency limit, and hosts are reported as
+soon as their ports have been probed. With a host inventory, only the
+addresses whose recheck is due are scanned.
 """
 
+import asyncio
 import socket
 import logging
 import subprocess
 import sys
-import threading
+import time
 import ipaddress
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
 import platform
 
-# Common HTTP-like ports where a simple GET may elicit a banner
-HTTP_PORTS = [1234, 8080, 5000, 8000, 3000]
+# Only used to raise the open file limit; missing on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from .inventory import HostInventory
+
+# Common HTTP-like ports where a simple GET may elicit a banner; HTTP
+# services send nothing until asked, so the banner read would time out
+HTTP_PORTS = [1234, 8080, 5000, 8000, 3000, 11434, 7860]
+
+# Common ports for LLM services
+# 1234 - LMStudio default
+# 8080, 8000, 5000 - Common web/API ports
+# 11434 - Ollama default
+# 7860 - Gradio default
+DEFAULT_PORTS = [1234, 8080, 8000, 5000, 11434, 7860, 3000]
+
+# Ways to decide whether a host is up
+LIVENESS_TCP = 'tcp'    # a port answered, even with a refusal
+LIVENESS_ICMP = 'icmp'  # ping answered (one ping process per host)
+LIVENESS_NONE = 'none'  # only report hosts with open ports
+
+# Probe outcomes
+PORT_OPEN = 'open'
+PORT_CLOSED = 'closed'  # refused: nothing listens, but the host is up
+PORT_FILTERED = 'filtered'  # no answer before the timeout
+
+# File descriptors kept free for everything other than probe sockets
+RESERVED_FDS = 64
+
+# Services recognised from banners
+SERVICE_LMSTUDIO = 'lmstudio'
+SERVICE_OLLAMA = 'ollama'
+SERVICE_GRADIO = 'gradio'
 
 def get_local_network():
     """Get the local network subnet."""
@@ -138,79 +177,326 @@ def scan_host(ip, ports):
     
     return host_info
 
+def raise_fd_limit(wanted):
+    """Raise the soft open-file limit towards `wanted`; returns the limit in effect."""
+    if resource is None:
+        return wanted
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError) as e:
+            logging.debug("Could not raise open file limit: %s", e)
+    return wanted if soft == resource.RLIM_INFINITY else soft
+
+
+async def probe_port(ip, port, timeout=1.0, banner_timeout=1.0):
+    """Connect to one port without blocking.
+
+    Returns (state, banner): PORT_OPEN with the service banner (or "Open"),
+    PORT_CLOSED if the host refused the connection, or PORT_FILTERED if it
+    did not answer in time.
+    """
+    address = str(ip)
+    sock = socket.socket(socket.AF_INET6 if ':' in address else socket.AF_INET,
+                         socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        # A bare non-blocking connect; streams are only set up for open ports
+        await asyncio.wait_for(asyncio.get_running_loop().sock_connect(sock, (address, port)),
+                               timeout)
+    except ConnectionRefusedError:
+        sock.close()
+        return PORT_CLOSED, None
+    except (asyncio.TimeoutError, OSError) as e:
+        sock.close()
+        logging.debug("probe_port %s:%s: %r", ip, port, e)
+        return PORT_FILTERED, None
+    banner = ""
+    writer = None
+    try:
+        reader, writer = await asyncio.open_connection(sock=sock)
+        if banner_timeout:
+            # Send HTTP request for common web services; others may greet first
+            if port in HTTP_PORTS:
+                writer.write(b"GET / HTTP/1.0\r\n\r\n")
+                await writer.drain()
+            data = await asyncio.wait_for(reader.read(1024), banner_timeout)
+            banner = data.decode('utf-8', errors='ignore').strip()
+    except (asyncio.TimeoutError, OSError) as e:
+        logging.debug("Banner read failed for %s:%s: %r", ip, port, e)
+    finally:
+        # The transport owns the socket once the streams exist
+        (writer or sock).close()
+    return PORT_OPEN, banner or "Open"
+
+
+async def ping_host_async(ip, timeout=1):
+    """Check if a host answers ping, without blocking the event loop."""
+    param = '-n' if platform.system().lower() == 'windows' else '-c'
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'ping', param, '1', '-W', str(timeout), str(ip),
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+        return await process.wait() == 0
+    except OSError:
+        return False
+
+
+async def scan_host_async(ip, ports, limit, timeout=1.0, banner_timeout=1.0,
+                          liveness=LIVENESS_TCP, host_rate=None):
+    """Probe a host's ports concurrently, at most `host_rate` connects per second.
+
+    `limit` is the semaphore shared by every probe of the scan. Returns the
+    same dict as scan_host.
+    """
+    host_info = {
+        'ip': str(ip),
+        'alive': False,
+        'open_ports': [],
+        'services': {}
+    }
+    if liveness == LIVENESS_ICMP:
+        async with limit:
+            host_info['alive'] = await ping_host_async(ip)
+        if not host_info['alive']:
+            return host_info
+
+    async def probe(index, port):
+        if host_rate:
+            # Spread this host's connects out instead of sending them in a burst
+            await asyncio.sleep(index / host_rate)
+        async with limit:
+            return port, await probe_port(ip, port, timeout, banner_timeout)
+
+    for port, (state, banner) in await asyncio.gather(
+            *(probe(index, port) for index, port in enumerate(ports))):
+        if state == PORT_OPEN:
+            host_info['open_ports'].append(port)
+            if banner != "Open":
+                host_info['services'][port] = banner[:100]  # Limit banner length
+        if state != PORT_FILTERED and liveness == LIVENESS_TCP:
+            host_info['alive'] = True
+    host_info['open_ports'].sort()
+    return host_info
+
+
+async def scan_network(hosts, ports, concurrency=2048, timeout=1.0, banner_timeout=1.0,
+                       liveness=LIVENESS_TCP, host_rate=None, include_dead=False):
+    """Scan hosts and yield each live host (or host with open ports) as it finishes.
+
+    At most `concurrency` probes run at once, capped by the open file
+    limit. Hosts are taken from the iterable as capacity frees up, so a /16
+    never has more than a bounded number of hosts in flight. With
+    `include_dead`, hosts that did not answer are yielded too.
+    """
+    concurrency = max(1, min(concurrency, raise_fd_limit(concurrency + RESERVED_FDS)
+                             - RESERVED_FDS))
+    limit = asyncio.Semaphore(concurrency)
+    hosts = iter(hosts)
+    results: asyncio.Queue = asyncio.Queue()
+    # Just enough hosts in flight to fill the probe slots: a semaphore with
+    # thousands of queued waiters is slow to hand over
+    width = max(1, concurrency // max(1, len(ports)))
+
+    async def worker():
+        for ip in hosts:
+            try:
+                host_info = await scan_host_async(ip, ports, limit, timeout, banner_timeout,
+                                                  liveness, host_rate)
+            except Exception as e:
+                logging.warning("Scanning %s failed: %s", ip, e)
+                continue
+            if include_dead or host_info['alive'] or host_info['open_ports']:
+                await results.put(host_info)
+
+    async def run_workers():
+        try:
+            await asyncio.gather(*(worker() for _ in range(width)))
+        finally:
+            await results.put(None)
+
+    runner = asyncio.ensure_future(run_workers())
+    try:
+        while True:
+            host_info = await results.get()
+            if host_info is None:
+                break
+            yield host_info
+        await runner
+    finally:
+        runner.cancel()
+
+
+async def scan_incremental(inventory, hosts, ports, now=None, full=False, batch_size=256,
+                           **scan_args):
+    """Scan only the hosts the inventory says are due, and record what they answered.
+
+    Known live hosts are revalidated first, then unknown addresses are
+    swept, then addresses that were down and are due a retry (`full` scans
+    every host regardless). Yields live hosts like scan_network; every
+    result, dead hosts included, is written to the inventory in batches of
+    `batch_size`.
+    """
+    now = time.time() if now is None else now
+    targets = [str(ip) for ip in hosts] if full else inventory.due(hosts, now)
+    logging.debug("Scanning %d due hosts", len(targets))
+    pending = []
+    try:
+        async for host_info in scan_network(targets, ports, include_dead=True, **scan_args):
+            host_info['service_types'] = {}
+            for port, banner in host_info['services'].items():
+                service = detect_service(port, banner)
+                if service:
+                    host_info['service_types'][port] = service
+            pending.append(host_info)
+            if len(pending) >= batch_size:
+                inventory.record(pending, now)
+                pending = []
+            if host_info['alive'] or host_info['open_ports']:
+                yield host_info
+    finally:
+        if pending:
+            inventory.record(pending, now)
+
+
+def detect_service(port, banner):
+    """Name the LLM service a banner comes from, or None if not recognised."""
+    if port == 1234 and ('LM Studio' in banner or 'HTTP' in banner):
+        return SERVICE_LMSTUDIO
+    if port == 11434 and 'Ollama' in banner:
+        return SERVICE_OLLAMA
+    if 'gradio' in banner.lower():
+        return SERVICE_GRADIO
+    return None
+
+
+def print_host(result):
+    """Print one scanned host and any LLM services recognised on it."""
+    print(f"\nHost: {result['ip']}")
+    if result['alive']:
+        print("  Status: Online")
+    
+    if result['open_ports']:
+        print(f"  Open ports: {', '.join(map(str, result['open_ports']))}")
+        
+        for port, banner in result['services'].items():
+            print(f"  Port {port} banner: {banner}")
+            
+            # Check for known LLM services
+            service = detect_service(port, banner)
+            if service == SERVICE_LMSTUDIO:
+                print(f"  🚀 Likely LMStudio instance on port {port}")
+            elif service == SERVICE_OLLAMA:
+                print(f"  🦙 Ollama instance detected on port {port}")
+            elif service == SERVICE_GRADIO:
+                print(f"  🎯 Gradio interface detected on port {port}")
+
+
+async def _scan_and_print(net, ports, args, inventory=None):
+    scan_args = dict(concurrency=args.concurrency, timeout=args.timeout,
+                     liveness=args.liveness, host_rate=args.host_rate or None)
+    if inventory is None:
+        results = scan_network(net.hosts(), ports, **scan_args)
+    else:
+        results = scan_incremental(inventory, net.hosts(), ports, full=args.full, **scan_args)
+    active_hosts = []
+    async for result in results:
+        active_hosts.append(result)
+        # Print result immediately
+        print_host(result)
+        sys.stdout.flush()
+    return active_hosts
+
+
+async def _watch(net, ports, args, inventory):
+    """Rescan whatever falls due, forever."""
+    while True:
+        start = time.monotonic()
+        active_hosts = await _scan_and_print(net, ports, args, inventory)
+        args.full = False
+        if active_hosts:
+            print(f"\nRechecked {len(active_hosts)} active hosts in "
+                  f"{time.monotonic() - start:.1f}s")
+        next_check = inventory.next_check() or time.time()
+        await asyncio.sleep(max(1.0, next_check - time.time()))
+
+
 def main():
     parser = argparse.ArgumentParser(description='Network scanner for LLM-capable machines')
     parser.add_argument('-n', '--network', help='Network to scan (e.g., 192.168.1.0/24)', 
                         default=None)
     parser.add_argument('-p', '--ports', help='Additional ports to scan (comma-separated)', 
                         default='')
-    parser.add_argument('-t', '--threads', help='Number of threads to use', 
-                        type=int, default=50)
+    parser.add_argument('-c', '--concurrency', '-t', '--threads', dest='concurrency',
+                        help='Maximum connection attempts in flight', type=int, default=2048)
+    parser.add_argument('--timeout', help='Seconds to wait for each connection',
+                        type=float, default=1.0)
+    parser.add_argument('--liveness', choices=[LIVENESS_TCP, LIVENESS_ICMP, LIVENESS_NONE],
+                        default=LIVENESS_TCP,
+                        help='Count a host as up when a port answers (tcp), when it '
+                             'answers ping (icmp), or only report open ports (none)')
+    parser.add_argument('--host-rate', type=float, default=100,
+                        help='Maximum connection attempts per second to one host (0 = no limit)')
+    parser.add_argument('--inventory', metavar='PATH', default=None,
+                        help='Host inventory (SQLite file) kept between runs: only hosts '
+                             'whose recheck is due are scanned')
+    parser.add_argument('--full', action='store_true',
+                        help='With --inventory, scan every host and refresh the inventory')
+    parser.add_argument('--watch', action='store_true',
+                        help='With --inventory, keep rescanning hosts as they fall due')
     
     args = parser.parse_args()
+    if (args.full or args.watch) and not args.inventory:
+        parser.error('--full and --watch need --inventory')
     
-    # Common ports for LLM services
-    # 1234 - LMStudio default
-    # 8080, 8000, 5000 - Common web/API ports
-    # 11434 - Ollama default
-    # 7860 - Gradio default
-    default_ports = [1234, 8080, 8000, 5000, 11434, 7860, 3000]
+    default_ports = list(DEFAULT_PORTS)
     
     # Add custom ports if specified
     if args.ports:
         custom_ports = [int(p.strip()) for p in args.ports.split(',') if p.strip().isdigit()]
         default_ports.extend(custom_ports)
     
-    ports = list(set(default_ports))  # Remove duplicates
+    ports = list(dict.fromkeys(default_ports))  # Remove duplicates
     
     # Get network to scan
     network = args.network or get_local_network()
     
     print(f"Scanning network: {network}")
     print(f"Ports: {', '.join(map(str, ports))}")
-    print(f"Using {args.threads} threads")
+    print(f"Up to {args.concurrency} connections at once, liveness: {args.liveness}")
     print("-" * 60)
     
     try:
         # Create network object
         net = ipaddress.ip_network(network, strict=False)
         
-        # Scan all hosts in the network
-        active_hosts = []
+        inventory = HostInventory(args.inventory) if args.inventory else None
+        if args.watch:
+            try:
+                asyncio.run(_watch(net, ports, args, inventory))
+            except KeyboardInterrupt:
+                inventory.close()
+                return
         
-        with ThreadPoolExecutor(max_workers=args.threads) as executor:
-            # Submit all scanning tasks
-            future_to_ip = {executor.submit(scan_host, ip, ports): ip 
-                          for ip in net.hosts()}
-            
-            # Process results as they complete
-            for future in as_completed(future_to_ip):
-                result = future.result()
-                
-                if result['alive'] or result['open_ports']:
-                    active_hosts.append(result)
-                    
-                    # Print result immediately
-                    print(f"\nHost: {result['ip']}")
-                    if result['alive']:
-                        print("  Status: Online")
-                    
-                    if result['open_ports']:
-                        print(f"  Open ports: {', '.join(map(str, result['open_ports']))}")
-                        
-                        for port, banner in result['services'].items():
-                            print(f"  Port {port} banner: {banner}")
-                            
-                            # Check for known LLM services
-                            if port == 1234 and ('LM Studio' in banner or 'HTTP' in banner):
-                                print(f"  🚀 Likely LMStudio instance on port {port}")
-                            elif port == 11434 and 'Ollama' in banner:
-                                print(f"  🦙 Ollama instance detected on port {port}")
-                            elif 'gradio' in banner.lower():
-                                print(f"  🎯 Gradio interface detected on port {port}")
+        start = time.monotonic()
+        active_hosts = asyncio.run(_scan_and_print(net, ports, args, inventory))
         
         print("\n" + "=" * 60)
-        print(f"Scan complete. Found {len(active_hosts)} active hosts")
+        print(f"Scan complete in {time.monotonic() - start:.1f}s. "
+              f"Found {len(active_hosts)} active hosts")
+        
+        if inventory is not None:
+            # Hosts that were not due are reported from the inventory
+            scanned = {host['ip'] for host in active_hosts}
+            cached = [host for host in inventory.hosts(alive=True)
+                      if host['ip'] not in scanned and ipaddress.ip_address(host['ip']) in net]
+            if cached:
+                print(f"{len(cached)} more active hosts in the inventory, not due for a recheck")
+            active_hosts.extend(cached)
+            inventory.close()
         
         # Summary of LLM-capable hosts
         llm_hosts = []
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Result storage for LANCompute
+Keeps finished task results out of the master's task table, with memory,
+file (append-only segment log) and Redis backends
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .codec import json_default
+
+# Redis is optional; only needed for the redis backend
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResultStore:
+    """Base class for task result backends"""
+
+    def put(self, task_id: str, result: Any):
+        """Store the result of a finished task"""
+        raise NotImplementedError
+
+    def get(self, task_id: str) -> Optional[Any]:
+        """Return a stored result, or None if missing or evicted"""
+        raise NotImplementedError
+
+    def delete(self, task_id: str):
+        """Drop a stored result"""
+        raise NotImplementedError
+
+    def evict(self) -> int:
+        """Apply retention and size limits, returning the number of results dropped"""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Backend statistics for the status endpoint"""
+        return {}
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+
+class MemoryResultStore(ResultStore):
+    """Results kept in process memory, oldest evicted first"""
+
+    def __init__(self, max_results: Optional[int] = None,
+                 retention_seconds: Optional[float] = None):
+        self.max_results = max_results
+        self.retention_seconds = retention_seconds
+        self._results: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def put(self, task_id: str, result: Any):
+        with self.lock:
+            self._results.pop(task_id, None)
+            self._results[task_id] = (time.time(), result)
+            if self.max_results is not None:
+                while len(self._results) > self.max_results:
+                    self._results.popitem(last=False)
+
+    def get(self, task_id: str) -> Optional[Any]:
+        with self.lock:
+            entry = self._results.get(task_id)
+        if entry is None or self._expired(entry[0]):
+            return None
+        return entry[1]
+
+    def delete(self, task_id: str):
+        with self.lock:
+            self._results.pop(task_id, None)
+
+    def evict(self) -> int:
+        if self.retention_seconds is None:
+            return 0
+        dropped = 0
+        with self.lock:
+            # Insertion order is age order, so stop at the first fresh entry
+            while self._results:
+                task_id, (stored_at, _) = next(iter(self._results.items()))
+                if not self._expired(stored_at):
+                    break
+                del self._results[task_id]
+                dropped += 1
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {'backend': 'memory', 'results': len(self._results)}
+
+    def _expired(self, stored_at: float) -> bool:
+        return (self.retention_seconds is not None and
+                time.time() - stored_at > self.retention_seconds)
+
+
+# Segment record header: crc32, stored_at, key length, payload length
+_RECORD_HEADER = struct.Struct('<IdHI')
+# Payload length marking a delete record
+_TOMBSTONE = 0xFFFFFFFF
+
+
+class FileResultStore(ResultStore):
+    """Append-only segment log on disk with an in-memory offset index
+
+    Results are appended as JSON records to numbered segment files and read
+    back through mmap. Space is reclaimed a whole segment at a time: sealed
+    segments are deleted once all of their records are past the retention
+    period, or oldest-first while the store exceeds its size limit.
+    """
+
+    SEGMENT_PREFIX = 'results-'
+    SEGMENT_SUFFIX = '.log'
+
+    def __init__(self, base_dir: str, retention_seconds: Optional[float] = None,
+                 max_size_bytes: Optional[int] = None,
+                 segment_size: int = 64 * 1024 * 1024):
+        self.base_dir = base_dir
+        self.retention_seconds = retention_seconds
+        self.max_size_bytes = max_size_bytes
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+
+        # task_id -> (segment, payload offset, payload length, stored_at)
+        self._index: Dict[str, Tuple[int, int, int, float]] = {}
+        self._segment_keys: Dict[int, Set[str]] = {}
+        self._segment_sizes: Dict[int, int] = {}
+        self._segment_newest: Dict[int, float] = {}
+        self._maps: Dict[int, mmap.mmap] = {}
+
+        os.makedirs(base_dir, exist_ok=True)
+        segments = self._list_segments()
+        for segment in segments:
+            self._load_segment(segment)
+
+        self._active = segments[-1] if segments else 1
+        self._active_file = open(self._segment_path(self._active), 'ab')
+        self._segment_sizes.setdefault(self._active, self._active_file.tell())
+        self._segment_keys.setdefault(self._active, set())
+        logger.info(f"Result store opened at {base_dir}: {len(self._index)} results "
+                    f"in {len(self._segment_sizes)} segments")
+
+    def put(self, task_id: str, result: Any):
+        payload = json.dumps(result, default=json_default).encode()
+        with self.lock:
+            offset, stored_at = self._append(task_id, payload)
+            self._forget(task_id)
+            self._index[task_id] = (self._active, offset, len(payload), stored_at)
+            self._segment_keys[self._active].add(task_id)
+            self._segment_newest[self._active] = stored_at
+            self._maybe_roll()
+
+    def get(self, task_id: str) -> Optional[Any]:
+        with self.lock:
+            entry = self._index.get(task_id)
+            if entry is None:
+                return None
+            segment, offset, length, stored_at = entry
+            if self._expired(stored_at):
+                return None
+            data = self._read(segment, offset, length)
+        return json.loads(data)
+
+    def delete(self, task_id: str):
+        with self.lock:
+            if task_id not in self._index:
+                return
+            self._append(task_id, None)
+            self._forget(task_id)
+            self._maybe_roll()
+
+    def evict(self) -> int:
+        dropped = 0
+        with self.lock:
+            now = time.time()
+            sealed = sorted(s for s in self._segment_sizes if s != self._active)
+            for segment in sealed:
+                newest = self._segment_newest.get(segment, 0.0)
+                if (self.retention_seconds is not None and
+                        now - newest > self.retention_seconds):
+                    dropped += self._drop_segment(segment)
+                elif (self.max_size_bytes is not None and
+                        self._total_size() > self.max_size_bytes):
+                    dropped += self._drop_segment(segment)
+            if (self.max_size_bytes is not None and
+                    self._total_size() > self.max_size_bytes):
+                logger.warning(f"Result store over its size limit; the active segment "
+                               f"is {self._segment_sizes[self._active]} bytes")
+        if dropped:
+            logger.info(f"Evicted {dropped} results from {self.base_dir}")
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'backend': 'file',
+                'results': len(self._index),
+                'segments': len(self._segment_sizes),
+                'size_bytes': self._total_size()
+            }
+
+    def close(self):
+        with self.lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            self._active_file.close()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.base_dir,
+                            f"{self.SEGMENT_PREFIX}{segment:08d}{self.SEGMENT_SUFFIX}")
+
+    def _list_segments(self) -> List[int]:
+        segments = []
+        for name in os.listdir(self.base_dir):
+            if name.startswith(self.SEGMENT_PREFIX) and name.endswith(self.SEGMENT_SUFFIX):
+                number = name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)]
+                if number.isdigit():
+                    segments.append(int(number))
+        return sorted(segments)
+
+    def _load_segment(self, segment: int):
+        """Rebuild index entries from a segment, truncating a torn tail"""
+        path = self._segment_path(segment)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        keys = self._segment_keys.setdefault(segment, set())
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            crc, stored_at, key_len, payload_len = _RECORD_HEADER.unpack_from(data, offset)
+            body_len = key_len + (0 if payload_len == _TOMBSTONE else payload_len)
+            start = offset + _RECORD_HEADER.size
+            end = start + body_len
+            if end > len(data) or zlib.crc32(data[start:end]) != crc:
+                break
+            task_id = data[start:start + key_len].decode()
+            self._forget(task_id)
+            if payload_len != _TOMBSTONE:
+                self._index[task_id] = (segment, start + key_len, payload_len, stored_at)
+                keys.add(task_id)
+                self._segment_newest[segment] = stored_at
+            offset = end
+
+        if offset < len(data):
+            logger.warning(f"Truncating {len(data) - offset} bytes of incomplete "
+                           f"records from {path}")
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        self._segment_sizes[segment] = offset
+
+    def _append(self, task_id: str, payload: Optional[bytes]) -> Tuple[int, float]:
+        """Write one record to the active segment, returning the payload offset"""
+        key = task_id.encode()
+        stored_at = time.time()
+        body = key + (payload or b'')
+        header = _RECORD_HEADER.pack(zlib.crc32(body), stored_at, len(key),
+                                     _TOMBSTONE if payload is None else len(payload))
+        start = self._segment_sizes[self._active]
+        self._active_file.write(header + body)
+        self._active_file.flush()
+        self._segment_sizes[self._active] = start + len(header) + len(body)
+        return start + len(header) + len(key), stored_at
+
+    def _read(self, segment: int, offset: int, length: int) -> bytes:
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < offset + length:
+            # The active segment grows, so its mapping is refreshed on demand
+            if mapped is not None:
+                mapped.close()
+            with open(self._segment_path(segment), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = mapped
+        return mapped[offset:offset + length]
+
+    def _forget(self, task_id: str):
+        entry = self._index.pop(task_id, None)
+        if entry is not None:
+            self._segment_keys[entry[0]].discard(task_id)
+
+    def _maybe_roll(self):
+        if self._segment_sizes[self._active] < self.segment_size:
+            return
+        self._active_file.close()
+        self._active += 1
+        self._active_file = open(self._segment_path(self._active), 'ab')
+        self._segment_sizes[self._active] = 0
+        self._segment_keys[self._active] = set()
+
+    def _drop_segment(self, segment: int) -> int:
+        keys = self._segment_keys.pop(segment, set())
+        for task_id in keys:
+            self._index.pop(task_id, None)
+        mapped = self._maps.pop(segment, None)
+        if mapped is not None:
+            mapped.close()
+        self._segment_sizes.pop(segment, None)
+        self._segment_newest.pop(segment, None)
+        try:
+            os.remove(self._segment_path(segment))
+        except OSError as e:
+            logger.error(f"Failed to remove result segment {segment}: {e}")
+        return len(keys)
+
+    def _total_size(self) -> int:
+        return sum(self._segment_sizes.values())
+
+    def _expired(self, stored_at: float) -> bool:
+        return (self.retention_seconds is not None and
+                time.time() - stored_at > self.retention_seconds)
+
+
+class RedisResultStore(ResultStore):
+    """Results stored in Redis with a per-key TTL"""
+
+    def __init__(self, url: str = 'redis://localhost:6379', prefix: str = 'lancompute:',
+                 ttl: Optional[int] = None, client: Any = None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis result store requires the 'redis' package")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def put(self, task_id: str, result: Any):
+        self.client.set(self._key(task_id), json.dumps(result, default=json_default), ex=self.ttl)
+
+    def get(self, task_id: str) -> Optional[Any]:
+        data = self.client.get(self._key(task_id))
+        return None if data is None else json.loads(data)
+
+    def delete(self, task_id: str):
+        self.client.delete(self._key(task_id))
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': 'redis', 'prefix': self.prefix}
+
+    def _key(self, task_id: str) -> str:
+        return f"{self.prefix}result:{task_id}"
+
+
+def create_result_store(storage_config: Optional[Dict[str, Any]] = None) -> ResultStore:
+    """Build a result store from the 'storage' section of config.yaml"""
+    storage_config = storage_config or {}
+    backend = storage_config.get('backend', 'memory')
+
+    if backend == 'memory':
+        settings = storage_config.get('memory') or {}
+        retention_days = settings.get('retention_days')
+        return MemoryResultStore(
+            max_results=settings.get('max_results'),
+            retention_seconds=retention_days * 86400 if retention_days else None
+        )
+    if backend == 'file':
+        settings = storage_config.get('file') or {}
+        retention_days = settings.get('retention_days')
+        max_size_gb = settings.get('max_size_gb')
+        return FileResultStore(
+            base_dir=settings.get('base_dir', './results'),
+            retention_seconds=retention_days * 86400 if retention_days else None,
+            max_size_bytes=int(max_size_gb * 1024 ** 3) if max_size_gb else None,
+            segment_size=int(settings.get('segment_size_mb', 64) * 1024 * 1024)
+        )
+    if backend == 'redis':
+        settings = storage_config.get('redis') or {}
+        return RedisResultStore(
+            url=settings.get('url', 'redis://localhost:6379'),
+            prefix=settings.get('prefix', 'lancompute:'),
+            ttl=settings.get('ttl')
+        )
+    raise ValueError(f"Unsupported result store backend: {backend}")
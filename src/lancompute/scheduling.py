@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Scheduling policies for LANCompute
+Decide which nodes are offered tasks in each round of the task scheduler
+"""
+
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .master_service import Node, Task, TaskQueue
+
+# Assumed execution time in seconds of a task type never seen before
+DEFAULT_ESTIMATE = 1.0
+
+
+class SchedulingPolicy:
+    """Offers tasks to nodes in the order they registered
+
+    The scheduler runs in rounds: it asks the policy to rank the online
+    nodes, offers each ranked node with free capacity its next task, and
+    repeats while tasks keep being assigned. A policy may leave nodes out
+    of a round to hold work back from them.
+    """
+
+    name = 'priority'
+
+    def rank(self, nodes: List['Node'], task_queue: 'TaskQueue') -> List['Node']:
+        """Order the online nodes for one scheduling round"""
+        return nodes
+
+    def task_assigned(self, task: 'Task', node: 'Node') -> None:
+        """Called after the scheduler assigns a task to a node"""
+
+    def task_finished(self, task: 'Task', node_id: str) -> None:
+        """Called when a node reports a task completed or failed"""
+
+
+class RoundRobinPolicy(SchedulingPolicy):
+    """Starts each round after the node that received the last task"""
+
+    name = 'round_robin'
+
+    def __init__(self):
+        self._last: Optional[str] = None
+
+    def rank(self, nodes: List['Node'], task_queue: 'TaskQueue') -> List['Node']:
+        ordered = sorted(nodes, key=lambda node: node.id)
+        if self._last is None:
+            return ordered
+        start = next((i for i, node in enumerate(ordered) if node.id > self._last), 0)
+        return ordered[start:] + ordered[:start]
+
+    def task_assigned(self, task: 'Task', node: 'Node') -> None:
+        self._last = node.id
+
+
+class LeastLoadedPolicy(SchedulingPolicy):
+    """Prefers the nodes with the least work per logical CPU
+
+    A node's load is the larger of the slots taken by tasks the master has
+    given it and the load average it reports, which also counts work from
+    outside LANCompute.
+    """
+
+    name = 'least_loaded'
+
+    @staticmethod
+    def load(node: 'Node') -> float:
+        """Load per logical CPU"""
+        cpus = node.capabilities.get('cpu_count_logical') or 1
+        return max(node.used_slots, node.load) / cpus
+
+    def rank(self, nodes: List['Node'], task_queue: 'TaskQueue') -> List['Node']:
+        return sorted(nodes, key=lambda node: (self.load(node), node.id))
+
+
+class ExecutionTimeEstimator:
+    """Exponentially weighted moving averages of task execution times
+
+    Kept per (task type, node) and per task type; a node that has not run a
+    type yet is assumed to take the type's average.
+    """
+
+    def __init__(self, alpha: float = 0.3, default: float = DEFAULT_ESTIMATE):
+        self.alpha = alpha
+        self.default = default
+        self._lock = threading.Lock()
+        self._by_node: Dict[Tuple[str, str], float] = {}
+        self._by_type: Dict[str, float] = {}
+
+    def observe(self, task_type: str, node_id: str, seconds: float) -> None:
+        """Fold one measured execution time into the averages"""
+        with self._lock:
+            for table, key in ((self._by_node, (task_type, node_id)),
+                               (self._by_type, task_type)):
+                previous = table.get(key)
+                table[key] = (seconds if previous is None
+                              else self.alpha * seconds + (1 - self.alpha) * previous)
+
+    def estimate(self, task_type: str, node_id: str) -> float:
+        """Expected execution time of a task type on a node"""
+        estimate = self._by_node.get((task_type, node_id))
+        if estimate is None:
+            estimate = self._by_type.get(task_type, self.default)
+        return estimate
+
+
+class PredictivePolicy(SchedulingPolicy):
+    """Offers tasks to the nodes expected to finish them first
+
+    A node's expected finish time for its next task is when one of its
+    slots frees up, from the estimated remaining time of the tasks it
+    holds, plus the estimated execution time of that task there. Nodes are
+    ranked by it. A node is held back when the other nodes are expected to
+    work through every pending task before it would finish one, so a slow
+    node does not pick up the tail of a batch and stretch the makespan.
+    """
+
+    name = 'predictive'
+
+    def __init__(self, estimator: Optional[ExecutionTimeEstimator] = None,
+                 clock: Callable[[], float] = time.time):
+        self.estimator = estimator or ExecutionTimeEstimator()
+        self.clock = clock
+
+    def rank(self, nodes: List['Node'], task_queue: 'TaskQueue') -> List['Node']:
+        now = self.clock()
+        candidates = []
+        for node in nodes:
+            task = task_queue.peek_task_for_node(node)
+            if task is not None:
+                ready, overdue = self._ready_in(node, task_queue, now)
+                candidates.append((node, task.type, ready, overdue))
+        if not candidates:
+            return []
+        pending = task_queue.pending_count()
+
+        ranked = []
+        for node, task_type, ready, _ in candidates:
+            if not node.has_capacity():
+                continue
+            finish = ready + self.estimator.estimate(task_type, node.id)
+            # Tasks the other nodes complete before this one would finish;
+            # nodes running late are not counted on
+            absorbed = sum(
+                other.slots * int((finish - other_ready)
+                                  // self.estimator.estimate(task_type, other.id))
+                for other, _, other_ready, other_overdue in candidates
+                if other is not node and not other_overdue and other_ready < finish
+            )
+            if pending > absorbed:
+                ranked.append((finish, node.id, node))
+        ranked.sort(key=lambda entry: entry[:2])
+        return [node for _, _, node in ranked]
+
+    def _ready_in(self, node: 'Node', task_queue: 'TaskQueue',
+                  now: float) -> Tuple[float, bool]:
+        """Seconds until the node has a slot for another task, and whether it runs late"""
+        remaining = []
+        used = 0
+        overdue = False
+        for task_id in list(node.current_tasks):
+            task = task_queue.tasks.get(task_id)
+            if task is None:
+                continue
+            used += task.slots
+            estimate = self.estimator.estimate(task.type, node.id)
+            if task.started_at is not None:
+                estimate -= now - task.started_at
+                if estimate < 0:
+                    overdue = True
+                    estimate = 0.0
+            remaining.append(estimate * task.slots)
+        slots = max(1, node.slots)
+        if used < slots:
+            return 0.0, overdue
+        # Treat the held work as spread evenly over the node's slots
+        return sum(remaining) / slots, overdue
+
+    def task_finished(self, task: 'Task', node_id: str) -> None:
+        if task.execution_time and task.status.value == 'completed':
+            self.estimator.observe(task.type, node_id, task.execution_time)
+
+
+class StragglerDetector:
+    """Spots running tasks that take far longer than their type usually does
+
+    Keeps the most recent execution times of each task type. A task is a
+    straggler once it has run for `multiplier` times the `quantile` of its
+    type's times, and at least `min_elapsed` seconds. Types with fewer than
+    `min_samples` recorded times never have stragglers. Per-node estimates
+    pick where a copy of a straggler should run.
+    """
+
+    def __init__(self, quantile: float = 0.9, multiplier: float = 1.5,
+                 min_samples: int = 10, min_elapsed: float = 5.0, window: int = 200):
+        self.quantile = quantile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.min_elapsed = min_elapsed
+        self.window = window
+        self.estimator = ExecutionTimeEstimator()
+        self._lock = threading.Lock()
+        self._times: Dict[str, Deque[float]] = {}
+        # Thresholds are recomputed only after a type records a new time
+        self._thresholds: Dict[str, Optional[float]] = {}
+
+    def observe(self, task_type: str, node_id: str, seconds: float) -> None:
+        """Record one measured execution time"""
+        self.estimator.observe(task_type, node_id, seconds)
+        with self._lock:
+            times = self._times.get(task_type)
+            if times is None:
+                times = self._times[task_type] = deque(maxlen=self.window)
+            times.append(seconds)
+            self._thresholds.pop(task_type, None)
+
+    def threshold(self, task_type: str) -> Optional[float]:
+        """Running time past which a task of this type is a straggler, if known"""
+        with self._lock:
+            if task_type in self._thresholds:
+                return self._thresholds[task_type]
+            times = self._times.get(task_type)
+            threshold = None
+            if times is not None and len(times) >= self.min_samples:
+                ordered = sorted(times)
+                index = min(len(ordered) - 1, int(self.quantile * len(ordered)))
+                threshold = max(self.min_elapsed, self.multiplier * ordered[index])
+            self._thresholds[task_type] = threshold
+            return threshold
+
+    def is_straggler(self, task_type: str, elapsed: float) -> bool:
+        """Check if a task that has run for `elapsed` seconds is a straggler"""
+        threshold = self.threshold(task_type)
+        return threshold is not None and elapsed > threshold
+
+
+POLICIES = {
+    policy.name: policy
+    for policy in (SchedulingPolicy, RoundRobinPolicy, LeastLoadedPolicy, PredictivePolicy)
+}
+
+
+def create_policy(name: str) -> SchedulingPolicy:
+    """Create a scheduling policy by name (raises ValueError for unknown names)"""
+    try:
+        return POLICIES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown scheduling algorithm: {name} "
+                         f"(expected one of {', '.join(sorted(POLICIES))})")
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Write-ahead log for LANCompute master state
+Durable JSON-lines journal with group commit and compacting snapshots
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .codec import json_default
+
+logger = logging.getLogger(__name__)
+
+
+# fsync policies
+SYNC_ALWAYS = 'always'  # callers wait until their record is fsync'd (group commit)
+SYNC_BATCH = 'batch'    # fsync in the background every batch interval
+SYNC_OFF = 'off'        # write every batch interval, leave flushing to the OS
+
+
+class WriteAheadLog:
+    """Append-only journal of state changes plus periodic snapshots
+
+    Records are dicts appended to an in-memory buffer; a single writer
+    thread serializes everything buffered since its last pass, writes it
+    with one write() and one fsync(), then wakes the callers waiting on
+    those records. Concurrent submitters therefore share fsyncs instead of
+    paying for one each.
+
+    The log is split into numbered segments. A snapshot numbered N holds
+    the complete state as of the start of segment N, so recovery reads the
+    newest snapshot and replays segments N and later; older segments and
+    snapshots are deleted once the snapshot is on disk.
+    """
+
+    def __init__(self, directory: str, sync: str = SYNC_BATCH,
+                 batch_interval: float = 0.01):
+        if sync not in (SYNC_ALWAYS, SYNC_BATCH, SYNC_OFF):
+            raise ValueError(f"Unknown WAL sync policy: {sync}")
+        self.directory = directory
+        self.sync = sync
+        self.batch_interval = batch_interval
+        self.records_since_snapshot = 0
+
+        self._cond = threading.Condition()
+        self._buffer: List[Dict[str, Any]] = []
+        self._next_lsn = 1
+        self._durable_lsn = 0
+        self._closed = False
+
+        os.makedirs(directory, exist_ok=True)
+        segments = self._list('wal-', '.log')
+        self._segment = segments[-1] if segments else self._latest_snapshot() or 1
+        self._file = None
+        self._writer = None
+
+    def load(self) -> Iterator[Dict[str, Any]]:
+        """Yield the newest snapshot's records followed by every later WAL record"""
+        snapshot = self._latest_snapshot()
+        if snapshot is not None:
+            with open(self._path('snapshot-', snapshot, '.jsonl'), 'rb') as f:
+                for line in f:
+                    yield json.loads(line)
+
+        segments = [s for s in self._list('wal-', '.log') if snapshot is None or s >= snapshot]
+        for segment in segments:
+            for record in self._read_segment(segment, last=segment == segments[-1]):
+                self.records_since_snapshot += 1
+                yield record
+
+    def open(self):
+        """Open the newest segment for appending and start the writer thread"""
+        self._file = open(self._path('wal-', self._segment, '.log'), 'ab')
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Buffer a record for the writer; returns its log sequence number
+
+        Records are serialized later on the writer thread, so callers must
+        not mutate them after appending.
+        """
+        with self._cond:
+            self._buffer.append(record)
+            lsn = self._next_lsn
+            self._next_lsn += 1
+            self.records_since_snapshot += 1
+            self._cond.notify_all()
+            return lsn
+
+    def append_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Buffer several records at once; returns the last sequence number"""
+        records = list(records)
+        count = len(records)
+        with self._cond:
+            self._buffer.extend(records)
+            self._next_lsn += count
+            self.records_since_snapshot += count
+            self._cond.notify_all()
+            return self._next_lsn - 1
+
+    def wait_durable(self, lsn: int, timeout: Optional[float] = None) -> bool:
+        """Block until a record is on disk when the sync policy is 'always'"""
+        if self.sync != SYNC_ALWAYS:
+            return True
+        with self._cond:
+            return self._cond.wait_for(lambda: self._durable_lsn >= lsn or self._closed,
+                                       timeout=timeout)
+
+    def begin_snapshot(self) -> int:
+        """Start a new segment and return its number
+
+        The caller must hold whatever locks keep state and log in step, so
+        that the state it captures next is exactly the state before the new
+        segment's first record.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self._buffer and
+                                self._durable_lsn == self._next_lsn - 1)
+            self._file.close()
+            self._segment += 1
+            self._file = open(self._path('wal-', self._segment, '.log'), 'ab')
+            self.records_since_snapshot = 0
+            return self._segment
+
+    def write_snapshot(self, segment: int, records: Iterable[Dict[str, Any]]) -> int:
+        """Write a snapshot for a segment returned by begin_snapshot and prune old files"""
+        start = time.time()
+        path = self._path('snapshot-', segment, '.jsonl')
+        count = 0
+        with open(path + '.tmp', 'wb') as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(',', ':'), default=json_default).encode() + b'\n')
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        self._fsync_directory()
+
+        for old in self._list('wal-', '.log'):
+            if old < segment:
+                os.remove(self._path('wal-', old, '.log'))
+        for old in self._list('snapshot-', '.jsonl'):
+            if old < segment:
+                os.remove(self._path('snapshot-', old, '.jsonl'))
+        logger.info(f"Snapshot {segment} written with {count} records "
+                    f"in {time.time() - start:.2f}s")
+        return count
+
+    def close(self):
+        """Flush buffered records and stop the writer"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._writer:
+            self._writer.join()
+        if self._file:
+            self._file.close()
+
+    def _write_loop(self):
+        """Writer thread: write and fsync everything buffered since the last pass"""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._buffer or self._closed)
+                if not self._buffer:
+                    return
+                batch, self._buffer = self._buffer, []
+                lsn = self._next_lsn - 1
+                f = self._file
+
+            data = ''.join(json.dumps(record, separators=(',', ':'), default=json_default) + '\n'
+                           for record in batch)
+            f.write(data.encode())
+            f.flush()
+            if self.sync != SYNC_OFF:
+                os.fsync(f.fileno())
+
+            with self._cond:
+                self._durable_lsn = lsn
+                self._cond.notify_all()
+
+            if self.sync != SYNC_ALWAYS and self.batch_interval:
+                # Nobody waits on these records; let more accumulate so the
+                # next write (and fsync) covers them all
+                time.sleep(self.batch_interval)
+
+    def _read_segment(self, segment: int, last: bool) -> Iterator[Dict[str, Any]]:
+        """Read a segment's records, truncating a torn write at the end of the log"""
+        path = self._path('wal-', segment, '.log')
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        while offset < len(data):
+            end = data.find(b'\n', offset)
+            if end == -1:
+                break
+            try:
+                record = json.loads(data[offset:end])
+            except ValueError:
+                break
+            offset = end + 1
+            yield record
+
+        if offset < len(data):
+            if not last:
+                raise ValueError(f"Corrupt WAL segment {path} at offset {offset}")
+            logger.warning(f"Truncating {len(data) - offset} bytes of incomplete "
+                           f"records from {path}")
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+
+    def _latest_snapshot(self) -> Optional[int]:
+        snapshots = self._list('snapshot-', '.jsonl')
+        return snapshots[-1] if snapshots else None
+
+    def _path(self, prefix: str, number: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"{prefix}{number:08d}{suffix}")
+
+    def _list(self, prefix: str, suffix: str) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith(suffix):
+                number = name[len(prefix):-len(suffix)]
+                if number.isdigit():
+                    numbers.append(int(number))
+        return sorted(numbers)
+
+    def _fsync_directory(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
@@ -5,7 +5,8 @@ Executes tasks on compute nodes with platform-specific optimizations
 """
 
 import asyncio
-import json
+import heapq
+import itertools
 import logging
 import platform
 import psutil
@@ -13,14 +14,25 @@ import requests
 import signal
 import subprocess
 import sys
+import tempfile
 import threading
 import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, Any, Optional, Callable
+from typing import Deque, Dict, Any, Iterable, List, Optional, Callable, Tuple
+from queue import Empty, Queue
 import os
 import importlib.util
+import multiprocessing
+
+from .blobs import BlobCache
+from .codec import (
+    ENCODING_DEFLATE, ENCODING_IDENTITY, ENCODING_ZSTD, MEDIA_CBOR, MEDIA_JSON, MEDIA_MSGPACK,
+    available_encodings, available_formats, compress, decode, encode, iter_chunks,
+    iter_compressed, media_type
+)
 
 # Try to import mac_optimizer if on macOS
 if platform.system() == 'Darwin':
@@ -39,16 +51,43 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Seconds between checks for cancellation while a task's child process runs
+CANCEL_CHECK_INTERVAL = 0.5
+
+# Attempts at downloading a blob; an interrupted download resumes where it stopped
+BLOB_FETCH_ATTEMPTS = 3
+
+# --wire-format names of the message media types
+WIRE_FORMATS = {'json': MEDIA_JSON, 'cbor': MEDIA_CBOR, 'msgpack': MEDIA_MSGPACK}
+
 
 @dataclass
 class WorkerConfig:
     """Worker configuration"""
     node_id: str
     master_url: str
-    max_concurrent_tasks: int = 2
+    max_concurrent_tasks: Optional[int] = None  # None = one per executor worker
+    prefetch_depth: int = 2  # extra tasks held in the local run queue
     heartbeat_interval: float = 10.0
     executor_type: str = 'thread'  # 'thread' or 'process'
     max_workers: int = None
+    dispatch_mode: str = 'poll'  # 'poll' (pushed over long poll) or 'heartbeat'
+    poll_timeout: float = 30.0
+    # Results whose encoding exceeds this many bytes are streamed in chunks
+    result_stream_threshold: int = 1024 * 1024
+    # Content encoding for streamed results and large messages: 'deflate',
+    # 'zstd' or 'identity'
+    result_compression: str = ENCODING_DEFLATE
+    # Messages to the master: 'auto' (msgpack if installed, else JSON),
+    # 'json', 'cbor' or 'msgpack'
+    wire_format: str = 'auto'
+    # Messages at least this many bytes are compressed (None = never)
+    compression_threshold: Optional[int] = 1024
+    # Deadline in seconds for tasks that do not carry their own timeout
+    task_timeout: Optional[float] = None
+    # Local cache of task input blobs (None = lancompute-blobs-<node_id> in the temp dir)
+    blob_cache_dir: Optional[str] = None
+    blob_cache_size: int = 10 * 1024 ** 3
 
 
 class PlatformDetector:
@@ -133,58 +172,20 @@ class PlatformDetector:
         return spec is not None
 
 
-class TaskExecutor:
-    """Executes tasks with platform-specific optimizations"""
+class TaskHandlers:
+    """Built-in task type implementations
+
+    Kept apart from TaskExecutor so that an instance can be pickled into a
+    child process when tasks run under the process executor.
+    """
     
-    def __init__(self, config: WorkerConfig, capabilities: Dict[str, Any]):
-        self.config = config
+    def __init__(self, node_id: str, capabilities: Dict[str, Any]):
+        self.node_id = node_id
         self.capabilities = capabilities
-        self.executor = self._create_executor()
-        self.running_tasks = {}
-        self.lock = threading.Lock()
-    
-    def _create_executor(self):
-        """Create appropriate executor based on configuration"""
-        max_workers = self.config.max_workers
-        if max_workers is None:
-            max_workers = self.capabilities.get('cpu_count_logical', 4)
-        
-        if self.config.executor_type == 'process':
-            return ProcessPoolExecutor(max_workers=max_workers)
-        else:
-            return ThreadPoolExecutor(max_workers=max_workers)
-    
-    def can_accept_task(self) -> bool:
-        """Check if worker can accept more tasks"""
-        with self.lock:
-            return len(self.running_tasks) < self.config.max_concurrent_tasks
-    
-    def execute_task(self, task: Dict[str, Any]) -> None:
-        """Execute a task asynchronously"""
-        task_id = task['id']
-        
-        with self.lock:
-            if task_id in self.running_tasks:
-                logger.warning(f"Task {task_id} already running")
-                return
-            
-            self.running_tasks[task_id] = {
-                'task': task,
-                'future': None,
-                'start_time': time.time()
-            }
-        
-        # Submit task to executor
-        future = self.executor.submit(self._run_task, task)
-        
-        with self.lock:
-            self.running_tasks[task_id]['future'] = future
-        
-        # Add callback for completion
-        future.add_done_callback(lambda f: self._task_completed(task_id, f))
     
-    def _run_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
-        """Run a single task"""
+    def run(self, task: Dict[str, Any],
+            cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Run a single task and return its outcome"""
         task_type = task.get('type', 'unknown')
         payload = task.get('payload', {})
         
@@ -199,22 +200,21 @@ class TaskExecutor:
             elif task_type == 'ml_inference':
                 result = self._handle_ml_inference_task(payload)
             elif task_type == 'test':
-                result = self._handle_test_task(payload)
+                result = self._handle_test_task(payload, cancel, task.get('inputs'),
+                                                task.get('blob_files'))
             else:
                 raise ValueError(f"Unknown task type: {task_type}")
             
             return {
                 'status': 'completed',
-                'result': result,
-                'execution_time': time.time() - self.running_tasks[task['id']]['start_time']
+                'result': result
             }
             
         except Exception as e:
             logger.error(f"Task {task['id']} failed: {e}")
             return {
                 'status': 'failed',
-                'error': str(e),
-                'execution_time': time.time() - self.running_tasks[task['id']]['start_time']
+                'error': str(e)
             }
     
     def _handle_compute_task(self, payload: Dict[str, Any]) -> Any:
@@ -253,31 +253,377 @@ class TaskExecutor:
         else:
             return {'result': f'Inference completed using CPU for {model_name}'}
     
-    def _handle_test_task(self, payload: Dict[str, Any]) -> Any:
+    def _handle_test_task(self, payload: Dict[str, Any],
+                          cancel: Optional[threading.Event] = None,
+                          inputs: Optional[Dict[str, Any]] = None,
+                          blob_files: Optional[Dict[str, str]] = None) -> Any:
         """Handle test tasks"""
         duration = payload.get('duration', 1.0)
-        time.sleep(duration)
-        return {
+        if cancel is not None:
+            # Return early if the task is cancelled at its deadline
+            cancel.wait(duration)
+        else:
+            time.sleep(duration)
+        result = {
             'result': 'test completed',
             'duration': duration,
-            'node_id': self.config.node_id,
+            'node_id': self.node_id,
             'platform': self.capabilities.get('platform')
         }
+        if inputs is not None:
+            # Parent results the task received, by parent task id
+            result['inputs'] = sorted(inputs)
+        if blob_files is not None:
+            # Sizes of the input blob files, by input name
+            result['blobs'] = {name: os.path.getsize(path)
+                               for name, path in blob_files.items()}
+        return result
+
+
+def _run_in_child(handlers: TaskHandlers, task: Dict[str, Any], conn) -> None:
+    """Child process entry point: run one task and send back its outcome"""
+    try:
+        conn.send(handlers.run(task))
+    finally:
+        conn.close()
+
+
+class TaskExecutor:
+    """Executes tasks with platform-specific optimizations
+
+    Tasks run on a thread pool. With the process executor each pool thread
+    supervises a child process per task, so a task that overruns its
+    deadline can be killed; threads cannot be, so in thread mode an overdue
+    task is reported as timed out and asked to stop, and its slot stays
+    taken until the thread actually returns.
+    """
+    
+    def __init__(self, config: WorkerConfig, capabilities: Dict[str, Any]):
+        self.config = config
+        self.capabilities = capabilities
+        self.handlers = TaskHandlers(config.node_id, capabilities)
+        self.executor = self._create_executor()
+        # Concurrent task slots; defaults to the size of the executor pool
+        self.slots = config.max_concurrent_tasks or self.max_workers
+        self.running_tasks = {}
+        # Slots taken by running tasks; a task may take several
+        self.used_slots = 0
+        # Tasks received ahead of time, started as soon as a slot frees up
+        self.run_queue: Deque[Dict[str, Any]] = deque()
+        self.lock = threading.Lock()
+        # Set whenever a running task finishes and frees a slot
+        self.slot_freed = threading.Event()
+        # Called with the task dict once a task is submitted to the pool, before
+        # its outcome can be reported; it runs on the caller's thread, so it
+        # must not block
+        self.on_task_start: Optional[Callable[[Dict[str, Any]], None]] = None
+        # Called with (task_id, outcome) from the future's done-callback
+        self.on_task_complete: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        # Called on the pool thread with a task that has dependencies; returns
+        # the parent results, which the master only passes by task id
+        self.fetch_inputs: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+        # Input blobs are pinned here while their task runs; tasks see the
+        # files as task['blob_files'], by input name. fetch_blob downloads a
+        # blob missing from the cache, as chunks
+        self.blob_cache: Optional[BlobCache] = None
+        self.fetch_blob: Optional[Callable[[str], Iterable[bytes]]] = None
+        # Thread-mode deadlines: heap of (deadline, sequence, task_id, entry)
+        self._deadlines: List[Tuple[float, int, str, Dict[str, Any]]] = []
+        self._deadline_sequence = itertools.count()
+        self._deadline_condition = threading.Condition()
+        self._watchdog = None
+        self._stopping = False
+    
+    def _create_executor(self):
+        """Create appropriate executor based on configuration"""
+        max_workers = self.config.max_workers
+        if max_workers is None:
+            max_workers = self.capabilities.get('cpu_count_logical') or 4
+        self.max_workers = max_workers
+        
+        if self.config.executor_type == 'process':
+            # forkserver children do not inherit this process's threads and locks
+            methods = multiprocessing.get_all_start_methods()
+            self._mp_context = multiprocessing.get_context(
+                'forkserver' if 'forkserver' in methods else 'spawn')
+        return ThreadPoolExecutor(max_workers=max_workers)
+    
+    def timeout_for(self, task: Dict[str, Any]) -> Optional[float]:
+        """Deadline in seconds for a task, or None for no limit"""
+        timeout = task.get('timeout') or self.config.task_timeout
+        return timeout if timeout and timeout > 0 else None
+    
+    def slots_for(self, task: Dict[str, Any]) -> int:
+        """Slots a task takes; a task wider than the worker takes all of them"""
+        return max(1, min(int(task.get('slots') or 1), self.slots))
+    
+    def _fits(self, task: Dict[str, Any]) -> bool:
+        """Check if a task can start in the free slots (lock held)"""
+        return self.used_slots + self.slots_for(task) <= self.slots
+    
+    def can_accept_task(self) -> bool:
+        """Check if worker can start another task right now"""
+        with self.lock:
+            return self.used_slots < self.slots
+    
+    def wanted_tasks(self) -> int:
+        """Number of tasks to request: free slots plus prefetch headroom"""
+        with self.lock:
+            return max(0, self.slots + self.config.prefetch_depth
+                       - self.used_slots - len(self.run_queue))
+    
+    def slot_stats(self) -> Dict[str, int]:
+        """Slot and prefetch accounting reported to the master"""
+        with self.lock:
+            return {
+                'slots': self.slots,
+                'running': len(self.running_tasks),
+                'queued': len(self.run_queue),
+                'prefetch_depth': self.config.prefetch_depth
+            }
+    
+    def has_task(self, task_id: str) -> bool:
+        """Check if a task is running or waiting in the local run queue"""
+        with self.lock:
+            return (task_id in self.running_tasks
+                    or any(task['id'] == task_id for task in self.run_queue))
+    
+    def submit_task(self, task: Dict[str, Any]) -> None:
+        """Start a task if a slot is free, otherwise hold it in the run queue"""
+        with self.lock:
+            if self.run_queue or not self._fits(task):
+                self.run_queue.append(task)
+                return
+            self._reserve(task)
+        
+        self._launch(task)
+    
+    def execute_task(self, task: Dict[str, Any]) -> None:
+        """Execute a task asynchronously"""
+        task_id = task['id']
+        
+        with self.lock:
+            if task_id in self.running_tasks:
+                logger.warning(f"Task {task_id} already running")
+                return
+            
+            self._reserve(task)
+        
+        self._launch(task)
+    
+    def _reserve(self, task: Dict[str, Any]) -> None:
+        """Claim slots for a task (lock held)"""
+        slots = self.slots_for(task)
+        self.used_slots += slots
+        self.running_tasks[task['id']] = {
+            'task': task,
+            'slots': slots,
+            'future': None,
+            'start_time': time.time(),
+            'cancel': threading.Event(),
+            'timed_out': False,
+            'cancelled': False
+        }
+    
+    def _launch(self, task: Dict[str, Any]) -> None:
+        """Submit a task that already holds a slot to the executor"""
+        task_id = task['id']
+        
+        # Submit task to executor
+        future = self.executor.submit(self._run_task, task)
+        
+        with self.lock:
+            entry = self.running_tasks[task_id]
+            entry['future'] = future
+        
+        # Before the done-callback is added, so the start is reported first
+        if self.on_task_start:
+            self.on_task_start(task)
+        
+        timeout = self.timeout_for(task)
+        if timeout and self.config.executor_type != 'process':
+            self._watch(entry['start_time'] + timeout, task_id, entry)
+        
+        # Add callback for completion
+        future.add_done_callback(lambda f: self._task_completed(task_id, f))
+    
+    def _run_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a single task on a pool thread"""
+        if task.get('depends_on') and self.fetch_inputs:
+            try:
+                task = dict(task, inputs=self.fetch_inputs(task))
+            except Exception as e:
+                logger.error(f"Task {task['id']} could not fetch its inputs: {e}")
+                return {'status': 'failed', 'error': f"Could not fetch inputs: {e}"}
+        
+        blobs = task.get('blobs')
+        if not blobs or self.blob_cache is None:
+            return self._execute(task)
+        try:
+            blob_files = self.blob_cache.acquire_all(blobs, self.fetch_blob)
+        except Exception as e:
+            logger.error(f"Task {task['id']} could not fetch its blobs: {e}")
+            return {'status': 'failed', 'error': f"Could not fetch blobs: {e}"}
+        try:
+            return self._execute(dict(task, blob_files=blob_files))
+        finally:
+            for digest in blobs.values():
+                self.blob_cache.release(digest)
+    
+    def _execute(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a task whose inputs are in place, in a child process or on this thread"""
+        with self.lock:
+            entry = self.running_tasks.get(task['id'])
+        cancel = entry['cancel'] if entry else None
+        
+        if self.config.executor_type == 'process':
+            return self._run_in_process(task, self.timeout_for(task), cancel)
+        return self.handlers.run(task, cancel)
+    
+    def _run_in_process(self, task: Dict[str, Any], timeout: Optional[float],
+                        cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Run a task in a child process, killing it if it overruns its deadline or is cancelled"""
+        receiver, sender = self._mp_context.Pipe(duplex=False)
+        process = self._mp_context.Process(target=_run_in_child,
+                                           args=(self.handlers, task, sender), daemon=True)
+        process.start()
+        sender.close()
+        deadline = None if timeout is None else time.time() + timeout
+        try:
+            while True:
+                wait = CANCEL_CHECK_INTERVAL
+                if deadline is not None:
+                    wait = min(wait, max(0.0, deadline - time.time()))
+                if receiver.poll(wait):
+                    try:
+                        return receiver.recv()
+                    except EOFError:
+                        process.join()
+                        return {'status': 'failed',
+                                'error': f"Task process exited with code {process.exitcode}"}
+                if cancel is not None and cancel.is_set():
+                    process.kill()
+                    return {'status': 'failed', 'error': "Task cancelled"}
+                if deadline is not None and time.time() >= deadline:
+                    break
+            
+            process.kill()
+            logger.warning(f"Task {task['id']} exceeded its {timeout}s deadline; "
+                           f"killed process {process.pid}")
+            return {'status': 'failed', 'error': f"Task timed out after {timeout}s"}
+        finally:
+            process.join()
+            receiver.close()
+    
+    def _watch(self, deadline: float, task_id: str, entry: Dict[str, Any]) -> None:
+        """Register a thread-mode deadline with the watchdog"""
+        with self._deadline_condition:
+            heapq.heappush(self._deadlines,
+                           (deadline, next(self._deadline_sequence), task_id, entry))
+            if self._watchdog is None:
+                self._watchdog = threading.Thread(target=self._watchdog_loop, daemon=True)
+                self._watchdog.start()
+            self._deadline_condition.notify()
+    
+    def _watchdog_loop(self) -> None:
+        """Expire thread-mode tasks as their deadlines pass"""
+        while True:
+            with self._deadline_condition:
+                while not self._stopping:
+                    if self._deadlines:
+                        delay = self._deadlines[0][0] - time.time()
+                        if delay <= 0:
+                            break
+                        self._deadline_condition.wait(delay)
+                    else:
+                        self._deadline_condition.wait()
+                if self._stopping:
+                    return
+                _, _, task_id, entry = heapq.heappop(self._deadlines)
+            self._expire(task_id, entry)
+    
+    def _expire(self, task_id: str, entry: Dict[str, Any]) -> None:
+        """Report an overdue thread-mode task as timed out and ask it to stop"""
+        with self.lock:
+            # The entry may belong to a task that already finished or was cancelled
+            if (self.running_tasks.get(task_id) is not entry or entry['timed_out']
+                    or entry['cancelled']):
+                return
+            entry['timed_out'] = True
+            entry['cancel'].set()
+        
+        timeout = self.timeout_for(entry['task'])
+        logger.warning(f"Task {task_id} exceeded its {timeout}s deadline")
+        if self.on_task_complete:
+            self.on_task_complete(task_id, {
+                'status': 'failed',
+                'error': f"Task timed out after {timeout}s",
+                'execution_time': time.time() - entry['start_time'],
+                'attempt': entry['task'].get('attempts')
+            })
     
     def _task_completed(self, task_id: str, future):
         """Handle task completion"""
+        next_tasks = []
         with self.lock:
-            if task_id in self.running_tasks:
-                del self.running_tasks[task_id]
+            entry = self.running_tasks.pop(task_id, None)
+            if entry is not None:
+                self.used_slots -= entry['slots']
+            
+            # Start prefetched tasks without a round trip to the master, in
+            # order, as long as the next one fits in the freed slots
+            while self.run_queue and self._fits(self.run_queue[0]):
+                next_task = self.run_queue.popleft()
+                self._reserve(next_task)
+                next_tasks.append(next_task)
+        
+        for next_task in next_tasks:
+            self._launch(next_task)
+        self.slot_freed.set()
         
         try:
-            result = future.result()
-            logger.info(f"Task {task_id} completed with status: {result.get('status')}")
+            outcome = future.result()
+            logger.info(f"Task {task_id} completed with status: {outcome.get('status')}")
         except Exception as e:
             logger.error(f"Task {task_id} failed with exception: {e}")
+            outcome = {'status': 'failed', 'error': str(e)}
+        
+        if entry is not None:
+            if entry['timed_out'] or entry['cancelled']:
+                # Already reported when the deadline passed, or the master
+                # took the task back
+                return
+            outcome['execution_time'] = time.time() - entry['start_time']
+            outcome['attempt'] = entry['task'].get('attempts')
+        if self.on_task_complete:
+            self.on_task_complete(task_id, outcome)
+    
+    def cancel_task(self, task_id: str) -> bool:
+        """Drop a task the master took back, e.g. moved to another node
+        
+        A queued task is removed; a running one is asked to stop (a child
+        process is killed) and its outcome is not reported. Its slots stay
+        taken until it actually returns.
+        """
+        with self.lock:
+            for task in self.run_queue:
+                if task['id'] == task_id:
+                    self.run_queue.remove(task)
+                    logger.info(f"Dropped queued task {task_id}")
+                    return True
+            entry = self.running_tasks.get(task_id)
+            if entry is None or entry['cancelled']:
+                return False
+            entry['cancelled'] = True
+            entry['cancel'].set()
+        logger.info(f"Cancelled running task {task_id}")
+        return True
     
     def shutdown(self):
         """Shutdown the executor"""
+        with self._deadline_condition:
+            self._stopping = True
+            self._deadline_condition.notify()
         self.executor.shutdown(wait=True)
 
 
@@ -288,9 +634,61 @@ class WorkerService:
         self.config = config
         self.capabilities = PlatformDetector.get_capabilities()
         self.executor = TaskExecutor(config, self.capabilities)
+        self.executor.on_task_start = self._queue_started
+        self.executor.on_task_complete = self._queue_result
+        self.executor.fetch_inputs = self._fetch_inputs
+        blob_cache_dir = config.blob_cache_dir or os.path.join(
+            tempfile.gettempdir(), f'lancompute-blobs-{config.node_id}')
+        self.executor.blob_cache = BlobCache(blob_cache_dir, config.blob_cache_size)
+        self.executor.fetch_blob = self._fetch_blob
         self.running = False
         self.heartbeat_thread = None
+        self.poll_thread = None
+        # Task starts and outcomes waiting to be reported by the reporter thread
+        self.result_queue: Queue = Queue()
+        self.reporter_thread = None
         self.session = requests.Session()
+        # Long polls hold their connection open, so they get their own session
+        self.poll_session = requests.Session()
+        self.wire_format = MEDIA_JSON
+        self._set_wire_format(self._configured_wire_format())
+    
+    def _configured_wire_format(self) -> str:
+        """Media type for messages to the master, from config.wire_format"""
+        if self.config.wire_format == 'auto':
+            return MEDIA_MSGPACK if MEDIA_MSGPACK in available_formats() else MEDIA_JSON
+        media = WIRE_FORMATS.get(self.config.wire_format)
+        if media not in available_formats():
+            logger.warning(f"Wire format {self.config.wire_format} unavailable - using JSON")
+            return MEDIA_JSON
+        return media
+    
+    def _set_wire_format(self, media: str):
+        """Send messages as `media` and ask for responses in it, with JSON as fallback"""
+        self.wire_format = media
+        accept = MEDIA_JSON if media == MEDIA_JSON else f"{media}, {MEDIA_JSON};q=0.5"
+        for session in (self.session, self.poll_session):
+            session.headers['Accept'] = accept
+    
+    def _post(self, session: requests.Session, path: str, data: Any,
+              **kwargs) -> requests.Response:
+        """POST a message to the master in the wire format, compressed when large"""
+        body = encode(data, self.wire_format)
+        headers = {'Content-Type': self.wire_format}
+        threshold = self.config.compression_threshold
+        encoding = self.config.result_compression
+        if (threshold is not None and len(body) >= threshold
+                and encoding in available_encodings() and encoding != ENCODING_IDENTITY):
+            body = compress(body, encoding)
+            headers['Content-Encoding'] = encoding
+        return session.post(f"{self.config.master_url}{path}", data=body, headers=headers,
+                            **kwargs)
+    
+    @staticmethod
+    def _decode(response: requests.Response) -> Any:
+        """Parse a master response in whichever format it was sent"""
+        media = media_type(response.headers.get('Content-Type'))
+        return response.json() if media == MEDIA_JSON else decode(response.content, media)
     
     def start(self):
         """Start the worker service"""
@@ -309,6 +707,15 @@ class WorkerService:
         self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
         self.heartbeat_thread.start()
         
+        # Start the thread that uploads task results
+        self.reporter_thread = threading.Thread(target=self._report_loop, daemon=True)
+        self.reporter_thread.start()
+        
+        # Start the long-poll thread that receives pushed tasks
+        if self.config.dispatch_mode == 'poll':
+            self.poll_thread = threading.Thread(target=self._poll_loop, daemon=True)
+            self.poll_thread.start()
+        
         # Handle shutdown signals
         signal.signal(signal.SIGINT, self._handle_shutdown)
         signal.signal(signal.SIGTERM, self._handle_shutdown)
@@ -334,14 +741,21 @@ class WorkerService:
                 'id': self.config.node_id,
                 'address': local_ip,
                 'port': 0,  # Not running a server
-                'capabilities': self.capabilities
+                'capabilities': self.capabilities,
+                'slots': self.executor.slots,
+                'prefetch_depth': self.config.prefetch_depth,
+                'blobs': self.executor.blob_cache.digests()
             }
             
-            response = self.session.post(
-                f"{self.config.master_url}/node/register",
-                json=data,
-                timeout=5
-            )
+            response = self._post(self.session, '/node/register', data, timeout=5)
+            if (response.status_code in (400, 415)
+                    and (self.wire_format != MEDIA_JSON or self.config.compression_threshold)):
+                # An older master reads only uncompressed JSON
+                logger.warning("Master rejected the binary or compressed registration - "
+                               "sending plain JSON")
+                self._set_wire_format(MEDIA_JSON)
+                self.config.compression_threshold = None
+                response = self._post(self.session, '/node/register', data, timeout=5)
             
             if response.status_code == 200:
                 logger.info("Successfully registered with master")
@@ -360,24 +774,29 @@ class WorkerService:
         
         while self.running:
             try:
-                # Send heartbeat
-                response = self.session.post(
-                    f"{self.config.master_url}/node/heartbeat",
-                    json={'node_id': self.config.node_id},
-                    timeout=5
-                )
+                # Send heartbeat with slot accounting, load and cached blobs; tasks
+                # are only pulled here when they are not pushed over the long poll
+                data = {'node_id': self.config.node_id, **self.executor.slot_stats(),
+                        'load': psutil.getloadavg()[0],
+                        'cpu_percent': psutil.cpu_percent(interval=None),
+                        'memory_percent': psutil.virtual_memory().percent,
+                        'blobs': self.executor.blob_cache.digests()}
+                data['want'] = (self.executor.wanted_tasks()
+                                if self.config.dispatch_mode == 'heartbeat' else 0)
+                response = self._post(self.session, '/node/heartbeat', data, timeout=5)
                 
                 if response.status_code == 200:
                     consecutive_failures = 0
-                    data = response.json()
+                    data = self._decode(response)
                     
-                    # Check if master assigned a task
+                    # Check if master assigned tasks or took any back
+                    for task_id in data.get('cancel', []):
+                        self.executor.cancel_task(task_id)
+                    tasks = data.get('tasks', [])
                     if 'task' in data:
-                        task = data['task']
-                        if self.executor.can_accept_task():
-                            self._accept_task(task)
-                        else:
-                            logger.warning("Cannot accept task - at capacity")
+                        tasks.append(data['task'])
+                    for task in tasks:
+                        self._accept_task(task)
                 else:
                     consecutive_failures += 1
                     logger.warning(f"Heartbeat failed: {response.status_code}")
@@ -393,36 +812,209 @@ class WorkerService:
             else:
                 time.sleep(self.config.heartbeat_interval)
     
+    def _poll_loop(self):
+        """Receive tasks pushed by the master over a long poll"""
+        while self.running:
+            if self.executor.wanted_tasks() <= 0:
+                # Wait for a slot instead of polling for work we cannot take
+                self.executor.slot_freed.wait(timeout=self.config.poll_timeout)
+                self.executor.slot_freed.clear()
+                continue
+            
+            try:
+                if not self._poll_once():
+                    logger.warning("Master does not support push dispatch - "
+                                   "falling back to heartbeat delivery")
+                    self.config.dispatch_mode = 'heartbeat'
+                    return
+            except Exception as e:
+                logger.error(f"Poll error: {e}")
+                time.sleep(self.config.heartbeat_interval)
+    
+    def _poll_once(self) -> bool:
+        """Run one long poll; returns False if the master lacks /node/poll"""
+        response = self._post(
+            self.poll_session, '/node/poll',
+            {
+                'node_id': self.config.node_id,
+                'timeout': self.config.poll_timeout,
+                'max_tasks': max(1, self.executor.wanted_tasks()),
+                **self.executor.slot_stats()
+            },
+            timeout=(5, self.config.poll_timeout + 10)
+        )
+        
+        # A 404 for an unknown node is transient; any other 404 means an
+        # older master without the poll endpoint
+        if response.status_code == 404 and 'Node not found' not in response.text:
+            return False
+        
+        if response.status_code != 200:
+            logger.warning(f"Poll failed: {response.status_code}")
+            time.sleep(self.config.heartbeat_interval)
+            return True
+        
+        data = self._decode(response)
+        for task_id in data.get('cancel', []):
+            self.executor.cancel_task(task_id)
+        for task in data.get('tasks', []):
+            self._accept_task(task)
+        return True
+    
+    def _fetch_inputs(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Download the results of a task's parents, keyed by parent task id"""
+        inputs = {}
+        for parent_id in task['depends_on']:
+            response = self.session.get(f"{self.config.master_url}/task/{parent_id}/result",
+                                        timeout=30)
+            response.raise_for_status()
+            inputs[parent_id] = self._decode(response)
+        return inputs
+    
+    def _fetch_blob(self, digest: str) -> Iterable[bytes]:
+        """Download a blob from the master as a stream of chunks
+        
+        A dropped connection is retried with a Range request for the rest,
+        so a multi-GB download does not start over.
+        """
+        received = 0
+        for attempt in range(1, BLOB_FETCH_ATTEMPTS + 1):
+            headers = {'Range': f"bytes={received}-"} if received else None
+            try:
+                with self.session.get(f"{self.config.master_url}/blob/{digest}",
+                                      headers=headers, stream=True,
+                                      timeout=(5, 300)) as response:
+                    response.raise_for_status()
+                    if received and response.status_code != 206:
+                        raise RuntimeError(f"Master cannot resume blob {digest}")
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        received += len(chunk)
+                        yield chunk
+                return
+            except (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == BLOB_FETCH_ATTEMPTS:
+                    raise
+                logger.warning(f"Download of blob {digest} interrupted after {received} "
+                               f"bytes ({e}); resuming")
+    
     def _accept_task(self, task: Dict[str, Any]):
         """Accept and execute a task"""
         task_id = task['id']
+        if self.executor.has_task(task_id):
+            # Redelivered, e.g. after a master restart
+            logger.info(f"Ignoring duplicate delivery of task {task_id}")
+            return
         logger.info(f"Accepting task {task_id}")
         
-        # Update task status to running
-        self._update_task_status(task_id, 'running')
-        
-        # Execute task
-        self.executor.execute_task(task)
+        # Run now or hold in the local run queue; once the task actually
+        # starts, and when it finishes, the executor queues a report for the
+        # reporter thread
+        self.executor.submit_task(task)
+    
+    def _queue_started(self, task: Dict[str, Any]):
+        """Hand a task that just started to the reporter, to report it running"""
+        self.result_queue.put((task['id'], {'status': 'running',
+                                            'attempt': task.get('attempts')}))
+    
+    def _queue_result(self, task_id: str, outcome: Dict[str, Any]):
+        """Hand a finished task to the reporter (called from the done-callback)"""
+        self.result_queue.put((task_id, outcome))
+    
+    def _report_loop(self):
+        """Report task starts and upload outcomes, in the order they happen"""
+        while self.running:
+            try:
+                task_id, outcome = self.result_queue.get(timeout=1)
+            except Empty:
+                continue
+            self._report_result(task_id, outcome)
+    
+    def _report_result(self, task_id: str, outcome: Dict[str, Any]):
+        """Report a task outcome, streaming large results in chunks"""
+        status = outcome.get('status', 'failed')
+        execution_time = outcome.get('execution_time')
+        attempt = outcome.get('attempt')
         
-        # Monitor task completion in background
-        threading.Thread(
-            target=self._monitor_task,
-            args=(task_id,),
-            daemon=True
-        ).start()
+        if status == 'completed':
+            try:
+                body = encode(outcome.get('result'), self.wire_format, strict=True)
+            except (TypeError, ValueError) as e:
+                self._update_task_status(task_id, 'failed', execution_time=execution_time,
+                                         error=f"Result is not serializable: {e}",
+                                         attempt=attempt)
+                return
+            
+            if len(body) > self.config.result_stream_threshold:
+                if self._stream_result(task_id, body, execution_time, attempt):
+                    return
+                # Fall through and inline the result if streaming failed
+            self._update_task_status(task_id, status, result=outcome.get('result'),
+                                     execution_time=execution_time, attempt=attempt)
+        else:
+            self._update_task_status(task_id, status, error=outcome.get('error'),
+                                     execution_time=execution_time, attempt=attempt)
     
-    def _monitor_task(self, task_id: str):
-        """Monitor task execution and report completion"""
-        # Wait for task to complete
-        while task_id in self.executor.running_tasks:
-            time.sleep(1)
+    def _stream_result(self, task_id: str, body: bytes, execution_time: Optional[float],
+                       attempt: Optional[int] = None) -> bool:
+        """Upload a large encoded result with chunked, optionally compressed, transfer
         
-        # Task completed - need to get result from executor
-        # In a real implementation, we'd store results properly
-        self._update_task_status(task_id, 'completed', result={'status': 'done'})
+        Returns False if the result should be sent inline instead.
+        """
+        encoding = self.config.result_compression
+        if encoding not in available_encodings():
+            logger.warning(f"{encoding} compression unavailable - using {ENCODING_DEFLATE}")
+            encoding = self.config.result_compression = ENCODING_DEFLATE
+        for content_encoding in (encoding, ENCODING_IDENTITY):
+            headers = {
+                'Content-Type': self.wire_format,
+                'X-Task-Id': task_id,
+                'X-Node-Id': self.config.node_id,
+                'X-Task-Status': 'completed'
+            }
+            if execution_time is not None:
+                headers['X-Execution-Time'] = f"{execution_time:.6f}"
+            if attempt is not None:
+                headers['X-Task-Attempt'] = str(attempt)
+            if content_encoding != ENCODING_IDENTITY:
+                headers['Content-Encoding'] = content_encoding
+            
+            try:
+                # A generator body makes requests use chunked transfer encoding
+                response = self.session.post(
+                    f"{self.config.master_url}/task/result",
+                    data=iter_compressed(iter_chunks(body), content_encoding),
+                    headers=headers,
+                    timeout=(5, 300)
+                )
+            except Exception as e:
+                logger.error(f"Error streaming result for task {task_id}: {e}")
+                return False
+            
+            if response.status_code == 200:
+                logger.info(f"Task {task_id} result streamed ({len(body)} bytes, {content_encoding})")
+                return True
+            if response.status_code == 413:
+                # Inlining it would not fare better; the task fails instead
+                logger.error(f"Result of task {task_id} ({len(body)} bytes) is larger "
+                             f"than the master accepts")
+                self._update_task_status(task_id, 'failed', execution_time=execution_time,
+                                         error=f"Result of {len(body)} bytes is larger "
+                                               f"than the master accepts",
+                                         attempt=attempt)
+                return True
+            if response.status_code == 415 and content_encoding != ENCODING_IDENTITY:
+                # Master cannot decode this encoding; retry uncompressed
+                continue
+            logger.error(f"Failed to stream result for task {task_id}: "
+                         f"{response.status_code}")
+            return False
+        return False
     
     def _update_task_status(self, task_id: str, status: str, 
-                           result: Any = None, error: str = None):
+                           result: Any = None, error: str = None,
+                           execution_time: Optional[float] = None,
+                           attempt: Optional[int] = None):
         """Update task status with master"""
         try:
             data = {
@@ -435,15 +1027,21 @@ class WorkerService:
                 data['result'] = result
             if error is not None:
                 data['error'] = error
+            if execution_time is not None:
+                data['execution_time'] = execution_time
+            if attempt is not None:
+                # Lets the master ignore reports from a superseded attempt
+                data['attempt'] = attempt
             
-            response = self.session.post(
-                f"{self.config.master_url}/task/update",
-                json=data,
-                timeout=5
-            )
+            response = self._post(self.session, '/task/update', data, timeout=5)
             
             if response.status_code == 200:
                 logger.info(f"Task {task_id} status updated to {status}")
+            elif response.status_code == 409:
+                logger.warning(f"Task {task_id} was reassigned; dropped {status} update")
+                if status == 'running':
+                    # Moved to another node before it started here
+                    self.executor.cancel_task(task_id)
             else:
                 logger.error(f"Failed to update task status: {response.status_code}")
                 
@@ -455,6 +1053,10 @@ class WorkerService:
         logger.info("Shutting down worker service...")
         self.running = False
         self.executor.shutdown()
+        
+        # Report whatever finished while the executor drained
+        while not self.result_queue.empty():
+            self._report_result(*self.result_queue.get_nowait())
         sys.exit(0)
 
 
@@ -467,14 +1069,33 @@ def main():
                        help='Master service URL (e.g., http://192.168.1.100:8080)')
     parser.add_argument('--node-id', default=None,
                        help='Unique node ID (auto-generated if not provided)')
-    parser.add_argument('--max-tasks', type=int, default=2,
-                       help='Maximum concurrent tasks')
+    parser.add_argument('--max-tasks', type=int, default=None,
+                       help='Maximum concurrent tasks (default: executor pool size)')
+    parser.add_argument('--prefetch', type=int, default=2,
+                       help='Extra tasks to fetch ahead into the local run queue')
     parser.add_argument('--heartbeat-interval', type=float, default=10.0,
                        help='Heartbeat interval in seconds')
     parser.add_argument('--executor', choices=['thread', 'process'], default='thread',
                        help='Executor type')
     parser.add_argument('--max-workers', type=int, default=None,
                        help='Maximum worker threads/processes')
+    parser.add_argument('--task-timeout', type=float, default=None,
+                       help='Deadline in seconds for tasks that do not set their own')
+    parser.add_argument('--compression', default=ENCODING_DEFLATE,
+                       choices=[ENCODING_DEFLATE, ENCODING_ZSTD, ENCODING_IDENTITY],
+                       help='Content encoding for streamed results and large messages')
+    parser.add_argument('--compression-threshold', type=int, default=1024,
+                       help='Compress messages to the master of at least this many bytes')
+    parser.add_argument('--wire-format', choices=['auto', *WIRE_FORMATS], default='auto',
+                       help='Message format: msgpack (auto, when installed), cbor or json')
+    parser.add_argument('--stream-threshold', type=int, default=1024 * 1024,
+                       help='Stream results larger than this many bytes in chunks')
+    parser.add_argument('--dispatch', choices=['poll', 'heartbeat'], default='poll',
+                       help='Receive tasks pushed over a long poll, or only on heartbeats')
+    parser.add_argument('--blob-cache-dir', default=None,
+                       help='Directory caching task input blobs (default: in the temp dir)')
+    parser.add_argument('--blob-cache-gb', type=float, default=10.0,
+                       help='Size limit of the blob cache in GB')
     parser.add_argument('--log-level', default='INFO',
                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
                        help='Logging level')
@@ -494,9 +1115,18 @@ def main():
         node_id=args.node_id,
         master_url=args.master_url.rstrip('/'),
         max_concurrent_tasks=args.max_tasks,
+        prefetch_depth=args.prefetch,
         heartbeat_interval=args.heartbeat_interval,
         executor_type=args.executor,
-        max_workers=args.max_workers
+        max_workers=args.max_workers,
+        dispatch_mode=args.dispatch,
+        result_stream_threshold=args.stream_threshold,
+        result_compression=args.compression,
+        compression_threshold=args.compression_threshold,
+        wire_format=args.wire_format,
+        task_timeout=args.task_timeout,
+        blob_cache_dir=args.blob_cache_dir,
+        blob_cache_size=int(args.blob_cache_gb * 1024 ** 3)
     )
     
     # Start worker service
@@ -0,0 +1,166 @@
+"""Tests for blobs module."""
+import hashlib
+import os
+import threading
+import pytest
+from src.lancompute.blobs import BlobCache, BlobStore, UploadConflict, is_digest
+
+
+def digest_of(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class TestBlobStore:
+    """Test cases for the master's blob store."""
+
+    def test_put_stores_content_under_its_digest(self, tmp_path):
+        """Test that uploads are addressed by SHA-256 and stored whole."""
+        store = BlobStore(str(tmp_path / "blobs"))
+        digest, size = store.put([b"hello ", b"world"])
+        assert digest == digest_of(b"hello world")
+        assert size == 11
+        assert store.size(digest) == 11
+        with store.open(digest) as f:
+            assert f.read() == b"hello world"
+        # Same content again is the same blob
+        assert store.put([b"hello world"]) == (digest, 11)
+        assert not store.exists(digest_of(b"other"))
+        assert not store.exists("../escape")
+
+    def test_put_rejects_content_not_matching_digest(self, tmp_path):
+        """Test that an upload checked against a digest leaves nothing behind."""
+        store = BlobStore(str(tmp_path))
+        expected = digest_of(b"expected")
+        with pytest.raises(ValueError, match="does not match"):
+            store.put([b"something else"], expected)
+        assert not store.exists(expected)
+        assert os.listdir(tmp_path) == []
+
+    def test_resumable_upload_continues_after_restart(self, tmp_path):
+        """Test ranged writes, gaps, interrupted bodies and resuming in a new store."""
+        data = bytes(range(256)) * 40
+        digest = digest_of(data)
+        store = BlobStore(str(tmp_path))
+        assert store.upload_offset(digest) is None
+        assert store.write_upload(digest, [data[:4000]], 0, None) == (4000, False)
+        with pytest.raises(UploadConflict) as conflict:
+            store.write_upload(digest, [data[5000:6000]], 5000, len(data))
+        assert conflict.value.offset == 4000
+
+        def interrupted():
+            yield data[4000:6000]
+            raise ValueError("Request body ended early")
+
+        with pytest.raises(ValueError):
+            store.write_upload(digest, interrupted(), 4000, len(data))
+        assert store.upload_offset(digest) == 6000
+
+        # A restarted master rebuilds the running hash from the kept bytes
+        store = BlobStore(str(tmp_path))
+        assert store.write_upload(digest, [data[5000:]], 5000, len(data)) == (len(data), True)
+        assert store.size(digest) == len(data)
+        assert store.upload_offset(digest) is None
+        with store.open(digest) as f:
+            assert f.read() == data
+
+    def test_completed_upload_must_match_digest(self, tmp_path):
+        """Test that a finished upload with the wrong content is discarded."""
+        store = BlobStore(str(tmp_path))
+        digest = digest_of(b"expected")
+        with pytest.raises(ValueError, match="does not match"):
+            store.write_upload(digest, [b"wrong!!!"], 0, 8)
+        assert store.upload_offset(digest) is None
+        assert not store.exists(digest)
+
+    def test_abandoned_uploads_expire(self, tmp_path):
+        """Test that idle partial uploads are removed."""
+        store = BlobStore(str(tmp_path))
+        digest = digest_of(b"never finished")
+        store.write_upload(digest, [b"never"], 0, None)
+        assert store.expire_uploads(3600) == 0
+        assert store.expire_uploads(-1) == 1
+        assert store.upload_offset(digest) is None
+
+
+class TestBlobCache:
+    """Test cases for the worker's LRU blob cache."""
+
+    def _fetcher(self, blobs, calls):
+        def fetch(digest):
+            calls.append(digest)
+            yield blobs[digest]
+        return fetch
+
+    def test_least_recently_used_unpinned_blobs_are_evicted(self, tmp_path):
+        """Test eviction order and that pinned blobs are kept."""
+        blobs = {digest_of(data): data for data in (b"a" * 40, b"b" * 40, b"c" * 40)}
+        a, b, c = blobs
+        calls = []
+        fetch = self._fetcher(blobs, calls)
+        cache = BlobCache(str(tmp_path), max_bytes=100)
+
+        for digest in (a, b):
+            cache.acquire(digest, fetch)
+            cache.release(digest)
+        cache.acquire(a, fetch)  # a is now the most recently used, and pinned
+        cache.acquire(c, fetch)
+        assert sorted(cache.digests()) == sorted([a, c])
+        assert calls == [a, b, c]
+        assert cache.stats()["hits"] == 1
+
+        # Over the limit while everything is pinned; released blobs go first
+        cache.acquire(b, fetch)
+        assert cache.total_bytes == 120
+        cache.release(a)
+        assert sorted(cache.digests()) == sorted([b, c])
+        assert not os.path.exists(cache.path(a))
+
+    def test_concurrent_requests_share_one_download(self, tmp_path):
+        """Test that tasks needing the same missing blob download it once."""
+        data = b"x" * 1000
+        digest = digest_of(data)
+        started = threading.Event()
+        proceed = threading.Event()
+        calls = []
+
+        def fetch(requested):
+            calls.append(requested)
+            started.set()
+            proceed.wait(5)
+            yield data
+
+        cache = BlobCache(str(tmp_path), max_bytes=10000)
+        paths = []
+        threads = [threading.Thread(target=lambda: paths.append(cache.acquire(digest, fetch)))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        assert started.wait(5)
+        assert cache.digests() == [digest]
+        proceed.set()
+        for thread in threads:
+            thread.join(5)
+        assert calls == [digest]
+        assert paths == [cache.path(digest)] * 3
+
+    def test_corrupt_download_is_rejected(self, tmp_path):
+        """Test that content not matching its digest is not cached."""
+        cache = BlobCache(str(tmp_path), max_bytes=1000)
+        digest = digest_of(b"good")
+        with pytest.raises(ValueError):
+            cache.acquire(digest, lambda _: iter([b"bad"]))
+        assert cache.digests() == []
+        assert os.listdir(tmp_path) == []
+
+    def test_cache_survives_restart(self, tmp_path):
+        """Test that blobs already on disk are reused by a new cache."""
+        data = b"model weights"
+        digest = digest_of(data)
+        BlobCache(str(tmp_path), 1000).acquire(digest, lambda _: iter([data]))
+        (tmp_path / ".partial-leftover").write_bytes(b"junk")
+
+        cache = BlobCache(str(tmp_path), 1000)
+        assert cache.digests() == [digest]
+        assert cache.total_bytes == len(data)
+        assert not (tmp_path / ".partial-leftover").exists()
+        assert is_digest(digest) and not is_digest(digest.upper())
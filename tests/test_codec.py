@@ -0,0 +1,135 @@
+"""Tests for codec module."""
+import array
+import zlib
+from enum import Enum
+
+import pytest
+from src.lancompute.codec import (
+    DECOMPRESS_CHUNK, ENCODING_DEFLATE, ENCODING_IDENTITY, MEDIA_CBOR, MEDIA_JSON,
+    MEDIA_MSGPACK, BodyTooLargeError, available_encodings, available_formats, decode, encode, iter_chunks, iter_compressed,
+    iter_decompressed, media_type, negotiate
+)
+
+
+class Color(Enum):
+    RED = "red"
+
+
+class TestStreamingCompression:
+    """Test cases for the streaming compression helpers."""
+
+    @pytest.mark.parametrize("encoding", available_encodings())
+    def test_roundtrip(self, encoding):
+        """Test that compressed chunks decompress to the original bytes."""
+        data = b'{"values": [' + b', '.join(str(i).encode() for i in range(50000)) + b']}'
+        compressed = list(iter_compressed(iter_chunks(data, 4096), encoding))
+        assert b''.join(iter_decompressed(compressed, encoding)) == data
+
+    def test_identity_passes_chunks_through(self):
+        """Test that identity encoding does not touch the chunks."""
+        chunks = [b'abc', b'def']
+        assert list(iter_compressed(chunks, ENCODING_IDENTITY)) == chunks
+
+    def test_corrupt_stream(self):
+        """Test that corrupt input raises ValueError."""
+        with pytest.raises(ValueError):
+            list(iter_decompressed([b'not deflate at all'], ENCODING_DEFLATE))
+
+    def test_truncated_stream(self):
+        """Test that a stream cut short raises ValueError."""
+        compressed = zlib.compress(b'x' * 100000)
+        with pytest.raises(ValueError):
+            list(iter_decompressed([compressed[:len(compressed) // 2]], ENCODING_DEFLATE))
+
+    @pytest.mark.parametrize("encoding", available_encodings())
+    def test_decompressed_size_is_limited(self, encoding):
+        """Test that output comes in bounded pieces and stops at max_size."""
+        data = b'\0' * (4 * 1024 * 1024)
+        compressed = list(iter_compressed([data], encoding))
+        pieces = iter_decompressed(compressed, encoding, max_size=1024 * 1024)
+        received = 0
+        with pytest.raises(BodyTooLargeError):
+            for piece in pieces:
+                assert len(piece) <= max(DECOMPRESS_CHUNK, len(compressed[0]))
+                received += len(piece)
+        assert received <= 1024 * 1024
+        assert b''.join(iter_decompressed(compressed, encoding, max_size=len(data))) == data
+
+    def test_unsupported_encoding(self):
+        """Test that unknown encodings are rejected."""
+        with pytest.raises(ValueError):
+            list(iter_compressed([b'data'], 'br'))
+
+    def test_iter_chunks(self):
+        """Test splitting bytes into fixed-size chunks."""
+        assert list(iter_chunks(b'abcdefg', 3)) == [b'abc', b'def', b'g']
+
+
+class TestMessageFormats:
+    """Test cases for the negotiated message encodings."""
+
+    MESSAGE = {
+        "id": "task-1", "priority": -3, "big": 2 ** 70, "ratio": 0.1, "done": False,
+        "missing": None, "text": "h\u00e9llo", "nested": {"list": [1, [2, {"x": 3}]]},
+        7: "integer key",
+    }
+
+    @pytest.mark.parametrize("media", available_formats())
+    def test_roundtrip(self, media):
+        """Test that every format reproduces plain data."""
+        expected = dict(self.MESSAGE)
+        if media == MEDIA_JSON:
+            expected["7"] = expected.pop(7)
+        assert decode(encode(self.MESSAGE, media), media) == expected
+
+    @pytest.mark.parametrize("media", [m for m in available_formats() if m != MEDIA_JSON])
+    def test_typed_arrays_travel_as_raw_buffers(self, media):
+        """Test that numeric arrays keep their element type in binary formats."""
+        arrays = [array.array(code, [1, 2, 3]) for code in "bBhHiIqQfd"]
+        body = encode({"arrays": arrays, "bytes": b"\x00\xff"}, media)
+        decoded = decode(body, media)
+        assert decoded["arrays"] == arrays
+        assert [a.itemsize for a in decoded["arrays"]] == [a.itemsize for a in arrays]
+        assert decoded["bytes"] == b"\x00\xff"
+        vector = array.array("d", range(10000))
+        assert len(encode(vector, media)) < 8 * len(vector) + 16
+
+    def test_json_fallback_converts_values(self):
+        """Test that JSON gets arrays as lists and enums as their values."""
+        body = encode({"vector": array.array("f", [0.5]), "color": Color.RED})
+        assert decode(body) == {"vector": [0.5], "color": "red"}
+        assert decode(encode({"color": Color.RED}, MEDIA_CBOR), MEDIA_CBOR) == {
+            "color": "red"}
+
+    @pytest.mark.parametrize("media", available_formats())
+    def test_strict_encoding_rejects_unknown_objects(self, media):
+        """Test that strict mode refuses to stringify arbitrary objects."""
+        assert isinstance(decode(encode({"x": object()}, media), media)["x"], str)
+        with pytest.raises(TypeError):
+            encode({"x": object()}, media, strict=True)
+
+    @pytest.mark.parametrize("body", [b"", b"\x9f\xff", b"\x82\x01", b"\x01\x02",
+                                      b"\xa1\x80\x01", b"\x62\xff\xfe"])
+    def test_malformed_cbor(self, body):
+        """Test that truncated, trailing or invalid CBOR raises ValueError."""
+        with pytest.raises(ValueError):
+            decode(body, MEDIA_CBOR)
+
+    def test_media_type(self):
+        """Test that only binary types change how a body is read."""
+        assert media_type("application/cbor; charset=binary") == MEDIA_CBOR
+        assert media_type("application/x-msgpack") == MEDIA_MSGPACK
+        assert media_type("application/x-www-form-urlencoded") == MEDIA_JSON
+        assert media_type(None) == MEDIA_JSON
+
+    def test_negotiate(self):
+        """Test quality values, wildcards and the implicit identity encoding."""
+        offered = [MEDIA_JSON, MEDIA_CBOR]
+        assert negotiate(None, offered) is None
+        assert negotiate("*/*", offered) == MEDIA_JSON
+        assert negotiate("application/cbor, application/json;q=0.5", offered) == MEDIA_CBOR
+        assert negotiate("text/html", offered) is None
+        encodings = [ENCODING_DEFLATE, ENCODING_IDENTITY]
+        assert negotiate("gzip, deflate", encodings) == ENCODING_DEFLATE
+        assert negotiate("gzip", encodings) == ENCODING_IDENTITY
+        assert negotiate("deflate;q=0, identity;q=0", encodings) is None
@@ -0,0 +1,187 @@
+"""Tests for discovery module."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from src.lancompute.discovery import LLMDiscovery, chat_request, endpoint_node_id
+from src.lancompute.gateway import InferenceGateway
+from src.lancompute.inventory import HostInventory
+from src.lancompute.master_service import MasterService, NodeStatus, Task, TaskStatus
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible endpoint answering from the server's model list."""
+
+    def do_GET(self):
+        if self.path == "/v1/models":
+            self._reply(200, {"object": "list",
+                              "data": [{"id": m, "object": "model"}
+                                       for m in self.server.models]})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        if body["model"] not in self.server.models:
+            self._reply(404, {"error": f"model {body['model']} not loaded"})
+            return
+        content = f"{body['model']}: {body['messages'][-1]['content']}"
+        self._reply(200, {"model": body["model"],
+                          "choices": [{"message": {"role": "assistant", "content": content}}]})
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def llm_server():
+    """Run a stub LLM endpoint on an ephemeral port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubLLMHandler)
+    server.models = ["qwen2.5-7b", "llama-3.2-3b"]
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class TestLLMDiscovery:
+    """Test cases for enrolling LLM endpoints as nodes."""
+
+    def test_endpoints_are_enrolled_with_their_models(self, llm_server):
+        """Test that an endpoint answering /v1/models becomes a node."""
+        master = MasterService(host="127.0.0.1", port=0)
+        port = llm_server.server_address[1]
+        discovery = LLMDiscovery(master, networks=[],
+                                 endpoints=[f"127.0.0.1:{port}", "127.0.0.1:1"])
+        assert discovery.discover() == 1
+        assert discovery.discover() == 0
+
+        node = master.node_manager.get_node(endpoint_node_id("127.0.0.1", port))
+        assert node.capabilities["models"] == ["qwen2.5-7b", "llama-3.2-3b"]
+        assert node.capabilities["service"] == "openai"
+        assert node.slots == 1
+        assert discovery.stats()["endpoints"] == 1
+
+    def test_enrolled_endpoints_join_the_gateway(self, llm_server):
+        """Test that the gateway serves the models of discovered endpoints."""
+        master = MasterService(host="127.0.0.1", port=0)
+        master.gateway = InferenceGateway()
+        port = llm_server.server_address[1]
+        LLMDiscovery(master, networks=[], endpoints=[f"127.0.0.1:{port}"]).discover()
+        assert master.gateway.models() == ["llama-3.2-3b", "qwen2.5-7b"]
+
+    def test_scanned_network_and_inventory(self, llm_server, tmp_path):
+        """Test discovery through the scanner, remembered in the host inventory."""
+        master = MasterService(host="127.0.0.1", port=0)
+        port = llm_server.server_address[1]
+        inventory = HostInventory(str(tmp_path / "hosts.db"))
+        discovery = LLMDiscovery(master, networks=["127.0.0.0/30"], ports=[port],
+                                 inventory=inventory)
+        assert discovery.discover() == 1
+        assert inventory.get("127.0.0.1")["open_ports"] == [port]
+
+        # A new master finds the endpoint from the inventory without rescanning it
+        master = MasterService(host="127.0.0.1", port=0)
+        discovery = LLMDiscovery(master, networks=["127.0.0.0/30"], ports=[port],
+                                 inventory=inventory)
+        assert discovery.discover() == 1
+        assert master.node_manager.get_node(endpoint_node_id("127.0.0.1", port))
+        inventory.close()
+
+    def test_only_tasks_naming_a_served_model_are_routed(self, llm_server):
+        """Test model-aware routing and that other tasks stay off endpoints."""
+        master = MasterService(host="127.0.0.1", port=0)
+        port = llm_server.server_address[1]
+        discovery = LLMDiscovery(master, networks=[], endpoints=[f"http://127.0.0.1:{port}"])
+        discovery.running = True
+        discovery.discover()
+        node_id = endpoint_node_id("127.0.0.1", port)
+
+        master.task_queue.add_task(Task("plain", "ml_inference", {"model": "x"}))
+        master.task_queue.add_task(Task("other-model", "ml_inference", {"prompt": "hi"},
+                                        requirements={"models": "mistral-7b"}))
+        master.task_queue.add_task(Task("qwen", "ml_inference",
+                                        {"prompt": "Say hi", "max_tokens": 8},
+                                        requirements={"models": "qwen2.5-7b"}))
+        assert master.scheduler.schedule() == 1
+        try:
+            wait_for(lambda: master.task_queue.get_task("qwen").status == TaskStatus.COMPLETED)
+        finally:
+            discovery.stop()
+
+        result = master.task_queue.get_result("qwen")
+        assert result["choices"][0]["message"]["content"] == "qwen2.5-7b: Say hi"
+        assert llm_server.requests[-1]["max_tokens"] == 8
+        assert master.task_queue.get_task("qwen").assigned_node == node_id
+        assert master.task_queue.get_task("plain").status == TaskStatus.PENDING
+        assert master.task_queue.get_task("other-model").status == TaskStatus.PENDING
+        assert master.node_manager.get_node(node_id).used_slots == 0
+
+    def test_health_checks_refresh_models_and_heartbeat(self, llm_server):
+        """Test that model changes are picked up and silent endpoints go offline."""
+        master = MasterService(host="127.0.0.1", port=0)
+        master.node_manager.heartbeat_timeout = 0.2
+        port = llm_server.server_address[1]
+        discovery = LLMDiscovery(master, networks=[], endpoints=[f"127.0.0.1:{port}"])
+        discovery.discover()
+        node_id = endpoint_node_id("127.0.0.1", port)
+
+        llm_server.models = ["mistral-7b"]
+        discovery.check_health()
+        node = master.node_manager.get_node(node_id)
+        assert node.capabilities["models"] == ["mistral-7b"]
+
+        llm_server.shutdown()
+        llm_server.server_close()
+        time.sleep(0.3)
+        discovery.check_health()
+        assert master.node_manager.get_online_nodes() == []
+        assert node.status == NodeStatus.OFFLINE
+
+    def test_unreachable_endpoint_gives_task_back(self, llm_server):
+        """Test that a task is retried when its endpoint stops answering."""
+        master = MasterService(host="127.0.0.1", port=0)
+        port = llm_server.server_address[1]
+        discovery = LLMDiscovery(master, networks=[], endpoints=[f"127.0.0.1:{port}"])
+        discovery.discover()
+        node_id = endpoint_node_id("127.0.0.1", port)
+        llm_server.shutdown()
+        llm_server.server_close()
+
+        master.task_queue.add_task(Task("t", "ml_inference", {"prompt": "hi"},
+                                        requirements={"models": "qwen2.5-7b"}))
+        master.scheduler.schedule()
+        task = master.dispatcher.take(node_id)[0]
+        discovery.run_task(node_id, task)
+        task = master.task_queue.get_task("t")
+        assert task.status == TaskStatus.PENDING
+        assert "failed" in task.error
+        assert master.node_manager.get_node(node_id).used_slots == 0
+
+    def test_chat_request_from_prompt(self):
+        """Test building chat completion requests from task payloads."""
+        assert chat_request({"prompt": "Hi", "system": "Be brief", "temperature": 0}, "m") == {
+            "model": "m", "stream": False, "temperature": 0,
+            "messages": [{"role": "system", "content": "Be brief"},
+                         {"role": "user", "content": "Hi"}]}
+        messages = [{"role": "user", "content": "Hello"}]
+        assert chat_request({"model": "ignored", "messages": messages}, "m") == {
+            "model": "m", "stream": False, "messages": messages}
@@ -0,0 +1,43 @@
+"""Tests for events module."""
+from src.lancompute.events import EventBus
+
+
+class TestEventBus:
+    """Test cases for EventBus routing and buffering."""
+
+    def test_routes_by_task_job_and_status(self):
+        """Test that subscribers only receive events matching their filters."""
+        bus = EventBus()
+        by_task = bus.subscribe(task_ids=["t1"])
+        by_job = bus.subscribe(job_ids=["j1"], statuses=["completed"])
+        everything = bus.subscribe()
+
+        bus.publish({"task_id": "t1", "job_id": None, "status": "running"})
+        bus.publish({"task_id": "t2", "job_id": "j1", "status": "running"})
+        bus.publish({"task_id": "t3", "job_id": "j1", "status": "completed"})
+
+        assert [e["task_id"] for e in by_task.get(timeout=0)[0]] == ["t1"]
+        assert [e["task_id"] for e in by_job.get(timeout=0)[0]] == ["t3"]
+        assert len(everything.get(timeout=0)[0]) == 3
+
+    def test_slow_subscriber_buffer_is_bounded(self):
+        """Test that a full buffer drops the oldest events and reports how many."""
+        bus = EventBus(max_buffer=3)
+        subscription = bus.subscribe()
+        for i in range(10):
+            bus.publish({"task_id": f"t{i}", "status": "pending"})
+
+        events, dropped = subscription.get(timeout=0)
+        assert [e["task_id"] for e in events] == ["t7", "t8", "t9"]
+        assert dropped == 7
+
+    def test_unsubscribe_stops_delivery(self):
+        """Test that closed subscriptions are removed from routing."""
+        bus = EventBus()
+        subscription = bus.subscribe(task_ids=["t1"])
+        assert bus.active
+        bus.unsubscribe(subscription)
+        assert not bus.active
+        assert subscription.closed
+        bus.publish({"task_id": "t1", "status": "running"})
+        assert subscription.get(timeout=0) == ([], 0)
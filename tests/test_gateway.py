@@ -0,0 +1,254 @@
+"""Tests for gateway module."""
+import http.client
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from src.lancompute.gateway import InferenceGateway, NoBackendError
+from src.lancompute.master_service import MasterHTTPServer, MasterService
+
+
+class StubBackendHandler(BaseHTTPRequestHandler):
+    """Kept-alive OpenAI-compatible backend answering with its own name."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/v1/models":
+            self._reply(200, {"object": "list",
+                              "data": [{"id": m, "object": "model"} for m in self.server.models]})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.connections.add(self.client_address)
+        self.server.requests += 1
+        if self.server.status != 200:
+            self._reply(self.server.status, {"error": "overloaded"})
+            return
+        time.sleep(self.server.delay)
+        if body.get("stream"):
+            self._stream(body["model"])
+            return
+        self._reply(200, {"model": body["model"], "backend": self.server.name,
+                          "choices": [{"message": {"role": "assistant", "content": "hi"}}]})
+
+    def _stream(self, model):
+        """Send two tokens as server-sent events, the second once released."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in ("Hel", "lo"):
+            event = {"model": model, "choices": [{"delta": {"content": token}}]}
+            self._chunk(f"data: {json.dumps(event)}\n\n".encode())
+            self.server.release.wait(5)
+        self._chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def backends():
+    """Start stub backends: start(name, models) -> server."""
+    servers = []
+
+    def start(name, models):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubBackendHandler)
+        server.daemon_threads = True
+        server.name = name
+        server.models = models
+        server.status = 200
+        server.delay = 0.0
+        server.requests = 0
+        server.connections = set()
+        server.release = threading.Event()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def address(server):
+    return f"127.0.0.1:{server.server_address[1]}"
+
+
+def chat(gateway, model):
+    """Send a chat completion through the gateway and return the decoded answer."""
+    body = json.dumps({"model": model, "messages": [{"role": "user", "content": "hi"}]})
+    response = gateway.request("POST", "/v1/chat/completions", body.encode(),
+                               {"Content-Type": "application/json"})
+    try:
+        return response.status, json.loads(response.read())
+    finally:
+        response.close()
+
+
+class TestInferenceGateway:
+    """Test cases for the load-balanced LLM proxy."""
+
+    def test_requests_follow_the_model(self, backends):
+        """Test that requests only go to backends serving their model."""
+        qwen = backends("qwen", ["qwen2.5-7b"])
+        llama = backends("llama", ["llama-3.2-3b", "qwen2.5-7b"])
+        gateway = InferenceGateway([address(qwen), f"http://{address(llama)}"])
+        assert gateway.models() == []
+        gateway.check_health()
+        assert gateway.models() == ["llama-3.2-3b", "qwen2.5-7b"]
+
+        for _ in range(3):
+            status, answer = chat(gateway, "llama-3.2-3b")
+            assert (status, answer["backend"]) == (200, "llama")
+        with pytest.raises(NoBackendError) as exc:
+            chat(gateway, "mistral-7b")
+        assert exc.value.status == 404
+
+    def test_least_outstanding_backend_is_picked(self, backends):
+        """Test that busy backends are passed over and ties are spread."""
+        servers = [backends(name, ["m"]) for name in ("a", "b", "c")]
+        gateway = InferenceGateway([address(server) for server in servers])
+        gateway.check_health()
+
+        held = [gateway.pick("m") for _ in range(3)]
+        assert sorted(backend.outstanding for backend in held) == [1, 1, 1]
+        assert len({backend.name for backend in held}) == 3
+        gateway._finished(held[1])
+        assert gateway.pick("m") is held[1]
+
+    def test_connections_are_kept_alive(self, backends):
+        """Test that sequential requests reuse one pooled connection."""
+        server = backends("a", ["m"])
+        gateway = InferenceGateway([address(server)])
+        gateway.check_health()
+        for _ in range(5):
+            assert chat(gateway, "m")[0] == 200
+        assert server.requests == 5
+        assert len(server.connections) == 1
+        assert gateway.stats()["backends"][0]["outstanding"] == 0
+
+    def test_stale_pooled_connection_is_replaced(self, backends):
+        """Test that a connection the backend dropped while idle is not an error."""
+        server = backends("a", ["m"])
+        gateway = InferenceGateway([address(server)])
+        gateway.check_health()
+        assert chat(gateway, "m")[0] == 200
+        backend = gateway.backends[address(server)]
+        backend._idle[0].sock.close()
+        assert chat(gateway, "m")[0] == 200
+        assert backend.failures == 0
+
+    def test_failed_backends_are_retried_elsewhere_and_ejected(self, backends):
+        """Test retries after 503s and refused connections, then ejection."""
+        busy = backends("busy", ["m"])
+        good = backends("good", ["m"])
+        gateway = InferenceGateway([address(busy), address(good), "127.0.0.1:1"],
+                                   max_failures=2, eject_seconds=60)
+        gateway.check_health()
+        gateway.add_backend("127.0.0.1", 1, ["m"])
+        busy.status = 503
+
+        for _ in range(4):
+            status, answer = chat(gateway, "m")
+            assert (status, answer["backend"]) == (200, "good")
+        stats = {b["backend"]: b for b in gateway.stats()["backends"]}
+        assert stats[address(busy)]["ejected"]
+        assert stats["127.0.0.1:1"]["ejected"]
+        assert not stats[address(good)]["ejected"]
+        assert busy.requests == 2
+
+        # Once the only healthy backend is down too, requests fail fast
+        good.status = 503
+        with pytest.raises(NoBackendError) as exc:
+            chat(gateway, "m")
+        assert exc.value.status == 503
+
+        # A successful health check readmits an ejected backend
+        busy.status = 200
+        gateway.check_health()
+        assert chat(gateway, "m")[1]["backend"] == "busy"
+
+    def test_master_serves_openai_api(self, backends):
+        """Test /v1/models and chat completions proxied by the master."""
+        server = backends("a", ["qwen2.5-7b"])
+        master = MasterService(host="127.0.0.1", port=0)
+        master.gateway = InferenceGateway([address(server)])
+        master.gateway.check_health()
+        http_server = MasterHTTPServer(("127.0.0.1", 0), master)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        conn = http.client.HTTPConnection("127.0.0.1", http_server.server_address[1], timeout=5)
+        try:
+            conn.request("GET", "/v1/models")
+            response = conn.getresponse()
+            assert [m["id"] for m in json.loads(response.read())["data"]] == ["qwen2.5-7b"]
+
+            body = json.dumps({"model": "qwen2.5-7b", "messages": []})
+            conn.request("POST", "/v1/chat/completions", body=body,
+                         headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            assert response.status == 200
+            assert response.getheader("X-Backend") == address(server)
+            assert json.loads(response.read())["backend"] == "a"
+
+            conn.request("POST", "/v1/chat/completions",
+                         body=json.dumps({"model": "mistral-7b", "messages": []}),
+                         headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            assert response.status == 404
+            assert json.loads(response.read())["error"]["code"] == "model_not_found"
+        finally:
+            conn.close()
+            http_server.shutdown()
+            http_server.server_close()
+
+    def test_streamed_completions_are_passed_on_as_they_arrive(self, backends):
+        """Test that SSE tokens reach the client before the backend finishes."""
+        server = backends("a", ["m"])
+        master = MasterService(host="127.0.0.1", port=0)
+        master.gateway = InferenceGateway([address(server)])
+        master.gateway.check_health()
+        http_server = MasterHTTPServer(("127.0.0.1", 0), master)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        conn = http.client.HTTPConnection("127.0.0.1", http_server.server_address[1], timeout=5)
+        body = json.dumps({"model": "m", "stream": True, "messages": []})
+        try:
+            for _ in range(2):
+                server.release.clear()
+                conn.request("POST", "/v1/chat/completions", body=body,
+                             headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                assert response.getheader("Content-Type") == "text/event-stream"
+                received = b""
+                while b"Hel" not in received:
+                    received += response.read1(65536)
+                # The backend holds back the second token until released
+                assert b"lo\"" not in received
+                server.release.set()
+                received += response.read()
+                assert received.endswith(b"data: [DONE]\n\n")
+                assert b'"content": "lo"' in received
+        finally:
+            conn.close()
+            http_server.shutdown()
+            http_server.server_close()
+        # Both streams went over one pooled backend connection
+        assert len(server.connections) == 1
+        assert master.gateway.stats()["backends"][0]["outstanding"] == 0
@@ -0,0 +1,81 @@
+"""Tests for inventory module."""
+import pytest
+from src.lancompute.inventory import HostInventory
+
+
+def result(ip, alive=True, open_ports=(), services=None, service_types=None):
+    return {'ip': ip, 'alive': alive, 'open_ports': list(open_ports),
+            'services': services or {}, 'service_types': service_types or {}}
+
+
+@pytest.fixture
+def inventory(tmp_path):
+    inventory = HostInventory(str(tmp_path / "hosts.db"), alive_interval=300,
+                              dead_interval=3600, max_interval=86400)
+    yield inventory
+    inventory.close()
+
+
+class TestHostInventory:
+    """Test cases for the persistent host inventory."""
+
+    def test_records_survive_reopening(self, tmp_path):
+        """Test that hosts, ports, banners and service types are persisted."""
+        path = str(tmp_path / "sub" / "hosts.db")
+        inventory = HostInventory(path)
+        inventory.record([result('10.0.0.5', open_ports=[11434, 1234],
+                                 services={11434: 'Ollama is running'},
+                                 service_types={11434: 'ollama'}),
+                          result('10.0.0.6', alive=False)], now=1000.0)
+        inventory.close()
+
+        inventory = HostInventory(path)
+        host = inventory.get('10.0.0.5')
+        assert host['alive'] is True
+        assert host['open_ports'] == [1234, 11434]
+        assert host['services'] == {11434: 'Ollama is running'}
+        assert host['first_seen'] == host['last_seen'] == host['last_checked'] == 1000.0
+        assert inventory.get('10.0.0.6')['last_seen'] is None
+        assert inventory.get('10.0.0.7') is None
+        assert [h['ip'] for h in inventory.hosts(service_type='ollama')] == ['10.0.0.5']
+        assert inventory.stats() == {'addresses': 2, 'alive': 1, 'next_check': 1300.0}
+        inventory.close()
+
+    def test_due_revalidates_known_hosts_first(self, inventory):
+        """Test scan order: live hosts by recency, then unknown, then down hosts."""
+        inventory.record([result('10.0.0.1')], now=0.0)
+        inventory.record([result('10.0.0.2'), result('10.0.0.3', alive=False)], now=10.0)
+        hosts = [f'10.0.0.{i}' for i in range(1, 6)]
+
+        assert inventory.due(hosts, now=100.0) == ['10.0.0.4', '10.0.0.5']
+        assert inventory.due(hosts, now=5000.0) == [
+            '10.0.0.2', '10.0.0.1', '10.0.0.4', '10.0.0.5', '10.0.0.3']
+
+    def test_intervals_adapt_to_history(self, inventory):
+        """Test that misses back off, faster for hosts that have been seen."""
+        never_seen = [inventory.interval(False, streak, False) for streak in (1, 2, 3, 10)]
+        assert never_seen == [3600, 7200, 14400, 86400]
+        went_away = [inventory.interval(False, streak, True) for streak in (1, 2, 3)]
+        assert went_away == [300, 600, 1200]
+        assert inventory.interval(True, 50, True) == 300
+
+        now = 0.0
+        for _ in range(3):
+            inventory.record([result('10.0.0.9', alive=False)], now=now)
+            now = inventory.get('10.0.0.9')['next_check']
+        assert now == 3600 + 7200 + 14400
+        assert inventory.get('10.0.0.9')['streak'] == 3
+
+        # Coming back resets the streak; the next miss is retried quickly
+        inventory.record([result('10.0.0.9')], now=now)
+        inventory.record([result('10.0.0.9', alive=False)], now=now + 300)
+        host = inventory.get('10.0.0.9')
+        assert host['streak'] == 1
+        assert host['last_seen'] == now
+        assert host['next_check'] == now + 600
+
+    def test_open_ports_count_as_alive(self, inventory):
+        """Test that a host with open ports is live even without liveness."""
+        inventory.record([result('10.0.0.8', alive=False, open_ports=[1234])], now=0.0)
+        assert inventory.get('10.0.0.8')['alive'] is True
+        assert inventory.next_check() == 300
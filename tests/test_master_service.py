@@ -1,11 +1,36 @@
 """Tests for master_service module."""
 import pytest
 from unittest.mock import patch, MagicMock
+import array
+import hashlib
+import http.client
 import json
+import socket
+import threading
 import time
+import zlib
+from src.lancompute.blobs import BlobStore
+from src.lancompute.codec import MEDIA_CBOR, MEDIA_JSON, decode, encode
 from src.lancompute.master_service import (
-    TaskStatus, NodeStatus, Task, Node, TaskQueue, NodeManager, MasterService
+    TaskStatus, NodeStatus, Task, Node, TaskQueue, NodeManager, MasterService,
+    MasterHTTPHandler, MasterHTTPServer, TaskDispatcher, iter_json_objects, job_params
 )
+from src.lancompute.result_store import FileResultStore
+from src.lancompute.scheduling import StragglerDetector
+from src.lancompute.wal import SYNC_OFF, WriteAheadLog
+
+
+@pytest.fixture
+def master_server():
+    """Run a master HTTP server on an ephemeral port."""
+    master = MasterService(host="127.0.0.1", port=0)
+    server = MasterHTTPServer(("127.0.0.1", 0), master)
+    master.server = server
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield master, server.server_address[1]
+    server.shutdown()
+    server.server_close()
 
 
 class TestTask:
@@ -52,6 +77,22 @@ class TestNode:
         assert node.status == NodeStatus.ONLINE
         assert isinstance(node.current_tasks, set)
 
+    def test_capacity_counts_task_slots(self):
+        """Test oversubscribed capacity and tasks that take several slots."""
+        node = Node("node-1", "127.0.0.1", 0, {}, slots=8, oversubscription=1.5)
+        assert node.capacity == 12
+        node.add_task("wide", 8)
+        node.add_task("narrow")
+        assert node.used_slots == 9
+        assert node.has_capacity(3)
+        assert not node.has_capacity(4)
+        node.remove_task("wide")
+        assert node.used_slots == 1
+        # A task wider than the node waits until the node is otherwise idle
+        assert not node.has_capacity(32)
+        node.remove_task("narrow")
+        assert node.has_capacity(32)
+
 
 class TestTaskQueue:
     """Test cases for TaskQueue class."""
@@ -87,6 +128,214 @@ class TestTaskQueue:
         assert retrieved_task.id == "task-1"
 
 
+    def test_get_task_for_node_priority_order(self):
+        """Test that the highest priority task is assigned first."""
+        queue = TaskQueue()
+        queue.add_task(Task("low", "compute", {}, priority=1))
+        queue.add_task(Task("high", "compute", {}, priority=10))
+        queue.add_task(Task("mid", "compute", {}, priority=5, requirements={"cpu_cores": 2}))
+
+        node = Node("node-1", "127.0.0.1", 0, {"cpu_cores": 4})
+
+        assert queue.get_task_for_node(node).id == "high"
+        assert queue.get_task_for_node(node).id == "mid"
+        assert queue.get_task_for_node(node).id == "low"
+        assert queue.get_task_for_node(node) is None
+
+    def test_get_task_for_node_fifo_within_priority(self):
+        """Test that equal priority tasks are assigned in submission order."""
+        queue = TaskQueue()
+        for i in range(5):
+            queue.add_task(Task(f"task-{i}", "compute", {}, priority=3))
+
+        node = Node("node-1", "127.0.0.1", 0, {})
+        assigned = [queue.get_task_for_node(node).id for _ in range(5)]
+        assert assigned == [f"task-{i}" for i in range(5)]
+
+    def test_get_task_for_node_skips_unmatched_requirements(self):
+        """Test that tasks the node cannot run stay queued for other nodes."""
+        queue = TaskQueue()
+        queue.add_task(Task("gpu", "ml_inference", {}, priority=50,
+                            requirements={"gpu_available": True}))
+        queue.add_task(Task("cpu", "compute", {}, priority=1))
+
+        cpu_node = Node("cpu-node", "127.0.0.1", 0, {"gpu_available": False})
+        gpu_node = Node("gpu-node", "127.0.0.1", 0, {"gpu_available": True})
+
+        task = queue.get_task_for_node(cpu_node)
+        assert task.id == "cpu"
+        assert task.status == TaskStatus.ASSIGNED
+        assert task.assigned_node == "cpu-node"
+
+        assert queue.get_task_for_node(cpu_node) is None
+        assert queue.get_task_for_node(gpu_node).id == "gpu"
+
+    def test_get_task_for_node_reevaluates_changed_capabilities(self):
+        """Test that the capability index notices re-registered capabilities."""
+        queue = TaskQueue()
+        queue.add_task(Task("big", "compute", {}, requirements={"memory_gb": 32}))
+
+        node = Node("node-1", "127.0.0.1", 0, {"memory_gb": 8})
+        assert queue.get_task_for_node(node) is None
+
+        node.capabilities = {"memory_gb": 64}
+        assert queue.get_task_for_node(node).id == "big"
+
+    def test_get_task_for_node_skips_non_pending(self):
+        """Test that cancelled tasks are never handed out."""
+        queue = TaskQueue()
+        queue.add_task(Task("cancelled", "compute", {}, priority=10))
+        queue.add_task(Task("pending", "compute", {}, priority=1))
+        queue.update_task_status("cancelled", TaskStatus.CANCELLED)
+
+        node = Node("node-1", "127.0.0.1", 0, {})
+        assert queue.get_task_for_node(node).id == "pending"
+        assert queue.pending_count() == 0
+
+    def test_get_task_for_node_backfills_free_slots(self):
+        """Test that tasks too wide for the free slots are passed over for narrower ones."""
+        queue = TaskQueue()
+        queue.add_task(Task("wide", "compute", {}, priority=10, slots=4))
+        queue.add_task(Task("narrow", "compute", {}, priority=1))
+
+        node = Node("node-1", "127.0.0.1", 0, {}, slots=4)
+        node.add_task("running", 2)
+        assert queue.peek_task_for_node(node).id == "narrow"
+        assert queue.get_task_for_node(node).id == "narrow"
+        assert queue.get_task_for_node(node) is None
+
+        node.remove_task("running")
+        assert queue.get_task_for_node(node).id == "wide"
+
+    def test_get_task_for_node_prefers_cached_blobs(self, tmp_path):
+        """Test that equal-priority tasks whose input blobs a node caches go first."""
+        store = BlobStore(str(tmp_path))
+        small, _ = store.put([b"s" * 10])
+        large, _ = store.put([b"l" * 1000])
+        queue = TaskQueue(blob_store=store)
+        queue.add_tasks([Task("plain", "compute", {}),
+                         Task("uses-small", "compute", {}, blobs={"in": small}),
+                         Task("uses-both", "compute", {}, blobs={"a": small, "b": large}),
+                         Task("urgent", "compute", {}, priority=5)])
+        with pytest.raises(ValueError, match="Unknown blob"):
+            queue.add_task(Task("missing", "compute", {}, blobs={"in": "0" * 64}))
+
+        node = Node("node-1", "127.0.0.1", 0, {}, slots=8)
+        node.blobs = {small, large}
+        # Priority still comes first
+        assert queue.get_task_for_node(node, cached_only=True) is None
+        assert queue.get_task_for_node(node).id == "urgent"
+        assert queue.get_task_for_node(node, cached_only=True).id == "uses-both"
+        assert queue.get_task_for_node(node).id == "uses-small"
+        assert queue.get_task_for_node(node, cached_only=True) is None
+        assert queue.get_task_for_node(node).id == "plain"
+
+        # A node that has nothing cached keeps submission order, and is
+        # counted as caching what it was given
+        queue.add_tasks([Task("first", "compute", {}),
+                         Task("second", "compute", {}, blobs={"in": large})])
+        other = Node("node-2", "127.0.0.1", 0, {}, slots=8)
+        assert queue.get_task_for_node(other).id == "first"
+        assert queue.get_task_for_node(other).id == "second"
+        assert other.blobs == {large}
+
+    def test_blob_affinity_keeps_one_bucket_and_prunes_its_index(self):
+        """Test that tasks reading distinct blobs share a bucket and leave no index behind."""
+        queue = TaskQueue()
+        digests = [f"{i:064x}" for i in range(50)]
+        queue.add_tasks([Task(f"t{i}", "compute", {}, blobs={"in": digest})
+                         for i, digest in enumerate(digests)])
+        assert len(queue._buckets) == 1
+        assert len(queue._blob_index) == 50
+
+        node = Node("node-1", "127.0.0.1", 0, {}, slots=100)
+        node.blobs = {digests[30]}
+        assert queue.get_task_for_node(node, cached_only=True).id == "t30"
+        # Released and queued again, t30 is offered once, its blob still cached
+        assert queue.release_task("t30", 1, "node lost") is not None
+        assert queue.requeue("t30", 1)
+        taken = []
+        while True:
+            task = queue.get_task_for_node(node)
+            if task is None:
+                break
+            taken.append(task.id)
+        assert taken == ["t30"] + [f"t{i}" for i in range(50) if i != 30]
+        assert (queue._buckets, queue._blob_index, queue._blob_sizes) == ({}, {}, {})
+
+
+    def test_add_tasks_batch(self):
+        """Test adding a batch of tasks at once."""
+        queue = TaskQueue()
+        queue.add_tasks([Task(f"task-{i}", "compute", {}, priority=i) for i in range(3)])
+
+        assert len(queue.tasks) == 3
+        node = Node("node-1", "127.0.0.1", 0, {})
+        assert queue.get_task_for_node(node).id == "task-2"
+
+
+    def test_results_are_kept_in_result_store(self, tmp_path):
+        """Test that finished results go to the result store and are read lazily."""
+        queue = TaskQueue(FileResultStore(str(tmp_path)))
+        queue.add_task(Task(id="task-1", type="test", payload={}))
+        queue.update_task_status("task-1", TaskStatus.COMPLETED, result={"answer": 42})
+
+        task = queue.get_task("task-1")
+        assert task.result is None
+        assert queue.task_to_dict(task)["result"] == {"answer": 42}
+        queue.result_store.close()
+
+    def test_equal_requirements_are_shared(self):
+        """Test that submitted tasks share interned types and requirement dicts."""
+        queue = TaskQueue()
+        specs = [json.loads('{"type": "compute", "requirements": {"gpu": true}}')
+                 for _ in range(2)]
+        tasks = [Task(f"task-{i}", spec["type"], {}, requirements=spec["requirements"])
+                 for i, spec in enumerate(specs)]
+        queue.add_tasks(tasks + [Task("task-2", "compute", {})])
+
+        assert tasks[0].type is tasks[1].type
+        assert tasks[0].requirements is tasks[1].requirements
+        assert queue.get_task("task-2").requirements == {}
+        assert not hasattr(tasks[0], "__dict__")
+
+    def test_payloads_in_payload_store(self, tmp_path):
+        """Test that payloads moved out of line are loaded when serialized."""
+        queue = TaskQueue(payload_store=FileResultStore(str(tmp_path)))
+        queue.add_task(Task(id="task-1", type="test", payload={"values": [1, 2, 3]}))
+
+        task = queue.get_task("task-1")
+        assert task.payload is None
+        assert queue.get_payload(task) == {"values": [1, 2, 3]}
+        data = queue.task_to_dict(task)
+        assert data["payload"] == {"values": [1, 2, 3]}
+        assert data["status"] == "pending"
+        queue.payload_store.close()
+
+class TestIterJsonObjects:
+    """Test cases for the incremental batch parser."""
+
+    def test_json_array_split_across_chunks(self):
+        """Test parsing an array delivered one byte at a time."""
+        data = '[{"type": "compute", "payload": {"x": [1, 2]}}, {"type": "test", "payload": {}}]'
+        data = data.encode()
+        objects = list(iter_json_objects(data[i:i + 1] for i in range(len(data))))
+        assert [obj["type"] for obj in objects] == ["compute", "test"]
+        assert objects[0]["payload"] == {"x": [1, 2]}
+
+    def test_ndjson_stream(self):
+        """Test parsing newline-delimited JSON."""
+        chunks = [b'{"type": "a", "payload": {}}\n{"type": ', b'"b", "payload": {}}\n\n']
+        assert [obj["type"] for obj in iter_json_objects(chunks)] == ["a", "b"]
+
+    def test_invalid_input_raises(self):
+        """Test that truncated or non-object input is rejected."""
+        with pytest.raises(ValueError):
+            list(iter_json_objects([b'[{"type": "a"}']))
+        with pytest.raises(ValueError):
+            list(iter_json_objects([b'[1, 2]']))
+
+
 class TestNodeManager:
     """Test cases for NodeManager class."""
     
@@ -153,6 +402,24 @@ class TestNodeManager:
         result = manager.update_heartbeat("non-existent")
         assert result is False
 
+    def test_nodes_without_headroom_are_throttled(self):
+        """Test that reported CPU and memory use above the limits stops assignment."""
+        manager = NodeManager(oversubscription_factor=2.0, max_cpu_percent=90,
+                              max_memory_percent=80)
+        node = manager.register_node({"id": "node-1", "address": "127.0.0.1", "port": 0,
+                                      "slots": 4})
+        assert node.capacity == 8
+
+        manager.update_heartbeat("node-1", {"memory_percent": 85})
+        assert manager.get_available_nodes() == []
+        # Busy CPU from outside work throttles a node with idle slots ...
+        manager.update_heartbeat("node-1", {"memory_percent": 50, "cpu_percent": 95,
+                                            "running": 1})
+        assert manager.get_available_nodes() == []
+        # ... but not one that is busy with its own tasks
+        manager.update_heartbeat("node-1", {"cpu_percent": 95, "running": 4})
+        assert manager.get_available_nodes() == [node]
+
 
 class TestMasterService:
     """Test cases for MasterService class."""
@@ -166,3 +433,1288 @@ class TestMasterService:
         assert master.task_queue is not None
         assert master.node_manager is not None
         assert master.scheduler is not None
+
+
+class TestMasterRecovery:
+    """Test cases for restoring master state from the write-ahead log."""
+
+    def _node(self):
+        return {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {},
+                "slots": 1, "prefetch_depth": 1}
+
+    @pytest.mark.parametrize("snapshot", [False, True])
+    def test_restart_restores_tasks_and_nodes(self, tmp_path, snapshot):
+        """Test that pending, assigned and finished tasks survive a restart."""
+        master = MasterService(wal=WriteAheadLog(str(tmp_path), sync=SYNC_OFF))
+        master.node_manager.register_node(self._node())
+        master.task_queue.add_tasks([Task(id=f"task-{i}", type="test", payload={"i": i})
+                                     for i in range(4)])
+        node = master.node_manager.get_node("node-1")
+        assigned = master.task_queue.get_task_for_node(node)
+        master.node_manager.assign_task_to_node("node-1", assigned.id)
+        done = master.task_queue.get_task_for_node(node)
+        master.task_queue.update_task_status(done.id, TaskStatus.RUNNING)
+        master.task_queue.update_task_status(done.id, TaskStatus.COMPLETED,
+                                             execution_time=0.5)
+        if snapshot:
+            master.snapshot()
+        master.wal.close()
+
+        restarted = MasterService(wal=WriteAheadLog(str(tmp_path), sync=SYNC_OFF))
+        queue = restarted.task_queue
+        assert queue.get_task("task-0").status == TaskStatus.ASSIGNED
+        assert queue.get_task("task-1").status == TaskStatus.COMPLETED
+        assert queue.get_task("task-1").execution_time == 0.5
+        assert queue.pending_count() == 2
+
+        node = restarted.node_manager.get_node("node-1")
+        assert node.status == NodeStatus.OFFLINE
+        assert node.current_tasks == {"task-0"}
+        assert [t.id for t in restarted.dispatcher.take("node-1", max_tasks=5)] == ["task-0"]
+
+        restarted.node_manager.update_heartbeat("node-1")
+        assert restarted.task_queue.get_task_for_node(node).id == "task-2"
+        restarted.wal.close()
+
+    def test_replayed_assignment_keeps_attempt_number(self, tmp_path):
+        """Test that an assignment replayed over a row that has it is not counted twice."""
+        master = MasterService(wal=WriteAheadLog(str(tmp_path), sync=SYNC_OFF))
+        master.node_manager.register_node(self._node())
+        master.task_queue.add_task(Task(id="task-1", type="test", payload={}))
+        task = master.task_queue.get_task_for_node(master.node_manager.get_node("node-1"))
+        assert task.attempts == 1
+        # A snapshot row written after the assignment, followed by its WAL record
+        master.wal.append({"op": "task", "task": task.to_record()})
+        master.wal.append({"op": "assign", "id": "task-1", "node": "node-1", "attempt": 1})
+        master.wal.close()
+
+        restarted = MasterService(wal=WriteAheadLog(str(tmp_path), sync=SYNC_OFF))
+        assert restarted.task_queue.get_task("task-1").attempts == 1
+        assert restarted.apply_task_update("task-1", "running", "node-1", attempt=1)
+        restarted.wal.close()
+
+    def test_snapshot_rows_are_taken_under_the_locks(self, tmp_path):
+        """Test that a change made while the snapshot is written stays out of it."""
+        master = MasterService(wal=WriteAheadLog(str(tmp_path), sync=SYNC_OFF))
+        master.node_manager.register_node(self._node())
+        master.task_queue.add_task(Task(id="task-1", type="test", payload={}))
+        write_snapshot = master.wal.write_snapshot
+        written = []
+
+        def assign_then_write(segment, records):
+            # The assignment lands in the new segment, after the snapshot point
+            master.task_queue.get_task_for_node(master.node_manager.get_node("node-1"))
+            records = list(records)
+            written.extend(records)
+            return write_snapshot(segment, records)
+
+        with patch.object(master.wal, "write_snapshot", side_effect=assign_then_write):
+            master.snapshot()
+        rows = [row for record in written if record["op"] == "tasks" for row in record["rows"]]
+        assert Task.from_record(rows[0]).status == TaskStatus.PENDING
+        master.wal.close()
+
+        restarted = MasterService(wal=WriteAheadLog(str(tmp_path), sync=SYNC_OFF))
+        task = restarted.task_queue.get_task("task-1")
+        assert (task.status, task.attempts) == (TaskStatus.ASSIGNED, 1)
+        restarted.wal.close()
+
+class TestMasterHTTPServer:
+    """Test cases for the concurrent keep-alive HTTP server."""
+
+    def test_keep_alive_reuses_connection(self, master_server):
+        """Test that several requests are served over one connection."""
+        _, port = master_server
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+
+        conn.request("GET", "/status")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert json.loads(response.read())["status"] == "running"
+        sock = conn.sock
+
+        conn.request("POST", "/task", body=json.dumps({"type": "compute", "payload": {}}),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        assert response.status == 200
+        assert "task_id" in json.loads(response.read())
+        assert conn.sock is sock
+        conn.close()
+
+    def test_pipelined_requests(self, master_server):
+        """Test that pipelined requests are answered in order."""
+        _, port = master_server
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+            request = b"GET /status HTTP/1.1\r\nHost: localhost\r\n\r\n"
+            sock.sendall(request + b"GET /nodes HTTP/1.1\r\nHost: localhost\r\n\r\n")
+
+            reader = sock.makefile("rb")
+            bodies = []
+            for _ in range(2):
+                assert reader.readline().startswith(b"HTTP/1.1 200")
+                headers = http.client.parse_headers(reader)
+                bodies.append(json.loads(reader.read(int(headers["Content-Length"]))))
+
+            assert "uptime" in bodies[0]
+            assert bodies[1]["nodes"] == []
+
+    def test_slow_client_does_not_block_others(self, master_server):
+        """Test that a stalled connection does not delay other requests."""
+        _, port = master_server
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as stalled:
+            stalled.sendall(b"POST /node/heartbeat HTTP/1.1\r\nContent-Length: 100\r\n\r\n{")
+
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/status")
+            assert conn.getresponse().status == 200
+            conn.close()
+
+
+class TestBatchSubmission:
+    """Test cases for POST /tasks/batch."""
+
+    def _post(self, port, body, headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("POST", "/tasks/batch", body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        conn.close()
+        return response, data
+
+    def test_submit_json_array(self, master_server):
+        """Test submitting a JSON array of tasks."""
+        master, port = master_server
+        specs = [{"type": "compute", "payload": {"i": i}, "priority": i} for i in range(10)]
+        response, data = self._post(port, json.dumps(specs))
+
+        assert response.status == 200
+        assert response.getheader("Transfer-Encoding") == "chunked"
+        result = json.loads(data)
+        assert result["count"] == 10
+        assert len(set(result["task_ids"])) == 10
+        assert all(task_id in master.task_queue.tasks for task_id in result["task_ids"])
+
+    def test_submit_chunked_ndjson(self, master_server):
+        """Test submitting an NDJSON stream with a chunked request body."""
+        master, port = master_server
+        lines = (json.dumps({"type": "test", "payload": {"i": i}}).encode() + b"\n"
+                 for i in range(5000))
+        response, data = self._post(port, lines, {"Content-Type": "application/x-ndjson"})
+
+        assert response.status == 200
+        assert json.loads(data)["count"] == 5000
+        assert len(master.task_queue.tasks) == 5000
+
+    def test_invalid_spec_rejects_whole_batch(self, master_server):
+        """Test that one bad spec rejects the batch without inserting anything."""
+        master, port = master_server
+        specs = [{"type": "compute", "payload": {}}, {"payload": {}}]
+        response, _ = self._post(port, json.dumps(specs))
+
+        assert response.status == 400
+        assert len(master.task_queue.tasks) == 0
+
+
+class TestTaskListing:
+    """Test cases for paginated, filtered task listings and the change feed."""
+
+    def _queue(self):
+        queue = TaskQueue()
+        queue.add_tasks([Task(f"task-{i}", "compute" if i % 2 else "test", {})
+                         for i in range(10)])
+        return queue
+
+    def test_cursor_pagination(self):
+        """Test walking all tasks in submission order page by page."""
+        queue = self._queue()
+        seen, cursor = [], None
+        while True:
+            page, cursor = queue.list_tasks(cursor=cursor, limit=4)
+            seen.extend(task.id for task in page)
+            if cursor is None:
+                break
+        assert seen == [f"task-{i}" for i in range(10)]
+
+    def test_filters_use_indexes(self):
+        """Test status, type and node filters, alone and combined."""
+        queue = self._queue()
+        node = Node("node-1", "127.0.0.1", 0, {})
+        assigned = queue.get_task_for_node(node)
+        queue.update_task_status(assigned.id, TaskStatus.COMPLETED)
+
+        page, _ = queue.list_tasks({"status": ["completed"]})
+        assert page == [assigned]
+        page, _ = queue.list_tasks({"type": ["compute"], "status": ["pending"]})
+        assert [task.id for task in page] == ["task-1", "task-3", "task-5", "task-7",
+                                              "task-9"]
+        page, cursor = queue.list_tasks({"status": ["pending", "completed"]}, limit=9)
+        assert len(page) == 9 and cursor is not None
+        page, _ = queue.list_tasks({"node": ["node-1"]})
+        assert page == [assigned]
+        assert queue.status_counts() == {"pending": 9, "completed": 1}
+
+    def test_changes_since_returns_only_delta(self):
+        """Test that the change feed returns each changed task once, in order."""
+        queue = self._queue()
+        revision = queue.revision
+        queue.update_task_status("task-3", TaskStatus.RUNNING)
+        queue.update_task_status("task-1", TaskStatus.RUNNING)
+        queue.update_task_status("task-3", TaskStatus.COMPLETED)
+
+        tasks, next_revision, more = queue.changes_since(revision)
+        assert [task.id for task in tasks] == ["task-1", "task-3"]
+        assert next_revision == queue.revision and not more
+
+        tasks, next_revision, more = queue.changes_since(revision, limit=1)
+        assert [task.id for task in tasks] == ["task-1"] and more
+        tasks, _, _ = queue.changes_since(next_revision)
+        assert [task.id for task in tasks] == ["task-3"]
+
+    def test_list_tasks_endpoint(self, master_server):
+        """Test projection, filters and the change feed over HTTP."""
+        master, port = master_server
+        master.task_queue.add_tasks([Task(f"task-{i}", "test", {}) for i in range(3)])
+
+        def get(path):
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", path)
+            response = conn.getresponse()
+            body = response.read()
+            conn.close()
+            return response.status, json.loads(body) if response.status == 200 else None
+
+        status, page = get("/tasks?fields=id,status&limit=2")
+        assert status == 200
+        assert page["tasks"] == [{"id": "task-0", "status": "pending"},
+                                 {"id": "task-1", "status": "pending"}]
+        status, rest = get(f"/tasks?fields=id&cursor={page['next_cursor']}")
+        assert rest["tasks"] == [{"id": "task-2"}] and rest["next_cursor"] is None
+
+        master.task_queue.update_task_status("task-1", TaskStatus.FAILED, error="boom")
+        _, feed = get(f"/tasks?since={page['revision']}&epoch={page['epoch']}&fields=id,error")
+        assert feed["tasks"] == [{"id": "task-1", "error": "boom"}]
+        _, feed = get(f"/tasks?since={feed['revision']}&epoch={page['epoch']}")
+        assert feed["tasks"] == [] and feed["more"] is False
+
+        assert get("/tasks?since=0&epoch=stale")[0] == 410
+        assert get("/tasks?limit=abc")[0] == 400
+
+
+class TestEventStream:
+    """Test cases for GET /events."""
+
+    def _open(self, port, path):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("GET", path)
+        return conn, conn.getresponse()
+
+    def test_stream_ends_when_named_tasks_finish(self, master_server):
+        """Test NDJSON events for named tasks, starting with their current state."""
+        master, port = master_server
+        master.task_queue.add_tasks([Task("task-1", "test", {}), Task("task-2", "test", {})])
+        master.task_queue.update_task_status("task-1", TaskStatus.COMPLETED)
+
+        conn, response = self._open(port, "/events?task_id=task-1,task-2&format=ndjson")
+        assert response.status == 200
+        assert json.loads(response.readline())["status"] == "completed"
+
+        master.task_queue.update_task_status("task-2", TaskStatus.RUNNING)
+        master.task_queue.update_task_status("task-2", TaskStatus.FAILED, error="boom")
+        events = [json.loads(line) for line in response.read().splitlines() if line.strip()]
+        conn.close()
+
+        assert [(e["task_id"], e["status"]) for e in events] == [
+            ("task-2", "pending"), ("task-2", "running"), ("task-2", "failed")]
+        assert events[-1]["error"] == "boom"
+
+    def test_sse_job_and_status_filter(self, master_server):
+        """Test that an SSE stream only carries matching job and status events."""
+        master, port = master_server
+        conn, response = self._open(port, "/events?job=job-1&status=completed")
+        assert response.getheader("Content-Type") == "text/event-stream"
+        assert response.readline() == b": keepalive\n"
+
+        master.task_queue.add_tasks([Task("a", "test", {}, job_id="job-1"),
+                                     Task("b", "test", {}, job_id="job-2")])
+        master.task_queue.update_task_status("b", TaskStatus.COMPLETED)
+        master.task_queue.update_task_status("a", TaskStatus.COMPLETED)
+
+        response.readline()
+        assert response.readline() == b"event: task\n"
+        assert response.readline().startswith(b"id: ")
+        data = json.loads(response.readline()[len(b"data: "):])
+        assert (data["task_id"], data["job_id"], data["status"]) == ("a", "job-1", "completed")
+        conn.close()
+
+
+class TestJobs:
+    """Test cases for jobs built lazily from a template."""
+
+    def _master(self, window=10, wal=None):
+        return MasterService(wal=wal, config={"master": {"jobs": {"materialize_window": window}}})
+
+    def _take(self, master, count):
+        node = Node("node-1", "127.0.0.1", 0, {})
+        return [master.task_queue.get_task_for_node(node) for _ in range(count)]
+
+    def test_tasks_are_materialized_lazily(self):
+        """Test that a huge job only keeps a window of tasks queued."""
+        master = self._master()
+        job = master.jobs.submit({"type": "test", "payload": {"scale": 2}},
+                                 range(1000000), 1000000)
+        assert len(master.task_queue.tasks) == 10
+        assert job.summary()["pending"] == 1000000
+
+        tasks = self._take(master, 5)
+        assert tasks[0].id == f"{job.id}-0"
+        assert tasks[0].payload == {"scale": 2, "param": 0}
+        assert master.jobs.refill() == 5
+        assert master.task_queue.pending_count() == 10
+        summary = job.summary()
+        assert (summary["materialized"], summary["assigned"], summary["pending"]) == (
+            15, 5, 1000000 - 5)
+
+    def test_counters_and_completion_order(self):
+        """Test aggregate counters and that finished tasks are kept in completion order."""
+        master = self._master()
+        job = master.jobs.submit({"type": "test"}, iter([{"x": 1}, {"x": 2}, {"x": 3}]))
+        first, second, third = self._take(master, 3)
+        master.task_queue.update_task_status(third.id, TaskStatus.COMPLETED, result=3)
+        master.task_queue.update_task_status(first.id, TaskStatus.FAILED, error="boom")
+        assert job.summary()["status"] == "running"
+        master.task_queue.update_task_status(second.id, TaskStatus.COMPLETED, result=2)
+
+        master.jobs.refill()
+        summary = job.summary()
+        assert (summary["completed"], summary["failed"], summary["status"]) == (2, 1, "done")
+        assert summary["total"] is None
+        assert master.jobs.wait_finished(job.id, 0, timeout=0) == (
+            [third.id, first.id, second.id], True)
+        assert master.jobs.wait_finished(job.id, 1, timeout=0) == ([first.id, second.id], True)
+
+    def test_rejected_refill_stops_the_job(self):
+        """Test that tasks the queue refuses are not counted and the job still finishes."""
+        master = self._master()
+        job = master.jobs.submit({"type": "test"}, range(100), 100)
+        taken = self._take(master, 10)
+        with patch.object(master.task_queue, "check_blobs",
+                          side_effect=ValueError("Unknown blob")):
+            assert master.jobs.refill() == 0
+        summary = job.summary()
+        assert (summary["materialized"], summary["pending"], summary["assigned"]) == (10, 0, 10)
+        assert summary["status"] == "running"
+        assert "Unknown blob" in summary["error"]
+
+        for task in taken:
+            master.task_queue.update_task_status(task.id, TaskStatus.COMPLETED, result=1)
+        assert master.jobs.refill() == 0
+        assert job.summary()["status"] == "failed"
+        assert master.jobs.wait_finished(job.id, 0, timeout=0) == (
+            [task.id for task in taken], True)
+
+    def test_job_survives_restart(self, tmp_path):
+        """Test that a job's counters and remaining parameters are recovered."""
+        master = self._master(window=2, wal=WriteAheadLog(str(tmp_path), sync=SYNC_OFF))
+        job = master.jobs.submit({"type": "test"}, *job_params({"range": {"stop": 5}}),
+                                 source={"range": {"stop": 5}})
+        done = self._take(master, 1)[0]
+        master.task_queue.update_task_status(done.id, TaskStatus.COMPLETED, result=0)
+        master.wal.close()
+
+        restarted = self._master(window=2, wal=WriteAheadLog(str(tmp_path), sync=SYNC_OFF))
+        recovered = restarted.jobs.get_job(job.id)
+        assert recovered.materialized == 2
+        assert recovered.counts["completed"] == 1
+        assert recovered.finished == [done.id]
+
+        restarted.jobs.refill()
+        for _ in range(4):
+            task = self._take(restarted, 1)[0]
+            restarted.task_queue.update_task_status(task.id, TaskStatus.COMPLETED)
+            restarted.jobs.refill()
+        assert recovered.summary()["status"] == "done"
+        assert recovered.summary()["completed"] == 5
+        restarted.wal.close()
+
+    def test_gather_streams_results(self, master_server):
+        """Test POST /job and gathering results over HTTP as they finish."""
+        master, port = master_server
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("POST", "/job", body=json.dumps(
+            {"type": "test", "payload": {"base": 10}, "params": [{"n": 1}, {"n": 2}]}),
+            headers={"Content-Type": "application/json"})
+        job_id = json.loads(conn.getresponse().read())["job_id"]
+
+        conn.request("GET", f"/job/{job_id}/results")
+        response = conn.getresponse()
+        first, second = self._take(master, 2)
+        master.task_queue.update_task_status(second.id, TaskStatus.COMPLETED,
+                                             result={"sum": 12})
+        master.task_queue.update_task_status(first.id, TaskStatus.COMPLETED,
+                                             result={"sum": 11})
+        lines = [json.loads(line) for line in response.read().splitlines() if line.strip()]
+        assert [(line["index"], line["result"]) for line in lines] == [
+            (1, {"sum": 12}), (0, {"sum": 11})]
+
+        conn.request("GET", f"/job/{job_id}")
+        summary = json.loads(conn.getresponse().read())
+        assert summary["completed"] == 2 and summary["status"] == "done"
+        conn.close()
+
+
+class TestTaskDependencies:
+    """Test cases for tasks that wait on other tasks."""
+
+    def _run(self, queue, task_id, status=TaskStatus.COMPLETED, result=None):
+        node = Node("node-1", "127.0.0.1", 0, {})
+        task = queue.get_task_for_node(node)
+        assert task.id == task_id
+        queue.update_task_status(task_id, status, result=result)
+
+    def test_child_is_released_when_all_parents_complete(self):
+        """Test that a task is queued only once its last parent completes."""
+        queue = TaskQueue()
+        queue.add_tasks([Task("a", "test", {}), Task("b", "test", {}),
+                         Task("c", "test", {}, depends_on=["a", "b", "a"])])
+        assert queue.get_task("c").status == TaskStatus.BLOCKED
+        assert queue.get_task("c").depends_on == ["a", "b"]
+        assert queue.pending_count() == 2
+
+        self._run(queue, "a")
+        assert queue.get_task("c").status == TaskStatus.BLOCKED
+        self._run(queue, "b")
+        assert queue.get_task("c").status == TaskStatus.PENDING
+        self._run(queue, "c")
+
+    def test_failure_cascades_to_descendants(self):
+        """Test that a failed parent fails the whole chain below it."""
+        queue = TaskQueue()
+        queue.add_tasks([Task("c", "test", {}, depends_on=["b"]),
+                         Task("b", "test", {}, depends_on=["a"]),
+                         Task("a", "test", {})])
+        self._run(queue, "a", TaskStatus.FAILED)
+        assert queue.get_task("b").status == TaskStatus.FAILED
+        assert queue.get_task("c").status == TaskStatus.FAILED
+        assert queue.get_task("c").error == "Dependency b failed"
+        assert queue.pending_count() == 0
+
+        # Depending on a task that already failed fails straight away
+        queue.add_task(Task("d", "test", {}, depends_on=["a"]))
+        assert queue.get_task("d").status == TaskStatus.FAILED
+
+    def test_unknown_parent_and_cycle_are_rejected(self):
+        """Test that invalid graphs are rejected before any task is added."""
+        queue = TaskQueue()
+        with pytest.raises(ValueError, match="unknown task"):
+            queue.add_task(Task("a", "test", {}, depends_on=["missing"]))
+        with pytest.raises(ValueError, match="cycle"):
+            queue.add_tasks([Task("x", "test", {}, depends_on=["y"]),
+                             Task("y", "test", {}, depends_on=["x"])])
+        assert queue.tasks == {}
+
+    def test_blocked_tasks_survive_restart(self, tmp_path):
+        """Test that dependency counters are rebuilt after a restart."""
+        master = MasterService(wal=WriteAheadLog(str(tmp_path), sync=SYNC_OFF))
+        queue = master.task_queue
+        queue.add_tasks([Task("a", "test", {}), Task("b", "test", {}),
+                         Task("c", "test", {}, depends_on=["a", "b"])])
+        self._run(queue, "a")
+        master.wal.close()
+
+        restarted = MasterService(wal=WriteAheadLog(str(tmp_path), sync=SYNC_OFF))
+        queue = restarted.task_queue
+        assert queue.get_task("c").status == TaskStatus.BLOCKED
+        self._run(queue, "b")
+        assert queue.get_task("c").status == TaskStatus.PENDING
+        restarted.wal.close()
+
+    def test_batch_dependencies_and_result_endpoint(self, master_server):
+        """Test batch-relative dependencies and fetching a parent result by reference."""
+        master, port = master_server
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("POST", "/tasks/batch", body=json.dumps([
+            {"type": "test", "payload": {}},
+            {"type": "test", "payload": {}, "depends_on": [0]}]))
+        parent_id, child_id = json.loads(conn.getresponse().read())["task_ids"]
+
+        conn.request("GET", f"/task/{parent_id}/result")
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 409
+
+        self._run(master.task_queue, parent_id, result={"answer": 42})
+        conn.request("GET", f"/task/{parent_id}/result")
+        assert json.loads(conn.getresponse().read()) == {"answer": 42}
+        conn.request("GET", f"/task/{child_id}")
+        child = json.loads(conn.getresponse().read())
+        assert child["status"] == "pending"
+        assert child["depends_on"] == [parent_id]
+
+        conn.request("POST", "/tasks/batch", body=json.dumps(
+            [{"type": "test", "payload": {}, "depends_on": [1]},
+             {"type": "test", "payload": {}, "depends_on": [0]}]))
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 400
+        conn.close()
+
+
+class TestTaskDispatcher:
+    """Test cases for push dispatch to waiting workers."""
+
+    def test_take_returns_pushed_task(self):
+        """Test that a waiting take is woken by a push."""
+        dispatcher = TaskDispatcher()
+        task = Task("task-1", "compute", {})
+        threading.Timer(0.05, dispatcher.push, args=("node-1", task)).start()
+
+        start = time.time()
+        assert dispatcher.take("node-1", timeout=5) == [task]
+        assert time.time() - start < 1
+
+    def test_take_times_out_empty(self):
+        """Test that take returns nothing when no task arrives."""
+        dispatcher = TaskDispatcher()
+        assert dispatcher.take("node-1", timeout=0.05) == []
+
+    def test_restore_puts_tasks_back_in_order(self):
+        """Test that undelivered tasks are restored to the front."""
+        dispatcher = TaskDispatcher()
+        first, second, third = (Task(f"task-{i}", "compute", {}) for i in range(3))
+        dispatcher.push("node-1", third)
+        dispatcher.restore("node-1", [first, second])
+        assert dispatcher.take("node-1", max_tasks=3) == [first, second, third]
+
+
+class TestPushDispatch:
+    """Test cases for the /node/poll long-poll endpoint."""
+
+    def _post(self, port, path, data, timeout=10):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        conn.request("POST", path, body=json.dumps(data),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response.status, body
+
+    def test_poll_receives_task_submitted_while_waiting(self, master_server):
+        """Test that a submitted task is pushed to a polling worker within milliseconds."""
+        master, port = master_server
+        master.scheduler.start()
+        try:
+            self._post(port, "/node/register",
+                       {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+
+            result = {}
+
+            def poll():
+                status, body = self._post(port, "/node/poll",
+                                          {"node_id": "node-1", "timeout": 5})
+                result["received_at"] = time.time()
+                result["body"] = json.loads(body)
+
+            poller = threading.Thread(target=poll)
+            poller.start()
+            time.sleep(0.2)
+
+            submitted_at = time.time()
+            self._post(port, "/task", {"type": "test", "payload": {}})
+            poller.join(timeout=5)
+
+            assert len(result["body"]["tasks"]) == 1
+            assert result["received_at"] - submitted_at < 0.5
+        finally:
+            master.scheduler.stop()
+
+    def test_heartbeat_prefetches_requested_tasks(self, master_server):
+        """Test that a heartbeat with 'want' receives several tasks up to capacity."""
+        master, port = master_server
+        self._post(port, "/node/register",
+                   {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {},
+                    "slots": 2, "prefetch_depth": 1})
+        for i in range(5):
+            self._post(port, "/task", {"type": "test", "payload": {"i": i}})
+
+        status, body = self._post(port, "/node/heartbeat",
+                                  {"node_id": "node-1", "want": 10, "running": 0, "queued": 0})
+        assert status == 200
+        assert len(json.loads(body)["tasks"]) == 3
+
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("GET", "/nodes")
+        node = json.loads(conn.getresponse().read())["nodes"][0]
+        conn.close()
+        assert node["slots"] == 2
+        assert node["prefetch_depth"] == 1
+        assert node["capacity"] == 3
+        assert node["assigned"] == 3
+        assert node["free_slots"] == 2
+
+    def test_heartbeat_rejects_invalid_want(self, master_server):
+        """Test that a non-numeric 'want' gets 400 and a negative one no tasks."""
+        master, port = master_server
+        self._post(port, "/node/register",
+                   {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+        self._post(port, "/task", {"type": "test", "payload": {}})
+        for want in ("many", None, [1]):
+            status, _ = self._post(port, "/node/heartbeat", {"node_id": "node-1", "want": want})
+            assert status == 400, want
+
+        status, body = self._post(port, "/node/heartbeat", {"node_id": "node-1", "want": -3})
+        assert status == 200
+        assert json.loads(body)["tasks"] == []
+        assert master.task_queue.pending_count() == 1
+
+    def test_heartbeat_keeps_tasks_when_the_response_is_lost(self, master_server, monkeypatch):
+        """Test that tasks handed out in a heartbeat that never arrived are offered again."""
+        master, port = master_server
+        self._post(port, "/node/register",
+                   {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {},
+                    "slots": 2})
+        self._post(port, "/task", {"type": "test", "payload": {}})
+        send = MasterHTTPHandler._send_json_response
+
+        def broken_pipe(handler, data, *args, **kwargs):
+            if data.get("tasks"):
+                monkeypatch.setattr(MasterHTTPHandler, "_send_json_response", send)
+                raise BrokenPipeError("worker went away")
+            return send(handler, data, *args, **kwargs)
+
+        monkeypatch.setattr(MasterHTTPHandler, "_send_json_response", broken_pipe)
+        with pytest.raises((http.client.HTTPException, OSError)):
+            self._post(port, "/node/heartbeat", {"node_id": "node-1", "want": 2})
+
+        status, body = self._post(port, "/node/heartbeat", {"node_id": "node-1", "want": 2})
+        assert status == 200
+        assert len(json.loads(body)["tasks"]) == 1
+
+    def test_poll_unknown_node(self, master_server):
+        """Test that polling for an unregistered node is rejected."""
+        _, port = master_server
+        status, body = self._post(port, "/node/poll", {"node_id": "ghost", "timeout": 0})
+        assert status == 404
+        assert b"Node not found" in body
+
+    def test_poll_rejects_invalid_parameters(self, master_server):
+        """Test that a bad timeout or max_tasks gets 400 and max_tasks is at least 1."""
+        master, port = master_server
+        self._post(port, "/node/register",
+                   {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+        for data in ({"timeout": "soon"}, {"max_tasks": "all"}, {"max_tasks": None},
+                     {"timeout": float("nan")}):
+            status, _ = self._post(port, "/node/poll", dict(data, node_id="node-1"))
+            assert status == 400, data
+
+        self._post(port, "/task", {"type": "test", "payload": {}})
+        status, body = self._post(port, "/node/poll",
+                                  {"node_id": "node-1", "timeout": 0, "max_tasks": -5})
+        assert status == 200
+        assert len(json.loads(body)["tasks"]) == 1
+
+    def test_register_rejects_invalid_slots(self, master_server):
+        """Test that a bad slot count gets 400 and registers nothing."""
+        master, port = master_server
+        node = {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {}}
+        for data in ({"slots": "two"}, {"slots": None}, {"slots": 4, "queued": [1]}):
+            status, _ = self._post(port, "/node/register", dict(node, **data))
+            assert status == 400, data
+        assert master.node_manager.get_node("node-1") is None
+
+    def test_heartbeat_rejects_invalid_slots(self, master_server):
+        """Test that a bad field in a heartbeat gets 400 and leaves the node untouched."""
+        master, port = master_server
+        self._post(port, "/node/register", {"id": "node-1", "address": "127.0.0.1", "port": 0,
+                                            "capabilities": {}, "slots": 2})
+        for data in ({"slots": "two"}, {"running": None}, {"slots": 8, "prefetch_depth": "x"}):
+            status, _ = self._post(port, "/node/heartbeat", dict(data, node_id="node-1"))
+            assert status == 400, data
+        assert master.node_manager.get_node("node-1").slots == 2
+
+    def test_heartbeat_rejects_invalid_load(self, master_server):
+        """Test that load and CPU/memory use must be finite numbers."""
+        master, port = master_server
+        self._post(port, "/node/register",
+                   {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+        # json.dumps writes Infinity and NaN, which the master's json.loads accepts
+        for data in ({"load": "high"}, {"cpu_percent": None}, {"load": float("inf")},
+                     {"load": 1.0, "memory_percent": float("nan")}):
+            status, _ = self._post(port, "/node/heartbeat", dict(data, node_id="node-1"))
+            assert status == 400, data
+        node = master.node_manager.get_node("node-1")
+        assert (node.load, node.memory_percent, node.throttled) == (0.0, 0.0, False)
+
+    def test_poll_rejects_invalid_slots(self, master_server):
+        """Test that a bad field in a poll gets 400 and leaves the node untouched."""
+        master, port = master_server
+        self._post(port, "/node/register", {"id": "node-1", "address": "127.0.0.1", "port": 0,
+                                            "capabilities": {}, "slots": 2})
+        for data in ({"slots": "two"}, {"queued": None}, {"slots": 8, "running": {}}):
+            status, _ = self._post(port, "/node/poll", dict(data, node_id="node-1", timeout=0))
+            assert status == 400, data
+        assert master.node_manager.get_node("node-1").slots == 2
+
+    def test_poll_rejects_invalid_blobs(self, master_server):
+        """Test that cached blobs must be reported as a list of digests."""
+        master, port = master_server
+        self._post(port, "/node/register",
+                   {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+        for blobs in (5, "abc", {"abc": 1}, ["abc", 1]):
+            status, _ = self._post(port, "/node/poll",
+                                   {"node_id": "node-1", "timeout": 0, "blobs": blobs})
+            assert status == 400, blobs
+        status, _ = self._post(port, "/node/poll",
+                               {"node_id": "node-1", "timeout": 0, "blobs": ["abc"]})
+        assert status == 200
+        assert master.node_manager.get_node("node-1").blobs == {"abc"}
+
+
+class TestSpeculationAndStealing:
+    """Test cases for speculative copies of stragglers and work stealing."""
+
+    def _post(self, port, path, data):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("POST", path, body=json.dumps(data),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response.status, body
+
+    def _register(self, port, node_id, slots=1, prefetch_depth=0):
+        self._post(port, "/node/register", {"id": node_id, "address": "127.0.0.1", "port": 0,
+                                           "capabilities": {}, "slots": slots,
+                                           "prefetch_depth": prefetch_depth})
+
+    def _straggler(self, master, port):
+        """Start a task on node 'slow' that has run far longer than usual"""
+        master.scheduler.stragglers = StragglerDetector(min_samples=1, min_elapsed=0.0)
+        master.scheduler.stragglers.observe("test", "fast", 1.0)
+        self._register(port, "slow")
+        _, body = self._post(port, "/task", {"type": "test", "payload": {}})
+        task_id = json.loads(body)["task_id"]
+        master.scheduler.schedule()
+        assert [t.id for t in master.dispatcher.take("slow")] == [task_id]
+        self._post(port, "/task/update", {"task_id": task_id, "status": "running",
+                                          "node_id": "slow", "attempt": 1})
+        master.task_queue.get_task(task_id).started_at -= 100
+
+        self._register(port, "fast")
+        master.scheduler.schedule()
+        assert [t.id for t in master.dispatcher.take("fast")] == [task_id]
+        status, _ = self._post(port, "/task/update", {"task_id": task_id, "status": "running",
+                                                      "node_id": "fast", "attempt": 1})
+        assert status == 200
+        assert master.task_queue.get_task(task_id).assigned_node == "slow"
+        return task_id
+
+    def test_first_copy_to_complete_wins(self, master_server):
+        """Test that a straggler's copy completing first cancels the original."""
+        master, port = master_server
+        task_id = self._straggler(master, port)
+
+        status, _ = self._post(port, "/task/update", {
+            "task_id": task_id, "status": "completed", "node_id": "fast", "attempt": 1,
+            "result": {"by": "fast"}, "execution_time": 1.0})
+        assert status == 200
+        task = master.task_queue.get_task(task_id)
+        assert task.status == TaskStatus.COMPLETED
+        assert task.assigned_node == "fast"
+        assert master.dispatcher.take_cancellations("slow") == [task_id]
+        assert master.node_manager.get_node("slow").used_slots == 0
+
+        status, _ = self._post(port, "/task/update", {
+            "task_id": task_id, "status": "completed", "node_id": "slow", "attempt": 1,
+            "result": {"by": "slow"}})
+        assert status == 409
+        assert master.task_queue.get_result(task_id) == {"by": "fast"}
+
+    def test_copy_carries_on_when_original_fails(self, master_server):
+        """Test that the copy takes over the task when the original node fails it."""
+        master, port = master_server
+        task_id = self._straggler(master, port)
+
+        status, _ = self._post(port, "/task/update", {
+            "task_id": task_id, "status": "failed", "node_id": "slow", "attempt": 1,
+            "error": "disk full"})
+        assert status == 200
+        task = master.task_queue.get_task(task_id)
+        assert task.status == TaskStatus.RUNNING
+        assert task.assigned_node == "fast"
+
+    def test_non_idempotent_tasks_are_not_copied(self, master_server):
+        """Test that tasks that opted out never get a speculative copy."""
+        master, port = master_server
+        master.scheduler.stragglers = StragglerDetector(min_samples=1, min_elapsed=0.0)
+        master.scheduler.stragglers.observe("test", "fast", 1.0)
+        self._register(port, "slow")
+        _, body = self._post(port, "/task", {"type": "test", "payload": {},
+                                             "idempotent": False})
+        task_id = json.loads(body)["task_id"]
+        master.scheduler.schedule()
+        master.task_queue.update_task_status(task_id, TaskStatus.RUNNING)
+        master.task_queue.get_task(task_id).started_at -= 100
+
+        self._register(port, "fast")
+        assert master.scheduler.speculate(master.node_manager.get_online_nodes()) == 0
+
+    def test_idle_node_steals_unstarted_tasks(self, master_server):
+        """Test that an idle node takes over tasks a backlogged node has not started."""
+        master, port = master_server
+        master.scheduler.work_stealing = True
+        self._register(port, "busy", prefetch_depth=3)
+        ids = [json.loads(self._post(port, "/task", {"type": "test", "payload": {},
+                                                     "priority": i})[1])["task_id"]
+               for i in range(3)]
+        assert master.scheduler.schedule() == 3
+        # The busy worker received its tasks and started the most urgent one
+        master.dispatcher.take("busy", max_tasks=3)
+        self._post(port, "/task/update", {"task_id": ids[2], "status": "running",
+                                          "node_id": "busy", "attempt": 1})
+
+        self._register(port, "idle")
+        assert master.scheduler.schedule() == 1
+        stolen = master.task_queue.get_task(ids[1])
+        assert stolen.assigned_node == "idle"
+        assert stolen.attempts == 2
+        assert [t.id for t in master.dispatcher.take("idle")] == [ids[1]]
+        assert master.dispatcher.take_cancellations("busy") == [ids[1]]
+
+        # Should the busy worker start it anyway, its report is stale
+        status, _ = self._post(port, "/task/update", {"task_id": ids[1], "status": "running",
+                                                      "node_id": "busy", "attempt": 1})
+        assert status == 409
+
+    def test_delivered_non_idempotent_tasks_are_not_stolen(self, master_server):
+        """Test that tasks that opted out are only stolen before delivery."""
+        master, port = master_server
+        master.scheduler.work_stealing = True
+        self._register(port, "busy", prefetch_depth=2)
+        for _ in range(3):
+            self._post(port, "/task", {"type": "test", "payload": {}, "idempotent": False})
+        assert master.scheduler.schedule() == 3
+        master.dispatcher.take("busy", max_tasks=2)
+
+        self._register(port, "idle")
+        assert master.scheduler.schedule() == 1
+        assert master.dispatcher.take_cancellations("busy") == []
+        assert len(master.dispatcher.take("idle")) == 1
+
+
+class TestBlobEndpoints:
+    """Test cases for PUT /blob, GET /blob/<digest> and tasks reading blobs."""
+
+    def _request(self, port, method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        conn.close()
+        return response.status, data
+
+    def test_upload_download_and_reference(self, master_server, tmp_path):
+        """Test a chunked upload, reading it back, and submitting tasks that use it."""
+        master, port = master_server
+        master.blob_store = master.task_queue.blob_store = BlobStore(str(tmp_path))
+        content = bytes(range(256)) * 1000
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("PUT", "/blob", body=iter([content[:1000], content[1000:]]),
+                     encode_chunked=True)
+        response = conn.getresponse()
+        uploaded = json.loads(response.read())
+        conn.close()
+        assert response.status == 200
+        digest = uploaded["digest"]
+        assert uploaded["size"] == len(content)
+
+        assert self._request(port, "GET", f"/blob/{digest}") == (200, content)
+        assert self._request(port, "HEAD", f"/blob/{digest}")[0] == 200
+        assert self._request(port, "GET", f"/blob/{'0' * 64}")[0] == 404
+        status, _ = self._request(port, "PUT", "/blob", b"tampered",
+                                  {"X-Blob-Digest": digest})
+        assert status == 400
+
+        submit = {"type": "test", "payload": {}, "blobs": {"model": digest}}
+        status, body = self._request(port, "POST", "/task", json.dumps(submit))
+        assert status == 200
+        task = master.task_queue.get_task(json.loads(body)["task_id"])
+        assert task.to_dict()["blobs"] == {"model": digest}
+
+        for blobs in ({"model": "0" * 64}, {"model": "not-a-digest"}, ["x"]):
+            status, _ = self._request(port, "POST", "/task",
+                                      json.dumps(dict(submit, blobs=blobs)))
+            assert status == 400
+        status, _ = self._request(port, "POST", "/job", json.dumps(
+            {"type": "test", "params": [1], "blobs": {"model": "0" * 64}}))
+        assert status == 400
+
+    def test_resumable_upload_and_range_reads(self, master_server, tmp_path):
+        """Test Content-Range uploads, resume offsets and Range downloads."""
+        master, port = master_server
+        master.blob_store = BlobStore(str(tmp_path))
+        content = bytes(range(256)) * 400
+        digest = hashlib.sha256(content).hexdigest()
+        path = f"/blob/{digest}"
+        total = len(content)
+
+        def put_range(first, last):
+            return self._request(port, "PUT", path, content[first:last + 1],
+                                 {"Content-Range": f"bytes {first}-{last}/{total}"})
+
+        status, body = put_range(0, 49999)
+        assert status == 200
+        assert json.loads(body) == {"digest": digest, "offset": 50000, "complete": False}
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("HEAD", path)
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        assert response.status == 404
+        assert response.getheader("X-Upload-Offset") == "50000"
+
+        status, body = put_range(60000, total - 1)
+        assert status == 409
+        assert json.loads(body)["offset"] == 50000
+        status, body = put_range(50000, total - 1)
+        assert json.loads(body)["complete"] is True
+        assert self._request(port, "GET", path) == (200, content)
+
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        for header, expected in (("bytes=100-199", content[100:200]),
+                                 ("bytes=102000-", content[102000:]),
+                                 ("bytes=-10", content[-10:])):
+            conn.request("GET", path, headers={"Range": header})
+            response = conn.getresponse()
+            assert response.status == 206
+            assert response.read() == expected
+        conn.request("GET", path, headers={"Range": f"bytes={total}-"})
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 416
+        assert response.getheader("Content-Range") == f"bytes */{total}"
+        conn.close()
+
+    def test_parse_range(self):
+        """Test Range header parsing against a 1000 byte blob."""
+        parse = MasterHTTPHandler._parse_range
+        assert parse("bytes=0-99", 1000) == (0, 99)
+        assert parse("bytes=900-5000", 1000) == (900, 999)
+        assert parse("bytes=-1", 1000) == (999, 999)
+        assert parse("bytes=-5000", 1000) == (0, 999)
+        assert parse("bytes=0-1,5-6", 1000) is None
+        assert parse("bytes=abc", 1000) is None
+        assert parse("items=0-1", 1000) is None
+        with pytest.raises(ValueError):
+            parse("bytes=1000-", 1000)
+
+
+class TestStreamedResults:
+    """Test cases for POST /task/result uploads."""
+
+    def _post_chunked(self, port, chunks, headers):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("POST", "/task/result", body=iter(chunks),
+                     headers=headers, encode_chunked=True)
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response.status, body
+
+    def test_compressed_result_upload(self, master_server):
+        """Test that a chunked deflate result is stored with its execution time."""
+        master, port = master_server
+        task = Task(id="task-1", type="test", payload={})
+        master.task_queue.add_task(task)
+        result = {"values": list(range(20000))}
+        body = json.dumps(result).encode()
+        compressed = zlib.compress(body)
+        chunks = [compressed[i:i + 1000] for i in range(0, len(compressed), 1000)]
+
+        status, _ = self._post_chunked(port, chunks, {
+            "Content-Type": "application/json",
+            "Content-Encoding": "deflate",
+            "X-Task-Id": "task-1",
+            "X-Task-Status": "completed",
+            "X-Execution-Time": "1.5"
+        })
+
+        assert status == 200
+        stored = master.task_queue.get_task("task-1")
+        assert stored.status == TaskStatus.COMPLETED
+        assert master.task_queue.get_result("task-1") == result
+        assert stored.execution_time == 1.5
+
+    def test_unsupported_encoding(self, master_server):
+        """Test that an unknown Content-Encoding is rejected with 415."""
+        master, port = master_server
+        master.task_queue.add_task(Task(id="task-1", type="test", payload={}))
+        # Only send headers: the master must answer before reading the body
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.putrequest("POST", "/task/result")
+        conn.putheader("Transfer-Encoding", "chunked")
+        conn.putheader("Content-Encoding", "br")
+        conn.putheader("X-Task-Id", "task-1")
+        conn.endheaders()
+        status = conn.getresponse().status
+        conn.close()
+        assert status == 415
+        assert master.task_queue.get_task("task-1").status == TaskStatus.PENDING
+
+    def test_running_update_keeps_node_slot(self, master_server):
+        """Test that a RUNNING update does not count as a finished task."""
+        master, port = master_server
+        master.node_manager.register_node(
+            {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+        master.task_queue.add_task(Task(id="task-1", type="test", payload={}))
+        master.node_manager.assign_task_to_node("node-1", "task-1")
+
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        conn.request("POST", "/task/update",
+                     body=json.dumps({"task_id": "task-1", "status": "running",
+                                      "node_id": "node-1"}),
+                     headers={"Content-Type": "application/json"})
+        assert conn.getresponse().status == 200
+        conn.close()
+
+        node = master.node_manager.nodes["node-1"]
+        assert "task-1" in node.current_tasks
+        assert node.total_failed == 0
+
+
+class TestTaskDeadlines:
+    """Test cases for task timeouts and reclaiming tasks from lost nodes."""
+
+    def _assigned_master(self, task, config=None):
+        master = MasterService(config=config)
+        master.node_manager.register_node(
+            {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+        master.task_queue.add_task(task)
+        node = master.node_manager.get_node("node-1")
+        assert master.task_queue.get_task_for_node(node) is task
+        master.node_manager.assign_task_to_node("node-1", task.id)
+        return master
+
+    def _wait_for(self, predicate, timeout=5.0):
+        deadline = time.time() + timeout
+        while not predicate() and time.time() < deadline:
+            time.sleep(0.01)
+        return predicate()
+
+    def test_config_sets_timeouts_and_retry_policy(self):
+        """Test that task timeouts come from the queue and task type sections."""
+        master = MasterService(config={
+            "master": {"task_queue": {"task_timeout": 60, "max_retries": 5},
+                       "node_manager": {"heartbeat_timeout": 10}},
+            "task_types": {"compute": {"timeout": 120}}
+        })
+        master.task_queue.add_tasks([Task(id="a", type="compute", payload={}),
+                                     Task(id="b", type="test", payload={}),
+                                     Task(id="c", type="test", payload={}, timeout=5)])
+        assert master.task_queue.get_task("a").timeout == 120
+        assert master.task_queue.get_task("b").timeout == 60
+        assert master.task_queue.get_task("c").timeout == 5
+        assert master.task_queue.max_retries == 5
+        assert master.node_manager.heartbeat_timeout == 10
+
+    def test_timed_out_task_is_retried(self):
+        """Test that an overdue running task is released and re-queued after backoff."""
+        task = Task(id="task-1", type="test", payload={}, timeout=0.05)
+        master = self._assigned_master(
+            task, {"master": {"task_queue": {"retry_backoff": 0.05}}})
+        master.task_queue.update_task_status("task-1", TaskStatus.RUNNING, attempt=1)
+
+        with patch.object(master.deadlines, "TIMEOUT_GRACE", 0):
+            master.deadlines.track_running(task)
+            master.deadlines.start()
+            try:
+                assert self._wait_for(lambda: master.task_queue.pending_count() == 1)
+            finally:
+                master.deadlines.stop()
+
+        assert task.status == TaskStatus.PENDING
+        assert "timed out" in task.error
+        node = master.node_manager.get_node("node-1")
+        assert node.current_tasks == set()
+        assert node.total_failed == 1
+
+    def test_offline_node_tasks_are_reclaimed(self):
+        """Test that tasks held by a node with a stale heartbeat are released."""
+        task = Task(id="task-1", type="test", payload={})
+        master = self._assigned_master(task)
+        master.dispatcher.push("node-1", task)
+        master.node_manager.get_node("node-1").last_heartbeat = time.time() - 3600
+
+        master.deadlines.check_nodes()
+
+        assert task.status == TaskStatus.PENDING
+        assert task.assigned_node is None
+        assert master.node_manager.get_node("node-1").status == NodeStatus.OFFLINE
+        assert master.dispatcher.take("node-1", max_tasks=5) == []
+        # Re-queued only once the retry backoff has passed
+        assert master.task_queue.pending_count() == 0
+        assert master.deadlines.pending() == 1
+
+    def test_unstarted_assignment_is_reclaimed(self):
+        """Test that a task its idle node never starts is taken back when its lease ends."""
+        master = MasterService(config={"master": {"task_queue": {
+            "assignment_lease": 0.05, "retry_backoff": 0.05}}})
+        master.node_manager.register_node(
+            {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+        task = Task(id="task-1", type="test", payload={})
+        master.task_queue.add_task(task)
+        assert master.scheduler.schedule() == 1
+        assert task.status == TaskStatus.ASSIGNED
+
+        master.deadlines.start()
+        try:
+            assert self._wait_for(lambda: master.task_queue.pending_count() == 1)
+        finally:
+            master.deadlines.stop()
+
+        assert task.status == TaskStatus.PENDING
+        assert "not started on node node-1" in task.error
+        assert master.node_manager.get_node("node-1").current_tasks == set()
+        # Taken out of the mailbox, so the node is not handed the stale attempt
+        assert master.dispatcher.take("node-1", max_tasks=5) == []
+
+    def test_busy_node_keeps_its_queued_task(self):
+        """Test that the lease is renewed while every slot of the node runs another task."""
+        master = MasterService(config={"master": {"task_queue": {"assignment_lease": 60}}})
+        master.node_manager.register_node(
+            {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {},
+             "slots": 1, "prefetch_depth": 1})
+        master.task_queue.add_tasks([Task(id="running", type="test", payload={}),
+                                     Task(id="queued", type="test", payload={})])
+        assert master.scheduler.schedule() == 2
+        master.task_queue.update_task_status("running", TaskStatus.RUNNING, attempt=1)
+        assert master.deadlines.pending() == 2
+
+        master.deadlines.lease_expired("queued", 1, "node-1")
+        assert master.task_queue.get_task("queued").status == TaskStatus.ASSIGNED
+        assert master.deadlines.pending() == 3
+
+        # Once a slot is free the task should have started; it is reclaimed
+        master.task_queue.update_task_status("running", TaskStatus.COMPLETED, attempt=1)
+        master.node_manager.complete_task_on_node("node-1", "running", True)
+        master.deadlines.lease_expired("queued", 1, "node-1")
+        assert master.task_queue.get_task("queued").status == TaskStatus.PENDING
+        # A lease outliving its attempt does nothing
+        master.deadlines.lease_expired("running", 1, "node-1")
+        assert master.task_queue.get_task("running").status == TaskStatus.COMPLETED
+
+    def test_exhausted_retries_fail_task(self):
+        """Test that a task out of retries fails instead of going back to the queue."""
+        task = Task(id="task-1", type="test", payload={}, max_retries=0)
+        master = self._assigned_master(task)
+        master.task_queue.update_task_status("task-1", TaskStatus.RUNNING)
+
+        master.deadlines.release("task-1", 1, "Task timed out after 1s")
+
+        assert task.status == TaskStatus.FAILED
+        assert task.error == "Task timed out after 1s"
+        assert master.deadlines.pending() == 0
+
+    def test_stale_attempt_update_is_rejected(self, master_server):
+        """Test that a report from a reassigned task's old node gets a 409."""
+        master, port = master_server
+        master.node_manager.register_node(
+            {"id": "node-1", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+        task = Task(id="task-1", type="test", payload={})
+        master.task_queue.add_task(task)
+        node = master.node_manager.get_node("node-1")
+        master.task_queue.get_task_for_node(node)
+        master.task_queue.release_task("task-1", 1, "Node node-1 went offline")
+        master.task_queue.requeue("task-1", 1)
+        master.task_queue.get_task_for_node(node)
+
+        def post(attempt):
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("POST", "/task/update",
+                         body=json.dumps({"task_id": "task-1", "status": "completed",
+                                          "node_id": "node-1", "result": attempt,
+                                          "attempt": attempt}),
+                         headers={"Content-Type": "application/json"})
+            status = conn.getresponse().status
+            conn.close()
+            return status
+
+        assert post(1) == 409
+        assert task.status == TaskStatus.ASSIGNED
+        assert post(2) == 200
+        assert task.status == TaskStatus.COMPLETED
+        assert master.task_queue.get_result("task-1") == 2
+
+
+class TestContentNegotiation:
+    """Test cases for binary message formats and compressed responses."""
+
+    def _request(self, port, method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        conn.close()
+        return response, data
+
+    def test_binary_request_and_response(self, master_server):
+        """Test a CBOR task submission carrying a typed array, read back as CBOR and JSON."""
+        master, port = master_server
+        vector = array.array("d", [0.5, 1.5, 2.5])
+        body = encode({"type": "test", "payload": {"vector": vector}}, MEDIA_CBOR)
+        response, data = self._request(port, "POST", "/task", body, {
+            "Content-Type": MEDIA_CBOR, "Accept": f"{MEDIA_CBOR}, {MEDIA_JSON};q=0.5"})
+        assert response.status == 200
+        assert response.getheader("Content-Type") == MEDIA_CBOR
+        task_id = decode(data, MEDIA_CBOR)["task_id"]
+        assert master.task_queue.get_task(task_id).payload["vector"] == vector
+
+        response, data = self._request(port, "GET", f"/task/{task_id}",
+                                       headers={"Accept": MEDIA_CBOR})
+        assert decode(data, MEDIA_CBOR)["payload"]["vector"] == vector
+        # "*/*" and no Accept header both get JSON, with the array as a list
+        for headers in ({"Accept": "*/*"}, {}):
+            response, data = self._request(port, "GET", f"/task/{task_id}", headers=headers)
+            assert response.getheader("Content-Type") == MEDIA_JSON
+            assert json.loads(data)["payload"]["vector"] == [0.5, 1.5, 2.5]
+
+    def test_large_responses_are_compressed_when_accepted(self, master_server):
+        """Test compression above the threshold and compressed request bodies."""
+        master, port = master_server
+        payload = {"type": "test", "payload": {"text": "x" * 5000}}
+        response, data = self._request(port, "POST", "/task", zlib.compress(
+            json.dumps(payload).encode()), {"Content-Encoding": "deflate"})
+        assert response.status == 200
+        task_id = json.loads(data)["task_id"]
+
+        response, data = self._request(port, "GET", f"/task/{task_id}",
+                                       headers={"Accept-Encoding": "gzip, deflate"})
+        assert response.getheader("Content-Encoding") == "deflate"
+        assert json.loads(zlib.decompress(data))["payload"] == payload["payload"]
+        response, data = self._request(port, "GET", f"/task/{task_id}")
+        assert response.getheader("Content-Encoding") is None
+        # Small responses are not worth compressing
+        response, _ = self._request(port, "GET", "/jobs",
+                                    headers={"Accept-Encoding": "deflate"})
+        assert response.getheader("Content-Encoding") is None
+
+        master.compression_threshold = None
+        response, _ = self._request(port, "GET", f"/task/{task_id}",
+                                    headers={"Accept-Encoding": "deflate"})
+        assert response.getheader("Content-Encoding") is None
+
+    def test_unreadable_bodies_are_rejected(self, master_server):
+        """Test 415 for unknown encodings and 400 for malformed binary bodies."""
+        master, port = master_server
+        response, _ = self._request(port, "POST", "/task", b"{}",
+                                    {"Content-Encoding": "br"})
+        assert response.status == 415
+        response, _ = self._request(port, "POST", "/task", b"\xa1",
+                                    {"Content-Type": MEDIA_CBOR})
+        assert response.status == 400
+        # A CBOR batch is one array of task objects
+        tasks = [{"type": "test", "payload": {"i": i}} for i in range(3)]
+        response, data = self._request(port, "POST", "/tasks/batch",
+                                       encode(tasks, MEDIA_CBOR),
+                                       {"Content-Type": MEDIA_CBOR})
+        assert response.status == 200
+        assert json.loads(data)["count"] == 3
@@ -1,13 +1,33 @@
 """Tests for network_scanner module."""
 import pytest
 from unittest.mock import patch, MagicMock
+import asyncio
 import socket
 import ipaddress
+from src.lancompute import network_scanner
+from src.lancompute.inventory import HostInventory
 from src.lancompute.network_scanner import (
-    ping_host, scan_port, get_local_network, scan_host
+    LIVENESS_NONE, PORT_CLOSED, PORT_FILTERED, PORT_OPEN, SERVICE_OLLAMA, ping_host,
+    probe_port, scan_port, get_local_network, scan_host, scan_incremental, scan_network
 )
 
 
+def closed_port():
+    """A local port with nothing listening on it."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_banner_server(banner=b"SSH-2.0-test"):
+    async def handle(reader, writer):
+        writer.write(banner)
+        await writer.drain()
+        writer.close()
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
 class TestNetworkScanner:
     """Test cases for network scanner functionality."""
     
@@ -76,3 +96,102 @@ class TestNetworkScanner:
                 assert result['alive'] is True
                 assert isinstance(result['open_ports'], list)
                 assert isinstance(result['services'], dict)
+
+
+class TestAsyncScanner:
+    """Test cases for the asyncio scan engine."""
+
+    def test_probe_port_open_and_closed(self):
+        """Test non-blocking probes of a listening and a refusing port."""
+        async def run():
+            server, port = await start_banner_server()
+            async with server:
+                return (await probe_port("127.0.0.1", port),
+                        await probe_port("127.0.0.1", closed_port()))
+
+        assert asyncio.run(run()) == ((PORT_OPEN, "SSH-2.0-test"), (PORT_CLOSED, None))
+
+    def test_probe_port_times_out(self):
+        """Test that a connect that never completes is reported as filtered."""
+        async def never(sock, address):
+            await asyncio.sleep(10)
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            with patch.object(loop, "sock_connect", never):
+                return await probe_port("127.0.0.1", 80, timeout=0.05)
+
+        assert asyncio.run(run()) == (PORT_FILTERED, None)
+
+    def test_scan_network_streams_live_hosts(self):
+        """Test TCP liveness: a refused port marks a host up, silence does not."""
+        async def run():
+            server, port = await start_banner_server(b"")
+            async with server:
+                found = [host async for host in scan_network(
+                    ["127.0.0.1", "127.0.0.2"], [port, closed_port()], host_rate=1000)]
+                only_open = [host async for host in scan_network(
+                    ["127.0.0.1", "127.0.0.2"], [port], liveness=LIVENESS_NONE)]
+            return port, found, only_open
+
+        port, found, only_open = asyncio.run(run())
+        by_ip = {host["ip"]: host for host in found}
+        assert by_ip["127.0.0.1"]["open_ports"] == [port]
+        assert by_ip["127.0.0.1"]["services"] == {}
+        # Every 127/8 address is local, so the second host refuses rather than staying silent
+        assert by_ip["127.0.0.2"]["alive"] and by_ip["127.0.0.2"]["open_ports"] == []
+        assert [host["ip"] for host in only_open] == ["127.0.0.1"]
+
+    def test_scan_network_limits_concurrent_probes(self):
+        """Test that probes in flight never exceed the concurrency limit."""
+        in_flight = []
+        peak = []
+
+        async def fake_probe(ip, port, timeout=1.0, banner_timeout=1.0):
+            in_flight.append(port)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.001)
+            in_flight.remove(port)
+            return (PORT_CLOSED if ip.endswith(".7") else PORT_FILTERED), None
+
+        async def run():
+            hosts = [f"10.0.0.{i}" for i in range(1, 101)]
+            return [host async for host in scan_network(hosts, [1, 2, 3], concurrency=10)]
+
+        with patch.object(network_scanner, "probe_port", fake_probe):
+            found = asyncio.run(run())
+        assert [host["ip"] for host in found] == ["10.0.0.7"]
+        assert len(peak) == 300
+        assert max(peak) <= 10
+
+    def test_scan_incremental_skips_hosts_not_due(self, tmp_path):
+        """Test that a second scan only probes hosts whose recheck is due."""
+        probed = []
+
+        async def fake_probe(ip, port, timeout=1.0, banner_timeout=1.0):
+            probed.append(ip)
+            if ip == "10.0.0.2" and port == 11434:
+                return PORT_OPEN, "HTTP/1.1 200 OK\r\n\r\nOllama is running"
+            return (PORT_CLOSED if ip == "10.0.0.2" else PORT_FILTERED), None
+
+        async def scan(inventory, now):
+            hosts = ipaddress.ip_network("10.0.0.0/29").hosts()
+            return [host["ip"] async for host in scan_incremental(
+                inventory, hosts, [1234, 11434], now=now, batch_size=2)]
+
+        inventory = HostInventory(str(tmp_path / "hosts.db"), alive_interval=60,
+                                  dead_interval=600)
+        with patch.object(network_scanner, "probe_port", fake_probe):
+            assert asyncio.run(scan(inventory, 0.0)) == ["10.0.0.2"]
+            assert len(probed) == 12 and len(inventory) == 6
+            probed.clear()
+            assert asyncio.run(scan(inventory, 30.0)) == []
+            assert probed == []
+            # The live host is due before the silent ones
+            assert asyncio.run(scan(inventory, 60.0)) == ["10.0.0.2"]
+            assert sorted(set(probed)) == ["10.0.0.2"]
+        host = inventory.get("10.0.0.2")
+        assert host["service_types"] == {11434: SERVICE_OLLAMA}
+        assert host["first_seen"] == 0.0 and host["last_seen"] == 60.0
+        assert inventory.get("10.0.0.3")["next_check"] == 600
+        inventory.close()
@@ -0,0 +1,155 @@
+"""Tests for result_store module."""
+import os
+import time
+
+import pytest
+from unittest.mock import patch
+from src.lancompute.result_store import (
+    FileResultStore, MemoryResultStore, RedisResultStore, create_result_store
+)
+
+
+class TestMemoryResultStore:
+    """Test cases for MemoryResultStore class."""
+
+    def test_put_get_delete(self):
+        """Test basic result storage."""
+        store = MemoryResultStore()
+        store.put("task-1", {"value": 1})
+        assert store.get("task-1") == {"value": 1}
+        store.delete("task-1")
+        assert store.get("task-1") is None
+
+    def test_max_results_evicts_oldest(self):
+        """Test that the oldest results are dropped over the limit."""
+        store = MemoryResultStore(max_results=2)
+        for i in range(3):
+            store.put(f"task-{i}", i)
+        assert store.get("task-0") is None
+        assert store.get("task-2") == 2
+
+    def test_retention(self):
+        """Test that expired results are hidden and evicted."""
+        store = MemoryResultStore(retention_seconds=10)
+        store.put("task-1", "old")
+        with patch('src.lancompute.result_store.time.time', return_value=time.time() + 60):
+            assert store.get("task-1") is None
+            assert store.evict() == 1
+
+
+class TestFileResultStore:
+    """Test cases for FileResultStore class."""
+
+    def test_put_get_and_reopen(self, tmp_path):
+        """Test that results survive reopening the store."""
+        store = FileResultStore(str(tmp_path))
+        store.put("task-1", {"values": list(range(100))})
+        store.put("task-2", "second")
+        store.put("task-1", "overwritten")
+        store.delete("task-2")
+        assert store.get("task-1") == "overwritten"
+        store.close()
+
+        reopened = FileResultStore(str(tmp_path))
+        assert reopened.get("task-1") == "overwritten"
+        assert reopened.get("task-2") is None
+        assert reopened.stats()['results'] == 1
+        reopened.close()
+
+    def test_torn_tail_is_truncated(self, tmp_path):
+        """Test that a partially written record is dropped on open."""
+        store = FileResultStore(str(tmp_path))
+        store.put("task-1", "kept")
+        store.put("task-2", "torn")
+        store.close()
+
+        path = store._segment_path(1)
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 3)
+
+        reopened = FileResultStore(str(tmp_path))
+        assert reopened.get("task-1") == "kept"
+        assert reopened.get("task-2") is None
+        reopened.put("task-3", "after")
+        assert reopened.get("task-3") == "after"
+        reopened.close()
+
+    def test_segments_roll_and_size_eviction(self, tmp_path):
+        """Test that the oldest sealed segments are removed over the size limit."""
+        store = FileResultStore(str(tmp_path), segment_size=1024, max_size_bytes=4096)
+        for i in range(40):
+            store.put(f"task-{i}", "x" * 200)
+        assert store.stats()['segments'] > 4
+
+        dropped = store.evict()
+        assert dropped > 0
+        assert store.stats()['size_bytes'] <= 4096
+        assert store.get("task-0") is None
+        assert store.get("task-39") == "x" * 200
+        store.close()
+
+    def test_retention_drops_whole_segments(self, tmp_path):
+        """Test that sealed segments past retention are deleted."""
+        store = FileResultStore(str(tmp_path), segment_size=256, retention_seconds=60)
+        for i in range(10):
+            store.put(f"task-{i}", "y" * 100)
+        with patch('src.lancompute.result_store.time.time', return_value=time.time() + 120):
+            assert store.get("task-0") is None
+            assert store.evict() > 0
+        assert store.stats()['segments'] == 1
+        store.close()
+
+
+class FakeRedis:
+    """Minimal stand-in for a redis client."""
+
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value.encode(), ex)
+
+    def get(self, key):
+        entry = self.data.get(key)
+        return entry[0] if entry else None
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class TestRedisResultStore:
+    """Test cases for RedisResultStore class."""
+
+    def test_put_get_with_ttl(self):
+        """Test that results are stored under the prefix with a TTL."""
+        client = FakeRedis()
+        store = RedisResultStore(prefix="test:", ttl=30, client=client)
+        store.put("task-1", [1, 2, 3])
+        assert client.data["test:result:task-1"][1] == 30
+        assert store.get("task-1") == [1, 2, 3]
+        store.delete("task-1")
+        assert store.get("task-1") is None
+
+
+class TestCreateResultStore:
+    """Test cases for create_result_store."""
+
+    def test_default_is_memory(self):
+        """Test that no storage config keeps results in memory."""
+        assert isinstance(create_result_store(None), MemoryResultStore)
+
+    def test_file_backend_from_config(self, tmp_path):
+        """Test building the file backend from the storage section."""
+        store = create_result_store({
+            'backend': 'file',
+            'file': {'base_dir': str(tmp_path), 'retention_days': 7, 'max_size_gb': 1}
+        })
+        assert isinstance(store, FileResultStore)
+        assert store.retention_seconds == 7 * 86400
+        assert store.max_size_bytes == 1024 ** 3
+        store.close()
+
+    def test_unknown_backend(self):
+        """Test that unsupported backends are rejected."""
+        with pytest.raises(ValueError):
+            create_result_store({'backend': 's3'})
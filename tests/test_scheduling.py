@@ -0,0 +1,140 @@
+"""Tests for scheduling module."""
+import pytest
+from src.lancompute.master_service import MasterService, Node, Task, TaskQueue, TaskStatus
+from src.lancompute.scheduling import (
+    ExecutionTimeEstimator, LeastLoadedPolicy, PredictivePolicy, RoundRobinPolicy,
+    SchedulingPolicy, StragglerDetector, create_policy
+)
+
+
+def make_node(node_id, cpus=4, slots=2, load=0.0):
+    return Node(node_id, "127.0.0.1", 0, {"cpu_count_logical": cpus}, slots=slots, load=load)
+
+
+class TestPolicies:
+    """Test cases for node ranking policies."""
+
+    def test_round_robin_continues_after_last_assignment(self):
+        """Test that round robin does not always start from the same node."""
+        policy = RoundRobinPolicy()
+        nodes = [make_node("c"), make_node("a"), make_node("b")]
+        assert [n.id for n in policy.rank(nodes, TaskQueue())] == ["a", "b", "c"]
+        policy.task_assigned(Task("t", "test", {}), nodes[1])
+        assert [n.id for n in policy.rank(nodes, TaskQueue())] == ["b", "c", "a"]
+
+    def test_least_loaded_weighs_by_cpus_and_reported_load(self):
+        """Test that load is per logical CPU and includes the reported load average."""
+        small = make_node("small", cpus=2)
+        big = make_node("big", cpus=16)
+        busy = make_node("busy", cpus=16, load=15.0)
+        small.current_tasks = {"t1"}
+        big.current_tasks = {"t2", "t3"}
+        ranked = LeastLoadedPolicy().rank([small, big, busy], TaskQueue())
+        assert [n.id for n in ranked] == ["big", "small", "busy"]
+
+    def test_estimator_uses_type_average_for_new_nodes(self):
+        """Test EWMA estimates per node with a per-type fallback."""
+        estimator = ExecutionTimeEstimator(alpha=0.5, default=7.0)
+        assert estimator.estimate("compute", "a") == 7.0
+        estimator.observe("compute", "a", 2.0)
+        estimator.observe("compute", "a", 4.0)
+        assert estimator.estimate("compute", "a") == 3.0
+        assert estimator.estimate("compute", "b") == 3.0
+
+    def test_straggler_threshold_from_type_history(self):
+        """Test that stragglers are judged against a quantile of their type's times."""
+        detector = StragglerDetector(quantile=0.9, multiplier=2.0, min_samples=10,
+                                     min_elapsed=1.0)
+        for seconds in range(1, 10):
+            detector.observe("compute", "a", float(seconds))
+        assert detector.threshold("compute") is None
+        detector.observe("compute", "a", 10.0)
+        assert detector.threshold("compute") == 20.0
+        assert detector.is_straggler("compute", 21.0)
+        assert not detector.is_straggler("compute", 19.0)
+        assert not detector.is_straggler("render", 1000.0)
+
+    def test_predictive_prefers_fast_node_and_holds_back_slow_one(self):
+        """Test that a slow node is skipped when faster nodes can absorb the backlog."""
+        queue = TaskQueue()
+        queue.add_task(Task("t1", "compute", {}))
+        policy = PredictivePolicy(clock=lambda: 100.0)
+        for _ in range(3):
+            policy.task_finished(Task("x", "compute", {}, status=TaskStatus.COMPLETED,
+                                      execution_time=1.0), "fast")
+            policy.task_finished(Task("x", "compute", {}, status=TaskStatus.COMPLETED,
+                                      execution_time=10.0), "slow")
+        fast, slow = make_node("fast"), make_node("slow")
+        assert policy.rank([slow, fast], queue) == [fast]
+
+        # With more queued work than the fast node gets through, both are used
+        queue.add_tasks([Task(f"t{i}", "compute", {}) for i in range(2, 40)])
+        assert policy.rank([slow, fast], queue) == [fast, slow]
+
+
+class TestSchedulerPolicy:
+    """Test cases for the scheduler's use of the configured policy."""
+
+    def test_config_selects_policy(self):
+        """Test that master.scheduler settings pick the policy."""
+        def policy_for(settings):
+            return MasterService(config={"master": {"scheduler": settings}}).scheduler.policy
+
+        assert type(policy_for({})) is SchedulingPolicy
+        assert isinstance(policy_for({"algorithm": "least_loaded"}), LeastLoadedPolicy)
+        assert isinstance(policy_for({"algorithm": "round_robin",
+                                      "predictive_scheduling": True}), PredictivePolicy)
+        scheduler = MasterService(config={"master": {"scheduler": {
+            "work_stealing": True, "speculation": {"enabled": True, "multiplier": 3}}}}).scheduler
+        assert scheduler.work_stealing
+        assert scheduler.stragglers.multiplier == 3
+        assert MasterService().scheduler.stragglers is None
+        with pytest.raises(ValueError, match="Unknown scheduling algorithm"):
+            create_policy("fastest")
+
+    def test_schedule_spreads_tasks_with_round_robin(self):
+        """Test that round robin does not favour the first registered node."""
+        master = MasterService(config={"master": {"scheduler": {"algorithm": "round_robin"}}})
+        for node_id in ("a", "b", "c"):
+            master.node_manager.register_node({"id": node_id, "address": "127.0.0.1",
+                                               "port": 0, "capabilities": {}, "slots": 4})
+        for round_number in range(3):
+            master.task_queue.add_task(Task(f"t{round_number}", "test", {}))
+            assert master.scheduler.schedule() == 1
+        assert sorted(master.dispatcher.pending(node_id) for node_id in ("a", "b", "c")) == [
+            1, 1, 1]
+
+    def test_schedule_packs_weighted_tasks_into_capacity(self):
+        """Test that scheduling fills oversubscribed capacity by task slots."""
+        master = MasterService(config={"master": {"node_manager": {
+            "oversubscription_factor": 1.5}}})
+        master.node_manager.register_node({"id": "a", "address": "127.0.0.1", "port": 0,
+                                           "capabilities": {}, "slots": 4,
+                                           "prefetch_depth": 0})
+        master.task_queue.add_tasks(
+            [Task("wide", "test", {}, priority=2, slots=4),
+             Task("too-wide", "test", {}, priority=1, slots=4)]
+            + [Task(f"t{i}", "test", {}) for i in range(4)])
+        assert master.scheduler.schedule() == 3
+        node = master.node_manager.get_node("a")
+        assert node.current_tasks == {"wide", "t0", "t1"}
+        assert node.used_slots == 6
+
+        master.node_manager.complete_task_on_node("a", "wide", True)
+        assert master.scheduler.schedule() == 1
+        assert "too-wide" in node.current_tasks
+
+    def test_schedule_sends_tasks_to_nodes_caching_their_blobs(self):
+        """Test that a node holding a task's input takes it ahead of nodes ranked first."""
+        master = MasterService(config={"master": {"scheduler": {"algorithm": "round_robin"}}})
+        # Without a blob store any digest is accepted
+        master.task_queue.blob_store = None
+        for node_id in ("a", "b"):
+            master.node_manager.register_node({"id": node_id, "address": "127.0.0.1",
+                                               "port": 0, "capabilities": {}, "slots": 1})
+        master.node_manager.update_heartbeat("b", {"blobs": ["f" * 64]})
+        master.task_queue.add_tasks([Task("reads-blob", "test", {}, blobs={"in": "f" * 64}),
+                                     Task("plain", "test", {})])
+        assert master.scheduler.schedule() == 2
+        assert master.task_queue.get_task("reads-blob").assigned_node == "b"
+        assert master.task_queue.get_task("plain").assigned_node == "a"
@@ -1,7 +1,16 @@
 """Tests for worker_service module."""
 import pytest
 from unittest.mock import patch, MagicMock
-from src.lancompute.worker_service import PlatformDetector, WorkerConfig, WorkerService
+import hashlib
+import requests
+import threading
+import time
+import zlib
+from src.lancompute.codec import decode
+from src.lancompute.master_service import MasterHTTPServer, MasterService, Task, TaskStatus
+from src.lancompute.worker_service import (
+    PlatformDetector, TaskExecutor, WorkerConfig, WorkerService
+)
 
 
 class TestPlatformDetector:
@@ -41,6 +50,123 @@ class TestPlatformDetector:
             assert result is False
 
 
+class TestTaskExecutor:
+    """Test cases for TaskExecutor slots and the local run queue."""
+
+    def test_slots_default_to_pool_size(self):
+        """Test that slots follow the executor size unless capped."""
+        config = WorkerConfig(node_id="test-node", master_url="http://localhost:8080")
+        executor = TaskExecutor(config, {'cpu_count_logical': 32})
+        assert executor.slots == 32
+        assert executor.wanted_tasks() == 32 + config.prefetch_depth
+        executor.shutdown()
+
+    def test_run_queue_starts_prefetched_task_when_slot_frees(self):
+        """Test that queued tasks start as soon as a running one finishes."""
+        config = WorkerConfig(node_id="test-node", master_url="http://localhost:8080",
+                              max_concurrent_tasks=1, prefetch_depth=1)
+        executor = TaskExecutor(config, {'cpu_count_logical': 2})
+        started = []
+        executor.on_task_start = lambda task: started.append(task['id'])
+
+        executor.submit_task({'id': 'task-1', 'type': 'test', 'payload': {'duration': 0.1}})
+        executor.submit_task({'id': 'task-2', 'type': 'test', 'payload': {'duration': 0}})
+
+        assert started == ['task-1']
+        assert executor.slot_stats() == {'slots': 1, 'running': 1, 'queued': 1,
+                                         'prefetch_depth': 1}
+        assert executor.wanted_tasks() == 0
+
+        deadline = time.time() + 5
+        while executor.has_task('task-2') and time.time() < deadline:
+            time.sleep(0.01)
+        assert started == ['task-1', 'task-2']
+        assert executor.wanted_tasks() == 2
+        executor.shutdown()
+
+    def test_tasks_take_their_slots(self):
+        """Test that a task taking several slots waits until they are free."""
+        config = WorkerConfig(node_id="test-node", master_url="http://localhost:8080",
+                              max_concurrent_tasks=4, prefetch_depth=0)
+        executor = TaskExecutor(config, {'cpu_count_logical': 4})
+        started = []
+        executor.on_task_start = lambda task: started.append(task['id'])
+
+        executor.submit_task({'id': 'task-1', 'type': 'test', 'payload': {'duration': 0.2},
+                              'slots': 2})
+        executor.submit_task({'id': 'task-2', 'type': 'test', 'payload': {'duration': 0},
+                              'slots': 4})
+        assert started == ['task-1']
+        assert executor.wanted_tasks() == 1
+
+        deadline = time.time() + 5
+        while executor.has_task('task-2') and time.time() < deadline:
+            time.sleep(0.01)
+        assert started == ['task-1', 'task-2']
+        assert executor.used_slots == 0
+        executor.shutdown()
+
+    def test_cancelled_tasks_are_dropped_without_a_report(self):
+        """Test that tasks the master took back are dequeued or stopped silently."""
+        config = WorkerConfig(node_id="test-node", master_url="http://localhost:8080",
+                              max_concurrent_tasks=1, prefetch_depth=1)
+        executor = TaskExecutor(config, {'cpu_count_logical': 1})
+        reported = []
+        executor.on_task_complete = lambda task_id, outcome: reported.append(task_id)
+
+        executor.submit_task({'id': 'task-1', 'type': 'test', 'payload': {'duration': 30}})
+        executor.submit_task({'id': 'task-2', 'type': 'test', 'payload': {'duration': 0}})
+        assert executor.cancel_task('task-2')
+        assert executor.cancel_task('task-1')
+        assert not executor.cancel_task('task-3')
+
+        deadline = time.time() + 5
+        while executor.has_task('task-1') and time.time() < deadline:
+            time.sleep(0.01)
+        assert not executor.has_task('task-1')
+        executor.shutdown()
+        assert reported == []
+
+    def _run_until_reported(self, executor, task, timeout=10):
+        reported = []
+        executor.on_task_complete = lambda task_id, outcome: reported.append(outcome)
+        start = time.time()
+        executor.submit_task(task)
+        while not reported and time.time() - start < timeout:
+            time.sleep(0.01)
+        return reported, time.time() - start
+
+    def test_thread_task_times_out(self):
+        """Test that an overdue thread task is reported failed and asked to stop."""
+        config = WorkerConfig(node_id="test-node", master_url="http://localhost:8080")
+        executor = TaskExecutor(config, {'cpu_count_logical': 2})
+        reported, elapsed = self._run_until_reported(executor, {
+            'id': 'task-1', 'type': 'test', 'payload': {'duration': 30},
+            'timeout': 0.2, 'attempts': 2})
+
+        assert elapsed < 5
+        assert reported[0]['status'] == 'failed'
+        assert 'timed out' in reported[0]['error']
+        assert reported[0]['attempt'] == 2
+        # The cancelled task returns promptly and is not reported a second time
+        executor.shutdown()
+        assert len(reported) == 1
+
+    def test_process_task_is_killed_at_deadline(self):
+        """Test that the process executor kills a task that overruns its timeout."""
+        config = WorkerConfig(node_id="test-node", master_url="http://localhost:8080",
+                              executor_type='process', task_timeout=0.5)
+        executor = TaskExecutor(config, {'cpu_count_logical': 1})
+        reported, elapsed = self._run_until_reported(executor, {
+            'id': 'task-1', 'type': 'test', 'payload': {'duration': 30}})
+
+        assert elapsed < 10
+        assert reported[0]['status'] == 'failed'
+        assert 'timed out' in reported[0]['error']
+        assert not executor.has_task('task-1')
+        executor.shutdown()
+
+
 class TestWorkerService:
     """Test cases for WorkerService class."""
     
@@ -97,3 +223,261 @@ class TestWorkerService:
             result = worker._register()
             
             assert result is False
+
+    def test_poll_once_accepts_pushed_tasks(self):
+        """Test that tasks from a long poll are accepted."""
+        config = WorkerConfig(
+            master_url="http://localhost:8080",
+            node_id="test-node"
+        )
+
+        with patch('src.lancompute.worker_service.PlatformDetector.get_capabilities') as mock_detect:
+            mock_detect.return_value = {'cpu_count': 4}
+            worker = WorkerService(config)
+
+        response = MagicMock(status_code=200)
+        response.json.return_value = {'status': 'ok', 'tasks': [{'id': 'task-1', 'type': 'test'}]}
+        with patch.object(worker.poll_session, 'post', return_value=response):
+            with patch.object(worker, '_accept_task') as mock_accept:
+                assert worker._poll_once() is True
+                mock_accept.assert_called_once_with({'id': 'task-1', 'type': 'test'})
+
+    def test_poll_once_detects_missing_endpoint(self):
+        """Test falling back when the master has no poll endpoint."""
+        config = WorkerConfig(
+            master_url="http://localhost:8080",
+            node_id="test-node"
+        )
+
+        with patch('src.lancompute.worker_service.PlatformDetector.get_capabilities') as mock_detect:
+            mock_detect.return_value = {'cpu_count': 4}
+            worker = WorkerService(config)
+
+        response = MagicMock(status_code=404, text="Not Found")
+        with patch.object(worker.poll_session, 'post', return_value=response):
+            assert worker._poll_once() is False
+
+
+    def test_accept_task_ignores_redelivery(self):
+        """Test that a task already held by the executor is not run twice."""
+        config = WorkerConfig(
+            master_url="http://localhost:8080",
+            node_id="test-node"
+        )
+
+        with patch('src.lancompute.worker_service.PlatformDetector.get_capabilities') as mock_detect:
+            mock_detect.return_value = {'cpu_count': 4}
+            worker = WorkerService(config)
+
+        with patch.object(worker.executor, 'has_task', return_value=True):
+            with patch.object(worker.executor, 'submit_task') as mock_submit:
+                worker._accept_task({'id': 'task-1', 'type': 'test'})
+                mock_submit.assert_not_called()
+
+class TestResultReporting:
+    """Test cases for reporting task outcomes to the master."""
+
+    def _make_worker(self, **overrides):
+        overrides.setdefault('master_url', "http://localhost:8080")
+        config = WorkerConfig(node_id="test-node", **overrides)
+        with patch('src.lancompute.worker_service.PlatformDetector.get_capabilities') as mock_detect:
+            mock_detect.return_value = {'cpu_count': 4}
+            return WorkerService(config)
+
+    def _wait_for_outcome(self, worker, timeout=5):
+        while True:
+            task_id, outcome = worker.result_queue.get(timeout=timeout)
+            if outcome['status'] != 'running':
+                return task_id, outcome
+
+    def test_completion_reports_real_result(self):
+        """Test that the done-callback queues the task's actual return value."""
+        worker = self._make_worker()
+        worker.executor.submit_task({'id': 'task-1', 'type': 'test', 'payload': {'duration': 0}})
+
+        task_id, outcome = self._wait_for_outcome(worker)
+        assert task_id == 'task-1'
+        assert outcome['status'] == 'completed'
+        assert outcome['result']['result'] == 'test completed'
+        assert outcome['execution_time'] >= 0
+        worker.executor.shutdown()
+
+    def test_start_is_reported_by_the_reporter(self):
+        """Test that starting a task queues its running report instead of posting it."""
+        worker = self._make_worker()
+        with patch.object(worker, '_update_task_status') as mock_update:
+            worker.executor.submit_task({'id': 'task-1', 'type': 'test', 'attempts': 3,
+                                         'payload': {'duration': 0}})
+            started = worker.result_queue.get(timeout=5)
+            finished = worker.result_queue.get(timeout=5)
+            mock_update.assert_not_called()
+
+            worker._report_result(*started)
+            mock_update.assert_called_once_with('task-1', 'running', error=None,
+                                                execution_time=None, attempt=3)
+        assert started == ('task-1', {'status': 'running', 'attempt': 3})
+        assert finished[1]['status'] == 'completed'
+        worker.executor.shutdown()
+
+    def test_failure_reports_failed(self):
+        """Test that a failing task is reported as failed, not completed."""
+        worker = self._make_worker()
+        worker.executor.submit_task({'id': 'task-1', 'type': 'no-such-type', 'payload': {}})
+
+        task_id, outcome = self._wait_for_outcome(worker)
+        assert outcome['status'] == 'failed'
+        assert outcome['error']
+        worker.executor.shutdown()
+
+    def test_parent_results_are_fetched_by_reference(self):
+        """Test that a dependent task gets its parents' results from the master."""
+        worker = self._make_worker()
+        response = MagicMock(status_code=200)
+        response.json.return_value = {'answer': 42}
+        with patch.object(worker.session, 'get', return_value=response) as mock_get:
+            worker.executor.submit_task({'id': 'task-2', 'type': 'test',
+                                         'payload': {'duration': 0}, 'depends_on': ['task-1']})
+            task_id, outcome = self._wait_for_outcome(worker)
+
+        mock_get.assert_called_once_with("http://localhost:8080/task/task-1/result",
+                                         timeout=30)
+        assert outcome['status'] == 'completed'
+        assert outcome['result']['inputs'] == ['task-1']
+        worker.executor.shutdown()
+
+    def test_input_blobs_are_cached_between_tasks(self, tmp_path):
+        """Test that a blob is downloaded once and handed to tasks as a file."""
+        worker = self._make_worker(blob_cache_dir=str(tmp_path))
+        data = b'weights' * 1000
+        digest = hashlib.sha256(data).hexdigest()
+        response = MagicMock(status_code=200)
+        response.__enter__.return_value = response
+        response.iter_content.return_value = [data[:3000], data[3000:]]
+        with patch.object(worker.session, 'get', return_value=response) as mock_get:
+            for task_id in ('task-1', 'task-2'):
+                worker.executor.submit_task({'id': task_id, 'type': 'test',
+                                             'payload': {'duration': 0},
+                                             'blobs': {'model': digest}})
+                _, outcome = self._wait_for_outcome(worker)
+                assert outcome['result']['blobs'] == {'model': len(data)}
+
+        assert mock_get.call_count == 1
+        assert mock_get.call_args[0][0] == f"http://localhost:8080/blob/{digest}"
+        assert worker.executor.blob_cache.digests() == [digest]
+        worker.executor.shutdown()
+
+    def test_interrupted_blob_download_resumes_with_range(self):
+        """Test that a dropped download asks only for the missing bytes."""
+        worker = self._make_worker()
+        data = b'0123456789' * 100
+
+        def broken_stream(chunk_size):
+            yield data[:300]
+            raise requests.exceptions.ChunkedEncodingError("connection reset")
+
+        first = MagicMock(status_code=200)
+        first.__enter__.return_value = first
+        first.iter_content.side_effect = broken_stream
+        second = MagicMock(status_code=206)
+        second.__enter__.return_value = second
+        second.iter_content.return_value = [data[300:]]
+        with patch.object(worker.session, 'get', side_effect=[first, second]) as mock_get:
+            assert b''.join(worker._fetch_blob('a' * 64)) == data
+
+        assert mock_get.call_args_list[0][1]['headers'] is None
+        assert mock_get.call_args_list[1][1]['headers'] == {'Range': 'bytes=300-'}
+        worker.executor.shutdown()
+
+    def test_large_result_is_streamed(self):
+        """Test that results over the threshold go to /task/result in chunks."""
+        worker = self._make_worker(result_stream_threshold=1024)
+        uploaded = {}
+
+        def fake_post(url, data=None, headers=None, **kwargs):
+            uploaded['url'] = url
+            uploaded['headers'] = headers
+            uploaded['body'] = b''.join(data)
+            return MagicMock(status_code=200)
+
+        result = {'values': list(range(5000))}
+        with patch.object(worker.session, 'post', side_effect=fake_post):
+            worker._report_result('task-1', {'status': 'completed', 'result': result,
+                                             'execution_time': 0.25})
+
+        assert uploaded['url'].endswith('/task/result')
+        assert uploaded['headers']['X-Task-Id'] == 'task-1'
+        assert uploaded['headers']['Content-Encoding'] == 'deflate'
+        assert decode(zlib.decompress(uploaded['body']),
+                      uploaded['headers']['Content-Type']) == result
+
+    def test_large_result_with_attempt_is_streamed_to_master(self):
+        """Test that a streamed result carrying its attempt number is accepted."""
+        master = MasterService(host="127.0.0.1", port=0)
+        server = MasterHTTPServer(("127.0.0.1", 0), master)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            node = master.node_manager.register_node(
+                {"id": "test-node", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+            master.task_queue.add_task(Task(id="task-1", type="test", payload={}))
+            task = master.task_queue.get_task_for_node(node)
+            worker = self._make_worker(
+                master_url=f"http://127.0.0.1:{server.server_address[1]}",
+                result_stream_threshold=1024)
+            responses = []
+            post = worker.session.post
+
+            def recording_post(url, *args, **kwargs):
+                response = post(url, *args, **kwargs)
+                responses.append((url, response.status_code))
+                return response
+
+            result = {'values': list(range(5000))}
+            with patch.object(worker.session, 'post', side_effect=recording_post):
+                worker._report_result('task-1', {'status': 'completed', 'result': result,
+                                                 'execution_time': 0.25,
+                                                 'attempt': task.attempts})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert responses == [(f"{worker.config.master_url}/task/result", 200)]
+        assert master.task_queue.get_task("task-1").status == TaskStatus.COMPLETED
+        assert master.task_queue.get_result("task-1") == result
+        worker.executor.shutdown()
+
+    def test_result_too_large_for_master_fails_task(self):
+        """Test that a streamed result over the master's size limit fails the task."""
+        master = MasterService(host="127.0.0.1", port=0)
+        master.max_result_size = 10000
+        server = MasterHTTPServer(("127.0.0.1", 0), master)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            node = master.node_manager.register_node(
+                {"id": "test-node", "address": "127.0.0.1", "port": 0, "capabilities": {}})
+            master.task_queue.add_task(Task(id="task-1", type="test", payload={}))
+            task = master.task_queue.get_task_for_node(node)
+            worker = self._make_worker(
+                master_url=f"http://127.0.0.1:{server.server_address[1]}",
+                result_stream_threshold=1024)
+            worker._report_result('task-1', {'status': 'completed',
+                                             'result': {'values': list(range(50000))},
+                                             'execution_time': 0.25,
+                                             'attempt': task.attempts})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        task = master.task_queue.get_task("task-1")
+        assert task.status == TaskStatus.FAILED
+        assert "larger than the master accepts" in task.error
+        assert master.task_queue.get_result("task-1") is None
+        worker.executor.shutdown()
+
+    def test_small_result_is_inlined(self):
+        """Test that small results use the regular status update."""
+        worker = self._make_worker()
+        with patch.object(worker, '_update_task_status') as mock_update:
+            worker._report_result('task-1', {'status': 'completed', 'result': {'ok': True},
+                                             'execution_time': 0.1})
+        mock_update.assert_called_once_with('task-1', 'completed', result={'ok': True},
+                                            execution_time=0.1, attempt=None)